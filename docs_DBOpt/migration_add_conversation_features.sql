@@ -0,0 +1,20 @@
+-- Migration: Add ingest-time conversation feature columns
+-- Date: 2026-10-17
+-- Description: Scalar features computed once in ConversationEventService.create_event
+--              (turns, per-speaker message counts, heuristic question count, text length,
+--              content hash). Scoring and the worker read these instead of re-walking
+--              conversation_log. Rows created before this migration keep NULL and fall back
+--              to counting from the log.
+
+ALTER TABLE conversation_events
+    ADD COLUMN IF NOT EXISTS total_turns INTEGER NULL,
+    ADD COLUMN IF NOT EXISTS pika_message_count INTEGER NULL,
+    ADD COLUMN IF NOT EXISTS user_message_count INTEGER NULL,
+    ADD COLUMN IF NOT EXISTS user_question_count INTEGER NULL,
+    ADD COLUMN IF NOT EXISTS text_length INTEGER NULL,
+    ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64) NULL;
+
+-- Tìm hội thoại trùng nội dung (retry / gửi lặp từ BE)
+CREATE INDEX IF NOT EXISTS ix_conversation_events_content_hash
+    ON conversation_events (content_hash)
+    WHERE content_hash IS NOT NULL;
@@ -0,0 +1,28 @@
+-- Migration: Add end-of-day friendship rollup (streak_day)
+-- Date: 2026-10-17
+-- Description: friendship_status.streak_date = ngày cuối cùng đã được tính vào streak_day.
+--              friendship_daily_rollups = checkpoint (keyset last_user_id) + report của mỗi ngày.
+--              Index (user_id, end_time) cho query activity theo chunk user_id + ngày.
+--
+-- Rollout:
+--   1. Run this migration
+--   2. Deploy with DAILY_ROLLUP_ENABLED=True (job chạy trên scheduler leader)
+
+ALTER TABLE friendship_status
+    ADD COLUMN IF NOT EXISTS streak_date DATE NULL;
+
+CREATE TABLE IF NOT EXISTS friendship_daily_rollups (
+    rollup_date DATE PRIMARY KEY,
+    last_user_id VARCHAR(255) NOT NULL DEFAULT '',
+    rows_scanned BIGINT NOT NULL DEFAULT 0,
+    rows_active BIGINT NOT NULL DEFAULT 0,
+    rows_updated BIGINT NOT NULL DEFAULT 0,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    completed_at TIMESTAMPTZ NULL,
+    duration_seconds DOUBLE PRECISION NULL
+);
+
+-- Bảng lớn: tạo index không khóa ghi (không chạy được trong transaction block)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_conversation_events_user_end_time
+    ON conversation_events (user_id, end_time);
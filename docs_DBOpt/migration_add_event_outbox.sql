@@ -0,0 +1,30 @@
+-- Migration: Add event_outbox table (transactional outbox)
+-- Date: 2026-10-17
+-- Description: Outbox rows are inserted in the same transaction as conversation_events.
+--              OutboxRelay publishes them to RabbitMQ with publisher confirms and
+--              deletes each row once the broker has acked it.
+--
+-- Rollout:
+--   1. Run this migration
+--   2. Deploy with OUTBOX_ENABLED=True (API writes outbox rows instead of publishing directly)
+--      and OUTBOX_RELAY_ENABLED=True on the processes that should run the relay
+
+CREATE TABLE IF NOT EXISTS event_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    conversation_id VARCHAR(255) NOT NULL,
+    routing_key VARCHAR(255) NOT NULL,
+    payload JSONB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_event_outbox_next_attempt
+    ON event_outbox (next_attempt_at, id);
+
+-- Rows are deleted right after publish: keep autovacuum aggressive on this hot, small table
+ALTER TABLE event_outbox SET (
+    autovacuum_vacuum_scale_factor = 0.0,
+    autovacuum_vacuum_threshold = 1000
+);
@@ -0,0 +1,51 @@
+-- Migration: Add normalized user_topic_metrics table
+-- Date: 2026-10-17
+-- Description: One row per (user_id, topic_id), mirroring friendship_status.topic_metrics.
+--              Top-N by score / bottom-N by turns become index scans.
+--
+-- Rollout:
+--   1. Run this migration
+--   2. Deploy with TOPIC_METRICS_DUAL_WRITE=True (new writes go to JSONB + table)
+--   3. Backfill (section below, or UserTopicMetricsRepository.backfill_from_friendship_status())
+--   4. Switch reads with TOPIC_METRICS_BACKEND=table
+
+CREATE TABLE IF NOT EXISTS user_topic_metrics (
+    user_id VARCHAR(255) NOT NULL,
+    topic_id VARCHAR(255) NOT NULL,
+    score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    turns INTEGER NOT NULL DEFAULT 0,
+    friendship_level VARCHAR(50) NOT NULL DEFAULT 'PHASE1_STRANGER',
+    last_date TIMESTAMPTZ NULL,
+    agents_used JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, topic_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_user_topic_metrics_user_score
+    ON user_topic_metrics (user_id, score DESC);
+CREATE INDEX IF NOT EXISTS ix_user_topic_metrics_user_turns
+    ON user_topic_metrics (user_id, turns);
+CREATE INDEX IF NOT EXISTS ix_user_topic_metrics_topic_score
+    ON user_topic_metrics (topic_id, score DESC);
+
+-- Backfill (idempotent; re-run safely after enabling dual-write)
+INSERT INTO user_topic_metrics (user_id, topic_id, score, turns, friendship_level, last_date, agents_used)
+SELECT
+    fs.user_id,
+    t.key,
+    COALESCE((t.value ->> 'score')::float8, 0),
+    COALESCE((t.value ->> 'turns')::int, (t.value ->> 'total_turns')::int, 0),
+    COALESCE(t.value ->> 'friendship_level', 'PHASE1_STRANGER'),
+    NULLIF(t.value ->> 'last_date', '')::timestamptz,
+    COALESCE(t.value -> 'agents_used', '[]'::jsonb)
+FROM friendship_status fs
+CROSS JOIN LATERAL jsonb_each(fs.topic_metrics) AS t
+WHERE jsonb_typeof(fs.topic_metrics) = 'object'
+ON CONFLICT (user_id, topic_id) DO UPDATE SET
+    score = EXCLUDED.score,
+    turns = EXCLUDED.turns,
+    friendship_level = EXCLUDED.friendship_level,
+    last_date = EXCLUDED.last_date,
+    agents_used = EXCLUDED.agents_used,
+    updated_at = now();
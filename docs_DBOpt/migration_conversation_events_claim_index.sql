@@ -0,0 +1,8 @@
+-- Migration: Partial index for claiming due conversation events
+-- Date: 2026-10-16
+-- Description: Support claim_due_events (SELECT ... FOR UPDATE SKIP LOCKED ordered by next_attempt_at).
+--              Only open rows are indexed, so PROCESSED history does not bloat the index.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conversation_events_claimable
+    ON conversation_events (next_attempt_at)
+    WHERE status IN ('PENDING', 'FAILED', 'PROCESSING');
@@ -3,14 +3,25 @@ Dependency injection setup for FastAPI.
 """
 from functools import lru_cache
 from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.db.async_database_connection import get_async_db
 from app.db.database_connection import SessionLocal
 from app.services.friendship_score_calculation_service import FriendshipScoreCalculationService
 from app.services.conversation_data_fetch_service import ConversationDataFetchService
 from app.services.friendship_status_store_service import FriendshipStatusStoreService
-from app.services.friendship_status_update_service import FriendshipStatusUpdateService
-from app.services.activity_suggestion_service import ActivitySuggestionService
-from app.services.conversation_event_service import ConversationEventService
+from app.services.friendship_status_update_service import (
+    AsyncFriendshipStatusUpdateService,
+    FriendshipStatusUpdateService,
+)
+from app.services.activity_suggestion_service import (
+    ActivitySuggestionService,
+    AsyncActivitySuggestionService,
+)
+from app.services.conversation_event_service import (
+    AsyncConversationEventService,
+    ConversationEventService,
+)
 from app.utils.logger_setup import get_logger
 
 logger = get_logger(__name__)
@@ -114,3 +125,28 @@ def get_conversation_event_service(
     return ConversationEventService(db)
 
 
+def get_async_friendship_status_update_service(
+    db: AsyncSession = Depends(get_async_db),
+) -> AsyncFriendshipStatusUpdateService:
+    """
+    Get friendship status update service on the async (asyncpg) session.
+    """
+    return AsyncFriendshipStatusUpdateService(db)
+
+
+def get_async_activity_suggestion_service(
+    db: AsyncSession = Depends(get_async_db),
+) -> AsyncActivitySuggestionService:
+    """
+    Get activity suggestion service on the async (asyncpg) session.
+    """
+    return AsyncActivitySuggestionService(db)
+
+
+def get_async_conversation_event_service(
+    db: AsyncSession = Depends(get_async_db),
+) -> AsyncConversationEventService:
+    """
+    Get conversation event service on the async (asyncpg) session.
+    """
+    return AsyncConversationEventService(db)
@@ -1,10 +1,20 @@
 """
 API Endpoint: Suggest activities (greeting + talk + game agents).
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from app.api.dependency_injection import get_activity_suggestion_service
-from app.services.activity_suggestion_service import ActivitySuggestionService
+from app.api.dependency_injection import get_async_activity_suggestion_service
+from app.core.config_settings import settings
+from app.cache.candidates_cache_manager import RenderedResponse
+from app.services.activity_suggestion_service import (
+    SUGGESTION_SUCCESS_MESSAGE,
+    AsyncActivitySuggestionService,
+    is_raw_response_enabled,
+)
 from app.core.exceptions_custom import FriendshipNotFoundError, AgentSelectionError
 from app.schemas.activity_suggestion_schemas import ActivitySuggestionResponse
 
@@ -14,6 +24,11 @@ class ActivitySuggestionRequest(BaseModel):
     user_id: str = Field(..., description="User ID to fetch suggestions for")
 
 
+class ActivitySuggestionBatchRequest(BaseModel):
+    """Request schema for batch activities suggestion (fleet pre-warming)."""
+    user_ids: List[str] = Field(..., min_length=1, description="User IDs to fetch suggestions for")
+
+
 router = APIRouter()
 
 
@@ -23,17 +38,24 @@ router = APIRouter()
 )
 async def suggest_activities(
     request: ActivitySuggestionRequest,
-    service: ActivitySuggestionService = Depends(get_activity_suggestion_service)
-) -> ActivitySuggestionResponse:
+    if_none_match: Optional[str] = Header(None),
+    service: AsyncActivitySuggestionService = Depends(get_async_activity_suggestion_service)
+):
     """
     Suggest greeting + talk + game agents for given user.
+
+    Khi bật CANDIDATES_RAW_RESPONSE_ENABLED: trả body đã render sẵn kèm `ETag`;
+    `If-None-Match` khớp ETag hiện tại -> 304 (client đã có candidate set mới nhất).
     """
     try:
-        data = service.get_suggestions(request.user_id)
+        if is_raw_response_enabled():
+            rendered = await service.get_rendered_suggestions(request.user_id)
+            return _rendered_response(rendered, if_none_match)
+        data = await service.get_suggestions(request.user_id)
         return ActivitySuggestionResponse(
             success=True,
             data=data,
-            message="Activities suggested successfully"
+            message=SUGGESTION_SUCCESS_MESSAGE
         )
     except FriendshipNotFoundError:
         raise HTTPException(
@@ -63,3 +85,58 @@ async def suggest_activities(
             }
         )
 
+
+def _rendered_response(rendered: RenderedResponse, if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": rendered.etag, "Cache-Control": "no-cache"}
+    if if_none_match and _etag_matches(rendered.etag, if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=rendered.body, media_type="application/json", headers=headers)
+
+
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    """Weak comparison (RFC 9110 §13.1.2): bỏ prefix W/, chấp nhận list và `*`."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+@router.post("/activities/suggest/batch")
+async def suggest_activities_batch(
+    request: ActivitySuggestionBatchRequest,
+    service: AsyncActivitySuggestionService = Depends(get_async_activity_suggestion_service)
+) -> StreamingResponse:
+    """
+    Suggest agents for many users, streamed as NDJSON (1 JSON object / line / user).
+
+    Mỗi dòng: `{"user_id", "success": true, "cached", "data"}` hoặc
+    `{"user_id", "success": false, "error", "message"}` (lỗi từng user không làm fail cả batch).
+    """
+    if len(request.user_ids) > settings.SUGGEST_BATCH_MAX_USERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "success": False,
+                "error": "BATCH_TOO_LARGE",
+                "message": f"At most {settings.SUGGEST_BATCH_MAX_USERS} user_ids per request"
+            }
+        )
+    try:
+        # Load (cache + friendship_status) trước khi stream: DB session của request đóng khi response bắt đầu
+        batch = await service.load_batch(request.user_ids)
+    except Exception as exc:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "success": False,
+                "error": "INTERNAL_SERVER_ERROR",
+                "message": str(exc)
+            }
+        )
+    return StreamingResponse(_ndjson(service.iter_batch(batch)), media_type="application/x-ndjson")
+
+
+async def _ndjson(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for result in results:
+        yield orjson.dumps(result) + b"\n"
@@ -1,9 +1,11 @@
 """
 API Endpoint: Store conversation end events.
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Dict, Optional
 
-from app.api.dependency_injection import get_conversation_event_service
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from app.api.dependency_injection import get_async_conversation_event_service
 from app.core.exceptions_custom import (
     ConversationEventAlreadyExistsError,
     ConversationEventValidationError,
@@ -13,9 +15,12 @@ from app.schemas.conversation_event_schemas import (
     ConversationEventCreateRequest,
     ConversationEventCreateResponse,
 )
-from app.services.conversation_event_service import ConversationEventService
-from app.background.rabbitmq_publisher import publish_conversation_event
+from app.services.conversation_event_service import AsyncConversationEventService
+from app.background.outbox_relay import notify_outbox_relay
+from app.background.async_rabbitmq_publisher import publish_conversation_event
+from app.core.config_settings import settings
 from app.utils.logger_setup import get_logger
+from app.utils.tracing import current_trace_context
 from app.utils.color_log import success, error, warning, info, key_value, status_code
 
 logger = get_logger(__name__)
@@ -31,13 +36,15 @@ router = APIRouter()
 )
 async def create_conversation_event(
     request: ConversationEventCreateRequest,
-    service: ConversationEventService = Depends(get_conversation_event_service),
+    http_request: Request,
+    service: AsyncConversationEventService = Depends(get_async_conversation_event_service),
 ) -> ConversationEventCreateResponse:
     """
     Store a conversation event that backend submits after each session.
 
-    The record is persisted immediately, published to RabbitMQ queue,
-    and will be processed asynchronously by background worker.
+    The record is persisted immediately, published to RabbitMQ queue (directly, or via
+    the transactional outbox when OUTBOX_ENABLED), and will be processed asynchronously
+    by background worker.
     
     Returns 202 Accepted immediately without waiting for processing.
     """
@@ -58,7 +65,8 @@ async def create_conversation_event(
     try:
         # STEP 1: Create event (save to DB, status=PENDING)
         logger.debug(f"💾 Saving conversation event to DB: {conversation_id}")
-        data = service.create_event(request)
+        trace_context = _trace_context(http_request)
+        data = await service.create_event(request, trace_context=trace_context)
         
         # Lấy conversation_id cuối cùng (có thể đã được modify nếu duplicate)
         final_conversation_id = data.get("conversation_id", conversation_id)
@@ -71,26 +79,12 @@ async def create_conversation_event(
         )
         
         # STEP 2: Publish to RabbitMQ queue for async processing
-        logger.debug(f"📤 Publishing to RabbitMQ queue: {final_conversation_id}")
-        try:
-            await publish_conversation_event(
-                conversation_id=data["conversation_id"],
-                user_id=data["user_id"],
-                bot_id=data["bot_id"],
-                conversation_log=data.get("conversation_log", [])
-            )
-            logger.info(
-                f"{success('✅ Published to queue')} | "
-                f"{key_value('conversation_id', final_conversation_id)}"
-            )
-        except Exception as publish_error:
-            # Don't fail API if publish fails - background scheduler will retry
-            logger.warning(
-                f"{warning('⚠️  Failed to publish to RabbitMQ')} | "
-                f"{key_value('conversation_id', conversation_id)} | "
-                f"{key_value('error', str(publish_error))} | "
-                f"Background scheduler will retry"
-            )
+        if settings.OUTBOX_ENABLED:
+            # Message đã được ghi vào event_outbox cùng transaction -> đánh thức relay
+            notify_outbox_relay()
+            logger.debug(f"📮 Queued in outbox: {final_conversation_id}")
+        else:
+            await _publish_directly(data, final_conversation_id, conversation_id, trace_context)
         
         # STEP 3: Return 202 Accepted immediately
         logger.info(
@@ -148,7 +142,51 @@ async def create_conversation_event(
         ) from exc
 
 
+def _trace_context(http_request: Request) -> Optional[Dict[str, str]]:
+    """
+    W3C trace context của request (propagate sang worker qua queue message).
 
+    TRACING_ENABLED: context của SERVER span hiện tại (con của header client); tắt thì
+    chuyển tiếp nguyên header client.
+    """
+    context = current_trace_context()
+    if context:
+        return context
+    traceparent = http_request.headers.get("traceparent")
+    if not traceparent:
+        return None
+    context = {"traceparent": traceparent}
+    tracestate = http_request.headers.get("tracestate")
+    if tracestate:
+        context["tracestate"] = tracestate
+    return context
 
 
-
+async def _publish_directly(
+    data,
+    final_conversation_id: str,
+    conversation_id: str,
+    trace_context: Optional[Dict[str, str]] = None,
+) -> None:
+    """Publish lên RabbitMQ qua async publisher (OUTBOX_ENABLED=False); lỗi không làm fail API."""
+    logger.debug(f"📤 Publishing to RabbitMQ queue: {final_conversation_id}")
+    try:
+        # Chỉ buffer message (compact: id/user_id/priority/trace); confirm xử lý ở flush task
+        await publish_conversation_event(
+            event_id=data["id"],
+            conversation_id=data["conversation_id"],
+            user_id=data["user_id"],
+            trace=trace_context,
+        )
+        logger.info(
+            f"{success('✅ Queued for publish')} | "
+            f"{key_value('conversation_id', final_conversation_id)}"
+        )
+    except Exception as publish_error:
+        # Don't fail API if publish fails - background scheduler will retry
+        logger.warning(
+            f"{warning('⚠️  Failed to publish to RabbitMQ')} | "
+            f"{key_value('conversation_id', conversation_id)} | "
+            f"{key_value('error', str(publish_error))} | "
+            f"Background scheduler will retry"
+        )
@@ -68,8 +68,8 @@ async def calculate_friendship_score_from_conversation_id(
     try:
         logger.info(f"API: Calculating friendship score for conversation_id: {conversation_id}")
         
-        # Calculate score
-        result = service.calculate_score_from_conversation_id(conversation_id)
+        # Calculate score (async LLM/Memory API clients, không block event loop)
+        result = await service.calculate_score_from_conversation_id_async(conversation_id)
         
         # Format response
         response_data = FriendshipScoreCalculationAPIResponse(
@@ -6,10 +6,10 @@ from typing import Dict, Any
 from pydantic import BaseModel, Field
 from app.api.dependency_injection import (
     get_friendship_score_calculation_service,
-    get_friendship_status_update_service
+    get_async_friendship_status_update_service
 )
 from app.services.friendship_score_calculation_service import FriendshipScoreCalculationService
-from app.services.friendship_status_update_service import FriendshipStatusUpdateService
+from app.services.friendship_status_update_service import AsyncFriendshipStatusUpdateService
 from app.core.exceptions_custom import ConversationNotFoundError, InvalidScoreError
 from app.utils.logger_setup import get_logger
 
@@ -28,18 +28,18 @@ class FriendshipScoreUpdateRequest(BaseModel):
 async def calculate_and_update_friendship_status_route(
     request: FriendshipScoreUpdateRequest,
     score_service: FriendshipScoreCalculationService = Depends(get_friendship_score_calculation_service),
-    update_service: FriendshipStatusUpdateService = Depends(get_friendship_status_update_service)
+    update_service: AsyncFriendshipStatusUpdateService = Depends(get_async_friendship_status_update_service)
 ) -> Dict[str, Any]:
     """
     Calculate score from conversation_id and immediately update friendship status for the user.
     """
     try:
         # Step 1: Calculate score change from conversation
-        result = score_service.calculate_score_from_conversation_id(request.conversation_id)
+        result = await score_service.calculate_score_from_conversation_id_async(request.conversation_id)
         score_change = result.get("friendship_score_change", 0.0)
         
         # Step 2: Apply score change to user (in-memory store for demo)
-        updated_status = update_service.apply_score_change(request.user_id, score_change)
+        updated_status = await update_service.apply_score_change(request.user_id, score_change)
         
         response = {
             "success": True,
@@ -1,10 +1,12 @@
 """
 Health check endpoint.
 """
+import asyncio
 from datetime import datetime
 from fastapi import APIRouter, status
 from fastapi.responses import JSONResponse
 
+from app.core.config_settings import settings
 from app.schemas.common_schemas import HealthCheckResponse
 from app.services.health_check_service import HealthCheckService
 from app.utils.logger_setup import get_logger
@@ -30,7 +32,8 @@ async def health_check():
     """
     try:
         health_service = HealthCheckService()
-        health_status = health_service.get_health_status()
+        # DB / Redis / RabbitMQ checks là sync -> chạy trong thread, không block event loop
+        health_status = await asyncio.to_thread(health_service.get_health_status)
         
         logger.info(f"Health check requested - Status: {health_status['status']}")
         
@@ -62,10 +65,39 @@ async def health_check():
             }
         )
 
+@router.get(
+    "/health/cache-stats",
+    status_code=status.HTTP_200_OK,
+    summary="Cache Statistics",
+    description="In-process hit/miss counters of the candidates cache and the LLM analysis cache"
+)
+async def cache_stats():
+    """Return cache counters of this process (each API replica / worker has its own)."""
+    from app.cache.candidates_cache_manager import candidates_cache_stats
+    from app.cache.llm_analysis_cache_manager import llm_analysis_cache_stats
 
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "candidates_cache": candidates_cache_stats.snapshot(),
+        "llm_analysis_cache": llm_analysis_cache_stats.snapshot(),
+    }
 
 
+@router.get(
+    "/health/scheduler-stats",
+    status_code=status.HTTP_200_OK,
+    summary="Scheduler Statistics",
+    description="Conversation event job (duration, backlog) and outbox relay metrics of this process"
+)
+async def scheduler_stats():
+    """Return conversation event job metrics of this process (leader replica or scheduler process)."""
+    from app.background.conversation_event_scheduler import conversation_event_job_stats
+    from app.background.outbox_relay import outbox_relay_stats
 
-
-
-
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "scheduler_mode": settings.CONVERSATION_EVENT_SCHEDULER_MODE,
+        "conversation_event_job": conversation_event_job_stats.snapshot(),
+        "outbox_enabled": settings.OUTBOX_ENABLED,
+        "outbox_relay": outbox_relay_stats.snapshot(),
+    }
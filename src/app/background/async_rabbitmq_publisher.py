@@ -0,0 +1,228 @@
+"""
+Async RabbitMQ publisher (aio-pika) cho `async def` endpoints.
+
+- Connection + channel pool (aio_pika.pool), channel ở publisher-confirm mode.
+- `publish()` chỉ đưa message vào buffer rồi return; 1 flush task gom message thành batch
+  (tối đa RABBITMQ_PUBLISH_BATCH_SIZE hoặc sau RABBITMQ_PUBLISH_FLUSH_MS) và publish cả
+  batch song song trên 1 channel, chờ confirms của cả batch một lần.
+- Không còn pika.BlockingConnection chạy trên event loop.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import aio_pika
+from aio_pika.exceptions import ChannelNotFoundEntity
+from aio_pika.pool import Pool
+
+from app.background.message_codec import (
+    MESSAGE_CONTENT_TYPE,
+    MESSAGE_PRIORITY_NORMAL,
+    build_event_message,
+    build_message_headers,
+    encode_message,
+)
+from app.background.rabbitmq_publisher import QUEUE_ARGUMENTS, RabbitMQConfig
+from app.core.config_settings import settings
+from app.utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+_PendingMessage = Tuple[bytes, int, Optional[Dict[str, str]], asyncio.Future]
+
+
+async def ensure_queue(connection: aio_pika.abc.AbstractConnection) -> None:
+    """Declare queue như sync publisher: passive trước, chưa có thì tạo với QUEUE_ARGUMENTS."""
+    probe = await connection.channel()
+    try:
+        await probe.declare_queue(RabbitMQConfig.QUEUE_NAME, passive=True)
+    except ChannelNotFoundEntity:
+        logger.info(f"📝 Creating queue '{RabbitMQConfig.QUEUE_NAME}' with arguments")
+        probe = await connection.channel()
+        await probe.declare_queue(RabbitMQConfig.QUEUE_NAME, durable=True, arguments=QUEUE_ARGUMENTS)
+    finally:
+        if not probe.is_closed:
+            await probe.close()
+
+
+class AsyncRabbitMQPublisher:
+    """Pooled, confirm-mode publisher with batched flushes."""
+
+    def __init__(
+        self,
+        pool_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_ms: Optional[int] = None,
+    ):
+        self.pool_size = pool_size or settings.RABBITMQ_PUBLISHER_POOL_SIZE
+        self.batch_size = batch_size or settings.RABBITMQ_PUBLISH_BATCH_SIZE
+        self.flush_seconds = (flush_ms if flush_ms is not None else settings.RABBITMQ_PUBLISH_FLUSH_MS) / 1000
+        self._connection_pool: Pool = Pool(self._create_connection, max_size=self.pool_size)
+        self._channel_pool: Pool = Pool(self._create_channel, max_size=self.pool_size)
+        self._buffer: "asyncio.Queue[_PendingMessage]" = asyncio.Queue()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._inflight: "set[asyncio.Task]" = set()
+        self._queue_ready = False
+
+    async def _create_connection(self) -> aio_pika.abc.AbstractRobustConnection:
+        connection = await aio_pika.connect_robust(RabbitMQConfig.get_url())
+        logger.info(
+            f"✅ Async publisher connected to RabbitMQ at "
+            f"{RabbitMQConfig.get_host()}:{RabbitMQConfig.get_port()}"
+        )
+        return connection
+
+    async def _create_channel(self) -> aio_pika.abc.AbstractChannel:
+        async with self._connection_pool.acquire() as connection:
+            channel = await connection.channel(publisher_confirms=True)
+            if not self._queue_ready:
+                await self._ensure_queue(connection)
+            return channel
+
+    async def _ensure_queue(self, connection) -> None:
+        await ensure_queue(connection)
+        self._queue_ready = True
+
+    async def publish(
+        self,
+        message: Dict[str, Any],
+        priority: int = MESSAGE_PRIORITY_NORMAL,
+        wait_confirm: bool = False,
+    ) -> asyncio.Future:
+        """
+        Buffer a message for the next flush.
+
+        Returns a future resolved when the broker confirms (or failed on nack/connection
+        error); `wait_confirm=True` awaits it before returning.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.put_nowait((encode_message(message), priority, message.get("trace"), future))
+        self._ensure_flush_task()
+        if wait_confirm:
+            await future
+        return future
+
+    def _ensure_flush_task(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            batch: List[_PendingMessage] = [await self._buffer.get()]
+            deadline = asyncio.get_running_loop().time() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._buffer.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Flush chạy song song (giới hạn bởi channel pool), loop tiếp tục gom batch mới
+            task = asyncio.create_task(self._flush(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _flush(self, batch: List[_PendingMessage]) -> None:
+        try:
+            async with self._channel_pool.acquire() as channel:
+                exchange = channel.default_exchange
+                results = await asyncio.gather(
+                    *(
+                        exchange.publish(
+                            aio_pika.Message(
+                                body,
+                                content_type=MESSAGE_CONTENT_TYPE,
+                                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                                priority=priority or None,
+                                headers=build_message_headers(trace),
+                            ),
+                            routing_key=RabbitMQConfig.QUEUE_NAME,
+                        )
+                        for body, priority, trace, _ in batch
+                    ),
+                    return_exceptions=True,
+                )
+        except Exception as exc:
+            results = [exc] * len(batch)
+
+        failed = 0
+        for (_, _, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                failed += 1
+                future.set_exception(result)
+            else:
+                future.set_result(None)
+        if failed:
+            logger.warning(f"⚠️  Async publisher: {failed}/{len(batch)} message(s) not confirmed")
+        else:
+            logger.debug(f"📤 Async publisher flushed {len(batch)} message(s)")
+
+    async def close(self) -> None:
+        """Flush buffered messages, then close channel/connection pools."""
+        if self._flush_task is not None:
+            while not self._buffer.empty():
+                await asyncio.sleep(self.flush_seconds or 0.01)
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        await self._channel_pool.close()
+        await self._connection_pool.close()
+        logger.info("🔌 Closed async RabbitMQ publisher")
+
+
+_async_publisher: Optional[AsyncRabbitMQPublisher] = None
+
+
+def get_async_publisher() -> AsyncRabbitMQPublisher:
+    """Get singleton async publisher (created lazily on the running event loop)."""
+    global _async_publisher
+    if _async_publisher is None:
+        _async_publisher = AsyncRabbitMQPublisher()
+    return _async_publisher
+
+
+async def close_async_publisher() -> None:
+    global _async_publisher
+    if _async_publisher is not None:
+        await _async_publisher.close()
+        _async_publisher = None
+
+
+def _log_publish_failure(conversation_id: str, future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(
+            f"❌ Failed to publish conversation event {conversation_id}: {future.exception()}"
+        )
+
+
+async def publish_conversation_event(
+    event_id: int,
+    conversation_id: str,
+    user_id: str,
+    trace: Optional[Dict[str, str]] = None,
+    priority: int = MESSAGE_PRIORITY_NORMAL,
+):
+    """
+    Publish conversation event to RabbitMQ queue (non-blocking, confirm handled by flush task).
+
+    Args:
+        event_id: conversation_events.id
+        conversation_id: Unique conversation identifier
+        user_id: User identifier
+        trace: Trace context (e.g. {"traceparent": ...})
+        priority: Message priority
+    """
+    try:
+        message = build_event_message(event_id, conversation_id, user_id, priority=priority, trace=trace)
+        future = await get_async_publisher().publish(message, priority=priority)
+        # Don't raise - allow API to return 202 even if publish fails
+        # Background scheduler will retry pending events
+        future.add_done_callback(lambda fut: _log_publish_failure(conversation_id, fut))
+    except Exception as e:
+        logger.error(
+            f"❌ Failed to publish conversation event {conversation_id}: {str(e)}",
+            exc_info=True
+        )
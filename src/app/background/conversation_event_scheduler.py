@@ -3,29 +3,160 @@ APScheduler job setup for processing conversation events.
 
 Scheduler này chạy định kỳ để xử lý các conversation events có status PENDING hoặc FAILED.
 Mặc định chạy mỗi 6 giờ, có thể điều chỉnh qua env var CONVERSATION_EVENT_POLL_INTERVAL_HOURS.
+
+Job chạy trên thread pool riêng của scheduler (không dùng event loop / default executor
+của FastAPI), nên LLM + Mem0 + DB work không làm treo API. Chế độ chạy
+(CONVERSATION_EVENT_SCHEDULER_MODE):
+- `api`: chạy trong process API (BackgroundScheduler, thread riêng)
+- `standalone`: chỉ chạy trong process riêng `python scheduler.py`
+- `off`: tắt
+
+Chỉ leader (giữ PostgreSQL advisory lock) mới xử lý events, nên nhiều API replicas
+không chạy trùng job.
 """
-from typing import Optional
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import BaseScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
 from app.api.dependency_injection import get_friendship_score_calculation_service
+from app.background.daily_rollup_job import run_pending_daily_rollups
+from app.background.leader_election import AdvisoryLockLeader
+from app.background.outbox_relay import shutdown_outbox_relay, start_outbox_relay
 from app.core.config_settings import settings
 from app.db.database_connection import SessionLocal
+from app.repositories.conversation_event_repository import ConversationEventRepository
 from app.services.conversation_event_processing_service import (
     ConversationEventProcessingService,
 )
 from app.services.friendship_status_update_service import FriendshipStatusUpdateService
 from app.utils.logger_setup import get_logger
+from app.utils.metrics_registry import start_metrics_server
 
 logger = get_logger(__name__)
 
 JOB_ID_CONVERSATION_EVENTS = "conversation_event_processor"
-_scheduler: Optional[AsyncIOScheduler] = None
+JOB_ID_BACKLOG_SAMPLER = "conversation_event_backlog_sampler"
+JOB_ID_DAILY_ROLLUP = "friendship_daily_rollup"
+SCHEDULER_MODE_API = "api"
+SCHEDULER_MODE_STANDALONE = "standalone"
+SCHEDULER_MODE_OFF = "off"
+
+_scheduler: Optional[BaseScheduler] = None
+_leader: Optional[AdvisoryLockLeader] = None
+
+
+class ConversationEventJobStats:
+    """Thread-safe in-process metrics of the conversation event job (duration, backlog)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._zero()
+
+    def _zero(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped_not_leader = 0
+        self.is_leader = False
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+        self.total_duration_ms = 0.0
+        self.last_processed = 0
+        self.last_failed = 0
+        self.last_total = 0
+        self.backlog_due = 0
+        self.backlog_oldest_age_seconds = 0.0
+        self.backlog_sampled_at: Optional[datetime] = None
+
+    def reset(self):
+        with self._lock:
+            self._zero()
+
+    def record_run(self, duration_ms: float, stats: Optional[Dict[str, int]]):
+        with self._lock:
+            self.is_leader = True
+            self.last_run_at = datetime.now(timezone.utc)
+            self.last_duration_ms = duration_ms
+            self.max_duration_ms = max(self.max_duration_ms, duration_ms)
+            self.total_duration_ms += duration_ms
+            if stats is None:
+                self.failures += 1
+                return
+            self.runs += 1
+            self.last_processed = stats.get("processed", 0)
+            self.last_failed = stats.get("failed", 0)
+            self.last_total = stats.get("total", 0)
+
+    def record_skipped(self):
+        with self._lock:
+            self.is_leader = False
+            self.skipped_not_leader += 1
+
+    def record_backlog(self, due: int, oldest: Optional[datetime]):
+        with self._lock:
+            now = datetime.now(timezone.utc)
+            self.backlog_due = due
+            self.backlog_oldest_age_seconds = (
+                max(0.0, (now - oldest).total_seconds()) if oldest is not None else 0.0
+            )
+            self.backlog_sampled_at = now
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the metrics with average duration."""
+        with self._lock:
+            executions = self.runs + self.failures
+            return {
+                "is_leader": self.is_leader,
+                "runs": self.runs,
+                "failures": self.failures,
+                "skipped_not_leader": self.skipped_not_leader,
+                "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+                "last_duration_ms": round(self.last_duration_ms, 1),
+                "max_duration_ms": round(self.max_duration_ms, 1),
+                "avg_duration_ms": (
+                    round(self.total_duration_ms / executions, 1) if executions else 0.0
+                ),
+                "last_processed": self.last_processed,
+                "last_failed": self.last_failed,
+                "last_total": self.last_total,
+                "backlog_due": self.backlog_due,
+                "backlog_oldest_age_seconds": round(self.backlog_oldest_age_seconds, 1),
+                "backlog_sampled_at": (
+                    self.backlog_sampled_at.isoformat() if self.backlog_sampled_at else None
+                ),
+            }
+
+
+conversation_event_job_stats = ConversationEventJobStats()
+
+
+def _get_leader() -> Optional[AdvisoryLockLeader]:
+    global _leader
+    if not settings.CONVERSATION_EVENT_LEADER_LOCK_ENABLED:
+        return None
+    if _leader is None:
+        _leader = AdvisoryLockLeader(settings.CONVERSATION_EVENT_LEADER_LOCK_KEY)
+    return _leader
 
 
 def _run_conversation_event_job() -> None:
-    """Job entrypoint executed by APScheduler."""
+    """Job entrypoint executed by APScheduler (scheduler thread pool)."""
+    leader = _get_leader()
+    if leader is not None and not leader.is_leader():
+        conversation_event_job_stats.record_skipped()
+        logger.info("Conversation event job skipped: another replica holds the leader lock")
+        return
+
+    started = time.perf_counter()
+    stats = None
     db = SessionLocal()
     try:
         score_service = get_friendship_score_calculation_service()
@@ -35,7 +166,10 @@ def _run_conversation_event_job() -> None:
             score_service=score_service,
             status_update_service=status_service,
         )
-        stats = processor.process_due_events()
+        if settings.CONVERSATION_EVENT_BULK_ENABLED:
+            stats = _drain_due_events_bulk(processor)
+        else:
+            stats = processor.process_due_events()
         if stats["total"]:
             logger.info(
                 "Conversation event job stats: %s processed / %s total",
@@ -46,34 +180,136 @@ def _run_conversation_event_job() -> None:
         logger.error("Conversation event job failed: %s", exc, exc_info=True)
     finally:
         db.close()
+        duration_ms = (time.perf_counter() - started) * 1000
+        conversation_event_job_stats.record_run(duration_ms, stats)
+        logger.info("Conversation event job finished in %.1f ms", duration_ms)
+    _sample_backlog()
 
 
-def start_background_jobs() -> None:
-    """
-    Khởi động APScheduler với job xử lý conversation events.
-    
-    Job này sẽ chạy định kỳ theo interval được cấu hình trong settings
-    (mặc định mỗi 6 giờ) để xử lý các conversation events có status PENDING hoặc FAILED.
-    """
-    global _scheduler
-    if _scheduler and _scheduler.running:
+def _run_daily_rollup_job() -> None:
+    """End-of-day rollup (streak_day...) cho các ngày chưa xong; chỉ chạy trên leader."""
+    leader = _get_leader()
+    if leader is not None and not leader.is_leader():
+        logger.info("Daily rollup job skipped: another replica holds the leader lock")
         return
+    try:
+        run_pending_daily_rollups()
+    except Exception as exc:  # pragma: no cover - defensive logging
+        # Checkpoint đã commit theo chunk: lần chạy sau tiếp tục từ chỗ dừng
+        logger.error("Daily rollup job failed: %s", exc, exc_info=True)
+
+
+def _drain_due_events_bulk(processor: ConversationEventProcessingService) -> dict:
+    """Claim batches until the queue of due events is empty (failed events move to next_attempt_at)."""
+    batch_size = settings.CONVERSATION_EVENT_BATCH_SIZE
+    totals = {"processed": 0, "failed": 0, "total": 0}
+    while True:
+        stats = processor.process_due_events_bulk(batch_size=batch_size)
+        for key in totals:
+            totals[key] += stats[key]
+        if stats["total"] < batch_size:
+            return totals
+
+
+def _sample_backlog() -> None:
+    """Đo backlog (số events đến hạn + tuổi event cũ nhất) bằng 1 query COUNT/MIN."""
+    db = SessionLocal()
+    try:
+        due, oldest = ConversationEventRepository(db).get_backlog_stats()
+        conversation_event_job_stats.record_backlog(due, oldest)
+    except Exception as exc:
+        logger.warning("⚠️  Failed to sample conversation event backlog: %s", exc)
+    finally:
+        db.close()
 
+
+def _configure_scheduler(scheduler: BaseScheduler) -> BaseScheduler:
+    """Register the processing job, the backlog sampler and the daily rollup on a scheduler."""
     interval_hours = settings.CONVERSATION_EVENT_POLL_INTERVAL_HOURS
-    
-    _scheduler = AsyncIOScheduler()
-    _scheduler.add_job(
+    scheduler.add_job(
         _run_conversation_event_job,
         trigger=IntervalTrigger(hours=interval_hours),
         id=JOB_ID_CONVERSATION_EVENTS,
         replace_existing=True,
         max_instances=1,
+        coalesce=True,
     )
+    if settings.CONVERSATION_EVENT_BACKLOG_SAMPLE_SECONDS > 0:
+        scheduler.add_job(
+            _sample_backlog,
+            trigger=IntervalTrigger(seconds=settings.CONVERSATION_EVENT_BACKLOG_SAMPLE_SECONDS),
+            id=JOB_ID_BACKLOG_SAMPLER,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+    if settings.DAILY_ROLLUP_ENABLED:
+        scheduler.add_job(
+            _run_daily_rollup_job,
+            trigger=CronTrigger(
+                hour=settings.DAILY_ROLLUP_HOUR,
+                minute=settings.DAILY_ROLLUP_MINUTE,
+                timezone=settings.DAILY_ROLLUP_TIMEZONE,
+            ),
+            id=JOB_ID_DAILY_ROLLUP,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=3600,
+        )
+    return scheduler
+
+
+def _executors() -> Dict[str, ThreadPoolExecutor]:
+    # Pool riêng: job không chiếm default executor của event loop (asyncio.to_thread)
+    return {"default": ThreadPoolExecutor(max_workers=settings.CONVERSATION_EVENT_JOB_MAX_WORKERS)}
+
+
+def start_background_jobs() -> None:
+    """
+    Khởi động scheduler trong process API (chỉ khi CONVERSATION_EVENT_SCHEDULER_MODE=api).
+
+    Job này sẽ chạy định kỳ theo interval được cấu hình trong settings
+    (mặc định mỗi 6 giờ) để xử lý các conversation events có status PENDING hoặc FAILED.
+    """
+    global _scheduler
+    if _scheduler and _scheduler.running:
+        return
+
+    mode = settings.CONVERSATION_EVENT_SCHEDULER_MODE
+    if mode != SCHEDULER_MODE_API:
+        logger.info("Background scheduler not started in API process (mode=%s)", mode)
+        return
+
+    _scheduler = _configure_scheduler(BackgroundScheduler(executors=_executors()))
     _scheduler.start()
     logger.info(
-        "Background scheduler started (conversation events every %s hours)",
-        interval_hours
+        "Background scheduler started (conversation events every %s hours, %s worker thread(s))",
+        settings.CONVERSATION_EVENT_POLL_INTERVAL_HOURS,
+        settings.CONVERSATION_EVENT_JOB_MAX_WORKERS,
+    )
+
+
+def run_standalone_scheduler() -> None:
+    """Blocking entrypoint cho process scheduler riêng (`python scheduler.py`)."""
+    global _scheduler
+    if settings.CONVERSATION_EVENT_SCHEDULER_MODE == SCHEDULER_MODE_API:
+        logger.warning(
+            "⚠️  CONVERSATION_EVENT_SCHEDULER_MODE=api: API replicas also run the job "
+            "(leader lock still prevents concurrent runs)"
+        )
+    _scheduler = _configure_scheduler(BlockingScheduler(executors=_executors()))
+    logger.info(
+        "Standalone scheduler started (conversation events every %s hours)",
+        settings.CONVERSATION_EVENT_POLL_INTERVAL_HOURS,
     )
+    start_outbox_relay()
+    start_metrics_server()
+    try:
+        _scheduler.start()
+    finally:
+        shutdown_outbox_relay()
+        _release_leader()
 
 
 def shutdown_background_jobs() -> None:
@@ -82,4 +318,9 @@ def shutdown_background_jobs() -> None:
     if _scheduler and _scheduler.running:
         _scheduler.shutdown(wait=False)
         logger.info("Background scheduler stopped")
+    _release_leader()
+
 
+def _release_leader() -> None:
+    if _leader is not None:
+        _leader.release()
@@ -0,0 +1,138 @@
+"""
+Job rollup cuối ngày cho friendship_status (Tài liệu 2 - Logic cập nhật các variable cuối ngày).
+
+Cập nhật `streak_day`, `streak_date`, `last_interaction_date` từ conversation_events của
+ngày (theo DAILY_ROLLUP_TIMEZONE), set-based theo chunk user_id (DailyRollupRepository):
+không load từng user lên ORM.
+
+- Resumable: checkpoint `last_user_id` được ghi cùng statement với mỗi chunk.
+- Idempotent theo ngày: ngày đã `completed_at` bị bỏ qua; chạy lại 1 chunk cũng không đổi gì.
+- friendship_score / topic_metrics KHÔNG cộng lại ở đây: chúng đã được cập nhật real-time
+  sau mỗi conversation (ConversationEventProcessingService), cộng lần nữa sẽ bị double.
+"""
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from app.core.config_settings import settings
+from app.db.database_connection import SessionLocal
+from app.repositories.daily_rollup_repository import DailyRollupRepository
+from app.utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+def rollup_day_bounds(rollup_date: date, tz_name: Optional[str] = None) -> Tuple[datetime, datetime]:
+    """[00:00, 00:00 ngày sau) của `rollup_date` theo timezone local (aware datetimes)."""
+    tz = ZoneInfo(tz_name or settings.DAILY_ROLLUP_TIMEZONE)
+    day_start = datetime.combine(rollup_date, dt_time.min, tzinfo=tz)
+    day_end = datetime.combine(rollup_date + timedelta(days=1), dt_time.min, tzinfo=tz)
+    return day_start, day_end
+
+
+def local_today(tz_name: Optional[str] = None) -> date:
+    return datetime.now(ZoneInfo(tz_name or settings.DAILY_ROLLUP_TIMEZONE)).date()
+
+
+def run_daily_rollup(rollup_date: date, chunk_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Rollup 1 ngày (tiếp tục từ checkpoint nếu lần trước dừng giữa chừng).
+
+    Returns:
+        Report: rollup_date, chunks, rows_scanned/active/updated (lần chạy này),
+        duration_seconds, rows_per_second, skipped (ngày đã xong từ trước)
+    """
+    chunk_size = chunk_size or settings.DAILY_ROLLUP_CHUNK_SIZE
+    day_start, day_end = rollup_day_bounds(rollup_date)
+    previous_date = rollup_date - timedelta(days=1)
+    report: Dict[str, Any] = {
+        "rollup_date": rollup_date.isoformat(),
+        "chunks": 0,
+        "rows_scanned": 0,
+        "rows_active": 0,
+        "rows_updated": 0,
+        "duration_seconds": 0.0,
+        "rows_per_second": 0.0,
+        "skipped": False,
+    }
+
+    db = SessionLocal()
+    try:
+        repository = DailyRollupRepository(db)
+        checkpoint = repository.get_or_create_checkpoint(rollup_date)
+        if checkpoint.completed_at is not None:
+            report["skipped"] = True
+            logger.info("Daily rollup %s already completed at %s, skipping", rollup_date, checkpoint.completed_at)
+            return report
+
+        after_user_id = checkpoint.last_user_id or ""
+        if after_user_id:
+            logger.info("🔁 Resuming daily rollup %s after user_id=%s", rollup_date, after_user_id)
+
+        started = time.perf_counter()
+        while True:
+            row = repository.rollup_chunk(
+                rollup_date=rollup_date,
+                previous_date=previous_date,
+                day_start=day_start,
+                day_end=day_end,
+                after_user_id=after_user_id,
+                chunk_size=chunk_size,
+            )
+            if row.last_user_id is None:
+                break
+            after_user_id = row.last_user_id
+            report["chunks"] += 1
+            report["rows_scanned"] += row.scanned
+            report["rows_active"] += row.active
+            report["rows_updated"] += row.updated
+            logger.debug(
+                "Daily rollup %s chunk %s: scanned=%s active=%s updated=%s last_user_id=%s",
+                rollup_date, report["chunks"], row.scanned, row.active, row.updated, after_user_id,
+            )
+
+        duration = time.perf_counter() - started
+        repository.mark_completed(rollup_date, duration)
+    finally:
+        db.close()
+
+    report["duration_seconds"] = round(duration, 2)
+    report["rows_per_second"] = round(report["rows_scanned"] / duration, 1) if duration > 0 else 0.0
+    logger.info(
+        "✅ Daily rollup %s done: %s users scanned, %s active, %s updated in %.1fs (%s rows/s)",
+        rollup_date,
+        report["rows_scanned"],
+        report["rows_active"],
+        report["rows_updated"],
+        duration,
+        report["rows_per_second"],
+    )
+    return report
+
+
+def pending_rollup_dates(today: Optional[date] = None) -> List[date]:
+    """Các ngày (tăng dần, tối đa DAILY_ROLLUP_MAX_CATCHUP_DAYS, tới hôm qua) chưa rollup xong."""
+    today = today or local_today()
+    candidates = [
+        today - timedelta(days=offset)
+        for offset in range(settings.DAILY_ROLLUP_MAX_CATCHUP_DAYS, 0, -1)
+    ]
+    db = SessionLocal()
+    try:
+        completed = DailyRollupRepository(db).get_completed_dates(candidates)
+    finally:
+        db.close()
+    return [day for day in candidates if day not in completed]
+
+
+def run_pending_daily_rollups(today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """
+    Rollup các ngày còn thiếu theo thứ tự (streak của ngày D dựa trên streak_date của D-1).
+
+    Dừng ở ngày lỗi đầu tiên; lần chạy sau tiếp tục từ checkpoint của ngày đó.
+    """
+    reports = []
+    for rollup_date in pending_rollup_dates(today):
+        reports.append(run_daily_rollup(rollup_date))
+    return reports
@@ -0,0 +1,103 @@
+"""
+Leader election giữa các API replicas bằng PostgreSQL advisory lock.
+
+Replica nào giữ được session-level `pg_try_advisory_lock(key)` là leader và được chạy
+scheduled job. Lock được giữ trên 1 connection riêng suốt vòng đời process; nếu
+process chết hoặc connection đứt, Postgres tự nhả lock và replica khác sẽ nhận làm
+leader ở lần tick tiếp theo. Không cần thêm hạ tầng (Redis lock, ZooKeeper...).
+"""
+import threading
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.database_connection import engine as default_engine
+from app.utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+class AdvisoryLockLeader:
+    """Sticky leadership backed by a session-level PostgreSQL advisory lock."""
+
+    def __init__(self, lock_key: int, engine: Optional[Engine] = None):
+        self.lock_key = lock_key
+        self._engine = engine or default_engine
+        self._conn: Optional[Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_held(self) -> bool:
+        """True nếu process này đang giữ lock (không kiểm tra connection)."""
+        return self._conn is not None
+
+    def is_leader(self) -> bool:
+        """
+        Return True nếu process này là leader.
+
+        Đang giữ lock -> kiểm tra connection còn sống; chưa giữ -> thử acquire (không block).
+        """
+        with self._lock:
+            if self._conn is not None:
+                if self._connection_alive():
+                    return True
+                logger.warning("⚠️  Leader lock connection lost (key=%s), re-electing", self.lock_key)
+                self._discard_connection()
+            return self._try_acquire()
+
+    def release(self) -> None:
+        """Nhả lock (app shutdown) để replica khác nhận leader ngay."""
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+                self._conn.commit()
+                self._conn.close()
+                logger.info("👑 Leader lock released (key=%s)", self.lock_key)
+            except Exception as exc:
+                logger.warning("⚠️  Failed to release leader lock cleanly: %s", exc)
+                self._discard_connection()
+            self._conn = None
+
+    def _try_acquire(self) -> bool:
+        conn = None
+        try:
+            conn = self._engine.connect()
+            acquired = conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}
+            ).scalar()
+            # Kết thúc transaction ngầm; advisory lock session-level vẫn được giữ
+            conn.commit()
+        except Exception as exc:
+            logger.warning("⚠️  Leader election failed (key=%s): %s", self.lock_key, exc)
+            if conn is not None:
+                conn.invalidate()
+                conn.close()
+            return False
+
+        if not acquired:
+            conn.close()
+            return False
+
+        self._conn = conn
+        logger.info("👑 Acquired leader lock (key=%s)", self.lock_key)
+        return True
+
+    def _connection_alive(self) -> bool:
+        try:
+            self._conn.execute(text("SELECT 1"))
+            self._conn.commit()
+            return True
+        except Exception:
+            return False
+
+    def _discard_connection(self) -> None:
+        # invalidate(): không trả connection (có thể còn giữ lock) về pool
+        try:
+            self._conn.invalidate()
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
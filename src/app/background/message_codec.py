@@ -0,0 +1,76 @@
+"""
+Message schema + codec cho queue conversation events.
+
+Message chỉ mang định danh (consumer luôn đọc lại event từ Postgres), không mang
+`conversation_log`:
+
+    {"v": 1, "id": 123, "conversation_id": "...", "user_id": "...", "priority": 0, "trace": {...}}
+
+Encode bằng orjson (bytes, nhanh hơn json.dumps nhiều lần). `decode_message` vẫn đọc
+được message cũ (JSON đầy đủ có conversation_log) còn nằm trong queue khi deploy.
+
+Publisher copy "trace" sang AMQP headers (`traceparent`/`tracestate`) kèm `x-published-at`
+(epoch ms lúc publish) để consumer tính thời gian chờ trong queue (app.utils.tracing).
+"""
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+
+MESSAGE_SCHEMA_VERSION = 1
+MESSAGE_CONTENT_TYPE = "application/json"
+MESSAGE_PRIORITY_NORMAL = 0
+PUBLISHED_AT_HEADER = "x-published-at"
+
+
+def build_event_message(
+    event_id: Optional[int],
+    conversation_id: str,
+    user_id: str,
+    priority: int = MESSAGE_PRIORITY_NORMAL,
+    trace: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Compact message for one conversation event."""
+    message: Dict[str, Any] = {
+        "v": MESSAGE_SCHEMA_VERSION,
+        "id": event_id,
+        "conversation_id": conversation_id,
+        "user_id": user_id,
+        "priority": priority,
+    }
+    if trace:
+        message["trace"] = trace
+    return message
+
+
+def build_message_headers(trace: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """AMQP headers cho 1 message: trace context + thời điểm publish (epoch ms)."""
+    headers: Dict[str, Any] = dict(trace or {})
+    headers[PUBLISHED_AT_HEADER] = time.time_ns() // 1_000_000
+    return headers
+
+
+def published_at_ns(headers: Optional[Dict[str, Any]]) -> Optional[int]:
+    """`x-published-at` (ms) -> ns; None nếu message không có header (publisher cũ)."""
+    value = (headers or {}).get(PUBLISHED_AT_HEADER)
+    try:
+        return int(value) * 1_000_000 if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    """Serialize a message body (orjson -> UTF-8 JSON bytes)."""
+    return orjson.dumps(message)
+
+
+def decode_message(body) -> Dict[str, Any]:
+    """
+    Parse a message body (bytes/str). Raises ValueError on invalid payloads.
+
+    orjson.JSONDecodeError là subclass của ValueError.
+    """
+    message = orjson.loads(body)
+    if not isinstance(message, dict):
+        raise ValueError("Message body must be a JSON object")
+    return message
@@ -0,0 +1,327 @@
+"""
+Outbox relay: publish `event_outbox` rows to RabbitMQ with publisher confirms.
+
+Luồng:
+1. `/conversations/end` insert event + outbox row trong cùng transaction, rồi gọi
+   `notify_outbox_relay()` để đánh thức relay ngay (không chờ poll).
+2. Relay lock 1 batch row đến hạn (FOR UPDATE SKIP LOCKED), publish cả batch (aio-pika,
+   1 channel ở confirm mode, tới `row.routing_key`) rồi chờ confirms một lần; xoá các row
+   đã được broker ack và reschedule (backoff) các row bị nack/unroutable - tất cả trong
+   1 commit. Lock + transaction chỉ giữ trong 1 round-trip confirm, không phải 1 / message.
+3. RabbitMQ down: các row chưa được confirm giữ nguyên; relay reconnect với backoff và
+   publish lại ngay khi broker lên -> độ trễ tính bằng giây, không phải chờ job quét 6 giờ.
+
+Delivery là at-least-once (crash giữa publish và commit -> publish lại); consumer đã
+idempotent nhờ `claim_event` (event PROCESSED không được claim lại).
+"""
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import Any, Coroutine, Dict, List, Optional, Tuple
+
+import aio_pika
+from aio_pika.exceptions import DeliveryError
+
+from app.background.async_rabbitmq_publisher import ensure_queue
+from app.background.message_codec import MESSAGE_CONTENT_TYPE, build_message_headers, encode_message
+from app.background.rabbitmq_publisher import RabbitMQConfig
+from app.core.config_settings import settings
+from app.db.database_connection import SessionLocal
+from app.models.event_outbox_model import EventOutbox
+from app.repositories.event_outbox_repository import EventOutboxRepository
+from app.utils.logger_setup import get_logger
+from app.utils.tracing import extract_context, record_span
+
+logger = get_logger(__name__)
+
+RELAY_MAX_RECONNECT_BACKOFF_SECONDS = 30.0
+RELAY_CONFIRM_TIMEOUT_SECONDS = 30.0
+
+
+class OutboxRelayStats:
+    """Thread-safe in-process counters of the outbox relay."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._zero()
+
+    def _zero(self):
+        self.batches = 0
+        self.published = 0
+        self.rejected = 0
+        self.errors = 0
+        self.last_batch_size = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def reset(self):
+        with self._lock:
+            self._zero()
+
+    def record_batch(self, published: int, rejected: int, lag_ms: float):
+        with self._lock:
+            self.batches += 1
+            self.published += published
+            self.rejected += rejected
+            self.last_batch_size = published + rejected
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "published": self.published,
+                "rejected": self.rejected,
+                "errors": self.errors,
+                "last_batch_size": self.last_batch_size,
+                "last_lag_ms": round(self.last_lag_ms, 1),
+                "max_lag_ms": round(self.max_lag_ms, 1),
+            }
+
+
+outbox_relay_stats = OutboxRelayStats()
+
+
+class OutboxBatchPublisher:
+    """
+    aio-pika connection + 1 channel ở publisher-confirm mode cho relay.
+
+    `publish_batch()` gửi cả batch rồi chờ confirms một lần. mandatory + on_return_raises:
+    message không route được queue nào -> PublishError thay vì bị broker bỏ rồi vẫn ack.
+    """
+
+    def __init__(self):
+        self._connection: Optional[aio_pika.abc.AbstractConnection] = None
+        self._channel: Optional[aio_pika.abc.AbstractChannel] = None
+
+    async def _get_channel(self) -> aio_pika.abc.AbstractChannel:
+        if self._connection is None or self._connection.is_closed:
+            self._connection = await aio_pika.connect(RabbitMQConfig.get_url())
+            await ensure_queue(self._connection)
+            self._channel = None
+        if self._channel is None or self._channel.is_closed:
+            self._channel = await self._connection.channel(publisher_confirms=True, on_return_raises=True)
+        return self._channel
+
+    async def publish_batch(self, rows: List[EventOutbox]) -> List[Optional[BaseException]]:
+        """Publish rows tới `row.routing_key`; returns lỗi của từng row (None = broker ack)."""
+        exchange = (await self._get_channel()).default_exchange
+        results = await asyncio.gather(
+            *(
+                exchange.publish(
+                    _build_outbox_message(row),
+                    routing_key=row.routing_key,
+                    mandatory=True,
+                    timeout=RELAY_CONFIRM_TIMEOUT_SECONDS,
+                )
+                for row in rows
+            ),
+            return_exceptions=True,
+        )
+        return [result if isinstance(result, BaseException) else None for result in results]
+
+    async def close(self) -> None:
+        connection, self._connection, self._channel = self._connection, None, None
+        if connection is not None and not connection.is_closed:
+            await connection.close()
+
+
+def _build_outbox_message(row: EventOutbox) -> aio_pika.Message:
+    message = row.payload or {}
+    return aio_pika.Message(
+        encode_message(message),
+        content_type=MESSAGE_CONTENT_TYPE,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        priority=message.get("priority") or None,
+        timestamp=datetime.now(timezone.utc),
+        headers=build_message_headers(message.get("trace")),
+    )
+
+
+class OutboxRelay:
+    """Background loop moving event_outbox rows to RabbitMQ."""
+
+    def __init__(self, batch_size: Optional[int] = None, poll_seconds: Optional[float] = None):
+        self.batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+        self.poll_seconds = poll_seconds if poll_seconds is not None else settings.OUTBOX_RELAY_POLL_SECONDS
+        self._publisher: Optional[OutboxBatchPublisher] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # event loop riêng của relay thread
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="outbox-relay", daemon=True)
+        self._thread.start()
+        logger.info(
+            "📮 Outbox relay started (batch=%s, poll=%ss)", self.batch_size, self.poll_seconds
+        )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                # Vẫn đang publish trên loop của relay thread; daemon thread, bỏ qua close
+                logger.warning("⚠️  Outbox relay did not stop within %.0fs", timeout)
+                return
+        self._close_publisher()
+        logger.info("📮 Outbox relay stopped")
+
+    def notify(self) -> None:
+        """Wake the relay right away (called after an event + outbox row is committed)."""
+        self._wakeup.set()
+
+    def run_forever(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                relayed = self.relay_once()
+                backoff = 1.0
+            except Exception as exc:
+                outbox_relay_stats.record_error()
+                logger.warning("⚠️  Outbox relay error, retrying in %.0fs: %s", backoff, exc)
+                self._close_publisher()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, RELAY_MAX_RECONNECT_BACKOFF_SECONDS)
+                continue
+            if relayed >= self.batch_size:
+                continue  # còn backlog -> batch tiếp luôn
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+    def relay_once(self) -> int:
+        """Publish one batch; return number of rows handled (published + rescheduled)."""
+        db = SessionLocal()
+        try:
+            repo = EventOutboxRepository(db)
+            rows = repo.lock_due_batch(self.batch_size)
+            if not rows:
+                db.rollback()
+                return 0
+
+            published_ids, rejected, broker_error = self._publish_rows(rows)
+            repo.delete_published(published_ids)
+            repo.mark_failed(rejected)
+            db.commit()
+
+            oldest = rows[0].created_at
+            lag_ms = (datetime.now(timezone.utc) - oldest).total_seconds() * 1000 if oldest else 0.0
+            outbox_relay_stats.record_batch(len(published_ids), len(rejected), lag_ms)
+            if published_ids:
+                logger.info(
+                    "📮 Outbox relay published %s message(s) (rejected=%s, lag=%.0f ms)",
+                    len(published_ids),
+                    len(rejected),
+                    lag_ms,
+                )
+            if broker_error is not None:
+                # Đã lưu kết quả phần publish được; để run_forever reconnect với backoff
+                raise broker_error
+            return len(published_ids) + len(rejected)
+        except Exception:
+            try:
+                db.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            db.close()
+
+    def _publish_rows(
+        self,
+        rows: List[EventOutbox],
+    ) -> Tuple[List[int], List[Tuple[EventOutbox, str]], Optional[Exception]]:
+        """
+        Publish cả batch, chờ confirms một lần rồi phân loại: ack -> published, nack /
+        unroutable -> rejected (reschedule), lỗi connection / timeout -> giữ nguyên row.
+        """
+        try:
+            results = self._run(self._get_publisher().publish_batch(rows))
+        except Exception as exc:
+            return [], [], exc
+        published_ids: List[int] = []
+        rejected: List[Tuple[EventOutbox, str]] = []
+        broker_error: Optional[Exception] = None
+        for row, error in zip(rows, results):
+            if error is None:
+                published_ids.append(row.id)
+                _record_outbox_wait(row)
+            elif isinstance(error, DeliveryError):
+                rejected.append((row, f"{type(error).__name__}: {error}"))
+            elif broker_error is None:
+                # Connection/channel lỗi: row chưa confirm publish lại ở lần sau
+                broker_error = error
+        return published_ids, rejected, broker_error
+
+    def _run(self, coro: Coroutine[Any, Any, Any]) -> Any:
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    def _get_publisher(self) -> OutboxBatchPublisher:
+        if self._publisher is None:
+            self._publisher = OutboxBatchPublisher()
+        return self._publisher
+
+    def _close_publisher(self) -> None:
+        if self._publisher is not None:
+            try:
+                self._run(self._publisher.close())
+            except Exception as exc:
+                logger.warning("Error closing outbox relay publisher: %s", exc)
+            self._publisher = None
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+
+
+def _record_outbox_wait(row: EventOutbox) -> None:
+    """Span `outbox.wait` (outbox row created -> published) trong trace của request gốc."""
+    if row.created_at is None:
+        return
+    record_span(
+        "outbox.wait",
+        extract_context((row.payload or {}).get("trace")),
+        start_ns=int(row.created_at.timestamp() * 1_000_000_000),
+        attributes={
+            "outbox.id": row.id,
+            "outbox.attempts": row.attempts or 0,
+            "conversation_id": row.conversation_id,
+        },
+    )
+
+
+_relay: Optional[OutboxRelay] = None
+
+
+def start_outbox_relay() -> None:
+    """Start the relay thread in this process (OUTBOX_ENABLED + OUTBOX_RELAY_ENABLED)."""
+    global _relay
+    if not (settings.OUTBOX_ENABLED and settings.OUTBOX_RELAY_ENABLED):
+        return
+    if _relay is None:
+        _relay = OutboxRelay()
+    _relay.start()
+
+
+def notify_outbox_relay() -> None:
+    """Đánh thức relay trong process này (no-op nếu relay không chạy ở đây)."""
+    if _relay is not None:
+        _relay.notify()
+
+
+def shutdown_outbox_relay() -> None:
+    global _relay
+    if _relay is not None:
+        _relay.stop()
+        _relay = None
@@ -2,10 +2,20 @@
 RabbitMQ Consumer for conversation events.
 
 Consumes messages from RabbitMQ queue and processes conversation events.
+
+Hai mode (chọn bằng RABBITMQ_CONSUMER_WORKERS):
+- Tuần tự (mặc định): xử lý từng message trên connection thread.
+- Concurrent: thread pool có giới hạn, giữ thứ tự theo user_id, drain khi SIGTERM.
 """
-import json
+import functools
+import signal
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Optional, Tuple
+
 import pika
-from typing import Optional
+from app.background.message_codec import decode_message, published_at_ns
 from app.core.config_settings import settings
 from app.db.database_connection import SessionLocal
 from app.repositories.conversation_event_repository import ConversationEventRepository
@@ -13,7 +23,17 @@ from app.services.conversation_data_fetch_service import ConversationDataFetchSe
 from app.services.friendship_score_calculation_service import FriendshipScoreCalculationService
 from app.services.friendship_status_update_service import FriendshipStatusUpdateService
 from app.services.conversation_event_processing_service import ConversationEventProcessingService
+from app.services.utils.llm_analysis_utils import close_analysis_clients
 from app.utils.logger_setup import get_logger
+from app.utils.metrics_registry import CONSUMER_IN_FLIGHT, start_metrics_server
+from app.utils.tracing import (
+    SPAN_KIND_CONSUMER,
+    extract_context,
+    flush_traces,
+    record_span,
+    start_span,
+    tracing_enabled,
+)
 from app.utils.color_log import success, error, warning, info, key_value
 from app.utils.color_worker import (
     worker_connected,
@@ -30,6 +50,9 @@ from app.utils.color_worker import (
 
 logger = get_logger(__name__)
 
+ACK = "ack"
+NACK_REQUEUE = "nack"
+
 
 class RabbitMQConfig:
     """RabbitMQ configuration (same as publisher)."""
@@ -95,9 +118,11 @@ class RabbitMQConfig:
 class RabbitMQConsumer:
     """RabbitMQ consumer for conversation events."""
     
-    def __init__(self):
+    def __init__(self, prefetch_count: int = 1):
         self.connection: Optional[pika.BlockingConnection] = None
         self.channel: Optional[pika.channel.Channel] = None
+        self.prefetch_count = max(1, prefetch_count)
+        self._stopping = False
         self._connect()
     
     def _connect(self):
@@ -146,8 +171,8 @@ class RabbitMQConsumer:
                     durable=True
                 )
             
-            # Set QoS: Process 1 message at a time
-            self.channel.basic_qos(prefetch_count=1)
+            # Set QoS: số message chưa ack tối đa mà broker giao cho consumer này
+            self.channel.basic_qos(prefetch_count=self.prefetch_count)
             
             logger.info(
                 worker_connected(
@@ -165,7 +190,7 @@ class RabbitMQConsumer:
     
     def callback(self, ch, method, properties, body):
         """
-        Callback function when receiving message from queue.
+        Callback function when receiving message from queue (sequential mode).
         
         Args:
             ch: Channel
@@ -173,29 +198,96 @@ class RabbitMQConsumer:
             properties: Message properties
             body: Message body (JSON string)
         """
-        conversation_id = None
+        outcome = self.handle_message(body, properties)
+        self._settle(method.delivery_tag, outcome)
+
+    def handle_message(self, body, properties=None, received_ns: Optional[int] = None) -> str:
+        """
+        Process one message body and return how it should be settled.
+
+        Không đụng tới channel (an toàn để chạy trong worker thread); việc ack/nack
+        luôn do connection thread thực hiện.
+
+        TRACING_ENABLED: span `rabbitmq.consume` (publish -> settle, con của trace trong
+        AMQP headers / message["trace"]) với các span con `rabbitmq.queue_wait`
+        (publish -> nhận), `consumer.local_wait` (nhận -> worker bắt đầu) và các stage.
+
+        Returns:
+            ACK hoặc NACK_REQUEUE
+        """
+        CONSUMER_IN_FLIGHT.inc()
+        try:
+            if not tracing_enabled():
+                return self._process_message(body)
+            return self._process_message_traced(body, properties, received_ns)
+        finally:
+            CONSUMER_IN_FLIGHT.dec()
+
+    def _process_message_traced(self, body, properties, received_ns: Optional[int]) -> str:
+        started_ns = time.time_ns()
+        received_ns = received_ns or started_ns
+        headers = getattr(properties, "headers", None)
+        try:
+            message = decode_message(body)
+        except (ValueError, TypeError):
+            message = {}
+        published_ns = published_at_ns(headers)
+        with start_span(
+            "rabbitmq.consume",
+            parent=extract_context(headers) or extract_context(message.get("trace")),
+            kind=SPAN_KIND_CONSUMER,
+            start_ns=min(published_ns or received_ns, received_ns),
+            attributes={
+                "messaging.destination": RabbitMQConfig.QUEUE_NAME,
+                "conversation_id": message.get("conversation_id"),
+                "event_id": message.get("id"),
+                "user_id": message.get("user_id"),
+            },
+        ) as span:
+            if published_ns:
+                span.set_attribute("messaging.queue_wait_ms", max(0, received_ns - published_ns) // 1_000_000)
+                record_span("rabbitmq.queue_wait", span.context, published_ns, received_ns)
+            record_span("consumer.local_wait", span.context, received_ns, started_ns)
+            outcome = self._process_message(body)
+            span.set_attribute("messaging.outcome", outcome)
+            return outcome
+
+    def _process_message(self, body) -> str:
         db = None  # FIX: Khai báo db ở ngoài để đảm bảo có thể close trong finally
         
+        # Parse message (compact schema: id/conversation_id/user_id/priority/trace).
+        # Chỉ lỗi decode mới ACK bỏ message; lỗi xử lý phía sau phải rollback + requeue.
+        try:
+            message = decode_message(body)
+        except (ValueError, TypeError) as e:
+            logger.error(
+                f"{error('❌ Error parsing message JSON')} | "
+                f"{key_value('error', str(e))}",
+                exc_info=True
+            )
+            # Acknowledge message to remove from queue (invalid format)
+            return ACK
+        conversation_id = message.get("conversation_id")
+        
         try:
-            # Parse message
-            message = json.loads(body)
-            conversation_id = message.get("conversation_id")
-            
             logger.info(message_received(conversation_id))
             
             # FIX: Tạo session MỚI cho mỗi message để tránh transaction bị "nhiễm" lỗi
             db = SessionLocal()
             
             repo = ConversationEventRepository(db)
-            event = repo.get_by_conversation_id(conversation_id)
+            event_id = message.get("id")
+            if event_id is None:
+                # Message cũ (trước compact schema) chỉ có conversation_id
+                event = repo.get_by_conversation_id(conversation_id)
+                event_id = event.id if event else None
             
-            if not event:
+            if event_id is None:
                 logger.error(
                     f"{error('❌ Conversation not found in DB')} | "
                     f"{key_value('conversation_id', conversation_id)}"
                 )
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-                return
+                return ACK
             
             # Setup services
             conversation_fetch_service = ConversationDataFetchService(
@@ -214,7 +306,7 @@ class RabbitMQConsumer:
                 status_update_service=status_service,
             )
             
-            result = processor.process_single_event(event.id)
+            result = processor.process_single_event(event_id)
             
             if result:
                 processed = result.get('processed', 0)
@@ -227,16 +319,7 @@ class RabbitMQConsumer:
                 )
             
             # Acknowledge message
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-        
-        except json.JSONDecodeError as e:
-            logger.error(
-                f"{error('❌ Error parsing message JSON')} | "
-                f"{key_value('error', str(e))}",
-                exc_info=True
-            )
-            # Acknowledge message to remove from queue (invalid format)
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return ACK
         
         except Exception as e:
             error_msg = str(e)
@@ -253,10 +336,7 @@ class RabbitMQConsumer:
                     logger.warning(f"⚠️ Error during rollback: {str(rollback_error)}")
             
             # Nack message (requeue for retry)
-            try:
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-            except Exception as nack_error:
-                logger.error(f"❌ Failed to nack message: {str(nack_error)}")
+            return NACK_REQUEUE
         
         finally:
             # FIX: LUÔN close session để giải phóng connection
@@ -265,6 +345,28 @@ class RabbitMQConsumer:
                     db.close()
                 except Exception as close_error:
                     logger.warning(f"⚠️ Error closing DB session: {str(close_error)}")
+
+    def _settle(self, delivery_tag: int, outcome: str) -> None:
+        """Ack/nack a delivery. Must run on the connection thread."""
+        try:
+            if outcome == ACK:
+                self.channel.basic_ack(delivery_tag=delivery_tag)
+            else:
+                self.channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+        except Exception as settle_error:
+            logger.error(f"❌ Failed to {outcome} message: {str(settle_error)}")
+
+    def request_stop(self) -> None:
+        """Ask the consumer to stop gracefully (safe to call from a signal handler)."""
+        if self._stopping or not self.connection or self.connection.is_closed:
+            return
+        self._stopping = True
+        self.connection.add_callback_threadsafe(self._stop_consuming)
+
+    def _stop_consuming(self) -> None:
+        logger.info(consumer_stopping())
+        if self.channel:
+            self.channel.stop_consuming()
     
     def start_consuming(self):
         """Start consuming messages from queue."""
@@ -280,11 +382,15 @@ class RabbitMQConsumer:
             logger.info(f"{info('💡')} Press CTRL+C to stop")
             
             self.channel.start_consuming()
+            # stop_consuming() đã được gọi (SIGTERM) -> chờ các message đang xử lý xong
+            self._drain()
+            logger.info(consumer_stopped())
         
         except KeyboardInterrupt:
             logger.info(consumer_stopping())
             if self.channel:
                 self.channel.stop_consuming()
+            self._drain()
             if self.connection and not self.connection.is_closed:
                 self.connection.close()
             logger.info(consumer_stopped())
@@ -296,6 +402,10 @@ class RabbitMQConsumer:
             )
             raise
     
+    def _drain(self) -> None:
+        """Wait for in-flight work before closing (nothing to wait for in sequential mode)."""
+        return None
+
     def close(self):
         """Close connection."""
         try:
@@ -310,9 +420,178 @@ class RabbitMQConsumer:
             )
 
 
+class ConcurrentRabbitMQConsumer(RabbitMQConsumer):
+    """
+    Consumer xử lý message trên thread pool có giới hạn.
+
+    - prefetch_count >= workers để pool luôn có việc trong khi chờ Groq/Mem0.
+    - Các message cùng user_id được xử lý tuần tự: 2 event của 1 user không bao giờ
+      update topic_metrics song song; message tới sau được giữ lại tới khi message
+      trước được ack/nack.
+    - Worker thread không đụng tới channel (pika không thread-safe): kết quả được đưa
+      về connection thread qua add_callback_threadsafe, nơi ack/nack và toàn bộ
+      state scheduling được xử lý -> không cần lock.
+    - Khi dừng (SIGTERM): cancel consumer, trả lại (nack requeue) các message chưa bắt
+      đầu, chờ message đang chạy tối đa drain_timeout_seconds rồi mới đóng connection.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        prefetch_count: Optional[int] = None,
+        drain_timeout_seconds: int = 30,
+    ):
+        self.workers = max(1, workers)
+        prefetch = prefetch_count or self.workers * 2
+        if prefetch < self.workers:
+            logger.warning(
+                f"{warning('⚠️')} prefetch_count={prefetch} < workers={self.workers}, "
+                f"using prefetch_count={self.workers}"
+            )
+            prefetch = self.workers
+        self.drain_timeout_seconds = drain_timeout_seconds
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="event-worker",
+        )
+        # key -> deque các (delivery_tag, body, properties, received_ns) đang chờ;
+        # key có mặt = user đang có message in-flight
+        self._pending_by_key: Dict[str, Deque[Tuple[int, bytes, object, int]]] = {}
+        self._in_flight = 0
+        super().__init__(prefetch_count=prefetch)
+        logger.info(
+            f"{info('🧵')} Concurrent consumer | "
+            f"{key_value('workers', self.workers)} | {key_value('prefetch', prefetch)}"
+        )
+
+    @staticmethod
+    def _ordering_key(body) -> Optional[str]:
+        """Key dùng để giữ thứ tự xử lý (user_id, fallback conversation_id)."""
+        try:
+            message = decode_message(body)
+        except (ValueError, TypeError):
+            return None
+        key = message.get("user_id") or message.get("conversation_id")
+        return str(key) if key else None
+
+    def callback(self, ch, method, properties, body):
+        """Schedule message on the worker pool (runs on the connection thread)."""
+        key = self._ordering_key(body)
+        if key is None:
+            # Message không hợp lệ: xử lý ngay (handle_message sẽ log + ack)
+            self._settle(method.delivery_tag, self.handle_message(body, properties))
+            return
+
+        if self._stopping:
+            self._settle(method.delivery_tag, NACK_REQUEUE)
+            return
+
+        waiting = self._pending_by_key.get(key)
+        if waiting is not None:
+            # User đang có message in-flight -> xếp hàng sau message đó
+            waiting.append((method.delivery_tag, body, properties, time.time_ns()))
+            return
+
+        self._pending_by_key[key] = deque()
+        self._submit(key, method.delivery_tag, body, properties, time.time_ns())
+
+    def _submit(self, key: str, delivery_tag: int, body, properties=None, received_ns: Optional[int] = None) -> None:
+        self._in_flight += 1
+        future = self._executor.submit(self.handle_message, body, properties, received_ns)
+        future.add_done_callback(
+            functools.partial(self._on_worker_done, key, delivery_tag)
+        )
+
+    def _on_worker_done(self, key: str, delivery_tag: int, future) -> None:
+        """Runs on the worker thread: hand the result back to the connection thread."""
+        try:
+            outcome = future.result()
+        except Exception:
+            outcome = NACK_REQUEUE
+        try:
+            self.connection.add_callback_threadsafe(
+                functools.partial(self._complete, key, delivery_tag, outcome)
+            )
+        except Exception as e:
+            # Connection đã đóng: broker sẽ tự redeliver message chưa ack
+            logger.warning(
+                f"{warning('⚠️')} Cannot settle delivery {delivery_tag}, connection closed: {str(e)}"
+            )
+
+    def _complete(self, key: str, delivery_tag: int, outcome: str) -> None:
+        """Runs on the connection thread: settle and start the next message for this key."""
+        self._in_flight -= 1
+        self._settle(delivery_tag, outcome)
+
+        waiting = self._pending_by_key.get(key)
+        if waiting and not self._stopping:
+            self._submit(key, *waiting.popleft())
+            return
+        self._pending_by_key.pop(key, None)
+
+    def _stop_consuming(self) -> None:
+        super()._stop_consuming()
+        self._release_waiting()
+
+    def _release_waiting(self) -> None:
+        """Nack (requeue) messages that were received but never started."""
+        released = 0
+        for key in list(self._pending_by_key):
+            waiting = self._pending_by_key[key]
+            while waiting:
+                delivery_tag = waiting.popleft()[0]
+                self._settle(delivery_tag, NACK_REQUEUE)
+                released += 1
+        if released:
+            logger.info(f"{info('↩️')} Requeued {released} waiting message(s)")
+
+    def _drain(self) -> None:
+        """Process acks of in-flight messages until they finish or the timeout expires."""
+        self._stopping = True
+        self._release_waiting()
+        deadline = time.monotonic() + self.drain_timeout_seconds
+        while (
+            self._in_flight > 0
+            and time.monotonic() < deadline
+            and self.connection
+            and not self.connection.is_closed
+        ):
+            self.connection.process_data_events(time_limit=0.5)
+        if self._in_flight > 0:
+            logger.warning(
+                f"{warning('⚠️')} Drain timeout: {self._in_flight} message(s) still in flight, "
+                f"they will be redelivered by RabbitMQ"
+            )
+        else:
+            logger.info(f"{success('✅')} All in-flight messages settled")
+        self._executor.shutdown(wait=False)
+
+
+def build_consumer() -> RabbitMQConsumer:
+    """Create consumer according to settings (sequential when RABBITMQ_CONSUMER_WORKERS <= 1)."""
+    if settings.RABBITMQ_CONSUMER_WORKERS > 1:
+        return ConcurrentRabbitMQConsumer(
+            workers=settings.RABBITMQ_CONSUMER_WORKERS,
+            prefetch_count=settings.RABBITMQ_PREFETCH_COUNT or None,
+            drain_timeout_seconds=settings.RABBITMQ_DRAIN_TIMEOUT_SECONDS,
+        )
+    return RabbitMQConsumer(prefetch_count=settings.RABBITMQ_PREFETCH_COUNT or 1)
+
+
+def _install_signal_handlers(consumer: RabbitMQConsumer) -> None:
+    """Graceful drain on SIGTERM (docker stop / k8s)."""
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: consumer.request_stop())
+    except ValueError:
+        # Không ở main thread -> không đăng ký được signal handler
+        logger.debug("SIGTERM handler not installed (not running in main thread)")
+
+
 def start_consumer():
     """Entry point to start consumer."""
-    consumer = RabbitMQConsumer()
+    consumer = build_consumer()
+    _install_signal_handlers(consumer)
+    start_metrics_server()
     try:
         consumer.start_consuming()
     except Exception as e:
@@ -323,6 +602,8 @@ def start_consumer():
         raise
     finally:
         consumer.close()
+        close_analysis_clients()
+        flush_traces()
 
 
 if __name__ == "__main__":
@@ -2,11 +2,15 @@
 RabbitMQ Publisher for conversation events.
 
 Publishes conversation events to RabbitMQ queue for asynchronous processing.
+
+Sync (pika) publisher. Endpoint async và OutboxRelay dùng aio-pika
+(`app.background.async_rabbitmq_publisher`, `app.background.outbox_relay`).
 """
-import json
 import pika
 from datetime import datetime
 from typing import Dict, Any, Optional
+from urllib.parse import quote
+from app.background.message_codec import MESSAGE_CONTENT_TYPE, build_message_headers, encode_message
 from app.core.config_settings import settings
 from app.utils.logger_setup import get_logger
 
@@ -76,11 +80,26 @@ class RabbitMQConfig:
                 pass
         return "guest"
     
+    @staticmethod
+    def get_url() -> str:
+        """AMQP URL built from the resolved host/port/credentials (aio-pika)."""
+        return (
+            f"amqp://{quote(RabbitMQConfig.get_username(), safe='')}:"
+            f"{quote(RabbitMQConfig.get_password(), safe='')}@"
+            f"{RabbitMQConfig.get_host()}:{RabbitMQConfig.get_port()}/"
+        )
+    
     QUEUE_NAME = settings.RABBITMQ_QUEUE_NAME
     EXCHANGE_NAME = settings.RABBITMQ_EXCHANGE_NAME
     ROUTING_KEY = settings.RABBITMQ_ROUTING_KEY
 
 
+QUEUE_ARGUMENTS = {
+    'x-message-ttl': 86400000,  # 24 hours
+    'x-max-length': 100000  # Max 100k messages
+}
+
+
 class RabbitMQPublisher:
     """RabbitMQ publisher for conversation events."""
     
@@ -129,10 +148,7 @@ class RabbitMQPublisher:
                 self.channel.queue_declare(
                     queue=RabbitMQConfig.QUEUE_NAME,
                     durable=True,
-                    arguments={
-                        'x-message-ttl': 86400000,  # 24 hours
-                        'x-max-length': 100000  # Max 100k messages
-                    }
+                    arguments=QUEUE_ARGUMENTS
                 )
             
             logger.info(
@@ -157,11 +173,13 @@ class RabbitMQPublisher:
             self.channel.basic_publish(
                 exchange='',
                 routing_key=RabbitMQConfig.QUEUE_NAME,
-                body=json.dumps(message),
+                body=encode_message(message),
                 properties=pika.BasicProperties(
                     delivery_mode=2,  # Persistent
-                    content_type='application/json',
-                    timestamp=int(datetime.utcnow().timestamp())
+                    content_type=MESSAGE_CONTENT_TYPE,
+                    priority=message.get("priority") or None,
+                    timestamp=int(datetime.utcnow().timestamp()),
+                    headers=build_message_headers(message.get("trace")),
                 )
             )
             
@@ -182,52 +200,3 @@ class RabbitMQPublisher:
                 logger.info("🔌 Closed RabbitMQ connection")
         except Exception as e:
             logger.warning(f"Error closing RabbitMQ connection: {str(e)}")
-
-
-# Singleton instance
-_publisher: Optional[RabbitMQPublisher] = None
-
-
-def get_publisher() -> RabbitMQPublisher:
-    """Get singleton RabbitMQ publisher instance."""
-    global _publisher
-    if _publisher is None:
-        _publisher = RabbitMQPublisher()
-    return _publisher
-
-
-async def publish_conversation_event(
-    conversation_id: str,
-    user_id: str,
-    bot_id: str,
-    conversation_log: list
-):
-    """
-    Publish conversation event to RabbitMQ queue.
-    
-    Args:
-        conversation_id: Unique conversation identifier
-        user_id: User identifier
-        bot_id: Bot identifier
-        conversation_log: Conversation log data
-    """
-    try:
-        publisher = get_publisher()
-        
-        message = {
-            "conversation_id": conversation_id,
-            "user_id": user_id,
-            "bot_id": bot_id,
-            "conversation_log": conversation_log,
-            "enqueued_at": datetime.utcnow().isoformat()
-        }
-        
-        publisher.publish(message)
-        
-    except Exception as e:
-        logger.error(
-            f"❌ Failed to publish conversation event {conversation_id}: {str(e)}",
-            exc_info=True
-        )
-        # Don't raise - allow API to return 202 even if publish fails
-        # Background scheduler will retry pending events
@@ -1,14 +1,124 @@
 """
 Redis-based cache manager for activity candidates.
+
+Mỗi user có 1 version key (`candidates:ver:{user_id}`). Cache entry lưu kèm version
+tại thời điểm tính toán và fingerprint của prompt catalog; entry chỉ hợp lệ khi cả hai
+còn khớp. Invalidate = INCR version key; `set()` chỉ ghi khi version key vẫn bằng version
+lúc tính (Lua, atomic), nên một request đang tính dở với status cũ không thể ghi đè
+candidates mà worker vừa precompute sau khi commit score mới.
+
+Response đã render (`candidates:resp:{user_id}`) được ghi cùng lúc với entry: 1 dòng header
+`version|catalog|etag` + body JSON của `/activities/suggest`, nên cache hit trả thẳng body
+(không json.loads, không validate lại qua pydantic, không serialize lại).
 """
+import hashlib
 import json
-from typing import Optional, Dict, Any
+import threading
+from typing import Iterable, List, NamedTuple, Optional, Dict, Any, Tuple
 from app.cache.redis_cache_manager import get_redis_client
+from app.core.constants_enums import CACHE_KEY_PREFIX_CANDIDATES, CACHE_TTL_CANDIDATES
 from app.utils.logger_setup import get_logger
 
 logger = get_logger(__name__)
 
-DEFAULT_TTL_SECONDS = 86400  # 24 hours
+DEFAULT_TTL_SECONDS = CACHE_TTL_CANDIDATES
+VERSION_KEY_TTL_SECONDS = 7 * 86400  # version key sống lâu hơn entry
+
+# KEYS[1] = entry key, KEYS[2] = version key, KEYS[3] = response key (optional);
+# ARGV = version, ttl, envelope, rendered response (optional)
+_SET_IF_CURRENT_SCRIPT = """
+local current = redis.call('GET', KEYS[2]) or '0'
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('SETEX', KEYS[1], ARGV[2], ARGV[3])
+if KEYS[3] then
+    redis.call('SETEX', KEYS[3], ARGV[2], ARGV[4])
+end
+return 1
+"""
+
+
+class RenderedResponse(NamedTuple):
+    """Body JSON đã render của `/activities/suggest` + ETag (strong, quoted)."""
+    body: bytes
+    etag: str
+
+
+def build_rendered_response(body: bytes) -> RenderedResponse:
+    return RenderedResponse(body=body, etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+
+class CandidatesCacheStats:
+    """Thread-safe in-process counters for the candidates cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._zero()
+
+    def _zero(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.invalidations = 0
+        self.precomputed = 0
+        self.stale_writes = 0
+        self.precompute_ms_total = 0.0
+        self.hit_latency_ms_total = 0.0
+        self.miss_latency_ms_total = 0.0
+
+    def reset(self):
+        with self._lock:
+            self._zero()
+
+    def record_hit(self, latency_ms: float):
+        with self._lock:
+            self.hits += 1
+            self.hit_latency_ms_total += latency_ms
+
+    def record_miss(self, latency_ms: float):
+        with self._lock:
+            self.misses += 1
+            self.miss_latency_ms_total += latency_ms
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def record_precompute(self, stored: int, latency_ms: float):
+        with self._lock:
+            self.precomputed += stored
+            self.precompute_ms_total += latency_ms
+
+    def record_stale_write(self):
+        with self._lock:
+            self.stale_writes += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the counters with derived hit rate / average latencies."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "invalidations": self.invalidations,
+                "precomputed": self.precomputed,
+                "stale_writes": self.stale_writes,
+                "precompute_ms_total": round(self.precompute_ms_total, 1),
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "avg_hit_latency_ms": round(self.hit_latency_ms_total / self.hits, 3) if self.hits else 0.0,
+                "avg_miss_latency_ms": (
+                    round(self.miss_latency_ms_total / self.misses, 3) if self.misses else 0.0
+                ),
+            }
+
+
+candidates_cache_stats = CandidatesCacheStats()
 
 
 class CandidatesCacheManager:
@@ -18,39 +128,207 @@ class CandidatesCacheManager:
         self.redis = get_redis_client()
 
     def _build_key(self, user_id: str) -> str:
-        return f"candidates:{user_id}"
+        return f"{CACHE_KEY_PREFIX_CANDIDATES}:{user_id}"
+
+    def _build_version_key(self, user_id: str) -> str:
+        return f"{CACHE_KEY_PREFIX_CANDIDATES}:ver:{user_id}"
+
+    def _build_response_key(self, user_id: str) -> str:
+        return f"{CACHE_KEY_PREFIX_CANDIDATES}:resp:{user_id}"
+
+    @staticmethod
+    def _response_header(version: int, catalog_fingerprint: Optional[str], etag: str) -> str:
+        return f"{version}|{catalog_fingerprint or ''}|{etag}"
+
+    def lookup(
+        self,
+        user_id: str,
+        catalog_fingerprint: Optional[str] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        Read cached candidates and current status version in a single round-trip.
 
-    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """Return cached candidates if available."""
+        Returns:
+            (payload, version): payload is None on miss/stale entry; version is the
+            status version to pass to `set()` after recomputing.
+        """
         if not self.redis:
-            return None
+            return None, 0
         key = self._build_key(user_id)
-        cached = self.redis.get(key)
+        cached, raw_version = self.redis.mget(key, self._build_version_key(user_id))
+        version = int(raw_version) if raw_version else 0
         if not cached:
-            return None
+            return None, version
         try:
-            return json.loads(cached)
+            envelope = json.loads(cached)
         except json.JSONDecodeError:
             logger.warning("Invalid JSON in cache for key %s", key)
             self.redis.delete(key)
-            return None
+            return None, version
+        if envelope.get("version") != version or envelope.get("catalog") != catalog_fingerprint:
+            return None, version
+        return envelope.get("payload"), version
 
-    def set(self, user_id: str, payload: Dict[str, Any], ttl: int = DEFAULT_TTL_SECONDS):
-        """Store candidates in cache."""
+    def lookup_many(
+        self,
+        user_ids: List[str],
+        catalog_fingerprint: Optional[str] = None,
+    ) -> Dict[str, Tuple[Optional[Dict[str, Any]], int]]:
+        """`lookup()` cho nhiều users trong 1 MGET (entry + version key của từng user)."""
+        if not self.redis or not user_ids:
+            return {user_id: (None, 0) for user_id in user_ids}
+        keys = []
+        for user_id in user_ids:
+            keys.append(self._build_key(user_id))
+            keys.append(self._build_version_key(user_id))
+        values = self.redis.mget(keys)
+        results = {}
+        for index, user_id in enumerate(user_ids):
+            cached, raw_version = values[2 * index], values[2 * index + 1]
+            version = int(raw_version) if raw_version else 0
+            payload = None
+            if cached:
+                try:
+                    envelope = json.loads(cached)
+                except json.JSONDecodeError:
+                    envelope = {}
+                if envelope.get("version") == version and envelope.get("catalog") == catalog_fingerprint:
+                    payload = envelope.get("payload")
+            results[user_id] = (payload, version)
+        return results
+
+    def lookup_response(
+        self,
+        user_id: str,
+        catalog_fingerprint: Optional[str] = None,
+    ) -> Tuple[Optional[RenderedResponse], int]:
+        """
+        Như `lookup()` nhưng trả response đã render (body + ETag), không parse JSON.
+
+        Returns:
+            (rendered, version): rendered is None on miss/stale entry
+        """
         if not self.redis:
-            return
-        key = self._build_key(user_id)
-        self.redis.setex(key, ttl, json.dumps(payload))
+            return None, 0
+        cached, raw_version = self.redis.mget(self._build_response_key(user_id), self._build_version_key(user_id))
+        version = int(raw_version) if raw_version else 0
+        if not cached:
+            return None, version
+        header, _, body = cached.partition("\n")
+        entry_version, _, rest = header.partition("|")
+        entry_catalog, _, etag = rest.rpartition("|")
+        if entry_version != str(version) or entry_catalog != (catalog_fingerprint or "") or not etag:
+            return None, version
+        return RenderedResponse(body=body.encode("utf-8"), etag=etag), version
 
-    def invalidate(self, user_id: str):
-        """Delete cached candidates."""
+    def get_versions(self, user_ids: Iterable[str]) -> Dict[str, int]:
+        """Current status version of many users (1 MGET)."""
+        ids = list(user_ids)
+        if not self.redis or not ids:
+            return {user_id: 0 for user_id in ids}
+        raw_versions = self.redis.mget([self._build_version_key(user_id) for user_id in ids])
+        return {
+            user_id: int(raw_version) if raw_version else 0
+            for user_id, raw_version in zip(ids, raw_versions)
+        }
+
+    def _set_if_current_args(
+        self,
+        user_id: str,
+        payload: Dict[str, Any],
+        ttl: int,
+        version: int,
+        catalog_fingerprint: Optional[str],
+        rendered: Optional[RenderedResponse],
+    ) -> Tuple[List[str], List[Any]]:
+        """KEYS / ARGV cho `_SET_IF_CURRENT_SCRIPT` (response key chỉ khi có `rendered`)."""
+        envelope = {"version": version, "catalog": catalog_fingerprint, "payload": payload}
+        keys = [self._build_key(user_id), self._build_version_key(user_id)]
+        args: List[Any] = [str(version), ttl, json.dumps(envelope)]
+        if rendered is not None:
+            keys.append(self._build_response_key(user_id))
+            header = self._response_header(version, catalog_fingerprint, rendered.etag)
+            args.append(f"{header}\n{rendered.body.decode('utf-8')}")
+        return keys, args
+
+    def get(self, user_id: str, catalog_fingerprint: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return cached candidates if available and still current."""
+        payload, _ = self.lookup(user_id, catalog_fingerprint)
+        return payload
+
+    def set(
+        self,
+        user_id: str,
+        payload: Dict[str, Any],
+        ttl: int = DEFAULT_TTL_SECONDS,
+        version: int = 0,
+        catalog_fingerprint: Optional[str] = None,
+        rendered: Optional[RenderedResponse] = None,
+    ) -> bool:
+        """
+        Store candidates, tagged with the status version they were computed from.
+
+        Chỉ ghi khi version hiện tại vẫn là `version` (status chưa đổi từ lúc tính);
+        returns False khi kết quả đã cũ và bị bỏ qua. `rendered` (nếu có) được ghi
+        cùng script vào response key cho `lookup_response()`.
+        """
         if not self.redis:
-            return
-        key = self._build_key(user_id)
-        self.redis.delete(key)
+            return False
+        keys, args = self._set_if_current_args(user_id, payload, ttl, version, catalog_fingerprint, rendered)
+        stored = self.redis.eval(_SET_IF_CURRENT_SCRIPT, len(keys), *keys, *args)
+        if not stored:
+            candidates_cache_stats.record_stale_write()
+        return bool(stored)
 
+    def set_many(
+        self,
+        entries: List[Tuple[str, Dict[str, Any], int]],
+        ttl: int = DEFAULT_TTL_SECONDS,
+        catalog_fingerprint: Optional[str] = None,
+        rendered: Optional[Dict[str, RenderedResponse]] = None,
+    ) -> int:
+        """
+        `set()` (compare-and-set) cho nhiều (user_id, payload, version) trong 1 pipeline.
 
+        `rendered` (user_id -> response đã render) được ghi cùng script với entry của user đó,
+        như `set(rendered=...)`.
+        """
+        if not self.redis or not entries:
+            return 0
+        rendered = rendered or {}
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id, payload, version in entries:
+            keys, args = self._set_if_current_args(
+                user_id, payload, ttl, version, catalog_fingerprint, rendered.get(user_id)
+            )
+            pipe.eval(_SET_IF_CURRENT_SCRIPT, len(keys), *keys, *args)
+        results = pipe.execute()
+        stored = sum(1 for result in results if result)
+        for _ in range(len(results) - stored):
+            candidates_cache_stats.record_stale_write()
+        return stored
 
+    def invalidate(self, user_id: str):
+        """Bump the user's status version so every cached entry becomes stale."""
+        if not self.redis:
+            return
+        version_key = self._build_version_key(user_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.incr(version_key)
+        pipe.expire(version_key, VERSION_KEY_TTL_SECONDS)
+        pipe.delete(self._build_key(user_id), self._build_response_key(user_id))
+        pipe.execute()
+        candidates_cache_stats.record_invalidation()
 
 
+def invalidate_candidates_cache(user_id: str) -> None:
+    """
+    Invalidate cached candidates for a user after their friendship status changed.
 
+    Never raises: a Redis outage must not fail score processing.
+    """
+    try:
+        CandidatesCacheManager().invalidate(user_id)
+    except Exception as exc:
+        candidates_cache_stats.record_error()
+        logger.warning("Failed to invalidate candidates cache for user %s: %s", user_id, exc)
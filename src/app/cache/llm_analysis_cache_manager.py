@@ -0,0 +1,210 @@
+"""
+Content-addressed cache for conversation analysis results (2 LLM calls + Mem0).
+
+Key = sha256(normalized conversation_log + model + prompt version + analysis mode +
+user_id + bot_type). Event retries, consumer requeues and debug re-scoring of the same
+conversation therefore reuse the first result instead of calling Groq/Mem0 again.
+conversation_id is not part of the key: another conversation with identical content
+reuses the LLM metrics, but its new_memories_count is reset to 0 (Mem0 only extracted
+memories for the conversation that produced the entry, see llm_analysis_utils._mark_cached).
+
+Lookup order: in-process LRU -> Redis. Degraded results (a subtask failed and fell
+back to its default) are never stored.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.cache.redis_cache_manager import get_redis_client
+from app.core.config_settings import settings
+from app.utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+CACHE_KEY_PREFIX_LLM_ANALYSIS = "llm_analysis"
+STATS_LOG_EVERY = 100  # log hit rate mỗi N lookup
+
+
+def normalize_conversation_log(conversation_log: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """
+    Reduce a conversation log to (speaker, text) pairs.
+
+    Supports both the standardized format (speaker/text) and the API format
+    (character/content); whitespace and speaker case do not change the key.
+    """
+    normalized = []
+    for msg in conversation_log or []:
+        speaker = msg.get("speaker") or msg.get("character") or ""
+        text = msg.get("text")
+        if text is None:
+            text = msg.get("content") or ""
+        normalized.append((str(speaker).strip().lower(), str(text).strip()))
+    return normalized
+
+
+def build_analysis_cache_key(
+    conversation_log: List[Dict[str, Any]],
+    *,
+    model: str,
+    mode: str,
+    user_id: Optional[str],
+    bot_type: Optional[str],
+) -> str:
+    """Content hash identifying one analysis result."""
+    material = {
+        "log": normalize_conversation_log(conversation_log),
+        "model": model,
+        "prompt_version": settings.LLM_PROMPT_VERSION,
+        "mode": mode,
+        "user_id": user_id,
+        "bot_type": (bot_type or "").strip().upper().replace(" ", "_"),
+    }
+    digest = hashlib.sha256(
+        json.dumps(material, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+    return f"{CACHE_KEY_PREFIX_LLM_ANALYSIS}:{digest}"
+
+
+class LLMAnalysisCacheStats:
+    """Thread-safe hit/miss counters (local LRU vs Redis)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._zero()
+
+    def _zero(self):
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped_degraded = 0
+        self.errors = 0
+
+    def reset(self):
+        with self._lock:
+            self._zero()
+
+    def record(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+            lookups = self.local_hits + self.redis_hits + self.misses
+        if field in ("local_hits", "redis_hits", "misses") and lookups % STATS_LOG_EVERY == 0:
+            logger.info(f"📦 LLM analysis cache stats: {self.snapshot()}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.local_hits + self.redis_hits
+            lookups = hits + self.misses
+            return {
+                "local_hits": self.local_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "skipped_degraded": self.skipped_degraded,
+                "errors": self.errors,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+llm_analysis_cache_stats = LLMAnalysisCacheStats()
+
+
+class _LocalLRU:
+    """Small thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+class LLMAnalysisCacheManager:
+    """Two-level (local LRU + Redis) cache for analyze_conversation_with_llm results."""
+
+    def __init__(self, local_size: Optional[int] = None, ttl_seconds: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or settings.LLM_ANALYSIS_CACHE_TTL_SECONDS
+        self._local = _LocalLRU(
+            local_size if local_size is not None else settings.LLM_ANALYSIS_CACHE_LOCAL_SIZE
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached analysis, or None."""
+        value = self._local.get(key)
+        if value is not None:
+            llm_analysis_cache_stats.record("local_hits")
+            return dict(value)
+
+        redis = get_redis_client()
+        if redis:
+            try:
+                cached = redis.get(key)
+            except Exception as e:
+                llm_analysis_cache_stats.record("errors")
+                logger.warning(f"⚠️  LLM analysis cache read failed: {e}")
+                cached = None
+            if cached:
+                try:
+                    value = json.loads(cached)
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️  Invalid JSON in LLM analysis cache for key {key}")
+                    value = None
+                if value is not None:
+                    self._local.set(key, value, self.ttl_seconds)
+                    llm_analysis_cache_stats.record("redis_hits")
+                    return dict(value)
+
+        llm_analysis_cache_stats.record("misses")
+        return None
+
+    def set(self, key: str, analysis: Dict[str, Any]) -> None:
+        """Store a (non-degraded) analysis result in both levels."""
+        value = dict(analysis)
+        self._local.set(key, value, self.ttl_seconds)
+        redis = get_redis_client()
+        if redis:
+            try:
+                redis.setex(key, self.ttl_seconds, json.dumps(value, ensure_ascii=False))
+            except Exception as e:
+                llm_analysis_cache_stats.record("errors")
+                logger.warning(f"⚠️  LLM analysis cache write failed: {e}")
+        llm_analysis_cache_stats.record("stores")
+
+
+_cache_manager: Optional[LLMAnalysisCacheManager] = None
+_cache_manager_lock = threading.Lock()
+
+
+def get_llm_analysis_cache() -> Optional[LLMAnalysisCacheManager]:
+    """Singleton cache manager, or None when LLM_ANALYSIS_CACHE_ENABLED is off."""
+    global _cache_manager
+    if not settings.LLM_ANALYSIS_CACHE_ENABLED:
+        return None
+    if _cache_manager is None:
+        with _cache_manager_lock:
+            if _cache_manager is None:
+                _cache_manager = LLMAnalysisCacheManager()
+    return _cache_manager
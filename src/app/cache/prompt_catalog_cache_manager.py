@@ -0,0 +1,282 @@
+"""
+In-process, versioned snapshot of the prompt catalog.
+
+The catalog tables (`agenda_agent_prompting`, `prompt_template_for_level_friend`)
+change rarely, but `AgentSelectionService` used to query them once per candidate
+topic on every `/activities/suggest`. This module loads both tables once into an
+immutable snapshot, indexes it in memory and hot-swaps it when the content changes,
+so candidate computation only needs to read `friendship_status`.
+
+The snapshot exposes the same read methods as `PromptTemplateRepository`, so it can
+be used as a drop-in replacement wherever the repository is only read.
+"""
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from app.core.config_settings import settings
+from app.db.database_connection import SessionLocal
+from app.repositories.prompt_template_repository import PromptTemplateRepository
+from app.utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class PersonaEntry:
+    """Immutable copy of a `prompt_template_for_level_friend` row."""
+    friendship_level: str
+    context_style_guideline: Optional[str]
+    user_profile: Optional[str]
+
+
+@dataclass(frozen=True)
+class GuideEntry:
+    """Immutable copy of an `agenda_agent_prompting` row (same attribute names as the ORM model)."""
+    id: int
+    topic_id: Optional[str]
+    agent_id: str
+    talking_agenda: Optional[str]
+    friendship_level: str
+    agent_type: str
+
+
+class PromptCatalogSnapshot:
+    """
+    Immutable, indexed view of the prompt catalog.
+
+    Indexes:
+    - `(friendship_level, agent_type)` -> guides
+    - `(friendship_level, agent_type, topic_id)` -> guides
+    - `agent_id` -> guides
+    - `friendship_level` -> persona
+    """
+
+    def __init__(
+        self,
+        *,
+        version: int,
+        personas: List[PersonaEntry],
+        guides: List[GuideEntry],
+        fingerprint: Optional[str] = None,
+    ):
+        self.version = version
+        self.fingerprint = fingerprint or compute_catalog_fingerprint(personas, guides)
+        self.loaded_at = datetime.now(timezone.utc)
+
+        by_level_type: Dict[Tuple[str, str], List[GuideEntry]] = {}
+        by_level_type_topic: Dict[Tuple[str, str, Optional[str]], List[GuideEntry]] = {}
+        by_agent_id: Dict[str, List[GuideEntry]] = {}
+        for guide in guides:
+            by_level_type.setdefault((guide.friendship_level, guide.agent_type), []).append(guide)
+            by_level_type_topic.setdefault(
+                (guide.friendship_level, guide.agent_type, guide.topic_id), []
+            ).append(guide)
+            by_agent_id.setdefault(guide.agent_id, []).append(guide)
+
+        self._personas: Mapping[str, PersonaEntry] = MappingProxyType(
+            {persona.friendship_level: persona for persona in personas}
+        )
+        self._guides_by_level_type: Mapping[Tuple[str, str], Tuple[GuideEntry, ...]] = MappingProxyType(
+            {key: tuple(value) for key, value in by_level_type.items()}
+        )
+        self._guides_by_level_type_topic: Mapping[
+            Tuple[str, str, Optional[str]], Tuple[GuideEntry, ...]
+        ] = MappingProxyType({key: tuple(value) for key, value in by_level_type_topic.items()})
+        self._guides_by_agent_id: Mapping[str, Tuple[GuideEntry, ...]] = MappingProxyType(
+            {key: tuple(value) for key, value in by_agent_id.items()}
+        )
+        self.guide_count = len(guides)
+        self.persona_count = len(personas)
+
+    # ------------------------------------------------------------------
+    # PromptTemplateRepository-compatible read API
+    # ------------------------------------------------------------------
+    def get_persona_by_phase(self, friendship_level: str) -> Optional[PersonaEntry]:
+        """Return persona template for a phase."""
+        return self._personas.get(friendship_level)
+
+    def get_guides(
+        self,
+        *,
+        friendship_level: str,
+        agent_type: str,
+        topic_id: Optional[str] = None,
+    ) -> Tuple[GuideEntry, ...]:
+        """Return guides filtered by phase, type and optional topic."""
+        if topic_id:
+            return self._guides_by_level_type_topic.get((friendship_level, agent_type, topic_id), ())
+        return self._guides_by_level_type.get((friendship_level, agent_type), ())
+
+    def get_guide_by_topic_agent_phase(
+        self,
+        *,
+        topic_id: str,
+        agent_id: str,
+        friendship_level: str,
+    ) -> Optional[GuideEntry]:
+        """Return single guide by topic/agent/phase."""
+        for guide in self._guides_by_agent_id.get(agent_id, ()):
+            if guide.topic_id == topic_id and guide.friendship_level == friendship_level:
+                return guide
+        return None
+
+    def get_topic_id_by_agent_id(
+        self,
+        *,
+        agent_id: str,
+        friendship_level: str,
+    ) -> Optional[str]:
+        """Return topic_id of the first guide matching agent_id + phase."""
+        for guide in self._guides_by_agent_id.get(agent_id, ()):
+            if guide.friendship_level == friendship_level:
+                return guide.topic_id
+        return None
+
+    def get_guides_by_agent_id(self, agent_id: str) -> Tuple[GuideEntry, ...]:
+        """Return every guide configured for an agent_id (all phases/types)."""
+        return self._guides_by_agent_id.get(agent_id, ())
+
+
+def compute_catalog_fingerprint(personas: List[PersonaEntry], guides: List[GuideEntry]) -> str:
+    """Stable content hash of the catalog, used to detect changes between reloads."""
+    digest = hashlib.sha256()
+    for persona in sorted(personas, key=lambda item: item.friendship_level):
+        digest.update(repr(
+            (persona.friendship_level, persona.context_style_guideline, persona.user_profile)
+        ).encode("utf-8"))
+    for guide in sorted(guides, key=lambda item: item.id):
+        digest.update(repr(
+            (guide.id, guide.topic_id, guide.agent_id, guide.talking_agenda,
+             guide.friendship_level, guide.agent_type)
+        ).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PromptCatalogManager:
+    """
+    Own the current `PromptCatalogSnapshot` and hot-swap it on change.
+
+    Readers never block: they always get the current snapshot reference. When the
+    snapshot is older than `PROMPT_CATALOG_REFRESH_SECONDS`, the first reader that
+    grabs the refresh lock reloads the tables and swaps the reference only if the
+    fingerprint changed; concurrent readers keep using the previous snapshot.
+    """
+
+    def __init__(self, refresh_seconds: Optional[int] = None):
+        self.refresh_seconds = (
+            refresh_seconds if refresh_seconds is not None else settings.PROMPT_CATALOG_REFRESH_SECONDS
+        )
+        self._snapshot: Optional[PromptCatalogSnapshot] = None
+        self._version = 0
+        self._last_checked = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def get(self) -> Optional[PromptCatalogSnapshot]:
+        """Return current snapshot, loading or refreshing it when needed."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._refresh_lock:
+                if self._snapshot is None:
+                    self._reload()
+            return self._snapshot
+
+        if self.refresh_seconds > 0 and time.monotonic() - self._last_checked >= self.refresh_seconds:
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self._reload()
+                finally:
+                    self._refresh_lock.release()
+        return self._snapshot
+
+    def refresh(self) -> Optional[PromptCatalogSnapshot]:
+        """Force a reload (e.g. after an admin edit); swap only if content changed."""
+        with self._refresh_lock:
+            self._reload()
+        return self._snapshot
+
+    def _reload(self) -> None:
+        self._last_checked = time.monotonic()
+        db = SessionLocal()
+        try:
+            repo = PromptTemplateRepository(db)
+            personas = [
+                PersonaEntry(
+                    friendship_level=row.friendship_level,
+                    context_style_guideline=row.context_style_guideline,
+                    user_profile=row.user_profile,
+                )
+                for row in repo.get_all_personas()
+            ]
+            guides = [
+                GuideEntry(
+                    id=row.id,
+                    topic_id=row.topic_id,
+                    agent_id=row.agent_id,
+                    talking_agenda=row.talking_agenda,
+                    friendship_level=row.friendship_level,
+                    agent_type=row.agent_type,
+                )
+                for row in repo.get_all_guides()
+            ]
+        except Exception as exc:
+            logger.warning("Failed to load prompt catalog, keeping previous snapshot: %s", exc)
+            return
+        finally:
+            db.close()
+
+        fingerprint = compute_catalog_fingerprint(personas, guides)
+        current = self._snapshot
+        if current is not None and current.fingerprint == fingerprint:
+            return
+
+        self._version += 1
+        self._snapshot = PromptCatalogSnapshot(
+            version=self._version,
+            personas=personas,
+            guides=guides,
+            fingerprint=fingerprint,
+        )
+        logger.info(
+            "Prompt catalog snapshot v%s loaded (%s guides, %s personas, fingerprint=%s)",
+            self._version,
+            len(guides),
+            len(personas),
+            fingerprint[:12],
+        )
+
+
+_catalog_manager: Optional[PromptCatalogManager] = None
+
+
+def get_prompt_catalog_manager() -> PromptCatalogManager:
+    """Get singleton catalog manager."""
+    global _catalog_manager
+    if _catalog_manager is None:
+        _catalog_manager = PromptCatalogManager()
+    return _catalog_manager
+
+
+def get_prompt_catalog() -> Optional[PromptCatalogSnapshot]:
+    """
+    Return the current catalog snapshot.
+
+    Returns None when the catalog is disabled or could not be loaded; callers should
+    then fall back to `PromptTemplateRepository`.
+    """
+    if not settings.PROMPT_CATALOG_ENABLED:
+        return None
+    return get_prompt_catalog_manager().get()
+
+
+def warm_prompt_catalog() -> None:
+    """Load the catalog eagerly at startup so the first request does not pay for it."""
+    if not settings.PROMPT_CATALOG_ENABLED:
+        return
+    snapshot = get_prompt_catalog_manager().get()
+    if snapshot is None:
+        logger.warning("Prompt catalog not loaded at startup, will retry on first use")
@@ -0,0 +1,83 @@
+"""
+Async database engine and session management (asyncpg).
+
+Dùng cho các endpoint `async def`: query không block event loop của uvicorn worker.
+Engine được tạo lazy ở lần dùng đầu tiên để process nào không cần async DB
+(RabbitMQ worker, scripts) không phải load driver asyncpg.
+"""
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from app.core.config_settings import settings
+from app.db.pool_metrics import timed_pool_kwargs
+from app.utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+
+def build_async_database_url(database_url: str) -> str:
+    """postgresql://... / postgresql+psycopg2://... -> postgresql+asyncpg://..."""
+    if database_url.startswith("postgresql+asyncpg://"):
+        return database_url
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if database_url.startswith(prefix):
+            return "postgresql+asyncpg://" + database_url[len(prefix):]
+    return database_url
+
+
+def get_async_engine() -> AsyncEngine:
+    """Get (or create) the process-wide async engine."""
+    global _async_engine
+    if _async_engine is None:
+        url = settings.ASYNC_DATABASE_URL or build_async_database_url(settings.DATABASE_URL)
+        _async_engine = create_async_engine(
+            url,
+            pool_pre_ping=True,
+            pool_size=settings.ASYNC_DB_POOL_SIZE,
+            max_overflow=settings.ASYNC_DB_MAX_OVERFLOW,
+            echo=settings.DEBUG,
+            **timed_pool_kwargs(async_engine=True),
+        )
+        logger.info("Async database engine initialized")
+    return _async_engine
+
+
+def get_async_session_factory() -> async_sessionmaker:
+    """Session factory bound to the async engine (expire_on_commit=False: đọc object sau commit không cần await)."""
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(
+            bind=get_async_engine(),
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _async_session_factory
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    Get async database session dependency.
+
+    Yields:
+        AsyncSession: Database session
+    """
+    async with get_async_session_factory()() as session:
+        yield session
+
+
+async def dispose_async_engine() -> None:
+    """Close pooled asyncpg connections (app shutdown)."""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
@@ -6,6 +6,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config_settings import settings
+from app.db.pool_metrics import timed_pool_kwargs
 from app.utils.logger_setup import get_logger
 
 logger = get_logger(__name__)
@@ -16,7 +17,8 @@ engine = create_engine(
     pool_pre_ping=True,
     pool_size=10,
     max_overflow=20,
-    echo=settings.DEBUG
+    echo=settings.DEBUG,
+    **timed_pool_kwargs(),
 )
 
 # Create session factory
@@ -0,0 +1,39 @@
+"""
+Pool classes đo thời gian chờ lấy connection (pika_db_pool_checkout_wait_seconds).
+
+SQLAlchemy không có event "bắt đầu checkout", nên đo quanh `_do_get()` của QueuePool:
+gồm thời gian chờ khi pool cạn (pool_size + max_overflow đang bị giữ) và thời gian mở
+connection mới.
+"""
+import time
+from typing import Any, Dict
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.utils.metrics_registry import DB_POOL_CHECKOUT_WAIT, metrics_enabled
+
+
+class _TimedCheckoutMixin:
+    metrics_pool_label = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started, pool=self.metrics_pool_label)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    metrics_pool_label = "sync"
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics_pool_label = "async"
+
+
+def timed_pool_kwargs(async_engine: bool = False) -> Dict[str, Any]:
+    """create_engine kwargs: timed poolclass khi METRICS_ENABLED, ngược lại pool mặc định."""
+    if not metrics_enabled():
+        return {}
+    return {"poolclass": TimedAsyncAdaptedQueuePool if async_engine else TimedQueuePool}
@@ -2,7 +2,7 @@
 FastAPI application entry point.
 """
 import time
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 
@@ -13,6 +13,14 @@ from app.background.conversation_event_scheduler import (
     start_background_jobs,
 )
 from app.utils.logger_setup import get_logger
+from app.utils.metrics_registry import (
+    CONTENT_TYPE_LATEST,
+    metrics_enabled,
+    observe_http_request,
+    render_metrics,
+    route_template,
+)
+from app.utils.tracing import SPAN_KIND_SERVER, extract_context, flush_traces, start_span
 from app.utils.color_log import success, error, warning, info, key_value, status_code
 
 logger = get_logger(__name__)
@@ -37,6 +45,10 @@ app.add_middleware(
 
 
 # Request logging middleware
+# Scrape / probe định kỳ: không tạo trace
+UNTRACED_ROUTES = frozenset({"/metrics", "/v1/health"})
+
+
 class RequestLoggingMiddleware(BaseHTTPMiddleware):
     """Middleware để log tất cả incoming requests."""
     
@@ -54,11 +66,23 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             f"{key_value('query_params', str(dict(request.query_params)))}"
         )
         
-        # Process request
-        response = await call_next(request)
+        # Process request (SERVER span; endpoint đọc trace context từ span này)
+        route = route_template(request.scope)
+        if route in UNTRACED_ROUTES:
+            response = await call_next(request)
+        else:
+            with start_span(
+                f"{method} {route}",
+                parent=extract_context(request.headers),
+                kind=SPAN_KIND_SERVER,
+                attributes={"http.method": method, "http.route": route},
+            ) as span:
+                response = await call_next(request)
+                span.set_attribute("http.status_code", response.status_code)
         
         # Calculate processing time
         process_time = time.time() - start_time
+        observe_http_request(method, route, response.status_code, process_time)
         
         # Log response with color based on status code
         status_colored = status_code(response.status_code)
@@ -84,15 +108,29 @@ async def startup_event():
     logger.info(f"Starting {settings.PROJECT_NAME} v{settings.PROJECT_VERSION}")
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"API available at: http://{settings.API_HOST}:{settings.API_PORT}")
+    from app.cache.prompt_catalog_cache_manager import warm_prompt_catalog
+    warm_prompt_catalog()
     start_background_jobs()
+    from app.background.outbox_relay import start_outbox_relay
+    start_outbox_relay()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Shutdown event handler."""
     from app.cache.redis_cache_manager import close_redis_client
+    from app.services.utils.llm_analysis_utils import close_analysis_clients, close_async_analysis_clients
     close_redis_client()
+    close_analysis_clients()
+    await close_async_analysis_clients()
+    from app.db.async_database_connection import dispose_async_engine
+    await dispose_async_engine()
     shutdown_background_jobs()
+    from app.background.outbox_relay import shutdown_outbox_relay
+    shutdown_outbox_relay()
+    from app.background.async_rabbitmq_publisher import close_async_publisher
+    await close_async_publisher()
+    flush_traces()
     logger.info("Application shutdown")
 
 
@@ -108,5 +146,9 @@ async def root():
     }
 
 
-
-
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    if not metrics_enabled():
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
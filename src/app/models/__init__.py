@@ -6,6 +6,9 @@ from app.models.friendship_status_model import FriendshipStatus  # noqa: F401
 from app.models.conversation_event_model import ConversationEvent  # noqa: F401
 from app.models.agent_prompting_model import AgentPrompting  # noqa: F401
 from app.models.friendship_agent_mapping_model import FriendshipAgentMapping  # noqa: F401
+from app.models.user_topic_metrics_model import UserTopicMetric  # noqa: F401
+from app.models.event_outbox_model import EventOutbox  # noqa: F401
+from app.models.friendship_daily_rollup_model import FriendshipDailyRollup  # noqa: F401
 from app.models.prompt_template_model import (  # noqa: F401
     PromptTemplateForLevelFriend,
     PromptTemplateForLevelFriendship,
@@ -12,6 +12,7 @@ from sqlalchemy import (
     Computed,
 )
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred
 
 from app.core.constants_enums import ConversationEventStatus
 from app.db.database_connection import Base
@@ -27,9 +28,13 @@ class ConversationEvent(Base):
     - `duration_seconds`: STORED computed column (Postgres) = EXTRACT(EPOCH FROM (end_time - start_time)).
        -> Không cần/không được set thủ công trong code; DB tự tính dựa trên start/end.
     - `conversation_log`: JSONB lưu trọn cuộc hội thoại BE gửi sang.
+    - `conversation_log` / `raw_conversation_log` là deferred: query mặc định không load
+       (không de-TOAST blob lớn); path cần log phải `undefer` (xem ConversationEventRepository).
     - `status` + `attempt_count` + `next_attempt_at`: theo dõi process pipeline (PENDING / PROCESSING / PROCESSED / FAILED / SKIPPED).
     - `processed_at`, `error_code`, `error_details`: log kết quả xử lý (thành công hay lỗi).
     - `friendship_score_change`, `new_friendship_level`: kết quả cuối cùng đưa ra sau khi AI xử lý.
+    - `total_turns`, message counts, `user_question_count`, `text_length`, `content_hash`:
+       features tính lúc ingest để worker không phải duyệt lại `conversation_log`.
     - `created_at` / `updated_at`: timestamps chuẩn cho auditing.
     """
 
@@ -49,8 +54,8 @@ class ConversationEvent(Base):
         Computed("(EXTRACT(EPOCH FROM (end_time - start_time))::INTEGER)", persisted=True),
         nullable=False,
     )
-    conversation_log = Column(JSONB, nullable=False, default=list)
-    raw_conversation_log = Column(JSONB, nullable=True, default=None)
+    conversation_log = deferred(Column(JSONB, nullable=False, default=list))
+    raw_conversation_log = deferred(Column(JSONB, nullable=True, default=None))
     status = Column(String(50), nullable=False, default=ConversationEventStatus.PENDING.value)
     attempt_count = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -61,6 +66,17 @@ class ConversationEvent(Base):
     friendship_score_change = Column(Float, nullable=True)
     new_friendship_level = Column(String(50), nullable=True)
     score_calculation_details = Column(JSONB, nullable=True, default=None)
+    # Features tính 1 lần lúc ingest (app.utils.conversation_features); NULL với rows cũ
+    total_turns = Column(Integer, nullable=True)
+    pika_message_count = Column(Integer, nullable=True)
+    user_message_count = Column(Integer, nullable=True)
+    user_question_count = Column(Integer, nullable=True)
+    text_length = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
+    # Không map vào cột: lease (next_attempt_at) mà processor này đã claim. Giữ ngoài ORM state
+    # để expire-on-commit không reload giá trị mới do processor khác ghi (fencing token).
+    claimed_lease_until = None
+
 
@@ -0,0 +1,33 @@
+"""
+EventOutbox ORM model (transactional outbox for RabbitMQ publishing).
+"""
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db.database_connection import Base
+
+
+class EventOutbox(Base):
+    """
+    SQLAlchemy model for `event_outbox`.
+
+    Row được insert cùng transaction với `conversation_events`, nên event đã commit thì
+    message chắc chắn sẽ được publish (kể cả khi RabbitMQ đang down lúc request tới).
+    `OutboxRelay` publish theo batch với publisher confirms rồi xoá row đã được broker ack.
+    """
+
+    __tablename__ = "event_outbox"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    conversation_id = Column(String(255), nullable=False)
+    routing_key = Column(String(255), nullable=False)  # Relay publish tới key này (default exchange)
+    payload = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Relay: WHERE next_attempt_at <= now ORDER BY id
+        Index("ix_event_outbox_next_attempt", "next_attempt_at", "id"),
+    )
@@ -0,0 +1,28 @@
+"""
+FriendshipDailyRollup ORM model (checkpoint + report của job cuối ngày).
+"""
+from sqlalchemy import BigInteger, Column, Date, DateTime, Float, String, func
+
+from app.db.database_connection import Base
+
+
+class FriendshipDailyRollup(Base):
+    """
+    SQLAlchemy model for `friendship_daily_rollups`.
+
+    1 row = 1 ngày rollup. `last_user_id` là checkpoint keyset (chunk cuối đã commit),
+    được cập nhật trong cùng câu SQL với chunk nên job chạy lại sẽ tiếp tục đúng chỗ.
+    `completed_at` khác NULL -> ngày đó đã xong, chạy lại là no-op.
+    """
+
+    __tablename__ = "friendship_daily_rollups"
+
+    rollup_date = Column(Date, primary_key=True)
+    last_user_id = Column(String(255), nullable=False, default="")
+    rows_scanned = Column(BigInteger, nullable=False, default=0)
+    rows_active = Column(BigInteger, nullable=False, default=0)
+    rows_updated = Column(BigInteger, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    duration_seconds = Column(Float, nullable=True)
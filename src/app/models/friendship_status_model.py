@@ -1,7 +1,7 @@
 """
 FriendshipStatus ORM model.
 """
-from sqlalchemy import Column, String, Float, Integer, DateTime, func
+from sqlalchemy import Column, Date, String, Float, Integer, DateTime, func
 from sqlalchemy.dialects.postgresql import JSONB
 from app.db.database_connection import Base
 
@@ -16,6 +16,8 @@ class FriendshipStatus(Base):
     friendship_level = Column(String(50), nullable=False, default="PHASE1_STRANGER")
     last_interaction_date = Column(DateTime(timezone=True), nullable=True)
     streak_day = Column(Integer, nullable=False, default=0)
+    # Ngày (local, DAILY_ROLLUP_TIMEZONE) cuối cùng đã được daily rollup tính vào streak_day
+    streak_date = Column(Date, nullable=True)
     topic_metrics = Column(JSONB, nullable=False, default=dict)
     last_emotion = Column(String(50), nullable=True)
     last_followup_topic = Column(String(255), nullable=True)
@@ -0,0 +1,39 @@
+"""
+UserTopicMetric ORM model (normalized topic_metrics).
+"""
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.core.constants_enums import FriendshipLevel
+from app.db.database_connection import Base
+
+
+class UserTopicMetric(Base):
+    """
+    SQLAlchemy model for `user_topic_metrics`.
+
+    1 row = 1 entry của `friendship_status.topic_metrics` (user_id + topic_id).
+    Được dual-write cùng transaction với JSONB khi bật TOPIC_METRICS_DUAL_WRITE
+    hoặc TOPIC_METRICS_BACKEND=table.
+    """
+
+    __tablename__ = "user_topic_metrics"
+
+    user_id = Column(String(255), primary_key=True)
+    topic_id = Column(String(255), primary_key=True)
+    score = Column(Float, nullable=False, default=0.0)
+    turns = Column(Integer, nullable=False, default=0)
+    friendship_level = Column(String(50), nullable=False, default=FriendshipLevel.PHASE1_STRANGER.value)
+    last_date = Column(DateTime(timezone=True), nullable=True)
+    agents_used = Column(JSONB, nullable=False, default=list)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Top-N topics theo score của 1 user (Talk/Game sở thích)
+        Index("ix_user_topic_metrics_user_score", "user_id", score.desc()),
+        # Bottom-N topics theo turns của 1 user (Talk/Game khám phá)
+        Index("ix_user_topic_metrics_user_turns", "user_id", "turns"),
+        # Báo cáo cross-user: top topics / users theo topic
+        Index("ix_user_topic_metrics_topic_score", "topic_id", score.desc()),
+    )
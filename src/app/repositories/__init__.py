@@ -7,4 +7,9 @@ from app.repositories.conversation_event_repository import ConversationEventRepo
 from app.repositories.agent_prompting_repository import AgentPromptingRepository  # noqa: F401
 from app.repositories.friendship_agent_mapping_repository import FriendshipAgentMappingRepository  # noqa: F401
 from app.repositories.prompt_template_repository import PromptTemplateRepository  # noqa: F401
+from app.repositories.user_topic_metrics_repository import UserTopicMetricsRepository  # noqa: F401
+from app.repositories.event_outbox_repository import EventOutboxRepository  # noqa: F401
+from app.repositories.daily_rollup_repository import DailyRollupRepository  # noqa: F401
 
+from app.repositories.async_friendship_status_repository import AsyncFriendshipStatusRepository  # noqa: F401
+from app.repositories.async_conversation_event_repository import AsyncConversationEventRepository  # noqa: F401
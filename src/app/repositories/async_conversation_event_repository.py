@@ -0,0 +1,60 @@
+"""
+Async repository for conversation_events table (AsyncSession / asyncpg).
+"""
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.conversation_event_model import ConversationEvent
+from app.models.event_outbox_model import EventOutbox
+from app.repositories.conversation_event_repository import restore_log_attributes
+
+
+class AsyncConversationEventRepository:
+    """Async data access helpers for conversation_events."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.model = ConversationEvent
+
+    async def get_by_conversation_id(self, conversation_id: str) -> Optional[ConversationEvent]:
+        """Return event by unique conversation_id (conversation_log deferred, không load)."""
+        result = await self.db.execute(
+            select(self.model).where(self.model.conversation_id == conversation_id)
+        )
+        return result.scalars().first()
+
+    async def exists(self, conversation_id: str) -> bool:
+        """Cheap existence check (chỉ select id, không load conversation_log)."""
+        result = await self.db.execute(
+            select(self.model.id).where(self.model.conversation_id == conversation_id).limit(1)
+        )
+        return result.scalar() is not None
+
+    async def get_by_id(self, event_id: int) -> Optional[ConversationEvent]:
+        """Return event by primary key ID."""
+        return await self.db.get(self.model, event_id)
+
+    async def create(
+        self,
+        payload: Dict[str, Any],
+        outbox_factory: Optional[Callable[[ConversationEvent], EventOutbox]] = None,
+    ) -> ConversationEvent:
+        """Persist a new event record (+ outbox row in the same transaction)."""
+        event = self.model(**payload)
+        self.db.add(event)
+        try:
+            if outbox_factory is not None:
+                await self.db.flush()
+                self.db.add(outbox_factory(event))
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            raise
+        # Server defaults (id, created_at, duration_seconds...) -> refresh 1 lần
+        await self.db.refresh(event)
+        # refresh expire cả deferred logs; lazy load không dùng được trên AsyncSession
+        restore_log_attributes(event, payload)
+        return event
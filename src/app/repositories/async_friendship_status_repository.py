@@ -0,0 +1,87 @@
+"""
+Async repository for friendship_status table (AsyncSession / asyncpg).
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.friendship_status_model import FriendshipStatus
+from app.repositories.friendship_status_repository import FriendshipStatusStatements
+from app.repositories.user_topic_metrics_repository import (
+    build_upsert_entries_stmt,
+    is_topic_metrics_dual_write_enabled,
+)
+
+
+class AsyncFriendshipStatusRepository(FriendshipStatusStatements):
+    """Async data access layer for friendship_status (same SQL as FriendshipStatusRepository)."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.model = FriendshipStatus
+
+    async def get_by_user_id(self, user_id: str) -> Optional[FriendshipStatus]:
+        """Fetch friendship status by user_id."""
+        result = await self.db.execute(
+            select(self.model).where(self.model.user_id == user_id)
+        )
+        return result.scalars().first()
+
+    async def get_by_user_ids(self, user_ids: Iterable[str]) -> Dict[str, FriendshipStatus]:
+        """Fetch many statuses in one query, keyed by user_id."""
+        ids = sorted(set(user_ids))
+        if not ids:
+            return {}
+        result = await self.db.execute(select(self.model).where(self.model.user_id.in_(ids)))
+        return {status.user_id: status for status in result.scalars().all()}
+
+    async def get_or_create(self, user_id: str) -> FriendshipStatus:
+        """Fetch status, creating the default row first when missing (race-safe)."""
+        status = await self.get_by_user_id(user_id)
+        if status is not None:
+            return status
+        await self.db.execute(self._ensure_defaults_stmt([user_id]))
+        await self.db.commit()
+        return await self.get_by_user_id(user_id)
+
+    async def apply_score_change(
+        self,
+        user_id: str,
+        score_change: float,
+        last_interaction_date: Optional[datetime] = None,
+    ) -> Row:
+        """Apply score change + level in one UPDATE; returns the new row state."""
+        await self.db.execute(self._ensure_defaults_stmt([user_id]))
+        result = await self.db.execute(
+            self._score_change_stmt(user_id, score_change, last_interaction_date)
+        )
+        row = result.one()
+        await self.db.commit()
+        return row
+
+    async def apply_topic_update(
+        self,
+        user_id: str,
+        topic_id: str,
+        score_change: float,
+        bot_id: str,
+        turns_change: int = 1,
+        last_interaction_date: Optional[datetime] = None,
+    ) -> Row:
+        """Update one topic key + score/level in one UPDATE; returns the new row state."""
+        await self.db.execute(self._ensure_defaults_stmt([user_id]))
+        result = await self.db.execute(
+            self._topic_update_stmt(
+                user_id, topic_id, score_change, bot_id, turns_change, last_interaction_date
+            )
+        )
+        row = result.one()
+        if is_topic_metrics_dual_write_enabled():
+            await self.db.execute(
+                build_upsert_entries_stmt([(user_id, topic_id, row.topic_metrics[topic_id])])
+            )
+        await self.db.commit()
+        return row
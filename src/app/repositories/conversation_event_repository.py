@@ -2,16 +2,46 @@
 Repository for conversation_events table.
 """
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
+from sqlalchemy import and_, func, or_, select, tuple_, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.core.config_settings import settings
 from app.core.constants_enums import (
     CONVERSATION_EVENT_RETRY_HOURS,
     ConversationEventStatus,
 )
 from app.models.conversation_event_model import ConversationEvent
+from app.models.event_outbox_model import EventOutbox
+
+# Deferred JSONB columns (xem ConversationEvent)
+LOG_ATTRIBUTES = ("conversation_log", "raw_conversation_log")
+# mark_* chỉ refresh các cột pipeline, không SELECT lại conversation_log đã load
+STATUS_ATTRIBUTES = (
+    "status",
+    "attempt_count",
+    "next_attempt_at",
+    "processed_at",
+    "error_code",
+    "error_details",
+    "friendship_score_change",
+    "new_friendship_level",
+    "updated_at",
+)
+
+
+def restore_log_attributes(event: ConversationEvent, payload: Dict[str, Any]) -> None:
+    """
+    Gán lại log (đã có trong memory lúc insert) làm committed value sau refresh.
+
+    refresh() expire cả deferred columns -> nếu không, đọc event.conversation_log sẽ
+    SELECT lại blob vừa insert (và lazy load không dùng được trên AsyncSession).
+    """
+    for name in LOG_ATTRIBUTES:
+        set_committed_value(event, name, payload.get(name))
 
 
 class ConversationEventRepository:
@@ -21,32 +51,65 @@ class ConversationEventRepository:
         self.db = db
         self.model = ConversationEvent
 
-    def get_by_conversation_id(self, conversation_id: str) -> Optional[ConversationEvent]:
-        """Return event by unique conversation_id."""
-        return (
-            self.db.query(self.model)
-            .filter(self.model.conversation_id == conversation_id)
-            .first()
-        )
+    def get_by_conversation_id(
+        self,
+        conversation_id: str,
+        with_log: bool = False,
+    ) -> Optional[ConversationEvent]:
+        """
+        Return event by unique conversation_id.
+
+        conversation_log chỉ được load cùng query khi `with_log=True` (analyzer path);
+        mặc định là lazy (deferred).
+        """
+        query = self.db.query(self.model).filter(self.model.conversation_id == conversation_id)
+        if with_log:
+            query = query.options(undefer(self.model.conversation_log))
+        return query.first()
+
+    def exists(self, conversation_id: str) -> bool:
+        """Cheap existence check (chỉ select id, không load conversation_log)."""
+        return self.db.execute(
+            select(self.model.id).where(self.model.conversation_id == conversation_id).limit(1)
+        ).scalar() is not None
 
-    def create(self, payload: Dict[str, Any]) -> ConversationEvent:
-        """Persist a new event record."""
+    def create(
+        self,
+        payload: Dict[str, Any],
+        outbox_factory: Optional[Callable[[ConversationEvent], EventOutbox]] = None,
+    ) -> ConversationEvent:
+        """
+        Persist a new event record.
+
+        `outbox_factory` (transactional outbox): được gọi sau khi flush (event đã có id),
+        outbox row được insert trong cùng transaction với event.
+        """
         event = self.model(**payload)
         self.db.add(event)
         try:
+            if outbox_factory is not None:
+                self.db.flush()
+                self.db.add(outbox_factory(event))
             self.db.commit()
         except IntegrityError:
             self.db.rollback()
             raise
         self.db.refresh(event)
+        restore_log_attributes(event, payload)
         return event
 
-    def get_by_id(self, event_id: int) -> Optional[ConversationEvent]:
-        """Return event by primary key ID."""
-        return self.db.get(self.model, event_id)
+    def get_by_id(self, event_id: int, with_log: bool = False) -> Optional[ConversationEvent]:
+        """Return event by primary key ID (conversation_log deferred unless `with_log`)."""
+        options = [undefer(self.model.conversation_log)] if with_log else None
+        return self.db.get(self.model, event_id, options=options)
 
     def fetch_due_events(self, batch_size: int = 25) -> List[ConversationEvent]:
-        """Return pending/failed events whose next_attempt_at has arrived."""
+        """
+        Return pending/failed events whose next_attempt_at has arrived (read-only).
+
+        Không khóa row: processors phải dùng claim_due_events() để tránh xử lý trùng.
+        conversation_log / raw_conversation_log không được load (deferred).
+        """
         now = datetime.now(timezone.utc)
         return (
             self.db.query(self.model)
@@ -64,66 +127,300 @@ class ConversationEventRepository:
             .all()
         )
 
+    def _claimable_condition(self, now: datetime):
+        """
+        Events có thể claim khi next_attempt_at <= now và:
+        - PENDING/FAILED: tới lượt xử lý / retry
+        - PROCESSING: lease đã hết hạn (worker chết giữa chừng) -> reclaim
+        """
+        return and_(
+            self.model.status.in_(
+                [
+                    ConversationEventStatus.PENDING.value,
+                    ConversationEventStatus.FAILED.value,
+                    ConversationEventStatus.PROCESSING.value,
+                ]
+            ),
+            self.model.next_attempt_at <= now,
+        )
+
+    def get_backlog_stats(self) -> Tuple[int, Optional[datetime]]:
+        """
+        Return (số events đang chờ xử lý, next_attempt_at cũ nhất) của backlog hiện tại.
+
+        Dùng cùng điều kiện với claim_due_events() nên được phục vụ bởi partial index.
+        """
+        now = datetime.now(timezone.utc)
+        count, oldest = self.db.execute(
+            select(func.count(self.model.id), func.min(self.model.next_attempt_at))
+            .where(self._claimable_condition(now))
+        ).one()
+        return int(count or 0), oldest
+
+    def _claim(self, id_subquery, now: datetime, lease_seconds: Optional[int], detach: bool) -> List[ConversationEvent]:
+        """
+        UPDATE ... SET PROCESSING + lease WHERE id IN (subquery) RETURNING ..., then commit.
+
+        RETURNING gồm conversation_log (analyzer cần) nhưng không gồm raw_conversation_log.
+        """
+        lease = lease_seconds if lease_seconds is not None else settings.CONVERSATION_EVENT_LEASE_SECONDS
+        stmt = (
+            update(self.model)
+            .where(self.model.id.in_(id_subquery))
+            .values(
+                status=ConversationEventStatus.PROCESSING.value,
+                attempt_count=self.model.attempt_count + 1,
+                # Lease: hết hạn mà chưa PROCESSED/FAILED thì processor khác được reclaim
+                next_attempt_at=now + timedelta(seconds=lease),
+                updated_at=now,
+            )
+            .returning(self.model)
+            .options(undefer(self.model.conversation_log))
+            .execution_options(synchronize_session=False)
+        )
+        events = list(self.db.scalars(stmt).all())
+        for event in events:
+            # Fencing token: mark_* / lock_held_events chỉ ghi/lock khi row vẫn giữ đúng lease này
+            event.claimed_lease_until = event.next_attempt_at
+        if detach:
+            for event in events:
+                self.db.expunge(event)
+        self.db.commit()
+        # RETURNING không đảm bảo thứ tự -> xử lý theo thứ tự tạo
+        events.sort(key=lambda item: item.id)
+        return events
+
+    def claim_due_events(
+        self,
+        batch_size: int = 200,
+        lease_seconds: Optional[int] = None,
+        detach: bool = True,
+    ) -> List[ConversationEvent]:
+        """
+        Atomically claim up to `batch_size` due events (safe with many processors).
+
+        UPDATE ... SET status = PROCESSING, attempt_count += 1, next_attempt_at = now + lease
+        WHERE id IN (SELECT ... ORDER BY next_attempt_at LIMIT n FOR UPDATE SKIP LOCKED)
+        RETURNING *
+
+        Rows đang bị processor khác claim sẽ bị bỏ qua (SKIP LOCKED), không block.
+        With `detach=True` the returned objects are detached from the session (safe to
+        read after commit without one lazy reload per row).
+        """
+        now = datetime.now(timezone.utc)
+        due_ids = (
+            select(self.model.id)
+            .where(self._claimable_condition(now))
+            .order_by(self.model.next_attempt_at.asc())
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        return self._claim(due_ids, now, lease_seconds, detach)
+
+    def claim_event(
+        self,
+        event_id: int,
+        lease_seconds: Optional[int] = None,
+    ) -> Optional[ConversationEvent]:
+        """
+        Atomically claim one event by ID (RabbitMQ path).
+
+        PENDING/FAILED được claim ngay (message là yêu cầu xử lý tường minh); PROCESSING
+        chỉ claim được khi lease đã hết hạn. Returns None nếu event đã PROCESSED hoặc
+        đang được processor khác giữ.
+        """
+        now = datetime.now(timezone.utc)
+        claimable_id = (
+            select(self.model.id)
+            .where(self.model.id == event_id)
+            .where(
+                or_(
+                    self.model.status.in_(
+                        [
+                            ConversationEventStatus.PENDING.value,
+                            ConversationEventStatus.FAILED.value,
+                        ]
+                    ),
+                    and_(
+                        self.model.status == ConversationEventStatus.PROCESSING.value,
+                        self.model.next_attempt_at <= now,
+                    ),
+                )
+            )
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        events = self._claim(claimable_id, now, lease_seconds, detach=False)
+        return events[0] if events else None
+
+    def bulk_mark_processed(self, results: List[Dict[str, Any]]) -> None:
+        """
+        Set PROCESSED for many events with one executemany UPDATE (no commit).
+
+        Each item: id, friendship_score_change, new_friendship_level, score_calculation_details.
+        Không fencing: caller phải giữ row lock từ lock_held_events() trong cùng transaction.
+        """
+        if not results:
+            return
+        now = datetime.now(timezone.utc)
+        self.db.execute(
+            update(self.model),
+            [
+                {
+                    "id": item["id"],
+                    "status": ConversationEventStatus.PROCESSED.value,
+                    "friendship_score_change": item["friendship_score_change"],
+                    "new_friendship_level": item["new_friendship_level"],
+                    "score_calculation_details": item.get("score_calculation_details"),
+                    "processed_at": now,
+                    "error_code": None,
+                    "error_details": None,
+                    "next_attempt_at": now,
+                    "updated_at": now,
+                }
+                for item in results
+            ],
+        )
+
+    def bulk_mark_failed(self, failures: List[Dict[str, Any]]) -> None:
+        """
+        Set FAILED + schedule retry for many events with one executemany UPDATE (no commit).
+
+        Không fencing: caller phải giữ row lock từ lock_held_events() trong cùng transaction.
+        """
+        if not failures:
+            return
+        now = datetime.now(timezone.utc)
+        retry_at = now + timedelta(hours=CONVERSATION_EVENT_RETRY_HOURS)
+        self.db.execute(
+            update(self.model),
+            [
+                {
+                    "id": item["id"],
+                    "status": ConversationEventStatus.FAILED.value,
+                    "error_code": item["error_code"],
+                    "error_details": item["error_details"],
+                    "next_attempt_at": retry_at,
+                    "updated_at": now,
+                }
+                for item in failures
+            ],
+        )
+
     def mark_processing(self, event: ConversationEvent) -> ConversationEvent:
-        """Set status to PROCESSING and increment attempt counter."""
+        """
+        Set status to PROCESSING and increment attempt counter (non-atomic).
+
+        Prefer claim_event()/claim_due_events() when several processors may run.
+        """
+        now = datetime.now(timezone.utc)
         event.status = ConversationEventStatus.PROCESSING.value
         event.attempt_count = (event.attempt_count or 0) + 1
-        event.updated_at = datetime.now(timezone.utc)
+        event.next_attempt_at = now + timedelta(seconds=settings.CONVERSATION_EVENT_LEASE_SECONDS)
+        event.claimed_lease_until = event.next_attempt_at
+        event.updated_at = now
         self.db.commit()
-        self.db.refresh(event)
+        self.db.refresh(event, attribute_names=STATUS_ATTRIBUTES)
         return event
 
+    def _held_lease_condition(self, event: ConversationEvent):
+        """Row vẫn PROCESSING với đúng lease đã claim (chưa bị processor khác reclaim)."""
+        return and_(
+            self.model.id == event.id,
+            self.model.status == ConversationEventStatus.PROCESSING.value,
+            self.model.next_attempt_at == event.claimed_lease_until,
+        )
+
+    def _update_if_held(self, event: ConversationEvent, values: Dict[str, Any], commit: bool = True) -> bool:
+        """Fenced UPDATE (+ commit). Returns False (không ghi gì) nếu lease đã mất."""
+        result = self.db.execute(
+            update(self.model)
+            .where(self._held_lease_condition(event))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if commit:
+            self.db.commit()
+        return result.rowcount == 1
+
+    def lock_held_events(self, events: List[ConversationEvent]) -> Set[int]:
+        """
+        SELECT ... FOR UPDATE các events vẫn giữ đúng lease đã claim (không commit).
+
+        Lock giữ tới hết transaction nên claim của processor khác (SKIP LOCKED) bỏ qua các
+        row này; returns ids còn giữ lease (bulk path chỉ ghi kết quả cho các id này).
+        """
+        held = [(event.id, event.claimed_lease_until) for event in events if event.claimed_lease_until]
+        if not held:
+            return set()
+        rows = self.db.execute(
+            select(self.model.id)
+            .where(self.model.status == ConversationEventStatus.PROCESSING.value)
+            .where(tuple_(self.model.id, self.model.next_attempt_at).in_(held))
+            .with_for_update()
+        ).scalars()
+        return set(rows)
+
     def mark_processed(
         self,
         event: ConversationEvent,
         friendship_score_change: float,
         friendship_level: str,
         score_calculation_details: Optional[Dict[str, Any]] = None,
-    ) -> ConversationEvent:
+        commit: bool = True,
+    ) -> bool:
         """
-        Set status to PROCESSED with processing metadata.
+        Set status to PROCESSED with processing metadata (fenced by the claimed lease).
         
         Args:
-            event: ConversationEvent to update
+            event: Claimed ConversationEvent to update
             friendship_score_change: Final score change
             friendship_level: New friendship level
             score_calculation_details: Optional detailed breakdown of score calculation
+            commit: False -> caller commit cùng status update (sau `lock_held_events()`)
+
+        Returns:
+            False nếu lease đã mất (event đã bị processor khác reclaim) -> không ghi gì
         """
-        event.status = ConversationEventStatus.PROCESSED.value
-        event.friendship_score_change = friendship_score_change
-        event.new_friendship_level = friendship_level
-        
-        # CRITICAL: SQLAlchemy không detect in-place changes trong JSONB
-        # Phải gán lại object và flag_modified để force SQLAlchemy detect changes
-        event.score_calculation_details = score_calculation_details
-        if score_calculation_details is not None:
-            from sqlalchemy.orm.attributes import flag_modified
-            flag_modified(event, "score_calculation_details")
-        
-        event.processed_at = datetime.now(timezone.utc)
-        event.error_code = None
-        event.error_details = None
-        event.next_attempt_at = event.processed_at
-        event.updated_at = event.processed_at
-        self.db.commit()
-        self.db.refresh(event)
-        return event
+        now = datetime.now(timezone.utc)
+        updated = self._update_if_held(
+            event,
+            {
+                "status": ConversationEventStatus.PROCESSED.value,
+                "friendship_score_change": friendship_score_change,
+                "new_friendship_level": friendship_level,
+                "score_calculation_details": score_calculation_details,
+                "processed_at": now,
+                "error_code": None,
+                "error_details": None,
+                "next_attempt_at": now,
+                "updated_at": now,
+            },
+            commit=commit,
+        )
+        if updated:
+            self.db.refresh(event, attribute_names=STATUS_ATTRIBUTES)
+        return updated
 
     def mark_failed(
         self,
         event: ConversationEvent,
         error_code: str,
         error_details: str,
-    ) -> ConversationEvent:
-        """Set status to FAILED and schedule retry."""
-        event.status = ConversationEventStatus.FAILED.value
-        event.error_code = error_code
-        event.error_details = error_details
-        retry_at = datetime.now(timezone.utc) + timedelta(hours=CONVERSATION_EVENT_RETRY_HOURS)
-        event.next_attempt_at = retry_at
-        event.updated_at = datetime.now(timezone.utc)
-        self.db.commit()
-        self.db.refresh(event)
-        return event
-
-
+    ) -> bool:
+        """Set status to FAILED and schedule retry (fenced; False nếu lease đã mất)."""
+        now = datetime.now(timezone.utc)
+        updated = self._update_if_held(
+            event,
+            {
+                "status": ConversationEventStatus.FAILED.value,
+                "error_code": error_code,
+                "error_details": error_details,
+                "next_attempt_at": now + timedelta(hours=CONVERSATION_EVENT_RETRY_HOURS),
+                "updated_at": now,
+            },
+        )
+        if updated:
+            self.db.refresh(event, attribute_names=STATUS_ATTRIBUTES)
+        return updated
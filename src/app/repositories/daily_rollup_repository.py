@@ -0,0 +1,142 @@
+"""
+Repository cho job rollup cuối ngày (friendship_status + conversation_events).
+
+Mỗi chunk là 1 câu SQL set-based (keyset theo user_id): tính activity trong ngày từ
+conversation_events, cập nhật streak_day / streak_date / last_interaction_date cho cả
+chunk và ghi checkpoint vào friendship_daily_rollups trong cùng statement.
+"""
+from datetime import date, datetime, timezone
+from typing import Iterable, Optional, Set
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.models.friendship_daily_rollup_model import FriendshipDailyRollup
+
+# 1 chunk user_id (keyset). Idempotent theo ngày:
+# - user có conversation trong ngày và streak_date < ngày: streak +1 nếu streak_date là hôm qua, ngược lại = 1
+# - user không có conversation trong ngày mà streak_day > 0: streak bị đứt -> 0
+# Chạy lại cùng ngày không đổi gì (streak_date đã = ngày, hoặc streak_day đã = 0).
+_ROLLUP_CHUNK_SQL = text(
+    """
+    WITH chunk AS (
+        SELECT user_id, streak_day, streak_date
+        FROM friendship_status
+        WHERE user_id > :after_user_id
+        ORDER BY user_id
+        LIMIT :chunk_size
+    ), activity AS (
+        SELECT ce.user_id, max(ce.end_time) AS last_end_time
+        FROM conversation_events ce
+        WHERE ce.user_id >= (SELECT min(user_id) FROM chunk)
+          AND ce.user_id <= (SELECT max(user_id) FROM chunk)
+          AND ce.end_time >= :day_start
+          AND ce.end_time < :day_end
+        GROUP BY ce.user_id
+    ), updated AS (
+        UPDATE friendship_status AS fs SET
+            streak_day = CASE
+                WHEN a.user_id IS NULL THEN 0
+                WHEN c.streak_date = :previous_date THEN c.streak_day + 1
+                ELSE 1
+            END,
+            streak_date = CASE WHEN a.user_id IS NULL THEN c.streak_date ELSE :rollup_date END,
+            last_interaction_date = CASE
+                WHEN a.user_id IS NULL THEN fs.last_interaction_date
+                ELSE GREATEST(fs.last_interaction_date, a.last_end_time)
+            END,
+            updated_at = now()
+        FROM chunk c
+        LEFT JOIN activity a ON a.user_id = c.user_id
+        WHERE fs.user_id = c.user_id
+          AND (c.streak_date IS NULL OR c.streak_date < :rollup_date)
+          AND (a.user_id IS NOT NULL OR c.streak_day > 0)
+        RETURNING a.user_id IS NOT NULL AS active
+    ), checkpoint AS (
+        UPDATE friendship_daily_rollups SET
+            last_user_id = COALESCE((SELECT max(user_id) FROM chunk), last_user_id),
+            rows_scanned = rows_scanned + (SELECT count(*) FROM chunk),
+            rows_active = rows_active + (SELECT count(*) FROM updated WHERE active),
+            rows_updated = rows_updated + (SELECT count(*) FROM updated),
+            updated_at = now()
+        WHERE rollup_date = :rollup_date
+    )
+    SELECT (SELECT max(user_id) FROM chunk) AS last_user_id,
+           (SELECT count(*) FROM chunk) AS scanned,
+           (SELECT count(*) FROM updated WHERE active) AS active,
+           (SELECT count(*) FROM updated) AS updated
+    """
+)
+
+
+class DailyRollupRepository:
+    """Data access helpers cho friendship_daily_rollups và rollup chunk SQL."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.model = FriendshipDailyRollup
+
+    def get_or_create_checkpoint(self, rollup_date: date) -> FriendshipDailyRollup:
+        """Return checkpoint row của ngày (INSERT ... ON CONFLICT DO NOTHING rồi đọc lại, commit)."""
+        self.db.execute(
+            pg_insert(self.model)
+            .values(rollup_date=rollup_date, last_user_id="", rows_scanned=0, rows_active=0, rows_updated=0)
+            .on_conflict_do_nothing(index_elements=[self.model.rollup_date])
+        )
+        self.db.commit()
+        return self.db.get(self.model, rollup_date, populate_existing=True)
+
+    def get_completed_dates(self, rollup_dates: Iterable[date]) -> Set[date]:
+        """Return các ngày trong `rollup_dates` đã rollup xong."""
+        dates = list(rollup_dates)
+        if not dates:
+            return set()
+        return set(
+            self.db.scalars(
+                select(self.model.rollup_date)
+                .where(self.model.rollup_date.in_(dates))
+                .where(self.model.completed_at.isnot(None))
+            ).all()
+        )
+
+    def rollup_chunk(
+        self,
+        rollup_date: date,
+        previous_date: date,
+        day_start: datetime,
+        day_end: datetime,
+        after_user_id: str,
+        chunk_size: int,
+    ) -> Row:
+        """
+        Rollup 1 chunk + ghi checkpoint (1 statement), rồi commit.
+
+        Returns:
+            Row (last_user_id, scanned, active, updated); last_user_id None = hết users
+        """
+        row = self.db.execute(
+            _ROLLUP_CHUNK_SQL,
+            {
+                "rollup_date": rollup_date,
+                "previous_date": previous_date,
+                "day_start": day_start,
+                "day_end": day_end,
+                "after_user_id": after_user_id,
+                "chunk_size": chunk_size,
+            },
+        ).one()
+        self.db.commit()
+        return row
+
+    def mark_completed(self, rollup_date: date, duration_seconds: float) -> Optional[FriendshipDailyRollup]:
+        """Đánh dấu ngày đã rollup xong (chạy lại ngày này sẽ là no-op)."""
+        checkpoint = self.db.get(self.model, rollup_date, populate_existing=True)
+        if checkpoint is None:
+            return None
+        checkpoint.completed_at = datetime.now(timezone.utc)
+        checkpoint.duration_seconds = duration_seconds
+        self.db.commit()
+        self.db.refresh(checkpoint)
+        return checkpoint
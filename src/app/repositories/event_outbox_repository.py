@@ -0,0 +1,77 @@
+"""
+Repository for event_outbox table.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.models.event_outbox_model import EventOutbox
+
+OUTBOX_MAX_BACKOFF_SECONDS = 300
+
+
+def build_outbox_entry(conversation_id: str, routing_key: str, message: Dict[str, Any]) -> EventOutbox:
+    """Outbox row for a message; caller adds it to the same session/transaction as the event."""
+    return EventOutbox(
+        conversation_id=conversation_id,
+        routing_key=routing_key,
+        payload=message,
+        attempts=0,
+    )
+
+
+class EventOutboxRepository:
+    """Data access helpers for the relay side of event_outbox."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.model = EventOutbox
+
+    def lock_due_batch(self, batch_size: int) -> List[EventOutbox]:
+        """
+        Lock up to `batch_size` due rows (FOR UPDATE SKIP LOCKED), oldest first.
+
+        Lock giữ tới khi caller commit, nên nhiều relay (nhiều replicas) chạy song song
+        không publish trùng row.
+        """
+        now = datetime.now(timezone.utc)
+        stmt = (
+            select(self.model)
+            .where(self.model.next_attempt_at <= now)
+            .order_by(self.model.id.asc())
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        return list(self.db.scalars(stmt).all())
+
+    def delete_published(self, ids: List[int]) -> None:
+        """Delete rows the broker has confirmed (no commit)."""
+        if not ids:
+            return
+        self.db.execute(
+            delete(self.model)
+            .where(self.model.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+
+    def mark_failed(self, failures: List[Tuple[EventOutbox, str]]) -> None:
+        """Reschedule rows whose publish was nacked/unroutable with exponential backoff (no commit)."""
+        if not failures:
+            return
+        now = datetime.now(timezone.utc)
+        self.db.execute(
+            update(self.model),
+            [
+                {
+                    "id": row.id,
+                    "attempts": row.attempts + 1,
+                    "last_error": reason[:1000],
+                    "next_attempt_at": now + timedelta(
+                        seconds=min(OUTBOX_MAX_BACKOFF_SECONDS, 2 ** min(row.attempts, 8))
+                    ),
+                }
+                for row, reason in failures
+            ],
+        )
@@ -1,15 +1,219 @@
 """
 Repository for friendship_status table.
 """
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Tuple
+from sqlalchemy import Float, Integer, Text, and_, case, cast, func, literal_column, update
+from sqlalchemy.dialects.postgresql import JSONB, array, insert as pg_insert
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 from datetime import datetime
 from app.models.friendship_status_model import FriendshipStatus
 from app.core.constants_enums import FriendshipLevel, PHASE3_FRIENDSHIP_SCORE_THRESHOLDS
 from app.core.exceptions_custom import FriendshipNotFoundError
+from app.repositories.user_topic_metrics_repository import (
+    UserTopicMetricsRepository,
+    is_topic_metrics_dual_write_enabled,
+)
+from app.utils.logger_setup import get_logger, lazy
 
+logger = get_logger(__name__)
 
-class FriendshipStatusRepository:
+# Ngưỡng nâng level cho từng topic (kết hợp với friendship_level của user)
+TOPIC_PHASE2_MIN_SCORE = 50.0
+TOPIC_PHASE3_MIN_SCORE = 150.0
+
+# JSONB literal trong SQL. KHÔNG dùng cast("{}", JSONB): bind param đi qua JSON serializer
+# nên DB nhận chuỗi JSON '"{}"' (scalar string), không phải object / array rỗng.
+EMPTY_JSONB_OBJECT = literal_column("'{}'::jsonb", JSONB)
+EMPTY_JSONB_ARRAY = literal_column("'[]'::jsonb", JSONB)
+
+
+def _jsonb_of_type(expr, jsonb_type: str, default):
+    """SQL: expr nếu jsonb_typeof(expr) = jsonb_type, ngược lại default (NULL / giá trị hỏng)."""
+    return case((func.jsonb_typeof(expr) == jsonb_type, expr), else_=default)
+
+
+class FriendshipStatusStatements:
+    """
+    SQL statement builders dùng chung cho repository sync và async.
+
+    Chỉ dựng statement, không execute/commit.
+    """
+
+    model = FriendshipStatus
+
+    def _ensure_defaults_stmt(self, user_ids: Iterable[str]):
+        """INSERT default rows ... ON CONFLICT DO NOTHING (None nếu không có user_id)."""
+        ids = sorted(set(user_ids))
+        if not ids:
+            return None
+        now = datetime.utcnow()
+        return pg_insert(self.model).values(
+            [
+                {
+                    "user_id": user_id,
+                    "friendship_score": 0.0,
+                    "friendship_level": FriendshipLevel.PHASE1_STRANGER.value,
+                    "streak_day": 0,
+                    "topic_metrics": {},
+                    "last_interaction_date": now,
+                }
+                for user_id in ids
+            ]
+        ).on_conflict_do_nothing(index_elements=[self.model.user_id])
+
+    def build_default(self, user_id: str) -> FriendshipStatus:
+        """
+        Default status in memory (transient, không add vào session, không commit).
+
+        Read path (suggest) dùng khi user chưa có row; row thật được tạo khi worker xử lý
+        conversation đầu tiên (ensure_defaults).
+        """
+        return self.model(
+            user_id=user_id,
+            friendship_score=0.0,
+            friendship_level=FriendshipLevel.PHASE1_STRANGER.value,
+            streak_day=0,
+            topic_metrics={},
+            last_interaction_date=datetime.utcnow(),
+        )
+
+    def _score_change_stmt(
+        self,
+        user_id: str,
+        score_change: float,
+        last_interaction_date: Optional[datetime] = None,
+    ):
+        """UPDATE score + level ... RETURNING new state."""
+        new_score = self._new_score_expr(score_change)
+        return (
+            update(self.model)
+            .where(self.model.user_id == user_id)
+            .values(
+                friendship_score=new_score,
+                friendship_level=self._level_expr(new_score),
+                last_interaction_date=last_interaction_date or datetime.utcnow(),
+            )
+            .returning(*self._state_columns())
+            .execution_options(synchronize_session=False)
+        )
+
+    def _topic_update_stmt(
+        self,
+        user_id: str,
+        topic_id: str,
+        score_change: float,
+        bot_id: str,
+        turns_change: int = 1,
+        last_interaction_date: Optional[datetime] = None,
+    ):
+        """UPDATE 1 topic key (jsonb_set) + score + level ... RETURNING new state."""
+        now = last_interaction_date or datetime.utcnow()
+        new_score = self._new_score_expr(score_change)
+        user_level = self._level_expr(new_score)
+
+        topic_key = cast(topic_id, Text)
+        # Entry / agents_used không đúng kiểu (NULL, hoặc scalar / array do bản cũ ghi sai)
+        # được coi như rỗng -> update kế tiếp ghi lại đúng shape
+        entry = _jsonb_of_type(self.model.topic_metrics.op("->")(topic_key), "object", EMPTY_JSONB_OBJECT)
+        topic_score = func.coalesce(cast(entry.op("->>")("score"), Float), 0.0) + score_change
+        topic_turns = func.coalesce(cast(entry.op("->>")("turns"), Integer), 0) + turns_change
+        current_topic_level = func.coalesce(
+            entry.op("->>")("friendship_level"), FriendshipLevel.PHASE1_STRANGER.value
+        )
+        # Cùng logic với _determine_topic_level
+        topic_level = case(
+            (
+                and_(
+                    topic_score >= TOPIC_PHASE3_MIN_SCORE,
+                    user_level == FriendshipLevel.PHASE3_FRIEND.value,
+                ),
+                FriendshipLevel.PHASE3_FRIEND.value,
+            ),
+            (
+                and_(
+                    topic_score >= TOPIC_PHASE2_MIN_SCORE,
+                    user_level.in_(
+                        [FriendshipLevel.PHASE2_ACQUAINTANCE.value, FriendshipLevel.PHASE3_FRIEND.value]
+                    ),
+                ),
+                case(
+                    (
+                        current_topic_level == FriendshipLevel.PHASE3_FRIEND.value,
+                        FriendshipLevel.PHASE3_FRIEND.value,
+                    ),
+                    else_=FriendshipLevel.PHASE2_ACQUAINTANCE.value,
+                ),
+            ),
+            (topic_score < TOPIC_PHASE2_MIN_SCORE, FriendshipLevel.PHASE1_STRANGER.value),
+            else_=current_topic_level,
+        )
+        bot_json = func.jsonb_build_array(cast(bot_id, Text))
+        agents_used = _jsonb_of_type(entry.op("->")("agents_used"), "array", EMPTY_JSONB_ARRAY)
+        new_agents_used = case(
+            (agents_used.op("@>")(bot_json), agents_used),
+            else_=agents_used.op("||")(bot_json),
+        )
+        new_entry = entry.op("||")(
+            func.jsonb_build_object(
+                "score", topic_score,
+                "turns", topic_turns,
+                "last_date", cast(now.isoformat() + "Z", Text),
+                "agents_used", new_agents_used,
+                "friendship_level", topic_level,
+            )
+        )
+
+        stmt = (
+            update(self.model)
+            .where(self.model.user_id == user_id)
+            .values(
+                friendship_score=new_score,
+                friendship_level=user_level,
+                topic_metrics=func.jsonb_set(
+                    _jsonb_of_type(self.model.topic_metrics, "object", EMPTY_JSONB_OBJECT),
+                    array([topic_key]),
+                    new_entry,
+                    True,
+                ),
+                last_interaction_date=now,
+            )
+            .returning(*self._state_columns())
+            .execution_options(synchronize_session=False)
+        )
+        return stmt
+
+    def _new_score_expr(self, score_change: float):
+        """SQL: GREATEST(0, friendship_score + score_change)."""
+        return func.greatest(0.0, func.coalesce(self.model.friendship_score, 0.0) + score_change)
+
+    @staticmethod
+    def _level_expr(score_expr):
+        """SQL CASE tương đương _determine_level."""
+        return case(
+            (
+                score_expr >= PHASE3_FRIENDSHIP_SCORE_THRESHOLDS[FriendshipLevel.PHASE3_FRIEND][0],
+                FriendshipLevel.PHASE3_FRIEND.value,
+            ),
+            (
+                score_expr >= PHASE3_FRIENDSHIP_SCORE_THRESHOLDS[FriendshipLevel.PHASE2_ACQUAINTANCE][0],
+                FriendshipLevel.PHASE2_ACQUAINTANCE.value,
+            ),
+            else_=FriendshipLevel.PHASE1_STRANGER.value,
+        )
+
+    def _state_columns(self) -> Tuple:
+        return (
+            self.model.user_id,
+            self.model.friendship_score,
+            self.model.friendship_level,
+            self.model.last_interaction_date,
+            self.model.streak_day,
+            self.model.topic_metrics,
+        )
+
+
+class FriendshipStatusRepository(FriendshipStatusStatements):
     """Data access layer for friendship_status."""
 
     def __init__(self, db: Session):
@@ -24,6 +228,34 @@ class FriendshipStatusRepository:
             .first()
         )
 
+    def get_by_user_ids(
+        self,
+        user_ids: Iterable[str],
+        for_update: bool = False,
+    ) -> Dict[str, FriendshipStatus]:
+        """
+        Fetch many statuses in one query, keyed by user_id.
+
+        for_update=True khóa các row (thứ tự user_id cố định để tránh deadlock).
+        """
+        ids = sorted(set(user_ids))
+        if not ids:
+            return {}
+        query = (
+            self.db.query(self.model)
+            .filter(self.model.user_id.in_(ids))
+            .order_by(self.model.user_id.asc())
+        )
+        if for_update:
+            query = query.with_for_update()
+        return {status.user_id: status for status in query.all()}
+
+    def ensure_defaults(self, user_ids: Iterable[str]) -> None:
+        """Insert default rows for users that have none (INSERT ... ON CONFLICT DO NOTHING, no commit)."""
+        stmt = self._ensure_defaults_stmt(user_ids)
+        if stmt is not None:
+            self.db.execute(stmt)
+
     def create_default(self, user_id: str) -> FriendshipStatus:
         """Create default friendship status for new user."""
         status = self.model(
@@ -44,17 +276,32 @@ class FriendshipStatusRepository:
         user_id: str,
         score_change: float,
         last_interaction_date: Optional[datetime] = None,
-    ) -> FriendshipStatus:
-        """Apply score change to user and update friendship level."""
-        status = self.get_by_user_id(user_id)
-        if not status:
-            status = self.create_default(user_id)
+        commit: bool = True,
+    ) -> Row:
+        """
+        Apply score change to user and update friendship level (1 atomic UPDATE).
 
+        Returns the new row state (user_id, friendship_score, friendship_level, ...),
+        không cần refresh sau commit. `commit=False`: caller commit cùng các ghi khác
+        (vd mark PROCESSED của event trong cùng transaction).
+        """
+        self.ensure_defaults([user_id])
+        stmt = self._score_change_stmt(user_id, score_change, last_interaction_date)
+        row = self.db.execute(stmt).one()
+        if commit:
+            self.db.commit()
+        return row
+
+    def apply_score_change_in_memory(
+        self,
+        status: FriendshipStatus,
+        score_change: float,
+        last_interaction_date: Optional[datetime] = None,
+    ) -> FriendshipStatus:
+        """Apply score change + level on a loaded row without committing (bulk path)."""
         status.friendship_score = max(0.0, (status.friendship_score or 0.0) + score_change)
         status.friendship_level = self._determine_level(status.friendship_score).value
         status.last_interaction_date = last_interaction_date or datetime.utcnow()
-        self.db.commit()
-        self.db.refresh(status)
         return status
 
     def _determine_level(self, score: float) -> FriendshipLevel:
@@ -86,13 +333,75 @@ class FriendshipStatusRepository:
         Returns:
             Dictionary containing updated topic_metrics entry
         """
-        # Lấy friendship_status hiện tại
-        friendship = self.get_by_user_id(user_id)
-        if not friendship:
-            friendship = self.create_default(user_id)
+        row = self.apply_topic_update(
+            user_id=user_id,
+            topic_id=topic_id,
+            score_change=score_change,
+            bot_id=bot_id,
+            turns_change=turns_change,
+        )
+        return row.topic_metrics[topic_id]
+    
+    def apply_topic_update(
+        self,
+        user_id: str,
+        topic_id: str,
+        score_change: float,
+        bot_id: str,
+        turns_change: int = 1,
+        last_interaction_date: Optional[datetime] = None,
+        commit: bool = True,
+    ) -> Row:
+        """
+        Cập nhật 1 topic + friendship_score/level trong 1 câu UPDATE (jsonb_set), rồi commit
+        (`commit=False`: caller commit).
         
-        # Lấy topic_metrics JSONB
-        topic_metrics = friendship.topic_metrics or {}
+        Chỉ key `topic_id` trong topic_metrics bị ghi lại; mọi giá trị mới được tính từ
+        row hiện tại ngay trong SQL nên 2 events song song của cùng user không làm mất
+        update của nhau (Postgres re-evaluate SET trên row version mới nhất).
+        
+        Returns:
+            New row state (user_id, friendship_score, friendship_level, last_interaction_date,
+            streak_day, topic_metrics)
+        """
+        self.ensure_defaults([user_id])
+        stmt = self._topic_update_stmt(
+            user_id, topic_id, score_change, bot_id, turns_change, last_interaction_date
+        )
+        row = self.db.execute(stmt).one()
+        if is_topic_metrics_dual_write_enabled():
+            # Cùng transaction (row friendship_status đang bị lock) -> thứ tự ghi nhất quán
+            UserTopicMetricsRepository(self.db).upsert_entries(
+                [(user_id, topic_id, row.topic_metrics[topic_id])]
+            )
+        if commit:
+            self.db.commit()
+        
+        logger.info(
+            "✅ topic_metrics updated for user_id=%s, topic_id=%s: %s | friendship_score=%s, friendship_level=%s",
+            user_id, topic_id, row.topic_metrics.get(topic_id), row.friendship_score, row.friendship_level,
+        )
+        return row
+    
+    def apply_topic_update_in_memory(
+        self,
+        friendship: FriendshipStatus,
+        topic_id: str,
+        score_change: float,
+        bot_id: str,
+        turns_change: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Cập nhật topic_metrics + friendship_score/level trên row đã load, KHÔNG commit.
+        
+        Dùng chung cho update_topic_metrics (commit từng event) và bulk path (1 commit / batch).
+        
+        Returns:
+            Dictionary containing updated topic_metrics entry
+        """
+        user_id = friendship.user_id
+        # Copy để SQLAlchemy nhận ra thay đổi khi gán lại
+        topic_metrics = dict(friendship.topic_metrics or {})
         
         # Nếu topic chưa tồn tại, tạo mới
         if topic_id not in topic_metrics:
@@ -103,6 +412,8 @@ class FriendshipStatusRepository:
                 "last_date": None,
                 "agents_used": []
             }
+        else:
+            topic_metrics[topic_id] = dict(topic_metrics[topic_id])
         
         # Cập nhật score và turns
         topic_metrics[topic_id]["score"] = float(topic_metrics[topic_id].get("score", 0.0)) + score_change
@@ -110,7 +421,7 @@ class FriendshipStatusRepository:
         topic_metrics[topic_id]["last_date"] = datetime.utcnow().isoformat() + "Z"
         
         # Thêm bot_id vào agents_used (nếu chưa có)
-        agents_used = topic_metrics[topic_id].get("agents_used", [])
+        agents_used = list(topic_metrics[topic_id].get("agents_used", []))
         if bot_id not in agents_used:
             agents_used.append(bot_id)
         topic_metrics[topic_id]["agents_used"] = agents_used
@@ -139,23 +450,22 @@ class FriendshipStatusRepository:
         
         friendship.last_interaction_date = datetime.utcnow()
         
-        from app.utils.logger_setup import get_logger
-        logger = get_logger(__name__)
-        logger.info(
-            f"📊 Updating topic_metrics for user_id={user_id}, topic_id={topic_id}:\n"
-            f"   - Topic score: {topic_score} (was {topic_score - score_change})\n"
-            f"   - Topic turns: {topic_metrics[topic_id]['turns']}\n"
-            f"   - Topic level: {current_topic_level} -> {new_topic_level.value}\n"
-            f"   - User friendship_score: {old_score} -> {friendship.friendship_score}\n"
-            f"   - User friendship_level: {friendship.friendship_level}\n"
-            f"   - topic_metrics keys: {list(topic_metrics.keys())}"
-        )
-        
-        self.db.commit()
-        self.db.refresh(friendship)
-        
+        # keys list chỉ build khi record được emit (user nhiều topic -> list dài, bị FieldCapFilter cắt)
         logger.info(
-            f"✅ topic_metrics updated successfully. Final topic_metrics: {friendship.topic_metrics}"
+            "📊 Updating topic_metrics for user_id=%s, topic_id=%s:\n"
+            "   - Topic score: %s (was %s)\n"
+            "   - Topic turns: %s\n"
+            "   - Topic level: %s -> %s\n"
+            "   - User friendship_score: %s -> %s\n"
+            "   - User friendship_level: %s\n"
+            "   - topic_metrics keys: %s",
+            user_id, topic_id,
+            topic_score, topic_score - score_change,
+            topic_metrics[topic_id]["turns"],
+            current_topic_level, new_topic_level.value,
+            old_score, friendship.friendship_score,
+            friendship.friendship_level,
+            lazy(list, topic_metrics.keys()),
         )
         
         return topic_metrics[topic_id]
@@ -184,18 +494,18 @@ class FriendshipStatusRepository:
         current_level_enum = FriendshipLevel(current_topic_level) if current_topic_level else FriendshipLevel.PHASE1_STRANGER
         
         # Topic lên PHASE3 nếu: topic_score >= 150 AND friendship_level_of_user >= PHASE3
-        if topic_score >= 150.0 and friendship_level_of_user >= FriendshipLevel.PHASE3_FRIEND:
+        if topic_score >= TOPIC_PHASE3_MIN_SCORE and friendship_level_of_user >= FriendshipLevel.PHASE3_FRIEND:
             return FriendshipLevel.PHASE3_FRIEND
         
         # Topic lên PHASE2 nếu: topic_score >= 50 AND friendship_level_of_user >= PHASE2
-        if topic_score >= 50.0 and friendship_level_of_user >= FriendshipLevel.PHASE2_ACQUAINTANCE:
+        if topic_score >= TOPIC_PHASE2_MIN_SCORE and friendship_level_of_user >= FriendshipLevel.PHASE2_ACQUAINTANCE:
             # Nếu đã là PHASE3, giữ nguyên
             if current_level_enum == FriendshipLevel.PHASE3_FRIEND:
                 return FriendshipLevel.PHASE3_FRIEND
             return FriendshipLevel.PHASE2_ACQUAINTANCE
         
         # Nếu không đủ điều kiện, giữ nguyên level hiện tại hoặc về PHASE1
-        if topic_score < 50.0:
+        if topic_score < TOPIC_PHASE2_MIN_SCORE:
             return FriendshipLevel.PHASE1_STRANGER
         
         # Giữ nguyên level hiện tại nếu không đủ điều kiện nâng cấp
@@ -28,6 +28,14 @@ class PromptTemplateRepository:
             .first()
         )
 
+    def get_all_personas(self) -> List[PromptTemplateForLevelFriend]:
+        """Return every persona template (used to build the in-memory catalog)."""
+        return (
+            self.db.query(PromptTemplateForLevelFriend)
+            .order_by(PromptTemplateForLevelFriend.id.asc())
+            .all()
+        )
+
     # ------------------------------------------------------------------
     # Prompt guides per topic/phase/type
     # ------------------------------------------------------------------
@@ -47,6 +55,14 @@ class PromptTemplateRepository:
             query = query.filter(PromptTemplateForLevelFriendship.topic_id == topic_id)
         return query.all()
 
+    def get_all_guides(self) -> List[PromptTemplateForLevelFriendship]:
+        """Return every guide ordered by id (used to build the in-memory catalog)."""
+        return (
+            self.db.query(PromptTemplateForLevelFriendship)
+            .order_by(PromptTemplateForLevelFriendship.id.asc())
+            .all()
+        )
+
     def get_guide_by_topic_agent_phase(
         self,
         *,
@@ -0,0 +1,281 @@
+"""
+Repository for user_topic_metrics table (normalized topic_metrics storage).
+
+Cùng shape dữ liệu với `friendship_status.topic_metrics`:
+`{topic_id: {"score", "turns", "friendship_level", "last_date", "agents_used"}}`,
+nhưng top-N theo score / bottom-N theo turns là index scan thay vì sort blob JSONB.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config_settings import settings
+from app.core.constants_enums import FriendshipLevel
+from app.models.friendship_status_model import FriendshipStatus
+from app.models.user_topic_metrics_model import UserTopicMetric
+
+TOPIC_METRICS_BACKEND_JSONB = "jsonb"
+TOPIC_METRICS_BACKEND_TABLE = "table"
+
+# Backfill 1 batch user_id (keyset) từ JSONB sang bảng
+_BACKFILL_SQL = text(
+    """
+    WITH batch AS (
+        SELECT user_id, topic_metrics
+        FROM friendship_status
+        WHERE user_id > :after_user_id
+          AND jsonb_typeof(topic_metrics) = 'object'
+        ORDER BY user_id
+        LIMIT :batch_size
+    ), upserted AS (
+        INSERT INTO user_topic_metrics
+            (user_id, topic_id, score, turns, friendship_level, last_date, agents_used)
+        SELECT
+            batch.user_id,
+            t.key,
+            COALESCE((t.value ->> 'score')::float8, 0),
+            COALESCE((t.value ->> 'turns')::int, (t.value ->> 'total_turns')::int, 0),
+            COALESCE(t.value ->> 'friendship_level', 'PHASE1_STRANGER'),
+            NULLIF(t.value ->> 'last_date', '')::timestamptz,
+            COALESCE(t.value -> 'agents_used', '[]'::jsonb)
+        FROM batch CROSS JOIN LATERAL jsonb_each(batch.topic_metrics) AS t
+        ON CONFLICT (user_id, topic_id) DO UPDATE SET
+            score = EXCLUDED.score,
+            turns = EXCLUDED.turns,
+            friendship_level = EXCLUDED.friendship_level,
+            last_date = EXCLUDED.last_date,
+            agents_used = EXCLUDED.agents_used,
+            updated_at = now()
+        RETURNING 1
+    )
+    SELECT (SELECT max(user_id) FROM batch) AS last_user_id,
+           (SELECT count(*) FROM upserted) AS topic_count
+    """
+)
+
+
+def is_topic_metrics_table_read_enabled() -> bool:
+    """Đọc topic metrics từ bảng normalized (TOPIC_METRICS_BACKEND=table)."""
+    return settings.TOPIC_METRICS_BACKEND == TOPIC_METRICS_BACKEND_TABLE
+
+
+def is_topic_metrics_dual_write_enabled() -> bool:
+    """Ghi song song JSONB + bảng (bắt buộc khi đọc từ bảng)."""
+    return settings.TOPIC_METRICS_DUAL_WRITE or is_topic_metrics_table_read_enabled()
+
+
+def build_upsert_entries_stmt(entries: Iterable[Tuple[str, str, Dict[str, Any]]]):
+    """
+    INSERT ... ON CONFLICT (user_id, topic_id) DO UPDATE cho các topic entry (None nếu rỗng).
+
+    Raises:
+        TypeError: entry không phải dict (JSONB topic sai shape) -> không ghi giá trị rác vào bảng
+    """
+    entries = list(entries)
+    for user_id, topic_id, entry in entries:
+        if not isinstance(entry, dict):
+            raise TypeError(
+                f"topic_metrics entry must be a dict (user_id={user_id}, topic_id={topic_id}, "
+                f"got {type(entry).__name__})"
+            )
+    values = [
+        {
+            "user_id": user_id,
+            "topic_id": topic_id,
+            "score": float(entry.get("score", 0.0) or 0.0),
+            "turns": int(entry.get("turns") or entry.get("total_turns") or 0),
+            "friendship_level": entry.get("friendship_level") or FriendshipLevel.PHASE1_STRANGER.value,
+            "last_date": _parse_datetime(entry.get("last_date")),
+            "agents_used": list(entry.get("agents_used") or []),
+        }
+        for user_id, topic_id, entry in entries
+    ]
+    if not values:
+        return None
+    stmt = pg_insert(UserTopicMetric).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserTopicMetric.user_id, UserTopicMetric.topic_id],
+        set_={
+            "score": stmt.excluded.score,
+            "turns": stmt.excluded.turns,
+            "friendship_level": stmt.excluded.friendship_level,
+            "last_date": stmt.excluded.last_date,
+            "agents_used": stmt.excluded.agents_used,
+            "updated_at": func.now(),
+        },
+    )
+    return stmt
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+class UserTopicMetricsRepository:
+    """Data access layer for user_topic_metrics."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.model = UserTopicMetric
+
+    def get_topic_metrics(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """Return all topics of a user in the JSONB `topic_metrics` shape."""
+        rows = (
+            self.db.query(self.model)
+            .filter(self.model.user_id == user_id)
+            .all()
+        )
+        return {row.topic_id: self._to_entry(row) for row in rows}
+
+    def get_topics_by_score(
+        self,
+        user_id: str,
+        top_n: int = 2,
+        exclude_topic_ids: Optional[Iterable[str]] = None,
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Top N topics có score cao nhất (index ix_user_topic_metrics_user_score)."""
+        query = self.db.query(self.model).filter(self.model.user_id == user_id)
+        exclude = list(exclude_topic_ids or [])
+        if exclude:
+            query = query.filter(self.model.topic_id.notin_(exclude))
+        rows = query.order_by(self.model.score.desc()).limit(top_n).all()
+        return [(row.topic_id, self._to_entry(row)) for row in rows]
+
+    def get_topics_by_turns(
+        self,
+        user_id: str,
+        top_n: int = 1,
+        exclude_topic_ids: Optional[Iterable[str]] = None,
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Bottom N topics có turns thấp nhất (index ix_user_topic_metrics_user_turns)."""
+        query = self.db.query(self.model).filter(self.model.user_id == user_id)
+        exclude = list(exclude_topic_ids or [])
+        if exclude:
+            query = query.filter(self.model.topic_id.notin_(exclude))
+        rows = query.order_by(self.model.turns.asc()).limit(top_n).all()
+        return [(row.topic_id, self._to_entry(row)) for row in rows]
+
+    def get_top_topics_across_users(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Topics phổ biến nhất trên toàn bộ users (tổng score)."""
+        rows = (
+            self.db.query(
+                self.model.topic_id,
+                func.count(self.model.user_id).label("user_count"),
+                func.sum(self.model.score).label("total_score"),
+                func.sum(self.model.turns).label("total_turns"),
+            )
+            .group_by(self.model.topic_id)
+            .order_by(func.sum(self.model.score).desc())
+            .limit(limit)
+            .all()
+        )
+        return [
+            {
+                "topic_id": row.topic_id,
+                "user_count": row.user_count,
+                "total_score": float(row.total_score or 0.0),
+                "total_turns": int(row.total_turns or 0),
+            }
+            for row in rows
+        ]
+
+    def get_users_without_topic(self, topic_id: str, limit: int = 100) -> List[str]:
+        """Users chưa từng nói chuyện về topic_id (NOT EXISTS trên PK)."""
+        touched = (
+            select(self.model.user_id)
+            .where(self.model.user_id == FriendshipStatus.user_id)
+            .where(self.model.topic_id == topic_id)
+        )
+        rows = (
+            self.db.query(FriendshipStatus.user_id)
+            .filter(~touched.exists())
+            .order_by(FriendshipStatus.user_id.asc())
+            .limit(limit)
+            .all()
+        )
+        return [row.user_id for row in rows]
+
+    def upsert_entries(self, entries: Iterable[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """
+        Dual-write: ghi giá trị tuyệt đối của các topic entry (user_id, topic_id, entry), không commit.
+
+        Gọi trong cùng transaction với UPDATE friendship_status để thứ tự ghi giữ nguyên
+        theo row lock của user.
+        """
+        stmt = build_upsert_entries_stmt(entries)
+        if stmt is not None:
+            self.db.execute(stmt)
+
+    def backfill_from_friendship_status(self, batch_size: int = 1000) -> int:
+        """
+        Copy toàn bộ friendship_status.topic_metrics sang bảng (idempotent, commit mỗi batch).
+
+        Returns:
+            Số topic rows đã upsert
+        """
+        after_user_id = ""
+        total = 0
+        while True:
+            row = self.db.execute(
+                _BACKFILL_SQL,
+                {"after_user_id": after_user_id, "batch_size": batch_size},
+            ).one()
+            self.db.commit()
+            if row.last_user_id is None:
+                return total
+            total += row.topic_count
+            after_user_id = row.last_user_id
+
+    @staticmethod
+    def _to_entry(row: UserTopicMetric) -> Dict[str, Any]:
+        return {
+            "score": row.score,
+            "turns": row.turns,
+            "friendship_level": row.friendship_level,
+            "last_date": (
+                row.last_date.astimezone(timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+                if row.last_date else None
+            ),
+            "agents_used": list(row.agents_used or []),
+        }
+
+
+class UserTopicMetricsView:
+    """
+    Lazy, read-only `topic_metrics` của 1 user đọc từ user_topic_metrics.
+
+    Top/bottom-N chạy query có index; `items()` chỉ load toàn bộ topics khi cần
+    (fallback trong AgentSelectionService).
+    """
+
+    def __init__(self, repository: UserTopicMetricsRepository, user_id: str):
+        self.repository = repository
+        self.user_id = user_id
+        self._all: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def get_topics_by_score(
+        self,
+        top_n: int = 2,
+        exclude_topic_ids: Optional[Iterable[str]] = None,
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        return self.repository.get_topics_by_score(self.user_id, top_n, exclude_topic_ids)
+
+    def get_topics_by_turns(
+        self,
+        top_n: int = 1,
+        exclude_topic_ids: Optional[Iterable[str]] = None,
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        return self.repository.get_topics_by_turns(self.user_id, top_n, exclude_topic_ids)
+
+    def items(self):
+        if self._all is None:
+            self._all = self.repository.get_topic_metrics(self.user_id)
+        return self._all.items()
@@ -1,12 +1,55 @@
 """
-Service to provide activity suggestions (always recomputed, no cache).
+Service to provide activity suggestions.
+
+Mặc định luôn tính lại (no cache). Khi bật `CANDIDATES_CACHE_ENABLED`, kết quả được
+cache read-through theo user_id + status version; worker invalidate cache mỗi khi
+friendship_status của user được commit rồi precompute candidates mới
+(CandidatesPrecomputeService), nên path này thường chỉ còn 1 lần đọc Redis.
+
+Khi bật thêm `CANDIDATES_RAW_RESPONSE_ENABLED`, response body được render (validate qua
+ActivitySuggestionResponse) 1 lần lúc ghi cache; cache hit trả thẳng bytes + ETag.
 """
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.cache.candidates_cache_manager import (
+    CandidatesCacheManager,
+    RenderedResponse,
+    build_rendered_response,
+    candidates_cache_stats,
+)
+from app.cache.prompt_catalog_cache_manager import get_prompt_catalog
+from app.core.config_settings import settings
+from app.core.exceptions_custom import AgentSelectionError
+from app.db.database_connection import SessionLocal
+from app.repositories.async_friendship_status_repository import AsyncFriendshipStatusRepository
+from app.repositories.friendship_status_repository import FriendshipStatusRepository
+from app.repositories.user_topic_metrics_repository import is_topic_metrics_table_read_enabled
+from app.schemas.activity_suggestion_schemas import ActivitySuggestionResponse
 from app.services.agent_selection_service import AgentSelectionService
 from app.utils.logger_setup import get_logger
 
 logger = get_logger(__name__)
 
+SUGGESTION_SUCCESS_MESSAGE = "Activities suggested successfully"
+
+
+def is_raw_response_enabled() -> bool:
+    return settings.CACHE_ENABLED and settings.CANDIDATES_CACHE_ENABLED and settings.CANDIDATES_RAW_RESPONSE_ENABLED
+
+
+def render_suggestion_response(data: Dict[str, Any]) -> RenderedResponse:
+    """Validate + serialize response của `/activities/suggest` đúng 1 lần (lúc ghi cache)."""
+    body = ActivitySuggestionResponse(
+        success=True,
+        data=data,
+        message=SUGGESTION_SUCCESS_MESSAGE,
+    ).model_dump_json().encode("utf-8")
+    return build_rendered_response(body)
+
 
 class ActivitySuggestionService:
     """Facade for retrieving activity suggestions."""
@@ -16,12 +59,320 @@ class ActivitySuggestionService:
         self.selection_service = AgentSelectionService(db)
 
     def get_suggestions(self, user_id: str):
-        """Always compute fresh suggestions for the user."""
+        """Return suggestions for the user (read-through cache when enabled)."""
+        if not (settings.CACHE_ENABLED and settings.CANDIDATES_CACHE_ENABLED):
+            logger.info("Computing activity suggestions for user %s", user_id)
+            return self.selection_service.compute_candidates(user_id)
+        return self._get_suggestions_cached(user_id)
+
+    def _get_suggestions_cached(self, user_id: str):
+        started = time.perf_counter()
+        catalog = get_prompt_catalog()
+        fingerprint = catalog.fingerprint if catalog else None
+
+        cache = None
+        version = 0
+        try:
+            cache = CandidatesCacheManager()
+            cached, version = cache.lookup(user_id, fingerprint)
+            if cached is not None:
+                candidates_cache_stats.record_hit((time.perf_counter() - started) * 1000)
+                logger.debug("Candidates cache hit for user %s (version=%s)", user_id, version)
+                return cached
+        except Exception as exc:
+            cache = None
+            candidates_cache_stats.record_error()
+            logger.warning("Candidates cache lookup failed for user %s: %s", user_id, exc)
+
+        logger.info("Computing activity suggestions for user %s", user_id)
+        candidates = self.selection_service.compute_candidates(user_id)
+
+        if cache is not None:
+            try:
+                cache.set(
+                    user_id,
+                    candidates,
+                    ttl=settings.CANDIDATES_CACHE_TTL_SECONDS,
+                    version=version,
+                    catalog_fingerprint=fingerprint,
+                )
+            except Exception as exc:
+                candidates_cache_stats.record_error()
+                logger.warning("Candidates cache write failed for user %s: %s", user_id, exc)
+        candidates_cache_stats.record_miss((time.perf_counter() - started) * 1000)
+        return candidates
+
+
+@dataclass
+class SuggestionBatch:
+    """
+    Input đã load của 1 batch suggest (cache entries + friendship_status rows).
+
+    Load xong trước khi stream response, nên phần tính toán không cần DB session của request.
+    """
+    user_ids: List[str]
+    fingerprint: Optional[str]
+    cached: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    versions: Dict[str, int] = field(default_factory=dict)
+    statuses: Optional[Dict[str, Any]] = None  # None -> selection cần session sync (fallback)
+    cache: Optional[CandidatesCacheManager] = None
+
+    @property
+    def pending_user_ids(self) -> List[str]:
+        return [user_id for user_id in self.user_ids if user_id not in self.cached]
+
+
+class AsyncActivitySuggestionService:
+    """
+    Async variant for the `async def` endpoint.
+
+    friendship_status được load qua AsyncSession; phần chọn agent chạy in-memory trên
+    prompt catalog snapshot. Redis (client sync) và fallback cần DB sync (catalog chưa
+    load / TOPIC_METRICS_BACKEND=table) chạy trong thread pool để không block event loop.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.status_repo = AsyncFriendshipStatusRepository(db)
+
+    async def get_suggestions(self, user_id: str):
+        """Return suggestions for the user (read-through cache when enabled)."""
+        if not (settings.CACHE_ENABLED and settings.CANDIDATES_CACHE_ENABLED):
+            logger.info("Computing activity suggestions for user %s", user_id)
+            return await self._compute_candidates(user_id)
+
+        started = time.perf_counter()
+        catalog = await asyncio.to_thread(get_prompt_catalog)
+        fingerprint = catalog.fingerprint if catalog else None
+
+        cache = None
+        version = 0
+        try:
+            cache = CandidatesCacheManager()
+            cached, version = await asyncio.to_thread(cache.lookup, user_id, fingerprint)
+            if cached is not None:
+                candidates_cache_stats.record_hit((time.perf_counter() - started) * 1000)
+                logger.debug("Candidates cache hit for user %s (version=%s)", user_id, version)
+                return cached
+        except Exception as exc:
+            cache = None
+            candidates_cache_stats.record_error()
+            logger.warning("Candidates cache lookup failed for user %s: %s", user_id, exc)
+
         logger.info("Computing activity suggestions for user %s", user_id)
-        return self.selection_service.compute_candidates(user_id)
+        candidates = await self._compute_candidates(user_id)
+
+        if cache is not None:
+            try:
+                await asyncio.to_thread(
+                    cache.set,
+                    user_id,
+                    candidates,
+                    ttl=settings.CANDIDATES_CACHE_TTL_SECONDS,
+                    version=version,
+                    catalog_fingerprint=fingerprint,
+                )
+            except Exception as exc:
+                candidates_cache_stats.record_error()
+                logger.warning("Candidates cache write failed for user %s: %s", user_id, exc)
+        candidates_cache_stats.record_miss((time.perf_counter() - started) * 1000)
+        return candidates
+
+    async def get_rendered_suggestions(self, user_id: str) -> RenderedResponse:
+        """
+        Read-through như `get_suggestions()` nhưng trên response đã render.
+
+        Hit: trả body từ Redis (không parse/validate). Chỉ có entry (vd pre-warm cũ): render
+        từ entry. Miss: tính, render 1 lần. Hai trường hợp sau ghi cả entry lẫn response key
+        (compare-and-set theo version).
+        """
+        started = time.perf_counter()
+        catalog = await asyncio.to_thread(get_prompt_catalog)
+        fingerprint = catalog.fingerprint if catalog else None
+
+        cache = None
+        version = 0
+        candidates = None
+        try:
+            cache = CandidatesCacheManager()
+            cached, version = await asyncio.to_thread(cache.lookup_response, user_id, fingerprint)
+            if cached is not None:
+                candidates_cache_stats.record_hit((time.perf_counter() - started) * 1000)
+                logger.debug("Candidates raw response hit for user %s (version=%s)", user_id, version)
+                return cached
+            # Entry không có response key (vd ghi bởi path không render): render từ entry
+            candidates, version = await asyncio.to_thread(cache.lookup, user_id, fingerprint)
+        except Exception as exc:
+            cache = None
+            candidates_cache_stats.record_error()
+            logger.warning("Candidates cache lookup failed for user %s: %s", user_id, exc)
+
+        entry_hit = candidates is not None
+        if entry_hit:
+            logger.debug("Candidates entry hit for user %s (version=%s), rendering response", user_id, version)
+        else:
+            logger.info("Computing activity suggestions for user %s", user_id)
+            candidates = await self._compute_candidates(user_id)
+        rendered = render_suggestion_response(candidates)
+
+        if cache is not None:
+            try:
+                await asyncio.to_thread(
+                    cache.set,
+                    user_id,
+                    candidates,
+                    ttl=settings.CANDIDATES_CACHE_TTL_SECONDS,
+                    version=version,
+                    catalog_fingerprint=fingerprint,
+                    rendered=rendered,
+                )
+            except Exception as exc:
+                candidates_cache_stats.record_error()
+                logger.warning("Candidates cache write failed for user %s: %s", user_id, exc)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if entry_hit:
+            candidates_cache_stats.record_hit(elapsed_ms)
+        else:
+            candidates_cache_stats.record_miss(elapsed_ms)
+        return rendered
+
+    async def load_batch(self, user_ids: List[str]) -> SuggestionBatch:
+        """
+        Chuẩn bị batch suggest: 1 catalog snapshot, 1 MGET cache (khi bật cache),
+        friendship_status của các users chưa có cache bằng 1 query.
+        """
+        catalog = await asyncio.to_thread(get_prompt_catalog)
+        batch = SuggestionBatch(
+            user_ids=list(dict.fromkeys(user_ids)),
+            fingerprint=catalog.fingerprint if catalog else None,
+        )
+
+        if settings.CACHE_ENABLED and settings.CANDIDATES_CACHE_ENABLED:
+            started = time.perf_counter()
+            try:
+                batch.cache = CandidatesCacheManager()
+                lookups = await asyncio.to_thread(batch.cache.lookup_many, batch.user_ids, batch.fingerprint)
+            except Exception as exc:
+                batch.cache = None
+                lookups = {}
+                candidates_cache_stats.record_error()
+                logger.warning("Candidates cache batch lookup failed: %s", exc)
+            per_user_ms = (time.perf_counter() - started) * 1000 / max(1, len(batch.user_ids))
+            for user_id, (payload, version) in lookups.items():
+                batch.versions[user_id] = version
+                if payload is not None:
+                    batch.cached[user_id] = payload
+                    candidates_cache_stats.record_hit(per_user_ms)
+
+        pending = batch.pending_user_ids
+        if pending and catalog is not None and not is_topic_metrics_table_read_enabled():
+            batch.statuses = await self.status_repo.get_by_user_ids(pending)
+        return batch
+
+    async def iter_batch(self, batch: SuggestionBatch) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield 1 result / user: cache hits trước, sau đó từng chunk tính trong thread pool
+        (không block event loop). Lỗi của 1 user chỉ nằm trên dòng của user đó.
+        """
+        for user_id, payload in batch.cached.items():
+            yield {"user_id": user_id, "success": True, "cached": True, "data": payload}
+
+        pending = batch.pending_user_ids
+        chunk_size = max(1, settings.SUGGEST_BATCH_CHUNK_SIZE)
+        selection_service = AgentSelectionService(db=None) if batch.statuses is not None else None
+        for offset in range(0, len(pending), chunk_size):
+            chunk = pending[offset:offset + chunk_size]
+            started = time.perf_counter()
+            if selection_service is not None:
+                results = await asyncio.to_thread(
+                    _compute_batch,
+                    selection_service,
+                    [(user_id, batch.statuses.get(user_id)) for user_id in chunk],
+                )
+            else:
+                results = await asyncio.to_thread(_compute_batch_sync, chunk)
+            if batch.cache is not None:
+                await self._store_batch(batch, results)
+                per_user_ms = (time.perf_counter() - started) * 1000 / len(chunk)
+                for _ in chunk:
+                    candidates_cache_stats.record_miss(per_user_ms)
+            for result in results:
+                yield result
+
+    @staticmethod
+    async def _store_batch(batch: SuggestionBatch, results: List[Dict[str, Any]]) -> None:
+        entries = [
+            (result["user_id"], result["data"], batch.versions.get(result["user_id"], 0))
+            for result in results
+            if result["success"]
+        ]
+        try:
+            await asyncio.to_thread(_store_batch_sync, batch, entries, is_raw_response_enabled())
+        except Exception as exc:
+            candidates_cache_stats.record_error()
+            logger.warning("Candidates cache batch write failed: %s", exc)
+
+    async def _compute_candidates(self, user_id: str):
+        # get_prompt_catalog() có thể reload catalog bằng session sync khi snapshot hết hạn
+        catalog = await asyncio.to_thread(get_prompt_catalog)
+        if catalog is None or is_topic_metrics_table_read_enabled():
+            # Selection cần query sync -> chạy trong thread với session riêng
+            return await asyncio.to_thread(_compute_candidates_sync, user_id)
+        status = await self.status_repo.get_by_user_id(user_id) or self.status_repo.build_default(user_id)
+        return AgentSelectionService(db=None).compute_candidates_for_status(status)
+
+
+def _store_batch_sync(
+    batch: SuggestionBatch,
+    entries: List[Tuple[str, Dict[str, Any], int]],
+    render: bool,
+) -> int:
+    # Pre-warm cho `/activities/suggest`: khi bật raw response thì ghi cả response key,
+    # nếu không request sau chỉ đọc lookup_response() vẫn miss
+    rendered = {user_id: render_suggestion_response(payload) for user_id, payload, _ in entries} if render else None
+    return batch.cache.set_many(
+        entries,
+        ttl=settings.CANDIDATES_CACHE_TTL_SECONDS,
+        catalog_fingerprint=batch.fingerprint,
+        rendered=rendered,
+    )
 
 
+def _compute_batch(
+    selection_service: AgentSelectionService,
+    items: List[Tuple[str, Optional[Any]]],
+) -> List[Dict[str, Any]]:
+    """Tính candidates cho (user_id, status) trên 1 selection service; lỗi ghi theo từng user."""
+    results = []
+    for user_id, status in items:
+        try:
+            status = status or selection_service.status_repo.build_default(user_id)
+            data = selection_service.compute_candidates_for_status(status)
+            results.append({"user_id": user_id, "success": True, "cached": False, "data": data})
+        except AgentSelectionError as exc:
+            results.append({"user_id": user_id, "success": False, "error": "AGENT_NOT_FOUND", "message": str(exc)})
+        except Exception as exc:
+            logger.warning("Batch suggestion failed for user %s: %s", user_id, exc)
+            results.append(
+                {"user_id": user_id, "success": False, "error": "INTERNAL_SERVER_ERROR", "message": str(exc)}
+            )
+    return results
 
 
+def _compute_batch_sync(user_ids: List[str]) -> List[Dict[str, Any]]:
+    """Fallback (catalog chưa load / TOPIC_METRICS_BACKEND=table): session sync riêng cho 1 chunk."""
+    db = SessionLocal()
+    try:
+        statuses = FriendshipStatusRepository(db).get_by_user_ids(user_ids)
+        selection_service = AgentSelectionService(db)
+        return _compute_batch(selection_service, [(user_id, statuses.get(user_id)) for user_id in user_ids])
+    finally:
+        db.close()
 
 
+def _compute_candidates_sync(user_id: str):
+    db = SessionLocal()
+    try:
+        return AgentSelectionService(db).compute_candidates(user_id)
+    finally:
+        db.close()
@@ -16,6 +16,12 @@ from sqlalchemy.orm import Session
 
 from app.repositories.friendship_status_repository import FriendshipStatusRepository
 from app.repositories.prompt_template_repository import PromptTemplateRepository
+from app.repositories.user_topic_metrics_repository import (
+    UserTopicMetricsRepository,
+    UserTopicMetricsView,
+    is_topic_metrics_table_read_enabled,
+)
+from app.cache.prompt_catalog_cache_manager import get_prompt_catalog
 from app.core.constants_enums import FriendshipLevel, AgentType, PHASE3_FRIENDSHIP_SCORE_THRESHOLDS
 from app.core.exceptions_custom import FriendshipNotFoundError, AgentSelectionError
 from app.utils.logger_setup import get_logger
@@ -49,7 +55,10 @@ class AgentSelectionService:
         """
         self.db = db
         self.status_repo = FriendshipStatusRepository(db)
-        self.prompt_repo = PromptTemplateRepository(db)
+        # Đọc guides/persona từ snapshot in-memory; fallback về DB nếu catalog chưa load được
+        self.prompt_repo = get_prompt_catalog() or PromptTemplateRepository(db)
+        # Persona theo level: lookup 1 lần / instance (batch suggest dùng chung 1 instance)
+        self._personas: Dict[FriendshipLevel, Any] = {}
 
     def determine_level(self, score: float) -> FriendshipLevel:
         """
@@ -536,9 +545,19 @@ class AgentSelectionService:
         """
         status = self.status_repo.get_by_user_id(user_id)
         if not status:
-            logger.info("Friendship status missing for %s, creating default", user_id)
-            status = self.status_repo.create_default(user_id)
+            # Không commit default row trên read path: worker tạo row khi có conversation đầu tiên
+            logger.info("Friendship status missing for %s, using in-memory default", user_id)
+            status = self.status_repo.build_default(user_id)
 
+        return self.compute_candidates_for_status(status)
+
+    def compute_candidates_for_status(self, status) -> Dict[str, Any]:
+        """
+        Tính candidates từ friendship_status đã load sẵn.
+
+        Không query DB khi prompt catalog snapshot đã load và topic metrics đọc từ JSONB,
+        nên path async có thể load status bằng AsyncSession rồi gọi thẳng hàm này.
+        """
         level = self.determine_level(status.friendship_score or 0.0)
 
         greeting_agent = self.select_greeting_agent(level, status)
@@ -559,9 +578,12 @@ class AgentSelectionService:
         }
 
     def _get_persona(self, friendship_level: FriendshipLevel):
+        if friendship_level in self._personas:
+            return self._personas[friendship_level]
         persona = self.prompt_repo.get_persona_by_phase(friendship_level.value)
         if not persona:
             logger.warning("Persona template missing for level %s", friendship_level.value)
+        self._personas[friendship_level] = persona
         return persona
 
     @staticmethod
@@ -585,8 +607,10 @@ class AgentSelectionService:
         final_prompt = "\n\n".join(blocks).strip()
         return final_prompt or None
 
-    @staticmethod
-    def _get_topic_metrics(status) -> Dict[str, Any]:
+    def _get_topic_metrics(self, status):
+        # TOPIC_METRICS_BACKEND=table: top/bottom-N là index scan trên user_topic_metrics
+        if is_topic_metrics_table_read_enabled():
+            return UserTopicMetricsView(UserTopicMetricsRepository(self.db), status.user_id)
         return getattr(status, "topic_metrics", None) or {}
 
     def _prioritize_topics(self, topic_metrics: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
@@ -669,6 +693,8 @@ class AgentSelectionService:
         Returns:
             List các tuple (topic_id, topic_data) đã sắp xếp theo score giảm dần
         """
+        if isinstance(topic_metrics, UserTopicMetricsView):
+            return topic_metrics.get_topics_by_score(top_n, exclude_topic_ids)
         if not topic_metrics:
             return []
         
@@ -703,6 +729,8 @@ class AgentSelectionService:
         Returns:
             List các tuple (topic_id, topic_data) đã sắp xếp theo turns tăng dần
         """
+        if isinstance(topic_metrics, UserTopicMetricsView):
+            return topic_metrics.get_topics_by_turns(top_n, exclude_topic_ids)
         if not topic_metrics:
             return []
         
@@ -0,0 +1,86 @@
+"""
+Precompute activity candidates sau khi worker commit friendship_status mới.
+
+Worker (ConversationEventProcessingService) gọi `precompute()` với các user vừa được cập
+nhật score/topic_metrics: candidates được tính ngay trên status mới và ghi vào candidates
+cache với version hiện tại. `/activities/suggest` của phiên tiếp theo chỉ còn 1 lần đọc
+Redis; miss (cache lỗi, version đã đổi, catalog đổi) thì vẫn tính live như cũ.
+Khi bật CANDIDATES_RAW_RESPONSE_ENABLED, response body cũng được render sẵn ở đây.
+"""
+import time
+from typing import Iterable
+
+from sqlalchemy.orm import Session
+
+from app.cache.candidates_cache_manager import CandidatesCacheManager, candidates_cache_stats
+from app.cache.prompt_catalog_cache_manager import get_prompt_catalog
+from app.core.config_settings import settings
+from app.repositories.friendship_status_repository import FriendshipStatusRepository
+from app.services.activity_suggestion_service import is_raw_response_enabled, render_suggestion_response
+from app.services.agent_selection_service import AgentSelectionService
+from app.utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+def is_candidates_precompute_enabled() -> bool:
+    return settings.CACHE_ENABLED and settings.CANDIDATES_CACHE_ENABLED and settings.CANDIDATES_PRECOMPUTE_ENABLED
+
+
+class CandidatesPrecomputeService:
+    """Build + store the next candidate set for users whose status was just committed."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.status_repo = FriendshipStatusRepository(db)
+
+    def precompute(self, user_ids: Iterable[str]) -> int:
+        """
+        Tính và cache candidates cho `user_ids` (status đã commit). Never raises.
+
+        Returns:
+            Số users đã được ghi vào cache
+        """
+        ids = sorted(set(user_ids))
+        if not ids or not is_candidates_precompute_enabled():
+            return 0
+
+        started = time.perf_counter()
+        try:
+            catalog = get_prompt_catalog()
+            fingerprint = catalog.fingerprint if catalog else None
+            cache = CandidatesCacheManager()
+            # Version đọc TRƯỚC khi load status: status đổi sau đó -> set() bị từ chối
+            versions = cache.get_versions(ids)
+            statuses = self.status_repo.get_by_user_ids(ids)
+            selection_service = AgentSelectionService(self.db)
+            render = is_raw_response_enabled()
+        except Exception as exc:
+            candidates_cache_stats.record_error()
+            logger.warning("⚠️  Candidates precompute skipped for %s user(s): %s", len(ids), exc)
+            return 0
+
+        stored = 0
+        for user_id in ids:
+            status = statuses.get(user_id)
+            if status is None:
+                continue
+            try:
+                candidates = selection_service.compute_candidates_for_status(status)
+                if cache.set(
+                    user_id,
+                    candidates,
+                    ttl=settings.CANDIDATES_CACHE_TTL_SECONDS,
+                    version=versions[user_id],
+                    catalog_fingerprint=fingerprint,
+                    rendered=render_suggestion_response(candidates) if render else None,
+                ):
+                    stored += 1
+            except Exception as exc:
+                candidates_cache_stats.record_error()
+                logger.warning("⚠️  Candidates precompute failed for user %s: %s", user_id, exc)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        candidates_cache_stats.record_precompute(stored, elapsed_ms)
+        logger.debug("Precomputed candidates for %s/%s user(s) in %.1f ms", stored, len(ids), elapsed_ms)
+        return stored
@@ -58,7 +58,9 @@ class ConversationDataFetchService:
             try:
                 # FIX: Sử dụng get_by_conversation_id thay vì get_by_id
                 # get_by_id nhận integer (event_id), get_by_conversation_id nhận string (conversation_id)
-                conversation = self.conversation_repository.get_by_conversation_id(conversation_id)
+                conversation = self.conversation_repository.get_by_conversation_id(
+                    conversation_id, with_log=True
+                )
                 if conversation:
                     logger.info(f"Found conversation in database: {conversation_id}")
                     return self._parse_conversation_data(conversation)
@@ -221,6 +223,17 @@ class ConversationDataFetchService:
             "metadata": default_metadata
         }
     
+    def parse_conversation(self, conversation: Any) -> Dict[str, Any]:
+        """
+        Normalize an already-loaded conversation row (e.g. a claimed event) without re-querying.
+        
+        Raises:
+            ConversationNotFoundError: If conversation is None
+        """
+        if conversation is None:
+            raise ConversationNotFoundError("Conversation not found")
+        return self._parse_conversation_data(conversation)
+    
     def _parse_conversation_data(self, conversation: Any) -> Dict[str, Any]:
         """
         Parse conversation model/object into dictionary.
@@ -250,7 +263,21 @@ class ConversationDataFetchService:
             "end_time": getattr(conversation, "end_time", None),
             "duration_seconds": getattr(conversation, "duration_seconds", None),
             "conversation_log": self._parse_conversation_log(conversation),
-            "metadata": self._parse_metadata(conversation)
+            "metadata": self._parse_metadata(conversation),
+            "features": self._parse_features(conversation)
+        }
+    
+    def _parse_features(self, conversation: Any) -> Optional[Dict[str, Any]]:
+        """Ingest-time features (conversation_events columns); None với rows cũ chưa có."""
+        if getattr(conversation, "total_turns", None) is None:
+            return None
+        return {
+            "total_turns": conversation.total_turns,
+            "pika_message_count": getattr(conversation, "pika_message_count", None),
+            "user_message_count": getattr(conversation, "user_message_count", None),
+            "user_question_count": getattr(conversation, "user_question_count", None),
+            "text_length": getattr(conversation, "text_length", None),
+            "content_hash": getattr(conversation, "content_hash", None),
         }
     
     def _parse_conversation_log(self, conversation: Any) -> list:
@@ -1,19 +1,32 @@
 """
 Service that scans pending conversation events and processes them.
 """
-from typing import Dict, List, Optional, Any
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
 
 from sqlalchemy.orm import Session
 
+from app.core.config_settings import settings
 from app.core.constants_enums import ConversationEventStatus
 from app.core.exceptions_custom import (
     ConversationNotFoundError,
     InvalidScoreError,
 )
 from app.repositories.conversation_event_repository import ConversationEventRepository
+from app.repositories.user_topic_metrics_repository import (
+    UserTopicMetricsRepository,
+    is_topic_metrics_dual_write_enabled,
+)
+from app.services.candidates_precompute_service import CandidatesPrecomputeService
+from app.services.conversation_data_fetch_service import ConversationDataFetchService
 from app.services.friendship_score_calculation_service import FriendshipScoreCalculationService
 from app.services.friendship_status_update_service import FriendshipStatusUpdateService
-from app.utils.logger_setup import get_logger
+from app.services.utils.llm_analysis_utils import close_async_analysis_clients
+from app.utils.conversation_features import count_complete_turns
+from app.utils.logger_setup import get_logger, payload, should_log_payload
+from app.utils.metrics_registry import observe_stage, record_event_outcome
 from app.utils.topic_utils import get_topic_id_from_agent_id
 
 logger = get_logger(__name__)
@@ -41,359 +54,472 @@ class ConversationEventProcessingService:
 
         Returns optional stats dict for consistency with batch method.
         """
-        event = self.repository.get_by_id(event_id)
+        event = self.repository.claim_event(event_id)
         if not event:
-            logger.warning("Conversation event not found for id=%s", event_id)
-            return None
+            # Không tồn tại, đã PROCESSED, hoặc đang được processor khác giữ lease
+            logger.info("Conversation event id=%s not claimable, skipping", event_id)
+            return {"processed": 0, "failed": 0, "total": 0}
 
         stats = {"processed": 0, "failed": 0, "total": 1}
         logger.info(
             "Processing single conversation event conversation_id=%s attempt=%s",
             event.conversation_id,
-            (event.attempt_count or 0) + 1,
+            event.attempt_count,
+        )
+        if self._process_event(event):
+            stats["processed"] = 1
+        else:
+            stats["failed"] = 1
+        return stats
+
+    def process_due_events(self, batch_size: int = 20) -> Dict[str, int]:
+        """
+        Claim (SKIP LOCKED) and process up to `batch_size` events with next_attempt_at <= now.
+
+        Claim từng event một: mỗi event có lease riêng bắt đầu khi nó được xử lý. Claim cả
+        batch 1 lần thì lease của các event cuối có thể hết hạn trong lúc chờ (Mem0 / LLM
+        mỗi event tới vài phút) và bị processor khác reclaim -> cộng score 2 lần.
+
+        Returns:
+            Dict with counters: processed, failed, total
+        """
+        stats = {"processed": 0, "failed": 0, "total": 0}
+
+        for _ in range(batch_size):
+            claimed = self.repository.claim_due_events(batch_size=1, detach=False)
+            if not claimed:
+                break
+            event = claimed[0]
+            stats["total"] += 1
+            logger.info(
+                "Processing conversation event conversation_id=%s attempt=%s",
+                event.conversation_id,
+                event.attempt_count,
+            )
+            if self._process_event(event):
+                stats["processed"] += 1
+            else:
+                stats["failed"] += 1
+
+        if not stats["total"]:
+            return stats
+
+        logger.info(
+            "Conversation event processing completed. processed=%s failed=%s",
+            stats["processed"],
+            stats["failed"],
         )
-        self.repository.mark_processing(event)
+        return stats
+
+    def process_due_events_bulk(
+        self,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """
+        Batch mode cho backlog lớn (bật bằng CONVERSATION_EVENT_BULK_ENABLED).
+
+        1. Claim tối đa `batch_size` events bằng 1 câu UPDATE ... RETURNING (1 commit).
+        2. Tính score song song (asyncio, tối đa `concurrency` conversation cùng lúc);
+           conversation_log lấy luôn từ row đã claim, không query lại.
+        3. Tạo default status còn thiếu + lock toàn bộ status của batch bằng 1 query,
+           áp dụng score/topic_metrics trong memory (theo thứ tự claim).
+        4. Ghi kết quả events bằng executemany UPDATE, 1 commit cho cả batch.
+
+        Returns:
+            Dict with counters: processed, failed, total
+        """
+        batch_size = batch_size or settings.CONVERSATION_EVENT_BATCH_SIZE
+        concurrency = max(1, concurrency or settings.CONVERSATION_EVENT_BULK_CONCURRENCY)
+
+        events = self.repository.claim_due_events(batch_size=batch_size)
+        stats = {"processed": 0, "failed": 0, "total": len(events)}
+        if not events:
+            return stats
+
+        started = time.perf_counter()
+        logger.info(
+            "📦 Bulk processing %s claimed conversation events (concurrency=%s)",
+            len(events),
+            concurrency,
+        )
+
+        with observe_stage("bulk_score"):
+            outcomes = asyncio.run(self._score_events_async(events, concurrency))
+        scored = [(event, calc_result) for event, calc_result, _ in outcomes if calc_result is not None]
+        failures = [failure for _, _, failure in outcomes if failure is not None]
+        for failure in failures:
+            logger.warning(
+                "Processing failed for event id=%s error_code=%s error=%s",
+                failure["id"],
+                failure["error_code"],
+                failure["error_details"],
+            )
+
+        touched_user_ids: List[str] = []
         try:
-            calc_result = self.score_service.calculate_score_from_conversation_id(
-                event.conversation_id
+            with observe_stage("bulk_apply"):
+                # Lock các event còn giữ lease (tới commit); event đã bị reclaim thì bỏ kết quả
+                scored, failures = self._drop_lost_leases(events, scored, failures)
+                processed_rows = self._apply_results_bulk(scored)
+                self.repository.bulk_mark_processed(processed_rows)
+                self.repository.bulk_mark_failed(failures)
+                self.db.commit()
+            touched_user_ids = sorted({event.user_id for event, _ in scored})
+            stats["processed"] = len(processed_rows)
+            stats["failed"] = len(failures)
+        except Exception as exc:  # pragma: no cover
+            # Áp dụng batch thất bại -> rollback, đánh dấu FAILED toàn bộ để retry sau
+            logger.error("❌ Bulk apply failed, marking batch as failed: %s", exc, exc_info=True)
+            try:
+                self.db.rollback()
+            except Exception:
+                pass  # Ignore rollback errors
+            failures.extend(
+                {"id": event.id, "error_code": "UNEXPECTED_ERROR", "error_details": str(exc)}
+                for event, _ in scored
             )
+            _, failures = self._drop_lost_leases(events, [], failures)
+            self.repository.bulk_mark_failed(failures)
+            self.db.commit()
+            stats["failed"] = len(failures)
+
+        self.status_update_service.invalidate_candidates(touched_user_ids)
+        with observe_stage("precompute"):
+            CandidatesPrecomputeService(self.db).precompute(touched_user_ids)
+
+        record_event_outcome("processed", count=stats["processed"])
+        for failure in failures:
+            record_event_outcome("failed", failure["error_code"])
+        logger.info(
+            "✅ Bulk conversation event processing completed in %.2fs. processed=%s failed=%s",
+            time.perf_counter() - started,
+            stats["processed"],
+            stats["failed"],
+        )
+        return stats
+
+    def _drop_lost_leases(
+        self,
+        events: List[Any],
+        scored: List[Tuple[Any, Dict[str, Any]]],
+        failures: List[Dict[str, Any]],
+    ) -> Tuple[List[Tuple[Any, Dict[str, Any]]], List[Dict[str, Any]]]:
+        """Lock (FOR UPDATE) events còn giữ lease; bỏ scored / failures của events đã bị reclaim."""
+        held_ids = self.repository.lock_held_events(events)
+        lost = len(events) - len(held_ids)
+        if lost:
+            logger.warning("⚠️  %s claimed event(s) lost their lease, results discarded", lost)
+            record_event_outcome("lease_lost", count=lost)
+        return (
+            [(event, calc_result) for event, calc_result in scored if event.id in held_ids],
+            [failure for failure in failures if failure["id"] in held_ids],
+        )
+
+    async def _score_events_async(
+        self,
+        events: List[Any],
+        concurrency: int,
+    ) -> List[Tuple[Any, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+        """Score claimed events concurrently. Returns (event, calc_result, failure) per event."""
+        fetch_service = self.score_service.conversation_fetch_service or ConversationDataFetchService()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def score(event):
+            async with semaphore:
+                try:
+                    with observe_stage("fetch"):
+                        conversation_data = fetch_service.parse_conversation(event)
+                    calc_result = await self.score_service.calculate_score_from_conversation_data_async(
+                        event.conversation_id, conversation_data
+                    )
+                    return event, calc_result, None
+                except ConversationNotFoundError as exc:
+                    error_code, error_details = "CONVERSATION_NOT_FOUND", str(exc)
+                except InvalidScoreError as exc:
+                    error_code, error_details = "INVALID_SCORE", str(exc)
+                except Exception as exc:  # pragma: no cover
+                    error_code, error_details = "UNEXPECTED_ERROR", str(exc)
+                return event, None, {
+                    "id": event.id,
+                    "error_code": error_code,
+                    "error_details": error_details,
+                }
+
+        try:
+            return await asyncio.gather(*(score(event) for event in events))
+        finally:
+            await close_async_analysis_clients()
+
+    def _apply_results_bulk(
+        self,
+        scored: List[Tuple[Any, Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Apply score changes for a whole batch in memory (no commit).
+
+        Status rows are created/locked with 2 statements; topic_id lookups are memoized
+        per (agent_tag, friendship_level) on top of the prompt catalog snapshot.
+        """
+        if not scored:
+            return []
+
+        status_repository = self.status_update_service.repository
+        user_ids = {event.user_id for event, _ in scored}
+        status_repository.ensure_defaults(user_ids)
+        statuses = status_repository.get_by_user_ids(user_ids, for_update=True)
+
+        topic_cache: Dict[Tuple[str, str], Optional[str]] = {}
+        touched_topics: Dict[Tuple[str, str], None] = {}
+        rows = []
+        for event, calc_result in scored:
+            status = statuses[event.user_id]
             score_change = calc_result["friendship_score_change"]
-            
-            # Try to update topic_metrics first (it also updates friendship_score)
-            # Use agent_tag ONLY (no fallback to bot_id)
-            agent_tag = event.agent_tag if hasattr(event, 'agent_tag') else None
-            bot_id = event.bot_id  # Keep bot_id for logging and agents_used tracking
-            
-            status = None
-            
-            # Only query topic_id if agent_tag is provided
+            calculation_details = calc_result.get("calculation_details") or {}
+
+            topic_id = None
+            agent_tag = getattr(event, "agent_tag", None)
             if agent_tag:
-                # Get user's friendship_level first to query topic_id from DB
-                # get_status() will auto-create record if user doesn't exist
-                # If it fails, we'll use default level and apply_score_change will create it
-                try:
-                    user_status = self.status_update_service.get_status(event.user_id)
-                    friendship_level = user_status.get("friendship_level", "PHASE1_STRANGER")
-                except Exception as e:
-                    logger.warning(
-                        f"⚠️  Failed to get/create friendship status for user {event.user_id}: {e}. "
-                        f"Using default level, will create record in apply_score_change"
+                cache_key = (agent_tag, status.friendship_level)
+                if cache_key not in topic_cache:
+                    topic_cache[cache_key] = get_topic_id_from_agent_id(
+                        agent_tag=agent_tag,
+                        friendship_level=status.friendship_level,
+                        db=self.db,
                     )
-                    # Use default level - apply_score_change will create the record
-                    friendship_level = "PHASE1_STRANGER"
-                
-                # Get topic_id from DB (agenda_agent_prompting table) using agent_tag
-                topic_id = get_topic_id_from_agent_id(
-                    agent_tag=agent_tag,  # Use agent_tag to query topic_id
-                    friendship_level=friendship_level,
-                    db=self.db
-                )
-                logger.info(
-                    f"🔍 Got topic_id from agent_id: agent_tag='{agent_tag}', "
-                    f"friendship_level='{friendship_level}' -> topic_id='{topic_id}'"
+                topic_id = topic_cache[cache_key]
+
+            if topic_id:
+                turns_change = calculation_details.get("total_turns")
+                if turns_change is None:
+                    turns_change = self._event_total_turns(event)
+                status_repository.apply_topic_update_in_memory(
+                    status,
+                    topic_id=topic_id,
+                    score_change=score_change,
+                    bot_id=event.bot_id,
+                    turns_change=turns_change,
                 )
-                
-                if topic_id:
-                    # Calculate turns from conversation log
-                    conversation_data = self.score_service.conversation_fetch_service.fetch_by_id(
-                        event.conversation_id
-                    )
-                    conversation_log = conversation_data.get("conversation_log", []) if conversation_data else []
-                    # Use same logic as score calculation: count complete turns (pika + user pairs)
-                    turns_change = self._count_complete_turns(conversation_log)
-                    
-                    try:
-                        self.status_update_service.update_topic_metrics(
-                            user_id=event.user_id,
-                            topic_id=topic_id,
-                            score_change=score_change,
-                            bot_id=bot_id,
-                            turns_change=turns_change
-                        )
-                        # Get updated status to get friendship_level
-                        status = self.status_update_service.get_status(event.user_id)
-                        logger.info(
-                            f"Updated topic_metrics for user_id={event.user_id}, "
-                            f"topic_id={topic_id}, score_change={score_change}, turns={turns_change}"
-                        )
-                    except Exception as e:
-                        logger.warning(
-                            f"Failed to update topic_metrics for user_id={event.user_id}, "
-                            f"topic_id={topic_id}: {e}, falling back to apply_score_change"
-                        )
-                        # Fallback to apply_score_change if update_topic_metrics fails
-                        status = self.status_update_service.apply_score_change(
-                            user_id=event.user_id,
-                            score_change=score_change,
-                        )
-                else:
-                    # No topic_id found for agent_tag, just update friendship score
-                    logger.warning(
-                        f"Could not extract topic_id from agent_tag={agent_tag} for user_id={event.user_id}, "
-                        f"using apply_score_change only"
-                    )
-                    status = self.status_update_service.apply_score_change(
-                        user_id=event.user_id,
-                        score_change=score_change,
-                    )
+                touched_topics[(event.user_id, topic_id)] = None
             else:
-                # No agent_tag provided, skip topic_metrics update, only update friendship score
-                logger.info(
-                    f"⏭️  agent_tag not provided for user_id={event.user_id}, "
-                    f"skipping topic_metrics update, using apply_score_change only"
-                )
-                status = self.status_update_service.apply_score_change(
-                    user_id=event.user_id,
+                status_repository.apply_score_change_in_memory(
+                    status,
                     score_change=score_change,
+                    last_interaction_date=datetime.utcnow(),
                 )
-            
-            # Ensure status is set (fallback if somehow status is still None)
-            if status is None:
-                logger.warning(
-                    f"Status is None after processing, applying score change as fallback"
+
+            rows.append(
+                {
+                    "id": event.id,
+                    "friendship_score_change": score_change,
+                    "new_friendship_level": status.friendship_level,
+                    "score_calculation_details": calc_result.get("calculation_details"),
+                }
             )
-            status = self.status_update_service.apply_score_change(
-                user_id=event.user_id,
-                    score_change=score_change,
+
+        if touched_topics and is_topic_metrics_dual_write_enabled():
+            UserTopicMetricsRepository(self.db).upsert_entries(
+                (user_id, topic_id, statuses[user_id].topic_metrics[topic_id])
+                for user_id, topic_id in touched_topics
+            )
+        return rows
+
+    def _process_event(self, event) -> bool:
+        """Process one already-claimed event with per-event commits. Returns True when processed."""
+        with observe_stage("event"):
+            return self._process_event_stages(event)
+
+    def _process_event_stages(self, event) -> bool:
+        try:
+            # Event đã được claim (row trong session) -> parse trực tiếp, không fetch lại
+            fetch_service = self.score_service.conversation_fetch_service or ConversationDataFetchService()
+            with observe_stage("fetch"):
+                conversation_data = fetch_service.parse_conversation(event)
+            with observe_stage("score"):
+                calc_result = self.score_service.calculate_score_from_conversation_data(
+                    event.conversation_id, conversation_data
                 )
+            # Status update + mark PROCESSED trong 1 transaction (như bulk path): lock event nếu
+            # còn giữ lease (processor khác claim bằng SKIP LOCKED sẽ bỏ qua tới commit). Lease
+            # đã mất (reclaim trong lúc chờ LLM / Mem0) -> không apply, score không bị cộng 2 lần;
+            # crash trước commit -> rollback cả hai, event được reclaim và tính lại đúng 1 lần.
+            if not self.repository.lock_held_events([event]):
+                self._safe_rollback()
+                self._log_lease_lost(event, "score apply skipped")
+                return False
+            with observe_stage("status_update"):
+                status = self._apply_event_result(event, calc_result)
 
             # Get calculation details from result
             calculation_details = calc_result.get("calculation_details")
             if calculation_details is not None:
-                logger.info(
-                    f"📊 Saving score_calculation_details for conversation_id={event.conversation_id}: "
-                    f"{calculation_details}"
-                )
+                # Details lớn -> sampled ở INFO (LOG_PAYLOAD_SAMPLE_RATE), luôn log ở DEBUG
+                if should_log_payload(logger):
+                    logger.info(
+                        "📊 Saving score_calculation_details for conversation_id=%s: %s",
+                        event.conversation_id, payload(calculation_details),
+                    )
             else:
                 logger.warning(
                     f"⚠️  No calculation_details found in calc_result for conversation_id={event.conversation_id}. "
                     f"calc_result keys: {list(calc_result.keys())}"
-            )
+                )
 
-            self.repository.mark_processed(
-                event=event,
-                friendship_score_change=calc_result["friendship_score_change"],
-                friendship_level=status["friendship_level"],
-                score_calculation_details=calculation_details,
-            )
-            stats["processed"] = 1
+            with observe_stage("mark_processed"):
+                # Row event đang bị lock với đúng lease -> fenced UPDATE luôn khớp
+                self.repository.mark_processed(
+                    event=event,
+                    friendship_score_change=calc_result["friendship_score_change"],
+                    friendship_level=status["friendship_level"],
+                    score_calculation_details=calculation_details,
+                    commit=False,
+                )
+                self.db.commit()
+            self.status_update_service.invalidate_candidates([event.user_id])
+            record_event_outcome("processed")
+            # Status mới đã commit -> tính sẵn candidates cho phiên tiếp theo
+            with observe_stage("precompute"):
+                CandidatesPrecomputeService(self.db).precompute([event.user_id])
+            return True
         except ConversationNotFoundError as exc:
             # Rollback transaction nếu bị abort
-            try:
-                self.db.rollback()
-            except Exception:
-                pass  # Ignore rollback errors
+            self._safe_rollback()
             self._handle_failure(event, "CONVERSATION_NOT_FOUND", str(exc))
-            stats["failed"] = 1
         except InvalidScoreError as exc:
-            # Rollback transaction nếu bị abort
-            try:
-                self.db.rollback()
-            except Exception:
-                pass  # Ignore rollback errors
+            self._safe_rollback()
             self._handle_failure(event, "INVALID_SCORE", str(exc))
-            stats["failed"] = 1
         except Exception as exc:  # pragma: no cover
             # FIX: Rollback transaction trước khi handle failure
             # Điều này đảm bảo transaction bị abort được reset
-            try:
-                self.db.rollback()
-            except Exception:
-                pass  # Ignore rollback errors
+            self._safe_rollback()
             self._handle_failure(event, "UNEXPECTED_ERROR", str(exc))
-            stats["failed"] = 1
-
-        return stats
+        return False
 
-    def process_due_events(self, batch_size: int = 20) -> Dict[str, int]:
+    def _apply_event_result(self, event, calc_result: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Process events with next_attempt_at <= now.
+        Apply score change của 1 event vào friendship_status (không commit: caller commit
+        cùng mark PROCESSED và invalidate candidates sau commit).
 
-        Returns:
-            Dict with counters: processed, failed, total
+        Ưu tiên update_topic_metrics (cũng cập nhật friendship_score); fallback
+        apply_score_change khi không có agent_tag / topic_id. Score chỉ được cộng 1 lần.
         """
-        due_events = self.repository.fetch_due_events(batch_size=batch_size)
-        stats = {"processed": 0, "failed": 0, "total": len(due_events)}
+        score_change = calc_result["friendship_score_change"]
 
-        if not due_events:
-            return stats
-
-        logger.info("Processing %s due conversation events", len(due_events))
+        # Use agent_tag ONLY (no fallback to bot_id)
+        agent_tag = event.agent_tag if hasattr(event, 'agent_tag') else None
+        bot_id = event.bot_id  # Keep bot_id for logging and agents_used tracking
 
-        for event in due_events:
+        if not agent_tag:
+            # No agent_tag provided, skip topic_metrics update, only update friendship score
             logger.info(
-                "Processing conversation event conversation_id=%s attempt=%s",
-                event.conversation_id,
-                (event.attempt_count or 0) + 1,
+                f"⏭️  agent_tag not provided for user_id={event.user_id}, "
+                f"skipping topic_metrics update, using apply_score_change only"
+            )
+            return self.status_update_service.apply_score_change(
+                user_id=event.user_id,
+                score_change=score_change,
+                commit=False,
             )
-            self.repository.mark_processing(event)
-            try:
-                calc_result = self.score_service.calculate_score_from_conversation_id(
-                    event.conversation_id
-                )
-                score_change = calc_result["friendship_score_change"]
-                
-                # Try to update topic_metrics first (it also updates friendship_score)
-                # Use agent_tag ONLY (no fallback to bot_id)
-                agent_tag = event.agent_tag if hasattr(event, 'agent_tag') else None
-                bot_id = event.bot_id  # Keep bot_id for logging and agents_used tracking
-                
-                status = None
-                
-                # Only query topic_id if agent_tag is provided
-                if agent_tag:
-                    # Get user's friendship_level first to query topic_id from DB
-                    user_status = self.status_update_service.get_status(event.user_id)
-                    friendship_level = user_status.get("friendship_level", "PHASE1_STRANGER")
-                    
-                    # Get topic_id from DB (agenda_agent_prompting table) using agent_tag
-                    topic_id = get_topic_id_from_agent_id(
-                        agent_tag=agent_tag,  # Use agent_tag to query topic_id
-                        friendship_level=friendship_level,
-                        db=self.db
-                    )
-                    logger.info(
-                        f"🔍 Got topic_id from agent_id: agent_tag='{agent_tag}', "
-                        f"friendship_level='{friendship_level}' -> topic_id='{topic_id}'"
-                    )
-                    
-                    if topic_id:
-                        # Calculate turns from conversation log
-                        conversation_data = self.score_service.conversation_fetch_service.fetch_by_id(
-                            event.conversation_id
-                        )
-                        conversation_log = conversation_data.get("conversation_log", []) if conversation_data else []
-                        # Use same logic as score calculation: count complete turns (pika + user pairs)
-                        turns_change = self._count_complete_turns(conversation_log)
-                        
-                        try:
-                            self.status_update_service.update_topic_metrics(
-                                user_id=event.user_id,
-                                topic_id=topic_id,
-                                score_change=score_change,
-                                bot_id=bot_id,
-                                turns_change=turns_change
-                            )
-                            # Get updated status to get friendship_level
-                            status = self.status_update_service.get_status(event.user_id)
-                            logger.info(
-                                f"Updated topic_metrics for user_id={event.user_id}, "
-                                f"topic_id={topic_id}, score_change={score_change}, turns={turns_change}"
-                            )
-                        except Exception as e:
-                            logger.warning(
-                                f"Failed to update topic_metrics for user_id={event.user_id}, "
-                                f"topic_id={topic_id}: {e}, falling back to apply_score_change"
-                            )
-                            # Fallback to apply_score_change if update_topic_metrics fails
-                            status = self.status_update_service.apply_score_change(
-                                user_id=event.user_id,
-                                score_change=score_change,
-                            )
-                    else:
-                        # No topic_id found for agent_tag, just update friendship score
-                        logger.warning(
-                            f"Could not extract topic_id from agent_tag={agent_tag} for user_id={event.user_id}, "
-                            f"using apply_score_change only"
-                        )
-                        status = self.status_update_service.apply_score_change(
-                            user_id=event.user_id,
-                            score_change=score_change,
-                        )
-                else:
-                    # No agent_tag provided, skip topic_metrics update, only update friendship score
-                    logger.info(
-                        f"⏭️  agent_tag not provided for user_id={event.user_id}, "
-                        f"skipping topic_metrics update, using apply_score_change only"
-                )
-                status = self.status_update_service.apply_score_change(
-                    user_id=event.user_id,
-                        score_change=score_change,
-                    )
 
-                # Get calculation details from result
-                calculation_details = calc_result.get("calculation_details")
-                if calculation_details is not None:
-                    logger.info(
-                        f"📊 Saving score_calculation_details for conversation_id={event.conversation_id}: "
-                        f"{calculation_details}"
-                    )
-                else:
-                    logger.warning(
-                        f"⚠️  No calculation_details found in calc_result for conversation_id={event.conversation_id}. "
-                        f"calc_result keys: {list(calc_result.keys())}"
-                )
+        # Get user's friendship_level first to query topic_id from DB. Không dùng get_status()
+        # (create_default commit -> nhả lock event); user mới thì row default được tạo trong
+        # apply_topic_update / apply_score_change (ensure_defaults, cùng transaction)
+        user_status = self.status_update_service.repository.get_by_user_id(event.user_id)
+        friendship_level = user_status.friendship_level if user_status else "PHASE1_STRANGER"
 
-                self.repository.mark_processed(
-                    event=event,
-                    friendship_score_change=calc_result["friendship_score_change"],
-                    friendship_level=status["friendship_level"],
-                    score_calculation_details=calculation_details,
-                )
-                stats["processed"] += 1
+        # Get topic_id (prompt catalog / agenda_agent_prompting) using agent_tag
+        with observe_stage("topic_lookup"):
+            topic_id = get_topic_id_from_agent_id(
+                agent_tag=agent_tag,
+                friendship_level=friendship_level,
+                db=self.db
+            )
+        logger.info(
+            f"🔍 Got topic_id from agent_id: agent_tag='{agent_tag}', "
+            f"friendship_level='{friendship_level}' -> topic_id='{topic_id}'"
+        )
 
-            except ConversationNotFoundError as exc:
-                self._handle_failure(event, "CONVERSATION_NOT_FOUND", str(exc))
-                stats["failed"] += 1
-            except InvalidScoreError as exc:
-                self._handle_failure(event, "INVALID_SCORE", str(exc))
-                stats["failed"] += 1
-            except Exception as exc:  # pragma: no cover
-                self._handle_failure(event, "UNEXPECTED_ERROR", str(exc))
-                stats["failed"] += 1
+        if not topic_id:
+            logger.warning(
+                f"Could not extract topic_id from agent_tag={agent_tag} for user_id={event.user_id}, "
+                f"using apply_score_change only"
+            )
+            return self.status_update_service.apply_score_change(
+                user_id=event.user_id,
+                score_change=score_change,
+                commit=False,
+            )
+
+        # Turns: dùng lại kết quả đếm của score calculation (cùng logic pika + user pairs)
+        calculation_details = calc_result.get("calculation_details") or {}
+        turns_change = calculation_details.get("total_turns")
+        if turns_change is None:
+            turns_change = self._event_total_turns(event)
+
+        try:
+            # Savepoint: lỗi topic update chỉ rollback phần này, giữ lock event của transaction
+            with self.db.begin_nested():
+                status = self.status_update_service.apply_topic_update(
+                    user_id=event.user_id,
+                    topic_id=topic_id,
+                    score_change=score_change,
+                    bot_id=bot_id,
+                    turns_change=turns_change,
+                    commit=False,
+                )
+        except Exception as e:
+            logger.warning(
+                f"Failed to update topic_metrics for user_id={event.user_id}, "
+                f"topic_id={topic_id}: {e}, falling back to apply_score_change"
+            )
+            return self.status_update_service.apply_score_change(
+                user_id=event.user_id,
+                score_change=score_change,
+                commit=False,
+            )
 
         logger.info(
-            "Conversation event processing completed. processed=%s failed=%s",
-            stats["processed"],
-            stats["failed"],
+            f"Updated topic_metrics for user_id={event.user_id}, "
+            f"topic_id={topic_id}, score_change={score_change}, turns={turns_change}"
         )
-        return stats
+        return status
 
-    def _count_complete_turns(self, conversation_log: List[Dict[str, Any]]) -> int:
-        """
-        Đếm số turn hoàn chỉnh (1 turn = 1 cặp pika + user).
-        
-        Logic:
-        - Duyệt conversation_log theo thứ tự
-        - Đếm số cặp liên tiếp (pika, user) hoặc (user, pika)
-        - Bỏ qua các messages đơn lẻ không tạo thành cặp
-        
-        Args:
-            conversation_log: List of conversation messages
-            
-        Returns:
-            Số turn hoàn chỉnh (cặp trao đổi)
-        """
-        if not conversation_log:
-            return 0
-        
-        turns = 0
-        i = 0
-        while i < len(conversation_log) - 1:
-            current_speaker = conversation_log[i].get("speaker", "").lower()
-            next_speaker = conversation_log[i + 1].get("speaker", "").lower()
-            
-            # Kiểm tra nếu là cặp (pika, user) hoặc (user, pika)
-            if (current_speaker == "pika" and next_speaker == "user") or \
-               (current_speaker == "user" and next_speaker == "pika"):
-                turns += 1
-                i += 2  # Bỏ qua cả 2 messages trong cặp
-            else:
-                i += 1  # Chỉ bỏ qua message hiện tại
-        
-        return turns
+    def _safe_rollback(self) -> None:
+        try:
+            self.db.rollback()
+        except Exception:
+            pass  # Ignore rollback errors
+
+    @staticmethod
+    def _event_total_turns(event) -> int:
+        """Turns từ cột total_turns (ingest-time); row cũ (NULL) thì đếm lại từ conversation_log."""
+        total_turns = getattr(event, "total_turns", None)
+        if total_turns is not None:
+            return total_turns
+        return count_complete_turns(getattr(event, "conversation_log", None) or [])
 
     def _handle_failure(self, event, error_code: str, error_details: str) -> None:
         """Update event as failed and log."""
+        record_event_outcome("failed", error_code)
         logger.warning(
             "Processing failed for conversation_id=%s error_code=%s error=%s",
             event.conversation_id,
             error_code,
             error_details,
         )
-        self.repository.mark_failed(
+        if not self.repository.mark_failed(
             event=event,
             error_code=error_code,
             error_details=error_details,
+        ):
+            self._log_lease_lost(event, "failure not recorded")
+
+    @staticmethod
+    def _log_lease_lost(event, action: str) -> None:
+        logger.warning(
+            "⚠️  Lease lost for conversation_id=%s (reclaimed by another processor), %s",
+            event.conversation_id,
+            action,
         )
+        record_event_outcome("lease_lost")
 
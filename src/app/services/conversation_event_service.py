@@ -2,12 +2,16 @@
 Service layer for conversation event operations.
 """
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Optional
 from zoneinfo import ZoneInfo
 
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.background.message_codec import build_event_message
+from app.background.rabbitmq_publisher import RabbitMQConfig
+from app.core.config_settings import settings
 from app.core.constants_enums import (
     CONVERSATION_EVENT_RETRY_HOURS,
     ConversationEventStatus,
@@ -16,7 +20,11 @@ from app.core.exceptions_custom import (
     ConversationEventAlreadyExistsError,
     ConversationEventValidationError,
 )
+from app.repositories.async_conversation_event_repository import AsyncConversationEventRepository
+from app.models.conversation_event_model import ConversationEvent
+from app.models.event_outbox_model import EventOutbox
 from app.repositories.conversation_event_repository import ConversationEventRepository
+from app.repositories.event_outbox_repository import build_outbox_entry
 from app.schemas.conversation_event_schemas import ConversationEventCreateRequest
 from app.services.conversation_data_fetch_service import ConversationDataFetchService
 from app.services.conversation_event_processing_service import (
@@ -28,6 +36,7 @@ from app.services.friendship_score_calculation_service import (
 from app.services.friendship_status_update_service import FriendshipStatusUpdateService
 from app.utils.logger_setup import get_logger
 from app.utils.color_log import success, error, warning, info, key_value
+from app.utils.conversation_features import extract_conversation_features
 from app.utils.conversation_log_transform import (
     transform_conversation_logs,
     is_api_format,
@@ -50,6 +59,190 @@ def _generate_timestamp_suffix() -> str:
     return now.strftime("_%Y%m%d_%H%M%S")
 
 
+MAX_CONVERSATION_ID_RETRIES = 3
+
+# Cột JSONB của conversation_events: dump ở JSON mode (datetime lồng trong log -> ISO string)
+_JSON_LOG_FIELDS = {"conversation_log", "raw_conversation_log"}
+
+
+def _validate_duration(request: ConversationEventCreateRequest) -> None:
+    duration_seconds = int((request.end_time - request.start_time).total_seconds())
+    if duration_seconds <= 0:
+        raise ConversationEventValidationError("Conversation duration must be greater than 0 seconds")
+
+
+def _candidate_conversation_ids(original_conversation_id: str):
+    """
+    Yield conversation_id candidates: original trước, sau đó original + suffix timestamp.
+
+    Caller dừng vòng lặp khi gặp id chưa tồn tại; hết số lần retry -> raise
+    ConversationEventAlreadyExistsError.
+    """
+    current_conversation_id = original_conversation_id
+    for retry_count in range(1, MAX_CONVERSATION_ID_RETRIES + 1):
+        yield current_conversation_id
+        if retry_count >= MAX_CONVERSATION_ID_RETRIES:
+            break
+        # Generate suffix và append vào conversation_id
+        suffix = _generate_timestamp_suffix()
+        current_conversation_id = f"{original_conversation_id}{suffix}"
+        logger.info(
+            f"{info('🔄')} Conversation_id already exists, generating new ID | "
+            f"{key_value('original', original_conversation_id)} | "
+            f"{key_value('new_id', current_conversation_id)} | "
+            f"{key_value('retry', f'{retry_count}/{MAX_CONVERSATION_ID_RETRIES}')}"
+        )
+    # Nếu đã retry quá nhiều lần, log warning và raise error
+    logger.warning(
+        f"{warning('⚠️')} Failed to generate unique conversation_id after {MAX_CONVERSATION_ID_RETRIES} attempts | "
+        f"{key_value('original_id', original_conversation_id)} | "
+        f"{key_value('last_tried', current_conversation_id)}"
+    )
+    raise ConversationEventAlreadyExistsError(
+        f"Conversation event already exists and cannot generate unique ID after {MAX_CONVERSATION_ID_RETRIES} retries. "
+        f"Original conversation_id={original_conversation_id}"
+    )
+
+
+def _build_event_payload(
+    request: ConversationEventCreateRequest,
+    current_conversation_id: str,
+) -> Dict[str, Any]:
+    """Build the insert payload (transform API-format logs, default status/next_attempt_at)."""
+    original_conversation_id = request.conversation_id
+    # Nếu conversation_id đã thay đổi, cập nhật vào request
+    if current_conversation_id != original_conversation_id:
+        logger.info(
+            f"{success('✅')} Using modified conversation_id | "
+            f"{key_value('original', original_conversation_id)} | "
+            f"{key_value('final', current_conversation_id)}"
+        )
+        # Tạo request mới với conversation_id đã được modify
+        request_dict = request.model_dump()
+        request_dict["conversation_id"] = current_conversation_id
+        request = ConversationEventCreateRequest(**request_dict)
+
+    # Chỉ JSON-mode cho cột JSONB; datetime giữ nguyên object (asyncpg không nhận ISO string
+    # cho timestamptz), status -> string value
+    payload = request.model_dump(exclude=_JSON_LOG_FIELDS)
+    payload.update(request.model_dump(mode="json", include=_JSON_LOG_FIELDS))
+    payload["status"] = ConversationEventStatus(payload["status"]).value
+    payload.pop("duration_seconds", None)
+    
+    # Transform conversation_logs if in API format
+    raw_logs = payload.get("conversation_log") or []
+    
+    # Debug: Log raw logs trước khi transform
+    if raw_logs:
+        bot_count = sum(1 for item in raw_logs if "BOT" in str(item.get("character", "")).upper())
+        user_count = sum(1 for item in raw_logs if "USER" in str(item.get("character", "")).upper())
+        logger.info(
+            f"📥 {info('Raw conversation_logs received')} | "
+            f"{key_value('conversation_id', request.conversation_id)} | "
+            f"{key_value('total', str(len(raw_logs)))} | "
+            f"{key_value('BOT', str(bot_count))} | "
+            f"{key_value('USER', str(user_count))}"
+        )
+    
+    # Store raw data before transformation
+    if raw_logs and is_api_format(raw_logs):
+        logger.info(
+            f"🔄 Detected API format, transforming to standardized format | "
+            f"conversation_id={request.conversation_id}"
+        )
+        # Save raw format to raw_conversation_log
+        payload["raw_conversation_log"] = raw_logs
+        # Transform to standardized format
+        payload["conversation_log"] = transform_conversation_logs(
+            conversation_logs=raw_logs,
+            start_time=request.start_time,
+            end_time=request.end_time,
+        )
+    else:
+        # If already in standard format, keep as-is
+        payload["conversation_log"] = raw_logs
+        # If raw_conversation_log was provided, use it; otherwise set to None
+        if "raw_conversation_log" not in payload:
+            payload["raw_conversation_log"] = None
+    
+    # Features (turns, message counts, questions, length, hash) tính 1 lần khi log đang trong memory
+    payload.update(extract_conversation_features(payload["conversation_log"]).as_columns())
+    
+    payload["status"] = payload.get("status") or ConversationEventStatus.PENDING.value
+    payload["next_attempt_at"] = payload.get("next_attempt_at") or (
+        datetime.now(timezone.utc) + timedelta(hours=CONVERSATION_EVENT_RETRY_HOURS)
+    )
+    return payload
+
+
+def _prepare_retry_payload(
+    payload: Dict[str, Any],
+    original_conversation_id: str,
+    current_conversation_id: str,
+    exc: Exception,
+) -> None:
+    """IntegrityError (race condition) -> đổi payload sang conversation_id có suffix mới."""
+    failed_conversation_id = payload.get("conversation_id", current_conversation_id)
+    logger.warning(
+        f"{warning('⚠️')} IntegrityError detected (race condition) | "
+        f"{key_value('conversation_id', failed_conversation_id)} | "
+        f"{key_value('error', str(exc))}"
+    )
+    
+    # Retry một lần nữa với suffix mới
+    suffix = _generate_timestamp_suffix()
+    new_conversation_id = f"{original_conversation_id}{suffix}"
+    payload["conversation_id"] = new_conversation_id
+    
+    logger.info(
+        f"{info('🔄')} Retrying with new conversation_id after IntegrityError | "
+        f"{key_value('failed_id', failed_conversation_id)} | "
+        f"{key_value('new_id', new_conversation_id)}"
+    )
+
+
+def _duplicate_after_retry_error(
+    payload: Dict[str, Any],
+    original_conversation_id: str,
+) -> ConversationEventAlreadyExistsError:
+    new_conversation_id = payload["conversation_id"]
+    logger.error(
+        f"{error('❌')} Still duplicate after retry | "
+        f"{key_value('conversation_id', new_conversation_id)}"
+    )
+    return ConversationEventAlreadyExistsError(
+        f"Conversation event already exists for conversation_id={new_conversation_id} "
+        f"(original: {original_conversation_id})"
+    )
+
+
+def _outbox_factory(
+    trace_context: Optional[Dict[str, str]] = None,
+) -> Optional[Callable[[ConversationEvent], EventOutbox]]:
+    """Factory tạo outbox row cho event (OUTBOX_ENABLED); None -> endpoint publish trực tiếp."""
+    if not settings.OUTBOX_ENABLED:
+        return None
+
+    def factory(event: ConversationEvent) -> EventOutbox:
+        message = build_event_message(
+            event.id,
+            event.conversation_id,
+            event.user_id,
+            trace=trace_context,
+        )
+        return build_outbox_entry(event.conversation_id, RabbitMQConfig.QUEUE_NAME, message)
+
+    return factory
+
+
+def _log_stored(event, original_conversation_id: str) -> None:
+    logger.info(
+        f"{success('✅')} Conversation event stored | "
+        f"{key_value('conversation_id', event.conversation_id)} | "
+        f"{key_value('original_id', original_conversation_id if event.conversation_id != original_conversation_id else 'same')}"
+    )
+
+
 class ConversationEventService:
     """Orchestrates validation and persistence for conversation events."""
 
@@ -57,152 +250,45 @@ class ConversationEventService:
         self.db = db
         self.repository = ConversationEventRepository(db)
 
-    def create_event(self, request: ConversationEventCreateRequest) -> Dict[str, Any]:
+    def create_event(
+        self,
+        request: ConversationEventCreateRequest,
+        trace_context: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
         """
         Store a new conversation event.
         
         Nếu conversation_id đã tồn tại, tự động thêm suffix timestamp (_YYYYMMDD_HHMMSS)
-        và retry insert với conversation_id mới.
+        và retry insert với conversation_id mới. `trace_context` (W3C traceparent) được
+        đưa vào queue message khi ghi outbox.
 
         Raises:
             ConversationEventValidationError: If business validation fails.
         """
-        duration_seconds = int((request.end_time - request.start_time).total_seconds())
-        if duration_seconds <= 0:
-            raise ConversationEventValidationError("Conversation duration must be greater than 0 seconds")
+        _validate_duration(request)
 
         # Kiểm tra và xử lý duplicate conversation_id
         original_conversation_id = request.conversation_id
-        current_conversation_id = original_conversation_id
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            # Kiểm tra conversation_id đã tồn tại chưa
-            if self.repository.get_by_conversation_id(current_conversation_id):
-                retry_count += 1
-                if retry_count >= max_retries:
-                    # Nếu đã retry quá nhiều lần, log warning và raise error
-                    logger.warning(
-                        f"{warning('⚠️')} Failed to generate unique conversation_id after {max_retries} attempts | "
-                        f"{key_value('original_id', original_conversation_id)} | "
-                        f"{key_value('last_tried', current_conversation_id)}"
-                    )
-                    raise ConversationEventAlreadyExistsError(
-                        f"Conversation event already exists and cannot generate unique ID after {max_retries} retries. "
-                        f"Original conversation_id={original_conversation_id}"
-                    )
-                
-                # Generate suffix và append vào conversation_id
-                suffix = _generate_timestamp_suffix()
-                current_conversation_id = f"{original_conversation_id}{suffix}"
-                logger.info(
-                    f"{info('🔄')} Conversation_id already exists, generating new ID | "
-                    f"{key_value('original', original_conversation_id)} | "
-                    f"{key_value('new_id', current_conversation_id)} | "
-                    f"{key_value('retry', f'{retry_count}/{max_retries}')}"
-                )
-            else:
-                # conversation_id chưa tồn tại, có thể dùng
+        for current_conversation_id in _candidate_conversation_ids(original_conversation_id):
+            if not self.repository.exists(current_conversation_id):
                 break
-        
-        # Nếu conversation_id đã thay đổi, cập nhật vào request
-        if current_conversation_id != original_conversation_id:
-            logger.info(
-                f"{success('✅')} Using modified conversation_id | "
-                f"{key_value('original', original_conversation_id)} | "
-                f"{key_value('final', current_conversation_id)}"
-            )
-            # Tạo request mới với conversation_id đã được modify
-            request_dict = request.model_dump()
-            request_dict["conversation_id"] = current_conversation_id
-            request = ConversationEventCreateRequest(**request_dict)
-
-        payload = request.model_dump(mode="json")
-        payload.pop("duration_seconds", None)
-        
-        # Transform conversation_logs if in API format
-        raw_logs = payload.get("conversation_log") or []
-        
-        # Debug: Log raw logs trước khi transform
-        if raw_logs:
-            bot_count = sum(1 for item in raw_logs if "BOT" in str(item.get("character", "")).upper())
-            user_count = sum(1 for item in raw_logs if "USER" in str(item.get("character", "")).upper())
-            logger.info(
-                f"📥 {info('Raw conversation_logs received')} | "
-                f"{key_value('conversation_id', request.conversation_id)} | "
-                f"{key_value('total', str(len(raw_logs)))} | "
-                f"{key_value('BOT', str(bot_count))} | "
-                f"{key_value('USER', str(user_count))}"
-            )
-        
-        # Store raw data before transformation
-        if raw_logs and is_api_format(raw_logs):
-            logger.info(
-                f"🔄 Detected API format, transforming to standardized format | "
-                f"conversation_id={request.conversation_id}"
-            )
-            # Save raw format to raw_conversation_log
-            payload["raw_conversation_log"] = raw_logs
-            # Transform to standardized format
-            payload["conversation_log"] = transform_conversation_logs(
-                conversation_logs=raw_logs,
-                start_time=request.start_time,
-                end_time=request.end_time,
-            )
-        else:
-            # If already in standard format, keep as-is
-            payload["conversation_log"] = raw_logs
-            # If raw_conversation_log was provided, use it; otherwise set to None
-            if "raw_conversation_log" not in payload:
-                payload["raw_conversation_log"] = None
-        
-        payload["status"] = payload.get("status") or ConversationEventStatus.PENDING.value
-        payload["next_attempt_at"] = payload.get("next_attempt_at") or (
-            datetime.now(timezone.utc) + timedelta(hours=CONVERSATION_EVENT_RETRY_HOURS)
-        )
+
+        payload = _build_event_payload(request, current_conversation_id)
 
         try:
-            event = self.repository.create(payload)
+            event = self.repository.create(payload, _outbox_factory(trace_context))
         except IntegrityError as exc:
             # Nếu vẫn bị IntegrityError (race condition), thử lại với suffix mới
-            failed_conversation_id = payload.get("conversation_id", current_conversation_id)
-            logger.warning(
-                f"{warning('⚠️')} IntegrityError detected (race condition) | "
-                f"{key_value('conversation_id', failed_conversation_id)} | "
-                f"{key_value('error', str(exc))}"
-            )
-            
-            # Retry một lần nữa với suffix mới
-            suffix = _generate_timestamp_suffix()
-            new_conversation_id = f"{original_conversation_id}{suffix}"
-            payload["conversation_id"] = new_conversation_id
-            
-            logger.info(
-                f"{info('🔄')} Retrying with new conversation_id after IntegrityError | "
-                f"{key_value('failed_id', failed_conversation_id)} | "
-                f"{key_value('new_id', new_conversation_id)}"
-            )
-            
+            _prepare_retry_payload(payload, original_conversation_id, current_conversation_id, exc)
             try:
-                event = self.repository.create(payload)
+                event = self.repository.create(payload, _outbox_factory(trace_context))
             except IntegrityError as retry_exc:
-                logger.error(
-                    f"{error('❌')} Still duplicate after retry | "
-                    f"{key_value('conversation_id', new_conversation_id)}"
-                )
-                raise ConversationEventAlreadyExistsError(
-                    f"Conversation event already exists for conversation_id={new_conversation_id} "
-                    f"(original: {original_conversation_id})"
-                ) from retry_exc
+                raise _duplicate_after_retry_error(payload, original_conversation_id) from retry_exc
 
-        logger.info(
-            f"{success('✅')} Conversation event stored | "
-            f"{key_value('conversation_id', event.conversation_id)} | "
-            f"{key_value('original_id', original_conversation_id if event.conversation_id != original_conversation_id else 'same')}"
-        )
+        _log_stored(event, original_conversation_id)
 
         # NOTE: Immediate processing removed - events will be processed by RabbitMQ worker
+        # (OUTBOX_ENABLED: message đã nằm trong event_outbox, OutboxRelay sẽ publish)
         # Background scheduler will still retry failed events as fallback
 
         return self._serialize(event)
@@ -236,3 +322,38 @@ class ConversationEventService:
             "updated_at": event.updated_at,
         }
 
+
+
+class AsyncConversationEventService:
+    """Async (AsyncSession) variant of ConversationEventService for `async def` endpoints."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.repository = AsyncConversationEventRepository(db)
+
+    async def create_event(
+        self,
+        request: ConversationEventCreateRequest,
+        trace_context: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """Same behaviour as ConversationEventService.create_event, without blocking the event loop."""
+        _validate_duration(request)
+
+        original_conversation_id = request.conversation_id
+        for current_conversation_id in _candidate_conversation_ids(original_conversation_id):
+            if not await self.repository.exists(current_conversation_id):
+                break
+
+        payload = _build_event_payload(request, current_conversation_id)
+
+        try:
+            event = await self.repository.create(payload, _outbox_factory(trace_context))
+        except IntegrityError as exc:
+            _prepare_retry_payload(payload, original_conversation_id, current_conversation_id, exc)
+            try:
+                event = await self.repository.create(payload, _outbox_factory(trace_context))
+            except IntegrityError as retry_exc:
+                raise _duplicate_after_retry_error(payload, original_conversation_id) from retry_exc
+
+        _log_stored(event, original_conversation_id)
+        return ConversationEventService._serialize(event)
@@ -52,11 +52,16 @@ Calculation:
 
 ================================================================================
 """
-from typing import Dict, List, Any, Optional
+import asyncio
+from typing import Dict, List, Any, Optional, Tuple
 from app.utils.logger_setup import get_logger
 from app.utils.color_log import success, error, warning, info, key_value
 from app.core.exceptions_custom import InvalidScoreError, ConversationNotFoundError
-from app.services.utils.llm_analysis_utils import analyze_conversation_with_llm
+from app.utils.conversation_features import extract_conversation_features
+from app.services.utils.llm_analysis_utils import (
+    analyze_conversation_with_llm,
+    analyze_conversation_with_llm_async,
+)
 
 logger = get_logger(__name__)
 
@@ -140,57 +145,98 @@ class FriendshipScoreCalculationService:
                     f"Conversation not found: {conversation_id}"
                 )
             
-            # Step 2: Extract conversation log and metadata
-            conversation_log = conversation_data.get("conversation_log", [])
-            metadata = conversation_data.get("metadata", {})
-            # Add conversation_id and user_id to metadata for LLM/Memory API tracking
-            metadata["conversation_id"] = conversation_id
-            if "user_id" not in metadata:
-                metadata["user_id"] = conversation_data.get("user_id")
-            # Add bot_type to metadata for Memory API skip logic
-            bot_type = conversation_data.get("bot_type")
-            if bot_type:
-                metadata["bot_type"] = bot_type
-                logger.info(
-                    f"🔍 bot_type extracted from conversation_data | "
-                    f"bot_type={bot_type} | "
-                    f"conversation_id={conversation_id}"
-                )
-            else:
-                logger.warning(
-                    f"⚠️  bot_type not found in conversation_data | "
-                    f"conversation_id={conversation_id} | "
-                    f"available_keys={list(conversation_data.keys())}"
-                )
+            return self.calculate_score_from_conversation_data(conversation_id, conversation_data)
+            
+        except (ConversationNotFoundError, InvalidScoreError):
+            raise
+        except Exception as e:
+            logger.error(
+                f"Error calculating friendship score for conversation_id: {conversation_id}, "
+                f"error: {str(e)}"
+            )
+            raise InvalidScoreError(
+                f"Failed to calculate friendship score: {str(e)}"
+            ) from e
+    
+    def calculate_score_from_conversation_data(
+        self,
+        conversation_id: str,
+        conversation_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Calculate friendship score change from already-fetched conversation data.
+        
+        Same result shape as calculate_score_from_conversation_id.
+        """
+        try:
+            conversation_log, metadata = self._prepare_conversation(conversation_id, conversation_data)
             
             # Step 3: Calculate score change (this will update metadata with LLM results)
             score_change, updated_metadata = self.calculate_friendship_score_change(
                 conversation_log=conversation_log,
                 metadata=metadata
             )
-            
-            # Step 4: Get calculation breakdown using updated metadata (with LLM results)
-            calculation_details = self._get_calculation_breakdown(
+            return self._build_result(
+                conversation_id, conversation_data, conversation_log, score_change, updated_metadata
+            )
+        except Exception as e:
+            logger.error(
+                f"Error calculating friendship score for conversation_id: {conversation_id}, "
+                f"error: {str(e)}"
+            )
+            raise InvalidScoreError(
+                f"Failed to calculate friendship score: {str(e)}"
+            ) from e
+    
+    async def calculate_score_from_conversation_id_async(
+        self,
+        conversation_id: str
+    ) -> Dict[str, Any]:
+        """
+        Async version of calculate_score_from_conversation_id.
+        
+        Fetching is a sync DB read, run in a worker thread so the event loop is never
+        blocked; the 2 LLM calls and the Memory API call are awaited concurrently on
+        pooled async clients.
+        """
+        if not self.conversation_fetch_service:
+            raise InvalidScoreError(
+                "Conversation fetch service not initialized. "
+                "Cannot fetch conversation data."
+            )
+        
+        try:
+            logger.info(f"Calculating friendship score (async) for conversation_id: {conversation_id}")
+            conversation_data = await asyncio.to_thread(
+                self.conversation_fetch_service.fetch_by_id, conversation_id
+            )
+        except Exception as e:
+            raise InvalidScoreError(
+                f"Failed to calculate friendship score: {str(e)}"
+            ) from e
+        
+        if not conversation_data:
+            raise ConversationNotFoundError(
+                f"Conversation not found: {conversation_id}"
+            )
+        
+        return await self.calculate_score_from_conversation_data_async(conversation_id, conversation_data)
+    
+    async def calculate_score_from_conversation_data_async(
+        self,
+        conversation_id: str,
+        conversation_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Async version of calculate_score_from_conversation_data."""
+        try:
+            conversation_log, metadata = self._prepare_conversation(conversation_id, conversation_data)
+            score_change, updated_metadata = await self.calculate_friendship_score_change_async(
                 conversation_log=conversation_log,
-                metadata=updated_metadata
+                metadata=metadata
             )
-            
-            result = {
-                "friendship_score_change": score_change,
-                "conversation_id": conversation_id,
-                "user_id": conversation_data.get("user_id"),
-                "calculation_details": calculation_details
-            }
-            
-            logger.info(
-                f"Score calculation completed for conversation_id: {conversation_id}, "
-                f"score_change: {score_change}"
+            return self._build_result(
+                conversation_id, conversation_data, conversation_log, score_change, updated_metadata
             )
-            
-            return result
-            
-        except ConversationNotFoundError:
-            raise
         except Exception as e:
             logger.error(
                 f"Error calculating friendship score for conversation_id: {conversation_id}, "
@@ -200,6 +246,67 @@ class FriendshipScoreCalculationService:
                 f"Failed to calculate friendship score: {str(e)}"
             ) from e
     
+    def _prepare_conversation(
+        self,
+        conversation_id: str,
+        conversation_data: Dict[str, Any]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Step 2: Extract conversation log and metadata (with ids + bot_type for LLM/Memory API)."""
+        conversation_log = conversation_data.get("conversation_log", [])
+        metadata = dict(conversation_data.get("metadata") or {})
+        # Add conversation_id and user_id to metadata for LLM/Memory API tracking
+        metadata["conversation_id"] = conversation_id
+        if "user_id" not in metadata:
+            metadata["user_id"] = conversation_data.get("user_id")
+        # Add bot_type to metadata for Memory API skip logic
+        # Ingest-time features (conversation_events columns) -> không phải duyệt lại log
+        features = conversation_data.get("features")
+        if features:
+            metadata["conversation_features"] = features
+        bot_type = conversation_data.get("bot_type")
+        if bot_type:
+            metadata["bot_type"] = bot_type
+            logger.info(
+                f"🔍 bot_type extracted from conversation_data | "
+                f"bot_type={bot_type} | "
+                f"conversation_id={conversation_id}"
+            )
+        else:
+            logger.warning(
+                f"⚠️  bot_type not found in conversation_data | "
+                f"conversation_id={conversation_id} | "
+                f"available_keys={list(conversation_data.keys())}"
+            )
+        return conversation_log, metadata
+    
+    def _build_result(
+        self,
+        conversation_id: str,
+        conversation_data: Dict[str, Any],
+        conversation_log: List[Dict[str, Any]],
+        score_change: float,
+        updated_metadata: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Step 4: Get calculation breakdown using updated metadata (with LLM results)."""
+        calculation_details = self._get_calculation_breakdown(
+            conversation_log=conversation_log,
+            metadata=updated_metadata
+        )
+        
+        result = {
+            "friendship_score_change": score_change,
+            "conversation_id": conversation_id,
+            "user_id": conversation_data.get("user_id"),
+            "calculation_details": calculation_details
+        }
+        
+        logger.info(
+            f"Score calculation completed for conversation_id: {conversation_id}, "
+            f"score_change: {score_change}"
+        )
+        
+        return result
+    
     def calculate_friendship_score_change(
         self,
         conversation_log: List[Dict[str, Any]],
@@ -225,101 +332,137 @@ class FriendshipScoreCalculationService:
             - updated_metadata: Metadata with LLM analysis results merged
         """
         try:
-            # Extract metrics
-            # 1 turn = 1 cặp trao đổi (pika + user)
-            # Đếm số cặp thực sự trong conversation_log
-            total_turns = self._count_complete_turns(conversation_log)
-            
-            # Use LLM analysis if metadata is incomplete
-            has_complete_metadata = self._has_complete_metadata(metadata)
-            logger.debug(
-                f"🔍 Metadata check | "
-                f"has_user_questions={'user_initiated_questions' in metadata} | "
-                f"has_emotion={'emotion' in metadata or 'session_emotion' in metadata} | "
-                f"complete={has_complete_metadata}"
-            )
-            
-            if not has_complete_metadata:
-                logger.info("📊 Metadata incomplete, using parallel analysis (2 LLMs + 1 Memory API)")
+            if self._needs_llm_analysis(metadata):
                 # Get conversation_id and user_id from metadata if available (for tracking)
-                conversation_id = metadata.get("conversation_id")
-                user_id = metadata.get("user_id")
-                bot_type = metadata.get("bot_type")  # ADDED: Get bot_type for Memory API skip logic
                 llm_analysis = analyze_conversation_with_llm(
                     conversation_log=conversation_log,
-                    conversation_id=conversation_id,
-                    user_id=user_id,
-                    bot_type=bot_type  # ADDED: Pass bot_type to skip Memory API if needed
-                )
-                # Mark as LLM analyzed to avoid re-running
-                llm_analysis["_llm_analyzed"] = True
-                # Merge LLM results into metadata (LLM takes precedence)
-                metadata = {**metadata, **llm_analysis}
-                logger.info(
-                    f"✅ LLM analysis completed | "
-                    f"user_initiated_questions={llm_analysis.get('user_initiated_questions')} | "
-                    f"session_emotion={llm_analysis.get('session_emotion')}"
+                    conversation_id=metadata.get("conversation_id"),
+                    user_id=metadata.get("user_id"),
+                    bot_type=metadata.get("bot_type")  # Pass bot_type to skip Memory API if needed
                 )
-            else:
-                logger.debug("✅ Metadata complete, skipping LLM analysis")
-            
-            user_initiated_questions = self._count_user_initiated_questions(
-                conversation_log, metadata
-            )
-            # Priority: session_emotion from LLM > emotion from metadata > default
-            session_emotion = metadata.get("session_emotion", metadata.get("emotion", "neutral"))
-            new_memories_count = metadata.get("new_memories_count", metadata.get("new_memories_created", 0))
-            
-            # Calculate components
-            base_score = self._calculate_base_score(total_turns)
-            engagement_bonus = self._calculate_engagement_bonus(user_initiated_questions)
-            emotion_bonus = self._calculate_emotion_bonus(session_emotion)
-            memory_bonus = self._calculate_memory_bonus(new_memories_count)
-            
-            # Log calculation breakdown
-            logger.info(
-                f"📊 {info('Score Calculation Breakdown')} | "
-                f"{key_value('total_turns', str(total_turns))} | "
-                f"{key_value('user_questions', str(user_initiated_questions))} | "
-                f"{key_value('emotion', session_emotion)} | "
-                f"{key_value('memories', str(new_memories_count))}"
-            )
-            logger.info(
-                f"💰 {info('Score Components')} | "
-                f"{key_value('base_score', f'{base_score:.1f}')} | "
-                f"{key_value('engagement_bonus', f'{engagement_bonus:.1f}')} | "
-                f"{key_value('emotion_bonus', f'{emotion_bonus:.1f}')} | "
-                f"{key_value('memory_bonus', f'{memory_bonus:.1f}')}"
-            )
+                metadata = self._merge_llm_analysis(metadata, llm_analysis)
             
-            # Combine all components
-            friendship_score_change = (
-                base_score + 
-                engagement_bonus + 
-                emotion_bonus + 
-                memory_bonus
-            )
-            
-            # Ensure non-negative result
-            final_score = max(0.0, friendship_score_change)
+            return self._compute_score(conversation_log, metadata), metadata
             
-            if final_score == 0.0:
-                logger.warning(
-                    f"{warning('⚠️  Final score = 0.0')} | "
-                    f"Check: {key_value('total_turns', str(total_turns))}, "
-                    f"{key_value('user_questions', str(user_initiated_questions))}, "
-                    f"{key_value('emotion', session_emotion)}, "
-                    f"{key_value('memories', str(new_memories_count))}"
+        except Exception as e:
+            logger.error(f"Error in score calculation: {str(e)}")
+            # Return 0.0 and original metadata on error
+            return 0.0, metadata
+    
+    async def calculate_friendship_score_change_async(
+        self,
+        conversation_log: List[Dict[str, Any]],
+        metadata: Dict[str, Any]
+    ) -> tuple[float, Dict[str, Any]]:
+        """Async version of calculate_friendship_score_change (awaits the 3 analyses)."""
+        try:
+            if self._needs_llm_analysis(metadata):
+                llm_analysis = await analyze_conversation_with_llm_async(
+                    conversation_log=conversation_log,
+                    conversation_id=metadata.get("conversation_id"),
+                    user_id=metadata.get("user_id"),
+                    bot_type=metadata.get("bot_type")
                 )
+                metadata = self._merge_llm_analysis(metadata, llm_analysis)
             
-            # Return both score and updated metadata (with LLM results)
-            return final_score, metadata
+            return self._compute_score(conversation_log, metadata), metadata
             
         except Exception as e:
             logger.error(f"Error in score calculation: {str(e)}")
-            # Return 0.0 and original metadata on error
             return 0.0, metadata
     
+    def _needs_llm_analysis(self, metadata: Dict[str, Any]) -> bool:
+        """Use LLM analysis if metadata is incomplete."""
+        has_complete_metadata = self._has_complete_metadata(metadata)
+        logger.debug(
+            f"🔍 Metadata check | "
+            f"has_user_questions={'user_initiated_questions' in metadata} | "
+            f"has_emotion={'emotion' in metadata or 'session_emotion' in metadata} | "
+            f"complete={has_complete_metadata}"
+        )
+        if has_complete_metadata:
+            logger.debug("✅ Metadata complete, skipping LLM analysis")
+            return False
+        logger.info("📊 Metadata incomplete, using parallel analysis (2 LLMs + 1 Memory API)")
+        return True
+    
+    def _merge_llm_analysis(
+        self,
+        metadata: Dict[str, Any],
+        llm_analysis: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Merge LLM results into metadata (LLM takes precedence)."""
+        # Mark as LLM analyzed to avoid re-running
+        llm_analysis["_llm_analyzed"] = True
+        logger.info(
+            f"✅ LLM analysis completed | "
+            f"user_initiated_questions={llm_analysis.get('user_initiated_questions')} | "
+            f"session_emotion={llm_analysis.get('session_emotion')}"
+        )
+        return {**metadata, **llm_analysis}
+    
+    def _compute_score(
+        self,
+        conversation_log: List[Dict[str, Any]],
+        metadata: Dict[str, Any]
+    ) -> float:
+        """Apply the scoring formula to the (analyzed) metadata."""
+        # Extract metrics
+        # 1 turn = 1 cặp trao đổi (pika + user)
+        # Đếm số cặp thực sự trong conversation_log
+        total_turns = self._total_turns(conversation_log, metadata)
+        
+        user_initiated_questions = self._count_user_initiated_questions(
+            conversation_log, metadata
+        )
+        # Priority: session_emotion from LLM > emotion from metadata > default
+        session_emotion = metadata.get("session_emotion", metadata.get("emotion", "neutral"))
+        new_memories_count = metadata.get("new_memories_count", metadata.get("new_memories_created", 0))
+        
+        # Calculate components
+        base_score = self._calculate_base_score(total_turns)
+        engagement_bonus = self._calculate_engagement_bonus(user_initiated_questions)
+        emotion_bonus = self._calculate_emotion_bonus(session_emotion)
+        memory_bonus = self._calculate_memory_bonus(new_memories_count)
+        
+        # Log calculation breakdown
+        logger.info(
+            f"📊 {info('Score Calculation Breakdown')} | "
+            f"{key_value('total_turns', str(total_turns))} | "
+            f"{key_value('user_questions', str(user_initiated_questions))} | "
+            f"{key_value('emotion', session_emotion)} | "
+            f"{key_value('memories', str(new_memories_count))}"
+        )
+        logger.info(
+            f"💰 {info('Score Components')} | "
+            f"{key_value('base_score', f'{base_score:.1f}')} | "
+            f"{key_value('engagement_bonus', f'{engagement_bonus:.1f}')} | "
+            f"{key_value('emotion_bonus', f'{emotion_bonus:.1f}')} | "
+            f"{key_value('memory_bonus', f'{memory_bonus:.1f}')}"
+        )
+        
+        # Combine all components
+        friendship_score_change = (
+            base_score + 
+            engagement_bonus + 
+            emotion_bonus + 
+            memory_bonus
+        )
+        
+        # Ensure non-negative result
+        final_score = max(0.0, friendship_score_change)
+        
+        if final_score == 0.0:
+            logger.warning(
+                f"{warning('⚠️  Final score = 0.0')} | "
+                f"Check: {key_value('total_turns', str(total_turns))}, "
+                f"{key_value('user_questions', str(user_initiated_questions))}, "
+                f"{key_value('emotion', session_emotion)}, "
+                f"{key_value('memories', str(new_memories_count))}"
+            )
+        
+        return final_score
+    
     def _calculate_base_score(self, total_turns: int) -> float:
         """Calculate base score from total turns."""
         return float(total_turns) * self.BASE_SCORE_PER_TURN
@@ -336,14 +479,18 @@ class FriendshipScoreCalculationService:
         """Calculate memory bonus from new memories count."""
         return float(new_memories_count) * self.MEMORY_BONUS_PER_MEMORY
     
+    def _total_turns(self, conversation_log: List[Dict[str, Any]], metadata: Dict[str, Any]) -> int:
+        """Turns từ ingest-time features nếu có, fallback đếm từ conversation_log."""
+        features = metadata.get("conversation_features") or {}
+        if features.get("total_turns") is not None:
+            return int(features["total_turns"])
+        return self._count_complete_turns(conversation_log)
+    
     def _count_complete_turns(self, conversation_log: List[Dict[str, Any]]) -> int:
         """
         Đếm số turn hoàn chỉnh (1 turn = 1 cặp pika + user).
         
-        Logic:
-        - Duyệt conversation_log theo thứ tự
-        - Đếm số cặp liên tiếp (pika, user) hoặc (user, pika)
-        - Bỏ qua các messages đơn lẻ không tạo thành cặp
+        Dùng chung extractor với lúc ingest (app.utils.conversation_features).
         
         Args:
             conversation_log: List of conversation messages
@@ -355,35 +502,15 @@ class FriendshipScoreCalculationService:
             logger.warning("⚠️  Empty conversation_log, total_turns = 0")
             return 0
         
-        # Debug: Đếm số messages theo speaker
-        pika_count = sum(1 for msg in conversation_log if msg.get("speaker", "").lower() == "pika")
-        user_count = sum(1 for msg in conversation_log if msg.get("speaker", "").lower() == "user")
+        features = extract_conversation_features(conversation_log)
+        turns = features.total_turns
         
-        logger.debug(
-            f"📊 Counting turns | total_messages={len(conversation_log)} | "
-            f"pika={pika_count} | user={user_count}"
-        )
-        
-        turns = 0
-        i = 0
-        while i < len(conversation_log) - 1:
-            current_speaker = conversation_log[i].get("speaker", "").lower()
-            next_speaker = conversation_log[i + 1].get("speaker", "").lower()
-            
-            # Kiểm tra nếu là cặp (pika, user) hoặc (user, pika)
-            if (current_speaker == "pika" and next_speaker == "user") or \
-               (current_speaker == "user" and next_speaker == "pika"):
-                turns += 1
-                i += 2  # Bỏ qua cả 2 messages trong cặp
-            else:
-                i += 1  # Chỉ bỏ qua message hiện tại
-        
-        if turns == 0 and len(conversation_log) > 0:
+        if turns == 0:
             logger.warning(
                 f"{warning('⚠️  No complete turns found!')} | "
                 f"{key_value('total_messages', str(len(conversation_log)))} | "
-                f"{key_value('pika', str(pika_count))} | "
-                f"{key_value('user', str(user_count))} | "
+                f"{key_value('pika', str(features.pika_message_count))} | "
+                f"{key_value('user', str(features.user_message_count))} | "
                 f"Reason: Conversation log chỉ có messages từ 1 speaker (không có cặp trao đổi)"
             )
         
@@ -406,7 +533,10 @@ class FriendshipScoreCalculationService:
         if "user_initiated_questions" in metadata:
             return int(metadata["user_initiated_questions"])
         
-        # Fallback: count user messages
+        # Fallback: count user messages (ingest-time feature nếu có)
+        features = metadata.get("conversation_features") or {}
+        if features.get("user_message_count") is not None:
+            return int(features["user_message_count"])
         user_messages = sum(
             1 for msg in conversation_log 
             if msg.get("speaker", "").lower() == "user"
@@ -479,7 +609,7 @@ class FriendshipScoreCalculationService:
             Dictionary with calculation components
         """
         # 1 turn = 1 cặp trao đổi (pika + user)
-        total_turns = self._count_complete_turns(conversation_log)
+        total_turns = self._total_turns(conversation_log, metadata)
         user_initiated_questions = self._count_user_initiated_questions(conversation_log, metadata)
         # Priority: session_emotion from LLM > emotion from metadata > default
         session_emotion = metadata.get("session_emotion", metadata.get("emotion", "neutral"))
@@ -494,12 +624,16 @@ class FriendshipScoreCalculationService:
         # Ensure non-negative
         total_exchange_score = max(0.0, total_exchange_score)
         
-        return {
+        breakdown = {
             "total_turns": total_turns,
             "session_emotion": session_emotion,
             "user_initiated_questions": user_initiated_questions,
             "new_memories_count": new_memories_count,
             "total_exchange_score": total_exchange_score
         }
+        # LLM mode + token usage/latency (để so sánh separate vs combined)
+        if metadata.get("llm_usage"):
+            breakdown["llm_usage"] = metadata["llm_usage"]
+        return breakdown
 
 
@@ -1,10 +1,15 @@
 """
 Service for updating friendship status in database.
 """
+import asyncio
 from typing import Dict, Any
 from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.repositories.async_friendship_status_repository import AsyncFriendshipStatusRepository
 from app.repositories.friendship_status_repository import FriendshipStatusRepository
+from app.cache.candidates_cache_manager import invalidate_candidates_cache
+from app.core.config_settings import settings
 from app.core.exceptions_custom import FriendshipNotFoundError
 
 
@@ -15,13 +20,21 @@ class FriendshipStatusUpdateService:
         self.db = db
         self.repository = FriendshipStatusRepository(db)
 
-    def apply_score_change(self, user_id: str, score_change: float) -> Dict[str, Any]:
-        """Apply score change and return serialized record."""
+    def apply_score_change(self, user_id: str, score_change: float, commit: bool = True) -> Dict[str, Any]:
+        """
+        Apply score change and return serialized record.
+
+        `commit=False`: không commit và không invalidate cache; caller gọi
+        `invalidate_candidates()` sau khi commit.
+        """
         status = self.repository.apply_score_change(
             user_id=user_id,
             score_change=score_change,
             last_interaction_date=datetime.utcnow(),
+            commit=commit,
         )
+        if commit:
+            self._invalidate_candidates(user_id)
         return self._serialize(status)
 
     def get_status(self, user_id: str) -> Dict[str, Any]:
@@ -94,7 +107,45 @@ class FriendshipStatusUpdateService:
             bot_id=bot_id,
             turns_change=turns_change
         )
+        self._invalidate_candidates(user_id)
         return updated_topic
+
+    def apply_topic_update(
+        self,
+        user_id: str,
+        topic_id: str,
+        score_change: float,
+        bot_id: str,
+        turns_change: int = 1,
+        commit: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Cập nhật 1 topic + friendship score/level (1 câu UPDATE) và trả về status mới.
+
+        Không cần get_status() sau khi gọi. `commit=False` như `apply_score_change()`.
+        """
+        status = self.repository.apply_topic_update(
+            user_id=user_id,
+            topic_id=topic_id,
+            score_change=score_change,
+            bot_id=bot_id,
+            turns_change=turns_change,
+            commit=commit,
+        )
+        if commit:
+            self._invalidate_candidates(user_id)
+        return self._serialize(status)
+
+    def invalidate_candidates(self, user_ids) -> None:
+        """Invalidate cached suggestions for many users (bulk path, sau khi commit batch)."""
+        for user_id in user_ids:
+            self._invalidate_candidates(user_id)
+
+    @staticmethod
+    def _invalidate_candidates(user_id: str) -> None:
+        """Status đã commit -> cached suggestions của user không còn đúng."""
+        if settings.CACHE_ENABLED and settings.CANDIDATES_CACHE_ENABLED:
+            invalidate_candidates_cache(user_id)
     
     @staticmethod
     def _serialize(status) -> Dict[str, Any]:
@@ -108,3 +159,26 @@ class FriendshipStatusUpdateService:
             "topic_metrics": status.topic_metrics or {},
         }
 
+
+
+class AsyncFriendshipStatusUpdateService:
+    """Async (AsyncSession) variant used by `async def` endpoints."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.repository = AsyncFriendshipStatusRepository(db)
+
+    async def apply_score_change(self, user_id: str, score_change: float) -> Dict[str, Any]:
+        """Apply score change and return serialized record."""
+        status = await self.repository.apply_score_change(
+            user_id=user_id,
+            score_change=score_change,
+            last_interaction_date=datetime.utcnow(),
+        )
+        await asyncio.to_thread(FriendshipStatusUpdateService._invalidate_candidates, user_id)
+        return FriendshipStatusUpdateService._serialize(status)
+
+    async def get_status(self, user_id: str) -> Dict[str, Any]:
+        """Get friendship status for user (auto-create default record)."""
+        status = await self.repository.get_or_create(user_id)
+        return FriendshipStatusUpdateService._serialize(status)
@@ -10,31 +10,233 @@ Functions:
 - extract_memories_from_api: Extract memories using Mem0 API
 - format_conversation_for_llm: Format conversation log for LLM input
 - format_conversation_for_memory_api: Format conversation log for Memory API
+
+Async variants (AsyncLLMAnalysisClient, extract_memories_from_api_async,
+analyze_conversation_with_llm_async) share prompts/parsing with the sync path and
+reuse pooled clients (one AsyncGroq + one httpx.AsyncClient per event loop), so a
+single event loop can keep many conversations in flight.
 """
+import asyncio
+import contextvars
 import json
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
 from typing import Dict, List, Any, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import httpx
-from groq import Groq
+from groq import AsyncGroq, Groq
 from langfuse import Langfuse, observe
 from app.core.config_settings import settings
-from app.utils.logger_setup import get_logger
+from app.utils.logger_setup import get_logger, payload, should_log_payload
+from app.utils.metrics_registry import observe_stage
+from app.utils.tracing import inject_headers, langfuse_trace_kwargs
 from app.core.exceptions_custom import InvalidScoreError
+from app.cache.llm_analysis_cache_manager import (
+    LLMAnalysisCacheManager,
+    build_analysis_cache_key,
+    get_llm_analysis_cache,
+    llm_analysis_cache_stats,
+)
 
 logger = get_logger(__name__)
 
 # Valid emotions for session emotion analysis
 VALID_EMOTIONS = ["interesting", "boring", "neutral", "angry", "happy", "sad"]
 
+# Analysis modes (settings.LLM_ANALYSIS_MODE)
+ANALYSIS_MODE_SEPARATE = "separate"  # 2 completions: user_initiated_questions + session_emotion
+ANALYSIS_MODE_COMBINED = "combined"  # 1 structured-JSON completion trả về cả 2 metric
+
+
+USER_QUESTIONS_SYSTEM_PROMPT = (
+    "You are an engagement analyst. Count how many times the USER actively asked a question."
+)
+SESSION_EMOTION_SYSTEM_PROMPT = (
+    "You are an emotion analyst. Determine the overall emotion of the conversation session."
+)
+
+
+def build_user_questions_prompt(formatted_conversation: str) -> str:
+    """User prompt for the user_initiated_questions analysis."""
+    return f"""
+Conversation:
+{formatted_conversation}
+
+Return JSON:
+{{
+    "user_initiated_questions": <integer count of questions the USER initiated (>=0)>
+}}
+
+Rules:
+- Only count USER messages that introduce a question (end with '?' or interrogative structure)
+- Do not count answers to Pika's questions
+- If unsure, err on the side of under-counting
+- Count only questions that the USER initiated, not responses to Pika's questions
+"""
+
+
+def build_session_emotion_prompt(formatted_conversation: str) -> str:
+    """User prompt for the session_emotion analysis."""
+    return f"""
+Conversation:
+{formatted_conversation}
+
+Return JSON:
+{{
+    "session_emotion": "<one of: interesting, boring, neutral, angry, happy, sad>"
+}}
+
+Rules:
+- Consider the overall tone/feeling of the entire session
+- Choose exactly one value from the allowed list
+- 'interesting': User is engaged, asking questions, showing curiosity
+- 'boring': User seems disinterested, giving short responses, not engaging
+- 'neutral': Standard conversation, no strong emotion
+- 'angry': User shows frustration, negative tone, complaints
+- 'happy': User shows positive emotion, excitement, joy
+- 'sad': User shows sadness, disappointment, negative feelings
+"""
+
+
+COMBINED_SYSTEM_PROMPT = (
+    "You are an engagement and emotion analyst. Count how many times the USER actively asked "
+    "a question and determine the overall emotion of the conversation session. "
+    "Respond with a single JSON object only."
+)
+
+
+def build_combined_prompt(formatted_conversation: str) -> str:
+    """User prompt for the combined analysis (both metrics in one completion)."""
+    return f"""
+Conversation:
+{formatted_conversation}
+
+Return JSON:
+{{
+    "user_initiated_questions": <integer count of questions the USER initiated (>=0)>,
+    "session_emotion": "<one of: interesting, boring, neutral, angry, happy, sad>"
+}}
+
+Rules for user_initiated_questions:
+- Only count USER messages that introduce a question (end with '?' or interrogative structure)
+- Do not count answers to Pika's questions
+- If unsure, err on the side of under-counting
+
+Rules for session_emotion:
+- Consider the overall tone/feeling of the entire session
+- Choose exactly one value from the allowed list
+- 'interesting': User is engaged, asking questions, showing curiosity
+- 'boring': User seems disinterested, giving short responses, not engaging
+- 'neutral': Standard conversation, no strong emotion
+- 'angry': User shows frustration, negative tone, complaints
+- 'happy': User shows positive emotion, excitement, joy
+- 'sad': User shows sadness, disappointment, negative feelings
+"""
+
+
+def get_analysis_mode() -> str:
+    """Return configured LLM analysis mode (unknown values fall back to 'separate')."""
+    mode = (settings.LLM_ANALYSIS_MODE or ANALYSIS_MODE_SEPARATE).strip().lower()
+    if mode not in (ANALYSIS_MODE_SEPARATE, ANALYSIS_MODE_COMBINED):
+        logger.warning(f"⚠️  Unknown LLM_ANALYSIS_MODE '{mode}', using '{ANALYSIS_MODE_SEPARATE}'")
+        return ANALYSIS_MODE_SEPARATE
+    return mode
 
-class LLMAnalysisClient:
+
+def _interpret_user_questions(data: Dict[str, Any]) -> int:
+    """Extract user_initiated_questions (>= 0) from parsed LLM JSON."""
+    logger.info(f"🔍 LLM 'user_initiated_questions' PARSED JSON: {data}")
+    try:
+        result = max(0, int(data.get("user_initiated_questions", 0)))
+    except (TypeError, ValueError):
+        logger.warning(
+            f"⚠️  Invalid user_initiated_questions '{data.get('user_initiated_questions')}', defaulting to 0"
+        )
+        result = 0
+    logger.info(f"✅ LLM user_initiated_questions: {result}")
+    return result
+
+
+def _interpret_session_emotion(data: Dict[str, Any]) -> str:
+    """Extract and validate session_emotion from parsed LLM JSON."""
+    logger.info(f"🔍 LLM 'session_emotion' PARSED JSON: {data}")
+    emotion = str(data.get("session_emotion", "neutral")).lower()
+
+    # Validate emotion
+    if emotion not in VALID_EMOTIONS:
+        logger.warning(f"⚠️  Invalid session_emotion '{emotion}', defaulting to 'neutral'")
+        emotion = "neutral"
+
+    logger.info(f"✅ LLM session_emotion: {emotion}")
+    return emotion
+
+
+def _interpret_combined(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract both metrics from one parsed JSON (same validation as the separate calls)."""
+    return {
+        "user_initiated_questions": _interpret_user_questions(data),
+        "session_emotion": _interpret_session_emotion(data),
+    }
+
+
+def summarize_llm_usage(usage_entries: List[Dict[str, Any]], mode: str) -> Dict[str, Any]:
     """
-    Client for LLM analysis using Groq with Langfuse observability.
+    Aggregate per-call usage into one record (stored in score_calculation_details for A/B).
     
-    This class handles:
-    - Groq client initialization
-    - Langfuse observability setup
-    - LLM prompt execution with error handling
+    Calls run in parallel, so latency_ms is the slowest call, not the sum.
+    """
+    return {
+        "mode": mode,
+        "calls": len(usage_entries),
+        "prompt_tokens": sum(entry.get("prompt_tokens") or 0 for entry in usage_entries),
+        "completion_tokens": sum(entry.get("completion_tokens") or 0 for entry in usage_entries),
+        "total_tokens": sum(entry.get("total_tokens") or 0 for entry in usage_entries),
+        "latency_ms": max((entry.get("latency_ms") or 0 for entry in usage_entries), default=0),
+    }
+
+
+def parse_llm_json_response(response_text: str) -> Dict[str, Any]:
+    """
+    Parse JSON response from LLM.
+    
+    Args:
+        response_text: Raw response text from LLM
+        
+    Returns:
+        Parsed JSON dictionary (empty dict if parsing fails)
+    """
+    try:
+        # Try to extract JSON from response (in case LLM adds extra text)
+        # Look for JSON object in the response
+        start_idx = response_text.find('{')
+        end_idx = response_text.rfind('}') + 1
+        
+        if start_idx >= 0 and end_idx > start_idx:
+            json_text = response_text[start_idx:end_idx]
+            logger.debug(f"📦 Extracted JSON text: {json_text}")
+            parsed = json.loads(json_text)
+            logger.debug(f"✅ Successfully parsed JSON: {parsed}")
+            return parsed
+        else:
+            # Try parsing entire response
+            logger.debug(f"📦 Attempting to parse entire response as JSON")
+            parsed = json.loads(response_text)
+            logger.debug(f"✅ Successfully parsed JSON: {parsed}")
+            return parsed
+    except json.JSONDecodeError as e:
+        logger.error(f"❌ Failed to parse LLM response as JSON: {e}")
+        logger.error(f"   Full response text: {response_text}")
+        logger.error(f"   Response length: {len(response_text)} chars")
+        return {}
+
+
+class _BaseLLMAnalysisClient(ABC):
+    """
+    Shared setup for the sync and async LLM analysis clients.
+    
+    Subclasses only provide the Groq client (`_create_client`) and the way it is invoked.
     """
     
     def __init__(self):
@@ -55,10 +257,10 @@ class LLMAnalysisClient:
             self.langfuse = None
         
         # Initialize Groq client
+        self.model = settings.GROQ_MODEL or "openai/gpt-oss-20b"
         if settings.GROQ_API_KEY:
             try:
-                self.client = Groq(api_key=settings.GROQ_API_KEY)
-                self.model = settings.GROQ_MODEL or "openai/gpt-oss-20b"
+                self.client = self._create_client()
                 self.enabled = settings.LLM_ANALYSIS_ENABLED
                 logger.info(f"✅ Groq client initialized | model={self.model} | enabled={self.enabled}")
             except Exception as e:
@@ -70,15 +272,116 @@ class LLMAnalysisClient:
             self.enabled = False
             logger.warning("⚠️  GROQ_API_KEY not provided. LLM analysis will be disabled.")
     
+    @abstractmethod
+    def _create_client(self):
+        """Build the Groq client (sync or async)."""
+    
     def is_enabled(self) -> bool:
         """Check if LLM analysis is enabled and client is available."""
         return self.enabled and self.client is not None
     
+    def _completion_kwargs(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        json_mode: bool = False
+    ) -> Dict[str, Any]:
+        """Request parameters shared by sync and async calls."""
+        kwargs = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 10000,  # Groq uses max_tokens, not max_completion_tokens
+            "top_p": 1,
+            "stream": False,
+        }
+        if json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+        return kwargs
+    
+    def _log_invoke_start(
+        self,
+        system_prompt: str,
+        conversation_id: Optional[str],
+        metric_label: str
+    ) -> None:
+        if not self.client:
+            raise InvalidScoreError("LLM client not initialized")
+        
+        logger.info(
+            f"🤖 LLM subtask '{metric_label}' started | "
+            f"conversation_id={conversation_id} | model={self.model}"
+        )
+        
+        # Log prompts for debugging (%-style: không build string khi DEBUG tắt)
+        logger.debug("📋 LLM '%s' SYSTEM PROMPT:\n%s", metric_label, system_prompt)
+    
+    def _extract_result_text(
+        self,
+        response,
+        user_prompt: str,
+        metric_label: str,
+        started_at: float,
+        usage_sink: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        result_text = response.choices[0].message.content.strip()
+        
+        # Token usage + latency (for comparing separate vs combined mode)
+        usage = getattr(response, "usage", None)
+        usage_entry = {
+            "metric": metric_label,
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+            "total_tokens": getattr(usage, "total_tokens", None),
+            "latency_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        }
+        logger.info(
+            "📈 LLM '%s' usage | prompt_tokens=%s | completion_tokens=%s | latency_ms=%s",
+            metric_label,
+            usage_entry["prompt_tokens"],
+            usage_entry["completion_tokens"],
+            usage_entry["latency_ms"],
+        )
+        if usage_sink is not None:
+            usage_sink.append(usage_entry)
+        
+        # Raw response: sampled ở INFO (LOG_PAYLOAD_SAMPLE_RATE), đầy đủ ở DEBUG
+        if should_log_payload(logger):
+            logger.info("📝 LLM '%s' RAW RESPONSE (%s chars):\n%s", metric_label, len(result_text), result_text)
+        
+        # Log prompt preview (first 500 chars)
+        logger.debug("📋 LLM '%s' PROMPT PREVIEW:\n%.500s", metric_label, user_prompt)
+        
+        return result_text
+    
+    def _parse_json_response(self, response_text: str) -> Dict[str, Any]:
+        """Parse JSON response from LLM (see parse_llm_json_response)."""
+        return parse_llm_json_response(response_text)
+
+
+class LLMAnalysisClient(_BaseLLMAnalysisClient):
+    """
+    Client for LLM analysis using Groq with Langfuse observability.
+    
+    This class handles:
+    - Groq client initialization
+    - Langfuse observability setup
+    - LLM prompt execution with error handling
+    """
+    
+    def _create_client(self):
+        return Groq(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
+    
     @observe(name="llm_analyze_user_questions")
     def analyze_user_questions(
         self,
         formatted_conversation: str,
-        conversation_id: Optional[str] = None
+        conversation_id: Optional[str] = None,
+        usage_sink: Optional[List[Dict[str, Any]]] = None,
+        raise_on_error: bool = False
     ) -> int:
         """
         Analyze user-initiated questions via LLM.
@@ -86,6 +389,8 @@ class LLMAnalysisClient:
         Args:
             formatted_conversation: Formatted conversation text
             conversation_id: Optional conversation ID for tracking
+            usage_sink: Optional list collecting token usage / latency of the call
+            raise_on_error: Re-raise instead of returning the default (lets callers detect degraded results)
             
         Returns:
             Count of user-initiated questions (>= 0)
@@ -94,51 +399,28 @@ class LLMAnalysisClient:
             logger.debug("LLM analysis disabled, returning 0 for user_initiated_questions")
             return 0
         
-        system_prompt = (
-            "You are an engagement analyst. Count how many times the USER actively asked a question."
-        )
-        user_prompt = f"""
-Conversation:
-{formatted_conversation}
-
-Return JSON:
-{{
-    "user_initiated_questions": <integer count of questions the USER initiated (>=0)>
-}}
-
-Rules:
-- Only count USER messages that introduce a question (end with '?' or interrogative structure)
-- Do not count answers to Pika's questions
-- If unsure, err on the side of under-counting
-- Count only questions that the USER initiated, not responses to Pika's questions
-"""
         try:
             response = self._invoke_llm(
-                system_prompt=system_prompt,
-                user_prompt=user_prompt,
+                system_prompt=USER_QUESTIONS_SYSTEM_PROMPT,
+                user_prompt=build_user_questions_prompt(formatted_conversation),
                 conversation_id=conversation_id,
-                metric_label="user_initiated_questions"
-            )
-            data = self._parse_json_response(response)
-            
-            # Log parsed JSON data
-            logger.info(
-                f"🔍 LLM 'user_initiated_questions' PARSED JSON: {data}"
+                metric_label="user_initiated_questions",
+                usage_sink=usage_sink
             )
-            
-            count = int(data.get("user_initiated_questions", 0))
-            result = max(0, count)
-            logger.info(f"✅ LLM user_initiated_questions: {result}")
-            return result
+            return _interpret_user_questions(self._parse_json_response(response))
         except Exception as e:
             logger.error(f"❌ LLM analysis failed for user_initiated_questions: {e}")
+            if raise_on_error:
+                raise
             return 0
     
     @observe(name="llm_analyze_session_emotion")
     def analyze_session_emotion(
         self,
         formatted_conversation: str,
-        conversation_id: Optional[str] = None
+        conversation_id: Optional[str] = None,
+        usage_sink: Optional[List[Dict[str, Any]]] = None,
+        raise_on_error: bool = False
     ) -> str:
         """
         Analyze session emotion via LLM.
@@ -146,6 +428,8 @@ Rules:
         Args:
             formatted_conversation: Formatted conversation text
             conversation_id: Optional conversation ID for tracking
+            usage_sink: Optional list collecting token usage / latency of the call
+            raise_on_error: Re-raise instead of returning the default (lets callers detect degraded results)
             
         Returns:
             Session emotion string (one of: interesting, boring, neutral, angry, happy, sad)
@@ -154,61 +438,63 @@ Rules:
             logger.debug("LLM analysis disabled, returning 'neutral' for session_emotion")
             return "neutral"
         
-        system_prompt = (
-            "You are an emotion analyst. Determine the overall emotion of the conversation session."
-        )
-        user_prompt = f"""
-Conversation:
-{formatted_conversation}
-
-Return JSON:
-{{
-    "session_emotion": "<one of: interesting, boring, neutral, angry, happy, sad>"
-}}
-
-Rules:
-- Consider the overall tone/feeling of the entire session
-- Choose exactly one value from the allowed list
-- 'interesting': User is engaged, asking questions, showing curiosity
-- 'boring': User seems disinterested, giving short responses, not engaging
-- 'neutral': Standard conversation, no strong emotion
-- 'angry': User shows frustration, negative tone, complaints
-- 'happy': User shows positive emotion, excitement, joy
-- 'sad': User shows sadness, disappointment, negative feelings
-"""
         try:
             response = self._invoke_llm(
-                system_prompt=system_prompt,
-                user_prompt=user_prompt,
+                system_prompt=SESSION_EMOTION_SYSTEM_PROMPT,
+                user_prompt=build_session_emotion_prompt(formatted_conversation),
                 conversation_id=conversation_id,
-                metric_label="session_emotion"
+                metric_label="session_emotion",
+                usage_sink=usage_sink
             )
-            data = self._parse_json_response(response)
-            
-            # Log parsed JSON data
-            logger.info(
-                f"🔍 LLM 'session_emotion' PARSED JSON: {data}"
-            )
-            
-            emotion = str(data.get("session_emotion", "neutral")).lower()
-            
-            # Validate emotion
-            if emotion not in VALID_EMOTIONS:
-                logger.warning(f"⚠️  Invalid session_emotion '{emotion}', defaulting to 'neutral'")
-                emotion = "neutral"
-            
-            logger.info(f"✅ LLM session_emotion: {emotion}")
-            return emotion
+            return _interpret_session_emotion(self._parse_json_response(response))
         except Exception as e:
             logger.error(f"❌ LLM analysis failed for session_emotion: {e}")
+            if raise_on_error:
+                raise
             return "neutral"
     
+    @observe(name="llm_analyze_combined")
+    def analyze_combined(
+        self,
+        formatted_conversation: str,
+        conversation_id: Optional[str] = None,
+        usage_sink: Optional[List[Dict[str, Any]]] = None,
+        raise_on_error: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Analyze user_initiated_questions + session_emotion in one structured-JSON completion.
+        
+        Returns:
+            {"user_initiated_questions": int, "session_emotion": str} (defaults on failure)
+        """
+        if not self.is_enabled():
+            logger.debug("LLM analysis disabled, returning defaults for combined analysis")
+            return {"user_initiated_questions": 0, "session_emotion": "neutral"}
+        
+        try:
+            response = self._invoke_llm(
+                system_prompt=COMBINED_SYSTEM_PROMPT,
+                user_prompt=build_combined_prompt(formatted_conversation),
+                conversation_id=conversation_id,
+                metric_label="combined",
+                usage_sink=usage_sink,
+                json_mode=True
+            )
+            return _interpret_combined(self._parse_json_response(response))
+        except Exception as e:
+            logger.error(f"❌ LLM analysis failed for combined: {e}")
+            if raise_on_error:
+                raise
+            return {"user_initiated_questions": 0, "session_emotion": "neutral"}
+    
     def _invoke_llm(
         self,
         system_prompt: str,
         user_prompt: str,
         conversation_id: Optional[str],
-        metric_label: str
+        metric_label: str,
+        usage_sink: Optional[List[Dict[str, Any]]] = None,
+        json_mode: bool = False
     ) -> str:
         """
         Invoke Groq LLM with provided prompts.
@@ -218,6 +504,8 @@ Rules:
             user_prompt: User prompt with conversation data
             conversation_id: Optional conversation ID for tracking
             metric_label: Label for logging (e.g., "user_initiated_questions")
+            usage_sink: Optional list collecting token usage / latency
+            json_mode: Request a JSON object response (structured output)
             
         Returns:
             LLM response text
@@ -225,84 +513,226 @@ Rules:
         Raises:
             InvalidScoreError: If LLM client is not initialized
         """
-        if not self.client:
-            raise InvalidScoreError("LLM client not initialized")
-        
-        logger.info(
-            f"🤖 LLM subtask '{metric_label}' started | "
-            f"conversation_id={conversation_id} | model={self.model}"
-        )
-        
-        # Log prompts for debugging
-        logger.debug(
-            f"📋 LLM '{metric_label}' SYSTEM PROMPT:\n{system_prompt}"
-        )
+        self._log_invoke_start(system_prompt, conversation_id, metric_label)
+        started_at = time.perf_counter()
+        try:
+            with observe_stage(f"llm_{metric_label}"):
+                response = self.client.chat.completions.create(
+                    **self._completion_kwargs(system_prompt, user_prompt, json_mode=json_mode)
+                )
+            return self._extract_result_text(response, user_prompt, metric_label, started_at, usage_sink)
+        except Exception as e:
+            logger.error(f"❌ LLM API call failed for '{metric_label}': {e}")
+            raise
+
+
+class AsyncLLMAnalysisClient(_BaseLLMAnalysisClient):
+    """
+    Async counterpart of LLMAnalysisClient (AsyncGroq).
+    
+    Prompts, parsing and defaults are identical to the sync client. Use
+    `get_async_llm_client()` to reuse one instance (and its connection pool) per event loop.
+    """
+    
+    def _create_client(self):
+        return AsyncGroq(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
+    
+    @observe(name="llm_analyze_user_questions")
+    async def analyze_user_questions(
+        self,
+        formatted_conversation: str,
+        conversation_id: Optional[str] = None,
+        usage_sink: Optional[List[Dict[str, Any]]] = None,
+        raise_on_error: bool = False
+    ) -> int:
+        """Async version of LLMAnalysisClient.analyze_user_questions."""
+        if not self.is_enabled():
+            logger.debug("LLM analysis disabled, returning 0 for user_initiated_questions")
+            return 0
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=10000,  # Groq uses max_tokens, not max_completion_tokens
-                top_p=1,
-                stream=False
+            response = await self._invoke_llm(
+                system_prompt=USER_QUESTIONS_SYSTEM_PROMPT,
+                user_prompt=build_user_questions_prompt(formatted_conversation),
+                conversation_id=conversation_id,
+                metric_label="user_initiated_questions",
+                usage_sink=usage_sink
             )
-            result_text = response.choices[0].message.content.strip()
-            
-            # Log full raw response for debugging
-            logger.info(
-                f"📝 LLM '{metric_label}' RAW RESPONSE (full):\n"
-                f"{result_text}"
+            return _interpret_user_questions(self._parse_json_response(response))
+        except Exception as e:
+            logger.error(f"❌ LLM analysis failed for user_initiated_questions: {e}")
+            if raise_on_error:
+                raise
+            return 0
+    
+    @observe(name="llm_analyze_session_emotion")
+    async def analyze_session_emotion(
+        self,
+        formatted_conversation: str,
+        conversation_id: Optional[str] = None,
+        usage_sink: Optional[List[Dict[str, Any]]] = None,
+        raise_on_error: bool = False
+    ) -> str:
+        """Async version of LLMAnalysisClient.analyze_session_emotion."""
+        if not self.is_enabled():
+            logger.debug("LLM analysis disabled, returning 'neutral' for session_emotion")
+            return "neutral"
+        
+        try:
+            response = await self._invoke_llm(
+                system_prompt=SESSION_EMOTION_SYSTEM_PROMPT,
+                user_prompt=build_session_emotion_prompt(formatted_conversation),
+                conversation_id=conversation_id,
+                metric_label="session_emotion",
+                usage_sink=usage_sink
             )
-            
-            # Log prompt preview (first 500 chars)
-            prompt_preview = user_prompt[:500] + "..." if len(user_prompt) > 500 else user_prompt
-            logger.debug(
-                f"📋 LLM '{metric_label}' PROMPT PREVIEW:\n"
-                f"{prompt_preview}"
+            return _interpret_session_emotion(self._parse_json_response(response))
+        except Exception as e:
+            logger.error(f"❌ LLM analysis failed for session_emotion: {e}")
+            if raise_on_error:
+                raise
+            return "neutral"
+    
+    @observe(name="llm_analyze_combined")
+    async def analyze_combined(
+        self,
+        formatted_conversation: str,
+        conversation_id: Optional[str] = None,
+        usage_sink: Optional[List[Dict[str, Any]]] = None,
+        raise_on_error: bool = False
+    ) -> Dict[str, Any]:
+        """Async version of LLMAnalysisClient.analyze_combined."""
+        if not self.is_enabled():
+            logger.debug("LLM analysis disabled, returning defaults for combined analysis")
+            return {"user_initiated_questions": 0, "session_emotion": "neutral"}
+        
+        try:
+            response = await self._invoke_llm(
+                system_prompt=COMBINED_SYSTEM_PROMPT,
+                user_prompt=build_combined_prompt(formatted_conversation),
+                conversation_id=conversation_id,
+                metric_label="combined",
+                usage_sink=usage_sink,
+                json_mode=True
             )
-            
-            return result_text
+            return _interpret_combined(self._parse_json_response(response))
+        except Exception as e:
+            logger.error(f"❌ LLM analysis failed for combined: {e}")
+            if raise_on_error:
+                raise
+            return {"user_initiated_questions": 0, "session_emotion": "neutral"}
+    
+    async def _invoke_llm(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        conversation_id: Optional[str],
+        metric_label: str,
+        usage_sink: Optional[List[Dict[str, Any]]] = None,
+        json_mode: bool = False
+    ) -> str:
+        """Invoke Groq LLM asynchronously (same contract as LLMAnalysisClient._invoke_llm)."""
+        self._log_invoke_start(system_prompt, conversation_id, metric_label)
+        started_at = time.perf_counter()
+        try:
+            with observe_stage(f"llm_{metric_label}"):
+                response = await self.client.chat.completions.create(
+                    **self._completion_kwargs(system_prompt, user_prompt, json_mode=json_mode)
+                )
+            return self._extract_result_text(response, user_prompt, metric_label, started_at, usage_sink)
         except Exception as e:
             logger.error(f"❌ LLM API call failed for '{metric_label}': {e}")
             raise
-    
-    def _parse_json_response(self, response_text: str) -> Dict[str, Any]:
-        """
-        Parse JSON response from LLM.
-        
-        Args:
-            response_text: Raw response text from LLM
-            
-        Returns:
-            Parsed JSON dictionary (empty dict if parsing fails)
-        """
-        try:
-            # Try to extract JSON from response (in case LLM adds extra text)
-            # Look for JSON object in the response
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            
-            if start_idx >= 0 and end_idx > start_idx:
-                json_text = response_text[start_idx:end_idx]
-                logger.debug(f"📦 Extracted JSON text: {json_text}")
-                parsed = json.loads(json_text)
-                logger.debug(f"✅ Successfully parsed JSON: {parsed}")
-                return parsed
-            else:
-                # Try parsing entire response
-                logger.debug(f"📦 Attempting to parse entire response as JSON")
-                parsed = json.loads(response_text)
-                logger.debug(f"✅ Successfully parsed JSON: {parsed}")
-                return parsed
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ Failed to parse LLM response as JSON: {e}")
-            logger.error(f"   Full response text: {response_text}")
-            logger.error(f"   Response length: {len(response_text)} chars")
-            return {}
+
+
+# ============================================================================
+# Shared clients (connection pooling)
+# ============================================================================
+# httpx.AsyncClient / AsyncGroq are bound to the event loop that created them, so the
+# async pools are cached per loop; the sync pools are process-wide and thread-safe.
+_async_llm_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncLLMAnalysisClient]" = (
+    weakref.WeakKeyDictionary()
+)
+_async_memory_api_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+_memory_api_client: Optional[httpx.Client] = None
+_analysis_executor: Optional[ThreadPoolExecutor] = None
+_shared_clients_lock = threading.Lock()
+
+
+def _memory_api_limits() -> httpx.Limits:
+    max_connections = settings.MEMORY_API_MAX_CONNECTIONS
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+    )
+
+
+def get_memory_api_client() -> httpx.Client:
+    """Process-wide pooled httpx.Client for Memory API calls (sync path)."""
+    global _memory_api_client
+    if _memory_api_client is None:
+        with _shared_clients_lock:
+            if _memory_api_client is None:
+                _memory_api_client = httpx.Client(limits=_memory_api_limits())
+    return _memory_api_client
+
+
+def get_async_memory_api_client() -> httpx.AsyncClient:
+    """Pooled httpx.AsyncClient for Memory API calls, one per running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_memory_api_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(limits=_memory_api_limits())
+        _async_memory_api_clients[loop] = client
+    return client
+
+
+def get_async_llm_client() -> AsyncLLMAnalysisClient:
+    """Shared AsyncLLMAnalysisClient (one AsyncGroq connection pool) for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_llm_clients.get(loop)
+    if client is None:
+        client = AsyncLLMAnalysisClient()
+        _async_llm_clients[loop] = client
+    return client
+
+
+def _get_analysis_executor() -> ThreadPoolExecutor:
+    """Shared thread pool for the sync parallel analysis (instead of one pool per conversation)."""
+    global _analysis_executor
+    if _analysis_executor is None:
+        with _shared_clients_lock:
+            if _analysis_executor is None:
+                _analysis_executor = ThreadPoolExecutor(
+                    max_workers=settings.LLM_ANALYSIS_MAX_WORKERS,
+                    thread_name_prefix="llm-analysis",
+                )
+    return _analysis_executor
+
+
+async def close_async_analysis_clients() -> None:
+    """Close the pooled async clients bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    memory_client = _async_memory_api_clients.pop(loop, None)
+    if memory_client is not None and not memory_client.is_closed:
+        await memory_client.aclose()
+    llm_client = _async_llm_clients.pop(loop, None)
+    if llm_client is not None and llm_client.client is not None:
+        await llm_client.client.close()
+
+
+def close_analysis_clients() -> None:
+    """Close the process-wide sync pools (Memory API client + analysis executor)."""
+    global _memory_api_client, _analysis_executor
+    with _shared_clients_lock:
+        if _memory_api_client is not None:
+            _memory_api_client.close()
+            _memory_api_client = None
+        if _analysis_executor is not None:
+            _analysis_executor.shutdown(wait=False)
+            _analysis_executor = None
 
 
 def format_conversation_for_llm(conversation_log: List[Dict[str, Any]]) -> str:
@@ -424,22 +854,15 @@ def format_conversation_for_memory_api(
     return formatted_conversation
 
 
-@observe(name="memory_api_extract_facts")
-def extract_memories_from_api(
+def _prepare_memory_api_request(
     conversation_log: List[Dict[str, Any]],
     user_id: str,
-    conversation_id: Optional[str] = None
-) -> int:
+    conversation_id: Optional[str]
+) -> Optional[Tuple[str, Dict[str, Any], int]]:
     """
-    Extract memories from conversation using Mem0 API.
+    Validate settings and build (api_url, payload, timeout_seconds) for /extract_facts.
     
-    Args:
-        conversation_log: List of conversation messages
-        user_id: User ID for the conversation
-        conversation_id: Optional conversation ID for tracking
-        
-    Returns:
-        Count of new memories extracted (>= 0)
+    Returns None when the Memory API should not be called (disabled, no URL, empty log).
     """
     if not settings.MEMORY_API_ENABLED:
         logger.warning(
@@ -447,7 +870,7 @@ def extract_memories_from_api(
             f"MEMORY_API_ENABLED={settings.MEMORY_API_ENABLED} | "
             f"Returning 0 for new_memories_count"
         )
-        return 0
+        return None
     
     if not settings.MEMORY_API_URL:
         logger.warning(
@@ -455,112 +878,346 @@ def extract_memories_from_api(
             f"MEMORY_API_URL={'not set' if not settings.MEMORY_API_URL else 'set'} | "
             f"Returning 0 for new_memories_count"
         )
-        return 0
+        return None
     
-    try:
-        logger.info(
-            f"🔍 Starting Memory API extraction | "
-            f"conversation_id={conversation_id} | user_id={user_id}"
-        )
-        
-        # Format conversation for Memory API
-        formatted_conversation = format_conversation_for_memory_api(conversation_log)
+    logger.info(
+        f"🔍 Starting Memory API extraction | "
+        f"conversation_id={conversation_id} | user_id={user_id}"
+    )
+    
+    # Format conversation for Memory API
+    formatted_conversation = format_conversation_for_memory_api(conversation_log)
+    
+    if not formatted_conversation:
+        logger.warning("⚠️  No valid conversation messages to extract memories")
+        return None
+    
+    # Prepare request payload
+    request_payload = {
+        "user_id": user_id,
+        "conversation_id": conversation_id or "unknown",
+        "conversation": formatted_conversation
+    }
+    
+    # Full payload: sampled ở INFO (LOG_PAYLOAD_SAMPLE_RATE), serialize lazily
+    if should_log_payload(logger):
+        logger.info("📤 Memory API request payload: %s", payload(request_payload))
+    
+    # Call Memory API with configurable timeout
+    timeout_seconds = settings.MEMORY_API_TIMEOUT_SECONDS or 60
+    api_url = f"{settings.MEMORY_API_URL}/extract_facts"
+    
+    logger.info(
+        f"⏱️  Calling Memory API | "
+        f"url={api_url} | "
+        f"timeout={timeout_seconds}s | "
+        f"conversation_id={conversation_id} | "
+        f"conversation_messages={len(formatted_conversation)}"
+    )
+    return api_url, request_payload, timeout_seconds
+
+
+_MEMORY_API_HEADERS = {
+    "accept": "application/json",
+    "Content-Type": "application/json"
+}
+
+
+def _log_memory_api_timeout(
+    elapsed_time: float,
+    timeout_seconds: int,
+    api_url: str,
+    conversation_id: Optional[str]
+) -> None:
+    logger.error(
+        f"❌ Memory API timeout after {elapsed_time:.2f}s | "
+        f"timeout_setting={timeout_seconds}s | "
+        f"url={api_url} | "
+        f"conversation_id={conversation_id}"
+    )
+
+
+def _interpret_memory_api_result(result: Dict[str, Any], conversation_id: Optional[str]) -> int:
+    """Log the /extract_facts response and return new_memories_count (>= 0)."""
+    # Full response: sampled ở INFO (LOG_PAYLOAD_SAMPLE_RATE), serialize lazily
+    if should_log_payload(logger):
+        logger.info("📥 Memory API response: %s", payload(result))
+    
+    # Extract count from response
+    count = result.get("count", 0)
+    facts = result.get("facts", [])
+    status = result.get("status", "unknown")
+    
+    logger.info(
+        f"✅ Memory API extraction completed | "
+        f"conversation_id={conversation_id} | "
+        f"status={status} | "
+        f"new_memories_count={count}"
+    )
+    
+    if count > 0:
+        logger.info(f"📝 Extracted {count} memories:")
+        for i, fact in enumerate(facts[:5], 1):  # Log first 5 facts
+            fact_value = fact.get("fact_value", "")
+            fact_id = fact.get("id", "unknown")
+            logger.info(f"   {i}. [{fact_id}] {fact_value}")
+    
+    return max(0, int(count))
+
+
+@observe(name="memory_api_extract_facts")
+def extract_memories_from_api(
+    conversation_log: List[Dict[str, Any]],
+    user_id: str,
+    conversation_id: Optional[str] = None,
+    raise_on_error: bool = False
+) -> int:
+    """
+    Extract memories from conversation using Mem0 API.
+    
+    Args:
+        conversation_log: List of conversation messages
+        user_id: User ID for the conversation
+        conversation_id: Optional conversation ID for tracking
+        raise_on_error: Re-raise HTTP/API errors instead of returning 0
         
-        if not formatted_conversation:
-            logger.warning("⚠️  No valid conversation messages to extract memories")
+    Returns:
+        Count of new memories extracted (>= 0)
+    """
+    try:
+        request = _prepare_memory_api_request(conversation_log, user_id, conversation_id)
+        if request is None:
             return 0
+        api_url, payload, timeout_seconds = request
         
-        # Prepare request payload
-        payload = {
-            "user_id": user_id,
-            "conversation_id": conversation_id or "unknown",
-            "conversation": formatted_conversation
-        }
-        
-        # Log full payload for debugging
-        logger.info(
-            f"📤 Memory API request payload:\n"
-            f"{json.dumps(payload, ensure_ascii=False, indent=2)}"
-        )
-        
-        # Call Memory API with configurable timeout
-        timeout_seconds = settings.MEMORY_API_TIMEOUT_SECONDS or 60
-        api_url = f"{settings.MEMORY_API_URL}/extract_facts"
-        
-        logger.info(
-            f"⏱️  Calling Memory API | "
-            f"url={api_url} | "
-            f"timeout={timeout_seconds}s | "
-            f"conversation_id={conversation_id} | "
-            f"conversation_messages={len(formatted_conversation)}"
-        )
-        
-        import time
         start_time = time.time()
-        
         try:
-            with httpx.Client(timeout=timeout_seconds) as client:
-                response = client.post(
+            with observe_stage("mem0"):
+                response = get_memory_api_client().post(
                     api_url,
-                    headers={
-                        "accept": "application/json",
-                        "Content-Type": "application/json"
-                    },
-                    json=payload
-                )
-                elapsed_time = time.time() - start_time
-                logger.info(
-                    f"⏱️  Memory API response received | "
-                    f"status_code={response.status_code} | "
-                    f"elapsed_time={elapsed_time:.2f}s"
+                    headers=inject_headers(_MEMORY_API_HEADERS),
+                    json=payload,
+                    timeout=timeout_seconds
                 )
-                response.raise_for_status()
-                result = response.json()
-        except httpx.TimeoutException as e:
             elapsed_time = time.time() - start_time
-            logger.error(
-                f"❌ Memory API timeout after {elapsed_time:.2f}s | "
-                f"timeout_setting={timeout_seconds}s | "
-                f"url={api_url} | "
-                f"conversation_id={conversation_id}"
+            logger.info(
+                f"⏱️  Memory API response received | "
+                f"status_code={response.status_code} | "
+                f"elapsed_time={elapsed_time:.2f}s"
             )
+            response.raise_for_status()
+            result = response.json()
+        except httpx.TimeoutException:
+            _log_memory_api_timeout(time.time() - start_time, timeout_seconds, api_url, conversation_id)
             raise
         
-        # Log full response for debugging
-        logger.info(
-            f"📥 Memory API response (full):\n"
-            f"{json.dumps(result, ensure_ascii=False, indent=2)}"
-        )
-        
-        # Extract count from response
-        count = result.get("count", 0)
-        facts = result.get("facts", [])
-        status = result.get("status", "unknown")
+        return _interpret_memory_api_result(result, conversation_id)
         
-        logger.info(
-            f"✅ Memory API extraction completed | "
-            f"conversation_id={conversation_id} | "
-            f"status={status} | "
-            f"new_memories_count={count}"
-        )
+    except httpx.HTTPError as e:
+        logger.error(f"❌ Memory API HTTP error: {e}")
+        if raise_on_error:
+            raise
+        return 0
+    except Exception as e:
+        logger.error(f"❌ Memory API extraction failed: {e}", exc_info=True)
+        if raise_on_error:
+            raise
+        return 0
+
+
+@observe(name="memory_api_extract_facts")
+async def extract_memories_from_api_async(
+    conversation_log: List[Dict[str, Any]],
+    user_id: str,
+    conversation_id: Optional[str] = None,
+    raise_on_error: bool = False
+) -> int:
+    """Async version of extract_memories_from_api (pooled httpx.AsyncClient)."""
+    try:
+        request = _prepare_memory_api_request(conversation_log, user_id, conversation_id)
+        if request is None:
+            return 0
+        api_url, payload, timeout_seconds = request
         
-        if count > 0:
-            logger.info(f"📝 Extracted {count} memories:")
-            for i, fact in enumerate(facts[:5], 1):  # Log first 5 facts
-                fact_value = fact.get("fact_value", "")
-                fact_id = fact.get("id", "unknown")
-                logger.info(f"   {i}. [{fact_id}] {fact_value}")
+        start_time = time.time()
+        try:
+            with observe_stage("mem0"):
+                response = await get_async_memory_api_client().post(
+                    api_url,
+                    headers=inject_headers(_MEMORY_API_HEADERS),
+                    json=payload,
+                    timeout=timeout_seconds
+                )
+            elapsed_time = time.time() - start_time
+            logger.info(
+                f"⏱️  Memory API response received | "
+                f"status_code={response.status_code} | "
+                f"elapsed_time={elapsed_time:.2f}s"
+            )
+            response.raise_for_status()
+            result = response.json()
+        except httpx.TimeoutException:
+            _log_memory_api_timeout(time.time() - start_time, timeout_seconds, api_url, conversation_id)
+            raise
         
-        return max(0, int(count))
+        return _interpret_memory_api_result(result, conversation_id)
         
     except httpx.HTTPError as e:
         logger.error(f"❌ Memory API HTTP error: {e}")
+        if raise_on_error:
+            raise
         return 0
     except Exception as e:
         logger.error(f"❌ Memory API extraction failed: {e}", exc_info=True)
+        if raise_on_error:
+            raise
         return 0
 
 
+def _should_extract_memories(
+    bot_type: Optional[str],
+    user_id: Optional[str],
+    conversation_id: Optional[str]
+) -> bool:
+    """
+    Decide whether the Memory API task runs for this conversation.
+    
+    Skip when bot_type == "NEXT_LESSON" (normalize: strip whitespace, case-insensitive),
+    when user_id is missing, or when the Memory API is disabled / has no URL.
+    """
+    if bot_type:
+        # Normalize bot_type: strip whitespace and convert to uppercase for comparison
+        normalized_bot_type = bot_type.strip().upper().replace(" ", "_")
+        logger.debug(
+            f"🔍 Checking bot_type for Memory API skip | "
+            f"original={bot_type} | "
+            f"normalized={normalized_bot_type}"
+        )
+        if normalized_bot_type == "NEXT_LESSON":
+            logger.info(
+                f"⏭️  Skipping Memory API extraction | "
+                f"bot_type={bot_type} (normalized={normalized_bot_type}) | "
+                f"reason=NEXT_LESSON conversations do not extract memories"
+            )
+            return False
+    
+    if not user_id:
+        logger.warning("⚠️  user_id not provided, skipping Memory API extraction")
+        return False
+    
+    if not (settings.MEMORY_API_ENABLED and settings.MEMORY_API_URL):
+        logger.warning(
+            f"⚠️  Memory API not enabled or URL not set, skipping | "
+            f"MEMORY_API_ENABLED={settings.MEMORY_API_ENABLED} | "
+            f"MEMORY_API_URL={'set' if settings.MEMORY_API_URL else 'not set'}"
+        )
+        return False
+    
+    logger.info(
+        f"🔍 Memory API task added | "
+        f"conversation_id={conversation_id} | user_id={user_id} | "
+        f"bot_type={bot_type} | url={settings.MEMORY_API_URL}"
+    )
+    return True
+
+
+def _default_analysis() -> Dict[str, Any]:
+    return {
+        "user_initiated_questions": 0,
+        "session_emotion": "neutral",
+        "new_memories_count": 0
+    }
+
+
+# Conversation có kết quả Mem0 nằm trong cache entry (không trả về cho caller)
+CACHED_SOURCE_CONVERSATION_FIELD = "_source_conversation_id"
+
+
+def _lookup_analysis_cache(
+    conversation_log: List[Dict[str, Any]],
+    user_id: Optional[str],
+    bot_type: Optional[str]
+) -> Tuple[Optional[LLMAnalysisCacheManager], Optional[str]]:
+    """Return (cache, key) for this conversation, or (None, None) when caching is off."""
+    cache = get_llm_analysis_cache()
+    if cache is None or not conversation_log:
+        return None, None
+    key = build_analysis_cache_key(
+        conversation_log,
+        model=settings.GROQ_MODEL or "openai/gpt-oss-20b",
+        mode=get_analysis_mode(),
+        user_id=user_id,
+        bot_type=bot_type,
+    )
+    return cache, key
+
+
+def _mark_cached(cached: Dict[str, Any], conversation_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Cache hit: no LLM/Memory API call was made for this analysis.
+
+    Key không chứa conversation_id (2 hội thoại khác nhau có cùng nội dung dùng chung kết
+    quả LLM), nhưng new_memories_count chỉ được giữ khi hit là retry của chính conversation
+    đã gọi Mem0; conversation khác không gọi Mem0 -> không có memory mới (bonus = 0).
+    """
+    source_conversation_id = cached.pop(CACHED_SOURCE_CONVERSATION_FIELD, None)
+    if conversation_id is None or source_conversation_id != conversation_id:
+        cached["new_memories_count"] = 0
+    logger.info(
+        f"♻️  Analysis cache hit | conversation_id={conversation_id} | "
+        f"source_conversation_id={source_conversation_id}"
+    )
+    if cached.get("llm_usage"):
+        usage = summarize_llm_usage([], cached["llm_usage"].get("mode", get_analysis_mode()))
+        usage["cached"] = True
+        cached["llm_usage"] = usage
+    _log_analysis_summary(cached, conversation_id)
+    return cached
+
+
+def _store_analysis_cache(
+    cache: Optional[LLMAnalysisCacheManager],
+    cache_key: Optional[str],
+    analysis: Dict[str, Any],
+    degraded: bool,
+    llm_enabled: bool,
+    conversation_id: Optional[str] = None
+) -> None:
+    """Cache only complete results: a failed subtask (or disabled LLM) must be retried later."""
+    if cache is None or not cache_key:
+        return
+    if degraded or not llm_enabled:
+        llm_analysis_cache_stats.record("skipped_degraded")
+        return
+    # Ghi kèm conversation đã gọi Mem0 (xem _mark_cached)
+    cache.set(cache_key, {**analysis, CACHED_SOURCE_CONVERSATION_FIELD: conversation_id})
+
+
+def _store_analysis_value(analysis: Dict[str, Any], metric: str, value: Any) -> None:
+    """Put a subtask result into the analysis dict (combined returns both LLM metrics)."""
+    if metric == "combined":
+        analysis.update(value)
+    else:
+        analysis[metric] = value
+
+
+def _log_llm_disabled() -> None:
+    logger.warning(
+        f"⚠️  LLM analysis disabled | "
+        f"LLM_ANALYSIS_ENABLED={settings.LLM_ANALYSIS_ENABLED} | "
+        f"GROQ_API_KEY={'set' if settings.GROQ_API_KEY else 'not set'}"
+    )
+
+
+def _log_analysis_summary(analysis: Dict[str, Any], conversation_id: Optional[str]) -> None:
+    logger.info(
+        f"📊 Parallel analysis completed for conversation_id={conversation_id}:\n"
+        f"   - user_initiated_questions: {analysis.get('user_initiated_questions')}\n"
+        f"   - session_emotion: {analysis.get('session_emotion')}\n"
+        f"   - new_memories_count: {analysis.get('new_memories_count')}"
+    )
+
+
 def analyze_conversation_with_llm(
     conversation_log: List[Dict[str, Any]],
     conversation_id: Optional[str] = None,
@@ -571,7 +1228,7 @@ def analyze_conversation_with_llm(
     """
     Analyze conversation using LLM and Memory API to extract metrics.
     
-    This function runs 3 analyses in parallel:
+    This function runs 3 analyses in parallel (on a shared thread pool):
     1. user_initiated_questions: Count of questions user actively asked (LLM)
     2. session_emotion: Overall emotion of the conversation session (LLM)
     3. new_memories_count: Number of new memories extracted (Memory API)
@@ -589,25 +1246,25 @@ def analyze_conversation_with_llm(
         - session_emotion: str
         - new_memories_count: int
     """
+    # Reuse cached result (retries / requeues / debug re-scoring cost zero LLM calls)
+    cache, cache_key = _lookup_analysis_cache(conversation_log, user_id, bot_type)
+    if cache_key and cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return _mark_cached(cached, conversation_id)
+    
     # Initialize LLM client if not provided
     if llm_client is None:
         llm_client = LLMAnalysisClient()
     
     # Initialize analysis result
-    analysis = {
-        "user_initiated_questions": 0,
-        "session_emotion": "neutral",
-        "new_memories_count": 0
-    }
+    analysis = _default_analysis()
+    degraded = False
     
     # Check if LLM is enabled
     llm_enabled = llm_client.is_enabled()
     if not llm_enabled:
-        logger.warning(
-            f"⚠️  LLM analysis disabled | "
-            f"LLM_ANALYSIS_ENABLED={settings.LLM_ANALYSIS_ENABLED} | "
-            f"GROQ_API_KEY={'set' if settings.GROQ_API_KEY else 'not set'}"
-        )
+        _log_llm_disabled()
     
     try:
         logger.info(
@@ -619,120 +1276,143 @@ def analyze_conversation_with_llm(
         formatted_conversation = format_conversation_for_llm(conversation_log)
         logger.debug(f"Formatted conversation length: {len(formatted_conversation)} chars")
         
-        # Prepare tasks: 2 LLMs + 1 Memory API
+        # Prepare tasks: 2 LLMs (or 1 combined) + 1 Memory API (disabled tasks keep the default value)
+        mode = get_analysis_mode()
+        usage_entries: List[Dict[str, Any]] = []
+        trace_kwargs = langfuse_trace_kwargs()  # Langfuse observations chung trace với event
         tasks = []
-        
-        # Task 1: LLM - user_initiated_questions
-        if llm_enabled:
+        if llm_enabled and mode == ANALYSIS_MODE_COMBINED:
+            tasks.append((
+                "combined",
+                lambda: llm_client.analyze_combined(
+                    formatted_conversation, conversation_id, usage_entries, raise_on_error=True, **trace_kwargs
+                )
+            ))
+        elif llm_enabled:
             tasks.append((
                 "user_initiated_questions",
-                lambda: llm_client.analyze_user_questions(formatted_conversation, conversation_id)
+                lambda: llm_client.analyze_user_questions(
+                    formatted_conversation, conversation_id, usage_entries, raise_on_error=True, **trace_kwargs
+                )
             ))
-        else:
-            tasks.append(("user_initiated_questions", lambda: 0))
-        
-        # Task 2: LLM - session_emotion
-        if llm_enabled:
             tasks.append((
                 "session_emotion",
-                lambda: llm_client.analyze_session_emotion(formatted_conversation, conversation_id)
-            ))
-        else:
-            tasks.append(("session_emotion", lambda: "neutral"))
-        
-        # Task 3: Memory API - new_memories_count
-        # Skip Memory API if bot_type == "NEXT_LESSON" (normalize: strip whitespace, case-insensitive)
-        if bot_type:
-            # Normalize bot_type: strip whitespace and convert to uppercase for comparison
-            normalized_bot_type = bot_type.strip().upper().replace(" ", "_")
-            logger.debug(
-                f"🔍 Checking bot_type for Memory API skip | "
-                f"original={bot_type} | "
-                f"normalized={normalized_bot_type}"
-            )
-            if normalized_bot_type == "NEXT_LESSON":
-                logger.info(
-                    f"⏭️  Skipping Memory API extraction | "
-                    f"bot_type={bot_type} (normalized={normalized_bot_type}) | "
-                    f"reason=NEXT_LESSON conversations do not extract memories"
-                )
-                tasks.append(("new_memories_count", lambda: 0))
-                # Continue to next condition check (don't add Memory API task)
-            elif user_id:
-                # Normal bot_type, proceed with Memory API if enabled
-                if settings.MEMORY_API_ENABLED and settings.MEMORY_API_URL:
-                    logger.info(
-                        f"🔍 Memory API task added | "
-                        f"conversation_id={conversation_id} | user_id={user_id} | "
-                        f"bot_type={bot_type} | url={settings.MEMORY_API_URL}"
-                    )
-                    tasks.append((
-                        "new_memories_count",
-                        lambda: extract_memories_from_api(conversation_log, user_id, conversation_id)
-                    ))
-                else:
-                    logger.warning(
-                        f"⚠️  Memory API not enabled or URL not set, skipping | "
-                        f"MEMORY_API_ENABLED={settings.MEMORY_API_ENABLED} | "
-                        f"MEMORY_API_URL={'set' if settings.MEMORY_API_URL else 'not set'}"
-                    )
-                    tasks.append(("new_memories_count", lambda: 0))
-            else:
-                logger.warning("⚠️  user_id not provided, skipping Memory API extraction")
-                tasks.append(("new_memories_count", lambda: 0))
-        elif user_id:
-            # bot_type is None, but user_id exists - proceed with Memory API if enabled
-            if settings.MEMORY_API_ENABLED and settings.MEMORY_API_URL:
-                logger.info(
-                    f"🔍 Memory API task added | "
-                    f"conversation_id={conversation_id} | user_id={user_id} | "
-                    f"bot_type=None | url={settings.MEMORY_API_URL}"
+                lambda: llm_client.analyze_session_emotion(
+                    formatted_conversation, conversation_id, usage_entries, raise_on_error=True, **trace_kwargs
                 )
-                tasks.append((
-                    "new_memories_count",
-                    lambda: extract_memories_from_api(conversation_log, user_id, conversation_id)
-                ))
-            else:
-                logger.warning(
-                    f"⚠️  Memory API not enabled or URL not set, skipping | "
-                    f"MEMORY_API_ENABLED={settings.MEMORY_API_ENABLED} | "
-                    f"MEMORY_API_URL={'set' if settings.MEMORY_API_URL else 'not set'}"
+            ))
+        if _should_extract_memories(bot_type, user_id, conversation_id):
+            tasks.append((
+                "new_memories_count",
+                lambda: extract_memories_from_api(
+                    conversation_log, user_id, conversation_id, raise_on_error=True, **trace_kwargs
                 )
-                tasks.append(("new_memories_count", lambda: 0))
-        else:
-            logger.warning("⚠️  user_id not provided, skipping Memory API extraction")
-            tasks.append(("new_memories_count", lambda: 0))
-        
-        # Run all 3 tasks in parallel
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            future_map = {
-                executor.submit(task): metric
-                for metric, task in tasks
-            }
-            
-            for future in as_completed(future_map):
-                metric = future_map[future]
-                try:
-                    value = future.result()
-                    analysis[metric] = value
-                    logger.info(f"✅ Analysis subtask '{metric}' completed with value={value}")
-                except Exception as e:
-                    logger.error(f"❌ Analysis subtask '{metric}' failed: {e}", exc_info=True)
+            ))
         
-        logger.info(
-            f"📊 Parallel analysis completed for conversation_id={conversation_id}:\n"
-            f"   - user_initiated_questions: {analysis.get('user_initiated_questions')}\n"
-            f"   - session_emotion: {analysis.get('session_emotion')}\n"
-            f"   - new_memories_count: {analysis.get('new_memories_count')}"
-        )
+        # Run tasks in parallel on the shared pool (copy context: span hiện tại đi theo subtask)
+        executor = _get_analysis_executor()
+        future_map = {
+            executor.submit(contextvars.copy_context().run, task): metric
+            for metric, task in tasks
+        }
         
+        for future in as_completed(future_map):
+            metric = future_map[future]
+            try:
+                value = future.result()
+                _store_analysis_value(analysis, metric, value)
+                logger.info(f"✅ Analysis subtask '{metric}' completed with value={value}")
+            except Exception as e:
+                degraded = True
+                logger.error(f"❌ Analysis subtask '{metric}' failed: {e}", exc_info=True)
+        
+        if llm_enabled:
+            analysis["llm_usage"] = summarize_llm_usage(usage_entries, mode)
+        _log_analysis_summary(analysis, conversation_id)
+        _store_analysis_cache(cache, cache_key, analysis, degraded, llm_enabled, conversation_id)
         return analysis
         
     except Exception as e:
         logger.error(f"❌ Parallel analysis failed: {e}", exc_info=True)
-        return {
-            "user_initiated_questions": 0,
-            "session_emotion": "neutral",
-            "new_memories_count": 0
-        }
+        return _default_analysis()
+
 
+async def analyze_conversation_with_llm_async(
+    conversation_log: List[Dict[str, Any]],
+    conversation_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    bot_type: Optional[str] = None,
+    llm_client: Optional[AsyncLLMAnalysisClient] = None
+) -> Dict[str, Any]:
+    """
+    Async version of analyze_conversation_with_llm.
+    
+    The 3 analyses are awaited concurrently with asyncio.gather on pooled clients, so
+    one event loop can keep many conversations in flight without extra threads.
+    """
+    cache, cache_key = _lookup_analysis_cache(conversation_log, user_id, bot_type)
+    if cache_key and cache is not None:
+        # Redis client là sync -> chạy trong thread để không block event loop
+        cached = await asyncio.to_thread(cache.get, cache_key)
+        if cached is not None:
+            return _mark_cached(cached, conversation_id)
+    
+    if llm_client is None:
+        llm_client = get_async_llm_client()
+    
+    analysis = _default_analysis()
+    degraded = False
+    
+    llm_enabled = llm_client.is_enabled()
+    if not llm_enabled:
+        _log_llm_disabled()
+    
+    try:
+        logger.info(
+            f"🔍 Starting async analysis (2 LLMs + 1 Memory API) | "
+            f"conversation_id={conversation_id} | user_id={user_id}"
+        )
+        
+        formatted_conversation = format_conversation_for_llm(conversation_log)
+        logger.debug(f"Formatted conversation length: {len(formatted_conversation)} chars")
+        
+        mode = get_analysis_mode()
+        usage_entries: List[Dict[str, Any]] = []
+        trace_kwargs = langfuse_trace_kwargs()
+        coroutines = {}
+        if llm_enabled and mode == ANALYSIS_MODE_COMBINED:
+            coroutines["combined"] = llm_client.analyze_combined(
+                formatted_conversation, conversation_id, usage_entries, raise_on_error=True, **trace_kwargs
+            )
+        elif llm_enabled:
+            coroutines["user_initiated_questions"] = llm_client.analyze_user_questions(
+                formatted_conversation, conversation_id, usage_entries, raise_on_error=True, **trace_kwargs
+            )
+            coroutines["session_emotion"] = llm_client.analyze_session_emotion(
+                formatted_conversation, conversation_id, usage_entries, raise_on_error=True, **trace_kwargs
+            )
+        if _should_extract_memories(bot_type, user_id, conversation_id):
+            coroutines["new_memories_count"] = extract_memories_from_api_async(
+                conversation_log, user_id, conversation_id, raise_on_error=True, **trace_kwargs
+            )
+        
+        results = await asyncio.gather(*coroutines.values(), return_exceptions=True)
+        for metric, value in zip(coroutines.keys(), results):
+            if isinstance(value, Exception):
+                degraded = True
+                logger.error(f"❌ Analysis subtask '{metric}' failed: {value}")
+                continue
+            _store_analysis_value(analysis, metric, value)
+            logger.info(f"✅ Analysis subtask '{metric}' completed with value={value}")
+        
+        if llm_enabled:
+            analysis["llm_usage"] = summarize_llm_usage(usage_entries, mode)
+        _log_analysis_summary(analysis, conversation_id)
+        await asyncio.to_thread(
+            _store_analysis_cache, cache, cache_key, analysis, degraded, llm_enabled, conversation_id
+        )
+        return analysis
+        
+    except Exception as e:
+        logger.error(f"❌ Async analysis failed: {e}", exc_info=True)
+        return _default_analysis()
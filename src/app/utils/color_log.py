@@ -3,6 +3,7 @@ Color logging utilities for better log visibility.
 
 Provides colored log formatting for different log levels and message types.
 """
+from functools import lru_cache
 from typing import Optional
 import sys
 
@@ -69,8 +70,9 @@ def colorize(text: str, color: str, bold: bool = False) -> str:
     return f"{style}{color}{text}{Colors.RESET}"
 
 
+@lru_cache(maxsize=None)
 def _supports_color() -> bool:
-    """Check if terminal supports color output."""
+    """Check if terminal supports color output (cached: colorize() runs on every log line)."""
     # Check if running in a terminal
     if not sys.stdout.isatty():
         return False
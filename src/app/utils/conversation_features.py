@@ -0,0 +1,82 @@
+"""
+Single-pass feature extraction for conversation logs.
+
+Chạy 1 lần lúc ingest (`ConversationEventService.create_event`) khi log đã nằm trong
+memory; kết quả lưu vào các cột scalar của `conversation_events`, nên worker và
+scoring service không phải duyệt lại JSONB log (và không cần fetch lại cả row).
+"""
+import hashlib
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+SPEAKER_PIKA = "pika"
+SPEAKER_USER = "user"
+_TURN_PAIR = frozenset((SPEAKER_PIKA, SPEAKER_USER))
+
+
+@dataclass(frozen=True)
+class ConversationFeatures:
+    """Scalar features of one conversation (same names as the conversation_events columns)."""
+    total_turns: int
+    pika_message_count: int
+    user_message_count: int
+    user_question_count: int
+    text_length: int
+    content_hash: str
+
+    def as_columns(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _speaker(message: Dict[str, Any]) -> str:
+    return str(message.get("speaker") or "").lower()
+
+
+def extract_conversation_features(conversation_log: Optional[List[Dict[str, Any]]]) -> ConversationFeatures:
+    """
+    Compute every feature in one pass over a standardized log (speaker/text).
+
+    total_turns dùng đúng logic cũ: 1 turn = 1 cặp liên tiếp (pika, user) hoặc (user, pika),
+    message lẻ không tạo thành cặp bị bỏ qua. user_question_count là heuristic (tin nhắn
+    của user có dấu "?"); điểm engagement vẫn lấy từ LLM khi có.
+    """
+    turns = 0
+    pika_count = 0
+    user_count = 0
+    question_count = 0
+    text_length = 0
+    digest = hashlib.sha256()
+    pending: Optional[str] = None
+
+    for message in conversation_log or []:
+        speaker = _speaker(message)
+        text = str(message.get("text") or "")
+
+        if speaker == SPEAKER_PIKA:
+            pika_count += 1
+        elif speaker == SPEAKER_USER:
+            user_count += 1
+            if "?" in text:
+                question_count += 1
+        text_length += len(text)
+        digest.update(f"{speaker}\x1f{text.strip()}\x1e".encode("utf-8"))
+
+        if pending is not None and {pending, speaker} == _TURN_PAIR:
+            turns += 1
+            pending = None
+        else:
+            pending = speaker
+
+    return ConversationFeatures(
+        total_turns=turns,
+        pika_message_count=pika_count,
+        user_message_count=user_count,
+        user_question_count=question_count,
+        text_length=text_length,
+        content_hash=digest.hexdigest(),
+    )
+
+
+def count_complete_turns(conversation_log: Optional[List[Dict[str, Any]]]) -> int:
+    """Số turn hoàn chỉnh (1 turn = 1 cặp pika + user)."""
+    return extract_conversation_features(conversation_log).total_turns
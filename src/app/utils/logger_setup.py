@@ -1,15 +1,41 @@
 """
 Logging configuration and setup with color support.
+
+Mọi logger của app dùng chung 1 handler:
+
+- LOG_QUEUE_ENABLED: `NonBlockingQueueHandler` -> queue -> `QueueListener` (thread nền) ->
+  StreamHandler(stdout). Thread gọi log chỉ ghép message (%-args) rồi put_nowait; format
+  màu / timestamp và write stdout chạy trên listener. Queue đầy -> bỏ record (đếm ở
+  `dropped_log_records()`), không bao giờ block request / worker.
+- `FieldCapFilter`: cắt từng %-arg dài hơn LOG_MAX_FIELD_CHARS và message (f-string) dài hơn
+  LOG_MAX_MESSAGE_CHARS.
+- Payload lớn (request/response Mem0, raw LLM response, score details): `should_log_payload()`
+  lấy mẫu LOG_PAYLOAD_SAMPLE_RATE ở INFO (luôn log ở DEBUG); `payload()` / `lazy()` chỉ
+  serialize khi record thật sự được emit.
+
+Dùng %-style (`logger.info("... %s", value)`) thay vì f-string cho message có giá trị lớn để
+việc format được bỏ qua khi level tắt và field cap áp dụng được.
 """
+import atexit
+import json
 import logging
+import os
+import queue
+import random
 import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, List, Mapping, Optional
+
+import orjson
+
 from app.core.config_settings import settings
 from app.utils.color_log import Colors, _supports_color
 
 
 class ColoredFormatter(logging.Formatter):
     """Custom formatter with color support for different log levels."""
-    
+
     # Color mapping for log levels
     LEVEL_COLORS = {
         "DEBUG": Colors.BRIGHT_BLACK,
@@ -18,19 +44,19 @@ class ColoredFormatter(logging.Formatter):
         "ERROR": Colors.BRIGHT_RED,
         "CRITICAL": Colors.BRIGHT_RED + Colors.BOLD,
     }
-    
+
     # Color for logger name
     NAME_COLOR = Colors.BRIGHT_MAGENTA
-    
+
     def __init__(self, use_color: bool = True):
         """
         Initialize formatter.
-        
+
         Args:
             use_color: Whether to use colors (auto-detected if None)
         """
         self.use_color = use_color if use_color is not None else _supports_color()
-        
+
         if self.use_color:
             fmt = (
                 f"{Colors.BRIGHT_BLACK}%(asctime)s{Colors.RESET} | "
@@ -40,16 +66,16 @@ class ColoredFormatter(logging.Formatter):
             )
         else:
             fmt = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-        
+
         super().__init__(fmt, datefmt="%Y-%m-%d %H:%M:%S")
-    
+
     def format(self, record: logging.LogRecord) -> str:
         """Format log record with colors."""
         if self.use_color:
             # Colorize level name
             level_color = self.LEVEL_COLORS.get(record.levelname, Colors.WHITE)
             record.levelname = f"{level_color}{Colors.BOLD}{record.levelname}{Colors.RESET}"
-            
+
             # Colorize logger name (shorten if too long)
             name = record.name
             if len(name) > 30:
@@ -57,49 +83,209 @@ class ColoredFormatter(logging.Formatter):
                 parts = name.split(".")
                 name = "..." + ".".join(parts[-2:])
             record.name = f"{self.NAME_COLOR}{name}{Colors.RESET}"
-        
+
         return super().format(record)
 
 
-def get_logger(name: str) -> logging.Logger:
+def truncate(text: str, limit: int) -> str:
+    """Cắt `text` còn `limit` ký tự (+ số ký tự bị bỏ); limit <= 0 = không cắt."""
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}… [+{len(text) - limit} chars]"
+
+
+class FieldCapFilter(logging.Filter):
+    """Giới hạn kích thước từng %-arg và message của 1 record (chạy sau level check)."""
+
+    def __init__(self, max_field_chars: int, max_message_chars: int):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+        self.max_message_chars = max_message_chars
+
+    def _cap(self, value: Any) -> Any:
+        if value is None or isinstance(value, (bool, int, float)):
+            return value  # giữ nguyên cho %d / %.2f
+        text = value if isinstance(value, str) else str(value)
+        return truncate(text, self.max_field_chars)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.args and self.max_field_chars > 0:
+            if isinstance(record.args, Mapping):
+                record.args = {key: self._cap(value) for key, value in record.args.items()}
+            else:
+                record.args = tuple(self._cap(value) for value in record.args)
+        if isinstance(record.msg, str):
+            record.msg = truncate(record.msg, self.max_message_chars)
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler không block: queue đầy thì bỏ record và đếm."""
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LazyLogValue:
+    """Giá trị log chỉ được tính khi record được format (sau level check / sampling)."""
+
+    __slots__ = ("_func", "_args")
+
+    def __init__(self, func: Callable[..., Any], *args: Any):
+        self._func = func
+        self._args = args
+
+    def __str__(self) -> str:
+        return str(self._func(*self._args))
+
+    __repr__ = __str__
+
+
+def lazy(func: Callable[..., Any], *args: Any) -> LazyLogValue:
+    return LazyLogValue(func, *args)
+
+
+def _dump_payload(value: Any) -> str:
+    try:
+        return orjson.dumps(value).decode("utf-8")
+    except TypeError:
+        return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def payload(value: Any) -> LazyLogValue:
+    """JSON 1 dòng (orjson, giữ Unicode) của `value`, serialize lazily."""
+    return LazyLogValue(_dump_payload, value)
+
+
+def should_log_payload(logger: logging.Logger) -> bool:
     """
-    Get logger instance with color support.
-    
-    Args:
-        name: Logger name (usually __name__)
-        
-    Returns:
-        logging.Logger: Configured logger instance
+    Có log payload lớn không: DEBUG -> luôn; INFO -> lấy mẫu LOG_PAYLOAD_SAMPLE_RATE.
+
+    Gọi trước khi build payload log để bỏ qua hoàn toàn chi phí khi không được chọn.
     """
-    logger = logging.getLogger(name)
-    
-    # Avoid duplicate handlers
-    if logger.handlers:
-        return logger
-    
-    logger.setLevel(getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
-    
-    handler = logging.StreamHandler(sys.stdout)
-    
+    if logger.isEnabledFor(logging.DEBUG):
+        return True
+    if not logger.isEnabledFor(logging.INFO):
+        return False
+    rate = settings.LOG_PAYLOAD_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def _build_formatter() -> logging.Formatter:
     # Use colored formatter for development, JSON for production
     if settings.ENVIRONMENT == "production":
-        formatter = logging.Formatter(
+        return logging.Formatter(
             '{"timestamp": "%(asctime)s", "level": "%(levelname)s", "name": "%(name)s", "message": "%(message)s"}',
             datefmt="%Y-%m-%d %H:%M:%S"
         )
-    else:
-        # Use colored formatter for development
-        formatter = ColoredFormatter(use_color=True)
-    
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    
-    return logger
+    # Use colored formatter for development
+    return ColoredFormatter(use_color=True)
+
+
+_handler_lock = threading.RLock()
+_shared_handler: Optional[logging.Handler] = None
+_listener: Optional[QueueListener] = None
+_output_stream = None
+_configured_loggers: List[logging.Logger] = []
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()  # xử lý hết record còn trong queue rồi mới dừng
+        except Exception:
+            pass
+        _listener = None
+
+
+def configure_logging(stream=None) -> logging.Handler:
+    """
+    (Re)build handler dùng chung và gắn lại cho các logger đã tạo.
+
+    Args:
+        stream: Output stream (mặc định sys.stdout; benchmark truyền sink riêng)
+    """
+    global _shared_handler, _listener, _output_stream
+    with _handler_lock:
+        old_handler = _shared_handler
+        _stop_listener()
+        _output_stream = stream
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(_build_formatter())
+        if settings.LOG_QUEUE_ENABLED:
+            handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_MAX_SIZE))
+            _listener = QueueListener(handler.queue, output)
+            _listener.start()
+        else:
+            handler = output
+        handler.addFilter(FieldCapFilter(settings.LOG_MAX_FIELD_CHARS, settings.LOG_MAX_MESSAGE_CHARS))
+        _shared_handler = handler
+        for logger in _configured_loggers:
+            if old_handler is not None:
+                logger.removeHandler(old_handler)
+            logger.addHandler(handler)
+        return handler
+
+
+def _get_shared_handler() -> logging.Handler:
+    with _handler_lock:
+        if _shared_handler is None:
+            configure_logging()
+        return _shared_handler
 
 
+def shutdown_logging() -> None:
+    """Flush queue (atexit / shutdown)."""
+    with _handler_lock:
+        _stop_listener()
 
 
+def dropped_log_records() -> int:
+    handler = _shared_handler
+    return getattr(handler, "dropped", 0)
 
 
+def _restart_after_fork() -> None:
+    # Thread listener không tồn tại trong process con (gunicorn --preload ...)
+    global _handler_lock, _listener
+    _handler_lock = threading.RLock()
+    if _listener is not None:
+        _listener = None
+        configure_logging(_output_stream)
 
 
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get logger instance with color support.
+
+    Args:
+        name: Logger name (usually __name__)
+
+    Returns:
+        logging.Logger: Configured logger instance
+    """
+    logger = logging.getLogger(name)
+
+    # Avoid duplicate handlers
+    if logger.handlers:
+        return logger
+
+    logger.setLevel(getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
+    logger.addHandler(_get_shared_handler())
+    with _handler_lock:
+        _configured_loggers.append(logger)
+
+    return logger
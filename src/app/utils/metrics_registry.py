@@ -0,0 +1,460 @@
+"""
+Prometheus-style metrics (text exposition format 0.0.4), in-process, không cần dependency.
+
+- API: `GET /metrics` (main_app)
+- Worker / standalone scheduler: sidecar HTTP server `start_metrics_server()` trên
+  METRICS_WORKER_PORT (chỉ phục vụ `/metrics`)
+
+Metric của mỗi process là riêng (giống các *_stats snapshot); Prometheus scrape từng
+replica / worker và aggregate bằng PromQL, vd p95 theo stage:
+
+    histogram_quantile(0.95, sum by (le, stage) (rate(pika_event_stage_duration_seconds_bucket[5m])))
+
+Cache hit rate: `pika_cache_hit_rate{cache=...}` theo process, hoặc theo fleet:
+
+    sum(rate(pika_llm_analysis_cache_events_total{event=~".*_hit"}[5m]))
+      / sum(rate(pika_llm_analysis_cache_events_total{event=~".*_hit|miss"}[5m]))
+
+Stages (`observe_stage`) có thể lồng nhau: `event` bao toàn bộ 1 event, `score` bao các
+subtask `llm_*` / `mem0`, `status_update` bao `topic_lookup`. Mỗi stage cũng là 1 span
+`stage.<stage>` khi TRACING_ENABLED (app.utils.tracing).
+"""
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config_settings import settings
+from app.utils.logger_setup import get_logger
+from app.utils.tracing import start_span
+
+logger = get_logger(__name__)
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+METRIC_PREFIX = "pika_"
+
+# Từ vài ms (Redis, topic lookup) tới nhiều phút (Groq/Mem0 chậm, cả event)
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base: name/help/labels + thread-safe storage theo label values."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = METRIC_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def _callback_items(self) -> Optional[List[Tuple[LabelValues, float]]]:
+        """Gọi callback lúc scrape; None nếu callback lỗi (bỏ qua metric này)."""
+        try:
+            result = self._callback()
+        except Exception as exc:
+            logger.debug("Metric callback %s failed: %s", self.name, exc)
+            return None
+        return list(result.items()) if isinstance(result, dict) else [((), result)]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    Counter inc, hoặc callback counter (`callback` trả {label values: float}) đọc lúc scrape
+    từ các counter có sẵn trong *_stats snapshot.
+    """
+
+    type_name = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        if self._callback is not None:
+            items = self._callback_items()
+            if items is None:
+                return []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(float(value))}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Gauge set/inc/dec, hoặc callback gauge (`callback` trả float hoặc {label values: float})
+    được đọc lúc scrape - dùng để export các *_stats snapshot có sẵn mà không đụng hot path.
+    """
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], object]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        if self._callback is not None:
+            items = self._callback_items()
+            if items is None:
+                return []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(float(value))}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [counts per bucket (+Inf cuối), sum]
+        self._values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _conversation_event_backlog() -> Dict[LabelValues, float]:
+    # Snapshot do backlog sampler của scheduler ghi (không query DB lúc scrape); process
+    # không chạy scheduler (worker) thì không export
+    scheduler = sys.modules.get("app.background.conversation_event_scheduler")
+    if scheduler is None:
+        return {}
+    snapshot = scheduler.conversation_event_job_stats.snapshot()
+    if not snapshot.get("backlog_sampled_at"):
+        return {}
+    return {
+        ("due",): snapshot.get("backlog_due") or 0,
+        ("oldest_age_seconds",): snapshot.get("backlog_oldest_age_seconds") or 0.0,
+    }
+
+
+def _db_pool_connections() -> Dict[LabelValues, float]:
+    values: Dict[LabelValues, float] = {}
+    pools = []
+    sync_db = sys.modules.get("app.db.database_connection")
+    if sync_db is not None:
+        pools.append(("sync", sync_db.engine.pool))
+    async_db = sys.modules.get("app.db.async_database_connection")
+    if async_db is not None and async_db._async_engine is not None:
+        pools.append(("async", async_db._async_engine.pool))
+    for label, pool in pools:
+        if hasattr(pool, "checkedout"):
+            values[(label, "checked_out")] = pool.checkedout()
+            values[(label, "idle")] = pool.checkedin()
+            values[(label, "overflow")] = max(0, pool.overflow())
+    return values
+
+
+def _llm_analysis_cache_snapshot() -> Optional[Dict[str, float]]:
+    # Đọc qua sys.modules như backlog: process chưa import cache thì không export
+    cache = sys.modules.get("app.cache.llm_analysis_cache_manager")
+    return cache.llm_analysis_cache_stats.snapshot() if cache is not None else None
+
+
+def _candidates_cache_snapshot() -> Optional[Dict[str, float]]:
+    cache = sys.modules.get("app.cache.candidates_cache_manager")
+    return cache.candidates_cache_stats.snapshot() if cache is not None else None
+
+
+def _llm_analysis_cache_events() -> Dict[LabelValues, float]:
+    snapshot = _llm_analysis_cache_snapshot()
+    if snapshot is None:
+        return {}
+    return {
+        ("local_hit",): snapshot["local_hits"],
+        ("redis_hit",): snapshot["redis_hits"],
+        ("miss",): snapshot["misses"],
+        ("store",): snapshot["stores"],
+        ("skipped_degraded",): snapshot["skipped_degraded"],
+        ("error",): snapshot["errors"],
+    }
+
+
+def _candidates_cache_events() -> Dict[LabelValues, float]:
+    snapshot = _candidates_cache_snapshot()
+    if snapshot is None:
+        return {}
+    return {
+        ("hit",): snapshot["hits"],
+        ("miss",): snapshot["misses"],
+        ("error",): snapshot["errors"],
+        ("invalidation",): snapshot["invalidations"],
+        ("precomputed",): snapshot["precomputed"],
+        ("stale_write",): snapshot["stale_writes"],
+    }
+
+
+def _cache_hit_rate() -> Dict[LabelValues, float]:
+    values: Dict[LabelValues, float] = {}
+    snapshots = (("llm_analysis", _llm_analysis_cache_snapshot()), ("candidates", _candidates_cache_snapshot()))
+    for label, snapshot in snapshots:
+        if snapshot is not None:
+            values[(label,)] = snapshot["hit_rate"]
+    return values
+
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template (time to response headers).",
+    ("method", "route", "status"),
+))
+EVENT_STAGE_DURATION = REGISTRY.register(Histogram(
+    "event_stage_duration_seconds",
+    "Conversation event processing time per stage (stages may nest).",
+    ("stage",),
+))
+EVENT_OUTCOMES = REGISTRY.register(Counter(
+    "conversation_events_total",
+    "Processed conversation events by outcome and error_code.",
+    ("outcome", "error_code"),
+))
+CONSUMER_IN_FLIGHT = REGISTRY.register(Gauge(
+    "rabbitmq_consumer_in_flight",
+    "RabbitMQ messages currently being processed by this consumer.",
+))
+EVENT_BACKLOG = REGISTRY.register(Gauge(
+    "conversation_events_backlog",
+    "Due conversation events (last scheduler backlog sample).",
+    ("kind",),
+    callback=_conversation_event_backlog,
+))
+DB_POOL_CHECKOUT_WAIT = REGISTRY.register(Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a DB pool connection (includes new connection setup).",
+    ("pool",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+))
+DB_POOL_CONNECTIONS = REGISTRY.register(Gauge(
+    "db_pool_connections",
+    "DB pool connections by state.",
+    ("pool", "state"),
+    callback=_db_pool_connections,
+))
+LLM_ANALYSIS_CACHE_EVENTS = REGISTRY.register(Counter(
+    "llm_analysis_cache_events_total",
+    "LLM analysis cache lookups/stores by event (llm_analysis_cache_stats).",
+    ("event",),
+    callback=_llm_analysis_cache_events,
+))
+CANDIDATES_CACHE_EVENTS = REGISTRY.register(Counter(
+    "candidates_cache_events_total",
+    "Candidates cache events (candidates_cache_stats).",
+    ("event",),
+    callback=_candidates_cache_events,
+))
+CACHE_HIT_RATE = REGISTRY.register(Gauge(
+    "cache_hit_rate",
+    "In-process cache hit rate since start (hits / lookups).",
+    ("cache",),
+    callback=_cache_hit_rate,
+))
+
+
+def metrics_enabled() -> bool:
+    return settings.METRICS_ENABLED
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    """Đo 1 stage xử lý event (ghi cả khi stage raise) + span `stage.<stage>`."""
+    with start_span(f"stage.{stage}"):
+        if not settings.METRICS_ENABLED:
+            yield
+            return
+        with EVENT_STAGE_DURATION.time(stage=stage):
+            yield
+
+
+def record_event_outcome(outcome: str, error_code: Optional[str] = None, count: int = 1) -> None:
+    if settings.METRICS_ENABLED and count:
+        EVENT_OUTCOMES.inc(count, outcome=outcome, error_code=error_code or "none")
+
+
+def route_template(scope) -> str:
+    """Route path template (vd /v1/friendship_status/calculate-score/{conversation_id}) để giới hạn cardinality."""
+    from starlette.routing import Match
+
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+def observe_http_request(method: str, route: str, status_code: int, duration_seconds: float) -> None:
+    if not settings.METRICS_ENABLED:
+        return
+    HTTP_REQUEST_DURATION.observe(duration_seconds, method=method, route=route, status=str(status_code))
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):  # noqa: A002 - signature của BaseHTTPRequestHandler
+        return
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE_LATEST)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: Optional[int] = None, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """
+    Sidecar `/metrics` HTTP server (daemon thread) cho worker / scheduler process.
+
+    Không raise: port bị chiếm (vd 2 worker trên 1 host) chỉ log warning, worker vẫn chạy.
+    """
+    port = settings.METRICS_WORKER_PORT if port is None else port
+    if not settings.METRICS_ENABLED or not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as exc:
+        logger.warning(f"⚠️  Metrics server not started on port {port}: {exc}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"📈 Metrics server listening on http://{host}:{port}/metrics")
+    return server
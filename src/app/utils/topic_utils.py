@@ -5,6 +5,7 @@ from typing import Optional
 from sqlalchemy.orm import Session
 from app.utils.logger_setup import get_logger
 from app.repositories.prompt_template_repository import PromptTemplateRepository
+from app.cache.prompt_catalog_cache_manager import get_prompt_catalog
 
 logger = get_logger(__name__)
 
@@ -16,7 +17,7 @@ def get_topic_id_from_agent_id(
     db: Session
 ) -> Optional[str]:
     """
-    Lấy topic_id từ agent_id bằng cách query bảng agenda_agent_prompting.
+    Lấy topic_id từ agent_id (prompt catalog snapshot, fallback query bảng agenda_agent_prompting).
     
     Args:
         agent_tag: Agent identifier sent from BE (e.g., "agent_story_telling")
@@ -39,7 +40,7 @@ def get_topic_id_from_agent_id(
         return None
     
     try:
-        prompt_repo = PromptTemplateRepository(db)
+        prompt_repo = get_prompt_catalog() or PromptTemplateRepository(db)
         topic_id = prompt_repo.get_topic_id_by_agent_id(
             agent_id=agent_tag,
             friendship_level=friendship_level
@@ -0,0 +1,430 @@
+"""
+Lightweight end-to-end tracing (W3C trace context), không cần OpenTelemetry SDK.
+
+Trace của 1 conversation:
+
+    POST /v1/conversations/end        SERVER span (parent = header `traceparent` nếu client gửi)
+      -> message "trace" (outbox / async publisher) -> AMQP headers traceparent + x-published-at
+         ├─ outbox.wait               event_outbox.created_at -> relay publish (OUTBOX_ENABLED)
+         └─ rabbitmq.consume          CONSUMER span, publish -> ack/nack
+              ├─ rabbitmq.queue_wait  publish -> consumer nhận message
+              ├─ consumer.local_wait  nhận -> worker thread bắt đầu (ConcurrentRabbitMQConsumer)
+              └─ stage.event -> stage.fetch / stage.score (stage.llm_*, stage.mem0) / stage.status_update ...
+
+Stage spans do `metrics_registry.observe_stage` mở (cùng chỗ đo histogram). Span được
+export theo batch trên thread nền dạng OTLP/JSON: mỗi dòng của TRACING_EXPORT_PATH là 1
+ExportTraceServiceRequest (receiver `otlpjsonfile` của OpenTelemetry Collector đọc được),
+và/hoặc POST tới TRACING_OTLP_ENDPOINT (OTLP/HTTP JSON: Collector, Jaeger, Tempo ... port 4318).
+Langfuse `@observe` dùng chung trace_id qua `langfuse_trace_kwargs()`.
+
+TRACING_ENABLED=False: mọi hàm là no-op; trace header của client vẫn được chuyển tiếp nguyên vẹn.
+"""
+import atexit
+import contextvars
+import os
+import queue
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional
+
+import httpx
+import orjson
+
+from app.core.config_settings import settings
+from app.utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+# OTLP SpanKind
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+SPAN_KIND_PRODUCER = 4
+SPAN_KIND_CONSUMER = 5
+
+_STATUS_UNSET = 0
+_STATUS_ERROR = 2
+
+_EXPORT_BATCH_SIZE = 512
+_EXPORT_INTERVAL_SECONDS = 1.0
+
+
+class SpanContext(NamedTuple):
+    trace_id: str  # 32 hex
+    span_id: str  # 16 hex
+    sampled: bool = True
+    tracestate: Optional[str] = None
+
+
+def _random_hex(nbytes: int) -> str:
+    return f"{random.getrandbits(nbytes * 8) or 1:0{nbytes * 2}x}"
+
+
+def parse_traceparent(traceparent: Optional[str], tracestate: Optional[str] = None) -> Optional[SpanContext]:
+    """`00-<trace_id>-<span_id>-<flags>` -> SpanContext; header sai format -> None."""
+    if not traceparent:
+        return None
+    parts = traceparent.strip().lower().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    trace_id, span_id, flags = parts[1], parts[2], parts[3]
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        if not int(trace_id, 16) or not int(span_id, 16):
+            return None
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return SpanContext(trace_id, span_id, sampled, tracestate or None)
+
+
+def format_traceparent(context: SpanContext) -> str:
+    return f"00-{context.trace_id}-{context.span_id}-{'01' if context.sampled else '00'}"
+
+
+def context_to_carrier(context: SpanContext) -> Dict[str, str]:
+    carrier = {"traceparent": format_traceparent(context)}
+    if context.tracestate:
+        carrier["tracestate"] = context.tracestate
+    return carrier
+
+
+def extract_context(carrier: Optional[Mapping[str, Any]]) -> Optional[SpanContext]:
+    """SpanContext từ HTTP headers / AMQP headers / message["trace"]."""
+    if not carrier:
+        return None
+    traceparent = carrier.get("traceparent")
+    tracestate = carrier.get("tracestate")
+    if isinstance(traceparent, bytes):
+        traceparent = traceparent.decode("ascii", "ignore")
+    if isinstance(tracestate, bytes):
+        tracestate = tracestate.decode("ascii", "ignore")
+    return parse_traceparent(traceparent, tracestate)
+
+
+class Span:
+    __slots__ = ("name", "context", "parent_span_id", "kind", "attributes", "start_ns", "end_ns", "status")
+
+    def __init__(
+        self,
+        name: str,
+        context: SpanContext,
+        parent_span_id: Optional[str],
+        kind: int,
+        attributes: Dict[str, Any],
+        start_ns: int,
+    ):
+        self.name = name
+        self.context = context
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = start_ns
+        self.end_ns: Optional[int] = None
+        self.status = (_STATUS_UNSET, "")
+
+    def set_name(self, name: str) -> None:
+        self.name = name
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = (_STATUS_ERROR, f"{type(exc).__name__}: {exc}"[:512])
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if self.context.sampled:
+            _get_exporter().export(self)
+
+
+class _NoopSpan:
+    """Span khi tracing tắt (giữ cùng API để call site không cần if)."""
+
+    context = None
+
+    def set_name(self, name: str) -> None:
+        return None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        return None
+
+    def record_exception(self, exc: BaseException) -> None:
+        return None
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        return None
+
+
+NOOP_SPAN = _NoopSpan()
+_UNSET: Any = object()
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+
+
+def tracing_enabled() -> bool:
+    return settings.TRACING_ENABLED
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _new_span(
+    name: str,
+    parent: Optional[SpanContext],
+    kind: int,
+    attributes: Optional[Dict[str, Any]],
+    start_ns: Optional[int],
+) -> Span:
+    if parent is None:
+        context = SpanContext(_random_hex(16), _random_hex(8), random.random() < settings.TRACING_SAMPLE_RATIO)
+    else:
+        context = SpanContext(parent.trace_id, _random_hex(8), parent.sampled, parent.tracestate)
+    return Span(
+        name,
+        context,
+        parent.span_id if parent is not None else None,
+        kind,
+        dict(attributes or {}),
+        start_ns or time.time_ns(),
+    )
+
+
+@contextmanager
+def start_span(
+    name: str,
+    parent: Optional[SpanContext] = _UNSET,
+    kind: int = SPAN_KIND_INTERNAL,
+    attributes: Optional[Dict[str, Any]] = None,
+    start_ns: Optional[int] = None,
+) -> Iterator[Span]:
+    """
+    Span con của span hiện tại (hoặc của `parent` lấy từ header); không có parent -> root
+    span mới, sampling theo TRACING_SAMPLE_RATIO. Exception -> status ERROR rồi raise lại.
+    """
+    if not settings.TRACING_ENABLED:
+        yield NOOP_SPAN
+        return
+    if parent is _UNSET:
+        active = _current_span.get()
+        parent = active.context if active is not None else None
+    span = _new_span(name, parent, kind, attributes, start_ns)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.record_exception(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def record_span(
+    name: str,
+    parent: Optional[SpanContext],
+    start_ns: Optional[int],
+    end_ns: Optional[int] = None,
+    kind: int = SPAN_KIND_INTERNAL,
+    attributes: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Ghi 1 span đã kết thúc (vd thời gian chờ trong queue, tính từ timestamp trong header)."""
+    if not settings.TRACING_ENABLED or not start_ns:
+        return
+    end_ns = end_ns or time.time_ns()
+    if end_ns <= start_ns:
+        return
+    _new_span(name, parent, kind, attributes, start_ns).end(end_ns)
+
+
+def current_trace_context() -> Optional[Dict[str, str]]:
+    """traceparent/tracestate của span hiện tại (đưa vào queue message)."""
+    span = _current_span.get()
+    return context_to_carrier(span.context) if span is not None else None
+
+
+def inject_headers(headers: Mapping[str, str]) -> Mapping[str, str]:
+    """`headers` + traceparent của span hiện tại cho HTTP call ra ngoài (vd Memory API)."""
+    span = _current_span.get()
+    if span is None:
+        return headers
+    return {**headers, **context_to_carrier(span.context)}
+
+
+def langfuse_trace_kwargs() -> Dict[str, str]:
+    """
+    kwargs cho hàm `@observe` để observation Langfuse nằm chung trace (Langfuse v3 nhận
+    `langfuse_trace_id` 32 hex = W3C trace id). Rỗng khi tracing/Langfuse tắt.
+    """
+    if not (settings.TRACING_ENABLED and settings.LANGFUSE_ENABLED):
+        return {}
+    span = _current_span.get()
+    if span is None or not span.context.sampled:
+        return {}
+    return {"langfuse_trace_id": span.context.trace_id}
+
+
+# ============================================================================
+# Export (OTLP/JSON)
+# ============================================================================
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    encoded = {
+        "traceId": span.context.trace_id,
+        "spanId": span.context.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+    }
+    if span.parent_span_id:
+        encoded["parentSpanId"] = span.parent_span_id
+    if span.status[0] != _STATUS_UNSET:
+        encoded["status"] = {"code": span.status[0], "message": span.status[1]}
+    return encoded
+
+
+class _SpanExporter:
+    """Gom span trên thread nền -> TRACING_EXPORT_PATH (JSON lines) và/hoặc TRACING_OTLP_ENDPOINT."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=settings.TRACING_MAX_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._http: Optional[httpx.Client] = None
+        self.dropped = 0
+
+    def export(self, span: Span) -> None:
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1  # không block hot path khi exporter chậm
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # Sau fork (uvicorn/gunicorn workers) thread của process cha không tồn tại
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + _EXPORT_INTERVAL_SECONDS
+            while len(batch) < _EXPORT_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def flush(self) -> None:
+        """Export phần còn trong queue (atexit)."""
+        batch: List[Span] = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+    def _request(self, spans: List[Span]) -> Dict[str, Any]:
+        resource = {
+            "service.name": settings.TRACING_SERVICE_NAME,
+            "service.version": settings.PROJECT_VERSION,
+            "deployment.environment": settings.ENVIRONMENT,
+            "host.name": socket.gethostname(),
+            "process.pid": os.getpid(),
+        }
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes(resource)},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [_otlp_span(span) for span in spans],
+                }],
+            }]
+        }
+
+    def _write(self, spans: List[Span]) -> None:
+        try:
+            payload = orjson.dumps(self._request(spans))
+        except Exception as exc:
+            logger.warning(f"⚠️  Cannot encode {len(spans)} span(s): {exc}")
+            return
+        with self._write_lock:
+            path = settings.TRACING_EXPORT_PATH
+            if path:
+                try:
+                    path = path.format(pid=os.getpid())
+                    directory = os.path.dirname(path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with open(path, "ab") as handle:
+                        handle.write(payload + b"\n")
+                except OSError as exc:
+                    logger.warning(f"⚠️  Cannot write spans to {path}: {exc}")
+            if settings.TRACING_OTLP_ENDPOINT:
+                try:
+                    if self._http is None:
+                        self._http = httpx.Client(timeout=5.0)
+                    response = self._http.post(
+                        settings.TRACING_OTLP_ENDPOINT,
+                        content=payload,
+                        headers={"Content-Type": "application/json"},
+                    )
+                    response.raise_for_status()
+                except httpx.HTTPError as exc:
+                    logger.warning(f"⚠️  OTLP export of {len(spans)} span(s) failed: {exc}")
+
+
+_exporter: Optional[_SpanExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def _get_exporter() -> _SpanExporter:
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = _SpanExporter()
+                atexit.register(_exporter.flush)
+    return _exporter
+
+
+def flush_traces() -> None:
+    if _exporter is not None:
+        _exporter.flush()
@@ -0,0 +1,88 @@
+"""
+Ghi kết quả benchmark ra file JSON (machine-readable) để so sánh giữa các release.
+
+Mỗi file là 1 lần chạy của 1 suite:
+
+    {
+      "suite": "locust" | "worker_throughput" | ...,
+      "created_at": "...Z", "git_sha": "...", "host": "...", "python": "3.11.x",
+      "params": {...},                     # tham số CLI của lần chạy
+      "metrics": {"<case>": {"rps": ..., "p50_ms": ..., "p95_ms": ..., "p99_ms": ...,
+                             "events_per_second": ..., ...}}
+    }
+
+So sánh 2 file bằng `benchmarks/compare_results.py`.
+"""
+import json
+import os
+import platform
+import socket
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples_ms: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max (ms) của 1 list latency."""
+    return {
+        "p50_ms": round(percentile(samples_ms, 50), 2),
+        "p95_ms": round(percentile(samples_ms, 95), 2),
+        "p99_ms": round(percentile(samples_ms, 99), 2),
+        "max_ms": round(max(samples_ms), 2) if samples_ms else 0.0,
+    }
+
+
+def _git_sha() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            timeout=5,
+            check=True,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def default_results_path(suite: str) -> str:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return os.path.join(DEFAULT_RESULTS_DIR, f"{suite}-{stamp}.json")
+
+
+def write_results(
+    suite: str,
+    metrics: Dict[str, Dict[str, Any]],
+    params: Optional[Dict[str, Any]] = None,
+    path: Optional[str] = None,
+) -> str:
+    """Ghi 1 lần chạy ra `path` (mặc định benchmarks/results/<suite>-<timestamp>.json)."""
+    path = path or default_results_path(suite)
+    document = {
+        "suite": suite,
+        "created_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "git_sha": _git_sha(),
+        "host": socket.gethostname(),
+        "python": platform.python_version(),
+        "params": params or {},
+        "metrics": metrics,
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(document, handle, ensure_ascii=False, indent=2, sort_keys=True)
+        handle.write("\n")
+    print(f"📄 Results written to {path}")
+    return path
@@ -0,0 +1,78 @@
+"""
+So sánh 2 file kết quả benchmark (bench_results.write_results) của cùng 1 suite.
+
+Metric "càng cao càng tốt" (rps, events_per_second, users_per_second) bị coi là regression
+khi giảm quá `--tolerance` %; metric latency (*_ms, *_us) khi tăng quá `--tolerance` %.
+Exit code 1 nếu có regression (dùng được trong CI / checklist release).
+
+Usage:
+    python benchmarks/compare_results.py baseline.json candidate.json --tolerance 10
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+HIGHER_IS_BETTER = ("rps", "events_per_second", "users_per_second")
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _direction(metric: str) -> int:
+    """+1: càng cao càng tốt, -1: càng thấp càng tốt, 0: không so sánh."""
+    if metric in HIGHER_IS_BETTER:
+        return 1
+    if metric.endswith(("_ms", "_us")):
+        return -1
+    return 0
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], tolerance_pct: float) -> List[Tuple]:
+    """Return rows (case, metric, baseline, candidate, change %, regressed)."""
+    rows = []
+    for case, base_metrics in sorted(baseline.get("metrics", {}).items()):
+        new_metrics = candidate.get("metrics", {}).get(case)
+        if new_metrics is None:
+            continue
+        for metric, base_value in sorted(base_metrics.items()):
+            direction = _direction(metric)
+            new_value = new_metrics.get(metric)
+            if not direction or not isinstance(base_value, (int, float)) or not isinstance(new_value, (int, float)):
+                continue
+            change = ((new_value - base_value) / base_value * 100) if base_value else 0.0
+            regressed = change * direction < -tolerance_pct
+            rows.append((case, metric, base_value, new_value, change, regressed))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Regression threshold (%%)")
+    args = parser.parse_args()
+
+    baseline, candidate = _load(args.baseline), _load(args.candidate)
+    if baseline.get("suite") != candidate.get("suite"):
+        sys.exit(f"Suite mismatch: {baseline.get('suite')} vs {candidate.get('suite')}")
+
+    rows = compare(baseline, candidate, args.tolerance)
+    print(f"suite={baseline.get('suite')} {baseline.get('git_sha')} -> {candidate.get('git_sha')} "
+          f"tolerance={args.tolerance}%")
+    print(f"{'case':<40}{'metric':<20}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for case, metric, base_value, new_value, change, regressed in rows:
+        flag = "  ❌" if regressed else ""
+        print(f"{case:<40}{metric:<20}{base_value:>12.2f}{new_value:>12.2f}{change:>9.1f}%{flag}")
+
+    regressions = sum(1 for row in rows if row[-1])
+    if regressions:
+        print(f"❌ {regressions} regression(s) beyond {args.tolerance}%")
+        sys.exit(1)
+    print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+So sánh load full row conversation_events (conversation_log + raw_conversation_log) với
+deferred loading trên các access path nóng.
+
+Seed N events (mỗi event `--turns` turns) với conversation_id prefix riêng, rồi đo cho
+từng path: thời gian/iteration, Python memory peak (tracemalloc) và số bytes JSONB
+(pg_column_size) mà query phải de-TOAST + gửi về:
+
+- idempotency check  : get_by_conversation_id (full row)  vs exists()
+- batch read (status) : select full rows                  vs select mặc định (deferred)
+- analyzer            : select + undefer(conversation_log) (không load raw_conversation_log)
+
+Cần PostgreSQL (DATABASE_URL như app). Rows seed bị xóa khi kết thúc (trừ khi --keep).
+
+Usage:
+    python benchmarks/deferred_log_loading.py --events 200 --turns 200 --iterations 20
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import delete, func, select  # noqa: E402
+from sqlalchemy.orm import undefer  # noqa: E402
+
+from app.core.constants_enums import ConversationEventStatus  # noqa: E402
+from app.db.database_connection import SessionLocal  # noqa: E402
+from app.models.conversation_event_model import ConversationEvent  # noqa: E402
+from app.repositories.conversation_event_repository import ConversationEventRepository  # noqa: E402
+
+PREFIX = "bench_deferred_"
+
+
+def _conversation_log(turns: int):
+    log = []
+    for index in range(turns):
+        log.append({"speaker": "pika", "turn_id": index * 2, "text": f"Câu hỏi số {index} của Pika nè? " * 4})
+        log.append({"speaker": "user", "turn_id": index * 2 + 1, "text": f"Câu trả lời số {index} của bé. " * 3})
+    return log
+
+
+def _seed(db, events: int, turns: int) -> None:
+    log = _conversation_log(turns)
+    raw = [{"type": "USER_RESPONSE_CONVERSATION", "payload": message} for message in log]
+    now = datetime.now(timezone.utc)
+    for index in range(events):
+        db.add(
+            ConversationEvent(
+                conversation_id=f"{PREFIX}{index}",
+                user_id=f"{PREFIX}user",
+                bot_type="benchmark",
+                bot_id="benchmark",
+                bot_name="benchmark",
+                start_time=now - timedelta(minutes=10),
+                end_time=now,
+                conversation_log=log,
+                raw_conversation_log=raw,
+                # PROCESSED: scheduler/worker thật không claim rows benchmark
+                status=ConversationEventStatus.PROCESSED.value,
+            )
+        )
+    db.commit()
+
+
+def _cleanup(db) -> None:
+    db.execute(delete(ConversationEvent).where(ConversationEvent.conversation_id.like(f"{PREFIX}%")))
+    db.commit()
+
+
+def _jsonb_bytes(db, *columns) -> int:
+    sizes = [func.coalesce(func.sum(func.pg_column_size(column)), 0) for column in columns]
+    return int(sum(db.execute(
+        select(*sizes).where(ConversationEvent.conversation_id.like(f"{PREFIX}%"))
+    ).one()))
+
+
+def _measure(fn, iterations: int):
+    """Return (ms/iteration, tracemalloc peak KiB) for fn(db) on a fresh session each run."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        db = SessionLocal()
+        try:
+            fn(db)
+        finally:
+            db.close()
+    elapsed = (time.perf_counter() - started) / iterations * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deferred conversation_log loading benchmark")
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="Không xóa rows benchmark")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        _cleanup(db)
+        _seed(db, args.events, args.turns)
+        log_bytes = _jsonb_bytes(db, ConversationEvent.conversation_log)
+        raw_bytes = _jsonb_bytes(db, ConversationEvent.raw_conversation_log)
+    finally:
+        db.close()
+
+    by_prefix = ConversationEvent.conversation_id.like(f"{PREFIX}%")
+    ids = [f"{PREFIX}{index}" for index in range(args.events)]
+    full_row = (undefer(ConversationEvent.conversation_log), undefer(ConversationEvent.raw_conversation_log))
+
+    cases = [
+        (
+            "idempotency (full row)",
+            lambda db: [db.scalars(select(ConversationEvent).options(*full_row)
+                                   .where(ConversationEvent.conversation_id == cid)).first() for cid in ids],
+            log_bytes + raw_bytes,
+        ),
+        (
+            "idempotency (exists)",
+            lambda db: [ConversationEventRepository(db).exists(cid) for cid in ids],
+            0,
+        ),
+        (
+            "batch read (full row)",
+            lambda db: db.scalars(select(ConversationEvent).options(*full_row).where(by_prefix)).all(),
+            log_bytes + raw_bytes,
+        ),
+        (
+            "batch read (deferred)",
+            lambda db: db.scalars(select(ConversationEvent).where(by_prefix)).all(),
+            0,
+        ),
+        (
+            "analyzer (log only)",
+            lambda db: db.scalars(
+                select(ConversationEvent).options(undefer(ConversationEvent.conversation_log)).where(by_prefix)
+            ).all(),
+            log_bytes,
+        ),
+    ]
+
+    print(f"events={args.events} turns={args.turns} iterations={args.iterations}")
+    print(f"jsonb stored: conversation_log={log_bytes / 1024:.0f} KiB raw_conversation_log={raw_bytes / 1024:.0f} KiB")
+    print(f"{'path':<26}{'ms/iter':>10}{'py peak KiB':>14}{'jsonb KiB':>12}")
+    try:
+        for name, fn, jsonb in cases:
+            elapsed, peak = _measure(fn, args.iterations)
+            print(f"{name:<26}{elapsed:>10.2f}{peak:>14.0f}{jsonb / 1024:>12.0f}")
+    finally:
+        if not args.keep:
+            db = SessionLocal()
+            try:
+                _cleanup(db)
+            finally:
+                db.close()
+
+
+if __name__ == "__main__":
+    main()
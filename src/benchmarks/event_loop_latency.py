@@ -0,0 +1,150 @@
+"""
+Load test: event loop không bị block bởi calculate-score.
+
+Đo p50/p99 của `GET /v1/health` và `POST /v1/activities/suggest` ở 2 pha:
+
+1. baseline   - chỉ có traffic health + suggest
+2. in-flight  - cùng traffic đó trong khi N request
+                `POST /v1/friendship_status/calculate-score/{conversation_id}` đang chạy
+                (Groq + Mem0 + DB, thường vài giây)
+
+Nếu path async không block, p99 của pha 2 phải xấp xỉ pha 1.
+
+Usage:
+    python benchmarks/event_loop_latency.py \
+        --base-url http://localhost:8000 \
+        --user-id user_123 \
+        --conversation-id conv_test_123 \
+        --duration 20 --concurrency 20 --score-calls 4
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile (ms)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def _probe_loop(
+    client: httpx.AsyncClient,
+    name: str,
+    user_id: str,
+    deadline: float,
+    results: Dict[str, List[float]],
+    errors: Dict[str, int],
+) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if name == "health":
+                response = await client.get("/v1/health")
+            else:
+                response = await client.post("/v1/activities/suggest", json={"user_id": user_id})
+            if response.status_code >= 500:
+                errors[name] += 1
+                continue
+        except httpx.HTTPError:
+            errors[name] += 1
+            continue
+        results[name].append((time.perf_counter() - started) * 1000)
+
+
+async def _score_loop(
+    client: httpx.AsyncClient,
+    conversation_id: str,
+    deadline: float,
+    durations: List[float],
+) -> None:
+    # Giữ luôn có 1 calculate-score in-flight cho tới hết pha
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            await client.post(f"/v1/friendship_status/calculate-score/{conversation_id}")
+        except httpx.HTTPError:
+            pass
+        durations.append((time.perf_counter() - started) * 1000)
+
+
+async def run_phase(args: argparse.Namespace, with_score_calls: bool) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, List[float]] = {"health": [], "suggest": []}
+    errors: Dict[str, int] = {"health": 0, "suggest": 0}
+    score_durations: List[float] = []
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2 + args.score_calls + 4)
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        deadline = time.perf_counter() + args.duration
+        tasks = []
+        for _ in range(args.concurrency):
+            tasks.append(_probe_loop(client, "health", args.user_id, deadline, results, errors))
+            tasks.append(_probe_loop(client, "suggest", args.user_id, deadline, results, errors))
+        if with_score_calls:
+            for _ in range(args.score_calls):
+                tasks.append(_score_loop(client, args.conversation_id, deadline, score_durations))
+        await asyncio.gather(*tasks)
+
+    summary: Dict[str, Dict[str, float]] = {}
+    for name, samples in results.items():
+        summary[name] = {
+            "count": len(samples),
+            "errors": errors[name],
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+            "mean_ms": round(statistics.fmean(samples), 2) if samples else 0.0,
+        }
+    if with_score_calls:
+        summary["calculate_score"] = {
+            "count": len(score_durations),
+            "errors": 0,
+            "p50_ms": round(percentile(score_durations, 50), 2),
+            "p99_ms": round(percentile(score_durations, 99), 2),
+            "mean_ms": round(statistics.fmean(score_durations), 2) if score_durations else 0.0,
+        }
+    return summary
+
+
+def _print_summary(title: str, summary: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n=== {title} ===")
+    print(f"{'endpoint':<18}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for name, row in summary.items():
+        print(
+            f"{name:<18}{row['count']:>8}{row['errors']:>8}"
+            f"{row['p50_ms']:>10}{row['p99_ms']:>10}{row['mean_ms']:>10}"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Event-loop latency load test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--user-id", default="user_loadtest")
+    parser.add_argument("--conversation-id", default="conv_test_123")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per phase")
+    parser.add_argument("--concurrency", type=int, default=20, help="Probe workers per endpoint")
+    parser.add_argument("--score-calls", type=int, default=4, help="Concurrent calculate-score calls")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    baseline = await run_phase(args, with_score_calls=False)
+    _print_summary("baseline", baseline)
+    loaded = await run_phase(args, with_score_calls=True)
+    _print_summary("calculate-score in flight", loaded)
+
+    print("\n=== p99 ratio (in-flight / baseline) ===")
+    for name in ("health", "suggest"):
+        base_p99 = baseline[name]["p99_ms"]
+        ratio = loaded[name]["p99_ms"] / base_p99 if base_p99 else 0.0
+        print(f"{name:<18}{ratio:>8.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,243 @@
+"""
+Local stand-ins cho Groq (OpenAI-compatible chat completions) và Mem0 `/extract_facts`.
+
+Dùng cho load test / worker benchmark để kết quả lặp lại được và không tốn quota: latency
+và lỗi được sinh theo phân phối cấu hình (seed cố định), trả về đúng shape mà
+`LLMAnalysisClient` / `extract_memories_from_api` parse.
+
+- groq: POST .../chat/completions -> content là JSON có cả `user_initiated_questions` và
+  `session_emotion` (hợp lệ cho cả LLM_ANALYSIS_MODE=separate và combined)
+- mem0: POST /extract_facts -> {"status", "count", "facts"}
+- GET /health, GET /__stats (số request / lỗi / latency đã inject)
+
+Trỏ app/worker vào fake:
+    GROQ_BASE_URL=http://localhost:8091 GROQ_API_KEY=fake LLM_ANALYSIS_ENABLED=True
+    MEMORY_API_URL=http://localhost:8092
+
+Usage:
+    python benchmarks/fake_upstreams.py groq --port 8091 --latency-ms 800 --jitter 0.4 --error-rate 0.02
+    python benchmarks/fake_upstreams.py mem0 --port 8092 --latency-ms 1500 --dist uniform --jitter 500
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+EMOTIONS = ["interesting", "boring", "neutral", "angry", "happy", "sad"]
+_USER_LINE = re.compile(r"^\d+\.\s*\[USER\]:(.*)$", re.MULTILINE)
+
+
+@dataclass
+class FaultProfile:
+    """
+    Latency + lỗi inject cho mỗi request.
+
+    dist: fixed (luôn latency_ms) | uniform (latency_ms ± jitter ms) |
+          lognormal (median latency_ms, sigma = jitter) -> có đuôi dài như upstream thật
+    """
+    latency_ms: float = 0.0
+    dist: str = "fixed"
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_statuses: Tuple[int, ...] = (500,)
+    hang_rate: float = 0.0
+    hang_seconds: float = 120.0
+    seed: int = 42
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> Tuple[float, Optional[int], bool]:
+        """Return (delay seconds, error status hoặc None, hang)."""
+        with self._lock:
+            roll = self._rng.random()
+            if self.dist == "uniform":
+                delay_ms = self._rng.uniform(self.latency_ms - self.jitter, self.latency_ms + self.jitter)
+            elif self.dist == "lognormal" and self.latency_ms > 0:
+                delay_ms = self._rng.lognormvariate(math.log(self.latency_ms), self.jitter)
+            else:
+                delay_ms = self.latency_ms
+            status = self._rng.choice(self.error_statuses)
+        if roll < self.hang_rate:
+            return self.hang_seconds, None, True
+        if roll < self.hang_rate + self.error_rate:
+            return max(0.0, delay_ms) / 1000, status, False
+        return max(0.0, delay_ms) / 1000, None, False
+
+
+class UpstreamStats:
+    """Thread-safe counters exposed at GET /__stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.hangs = 0
+        self.delay_ms_total = 0.0
+
+    def record(self, delay_seconds: float, status: Optional[int], hang: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += 1 if status else 0
+            self.hangs += 1 if hang else 0
+            self.delay_ms_total += delay_seconds * 1000
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "hangs": self.hangs,
+                "avg_injected_delay_ms": round(self.delay_ms_total / self.requests, 2) if self.requests else 0.0,
+            }
+
+
+def _stable_int(text: str) -> int:
+    value = 0
+    for char in text[:4096]:
+        value = (value * 31 + ord(char)) & 0xFFFFFFFF
+    return value
+
+
+def groq_completion(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Chat completion giả lập: kết quả deterministic theo nội dung prompt."""
+    messages: List[Dict[str, Any]] = request.get("messages") or []
+    prompt = "\n".join(str(message.get("content") or "") for message in messages)
+    questions = sum(1 for line in _USER_LINE.findall(prompt) if "?" in line)
+    content = json.dumps({
+        "user_initiated_questions": questions,
+        "session_emotion": EMOTIONS[_stable_int(prompt) % len(EMOTIONS)],
+    })
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": f"chatcmpl-fake-{_stable_int(prompt):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model") or "fake-model",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def mem0_extract_facts(request: Dict[str, Any], max_facts: int) -> Dict[str, Any]:
+    """Response /extract_facts giả lập: số facts deterministic theo conversation_id."""
+    conversation_id = str(request.get("conversation_id") or "")
+    count = _stable_int(conversation_id) % (max_facts + 1) if max_facts > 0 else 0
+    return {
+        "status": "success",
+        "count": count,
+        "facts": [
+            {"id": f"fact_{conversation_id}_{index}", "fact_value": f"Fake fact {index} of {conversation_id}"}
+            for index in range(count)
+        ],
+    }
+
+
+def build_handler(kind: str, profile: FaultProfile, stats: UpstreamStats, max_facts: int):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive như upstream thật (client dùng pool)
+
+        def log_message(self, format, *args):  # noqa: A002 - signature của BaseHTTPRequestHandler
+            return
+
+        def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok", "kind": kind})
+            elif self.path == "/__stats":
+                self._send_json(200, stats.snapshot())
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "invalid json"})
+                return
+
+            if kind == "groq" and self.path.endswith("/chat/completions"):
+                build = lambda: groq_completion(request)  # noqa: E731
+            elif kind == "mem0" and self.path.rstrip("/") == "/extract_facts":
+                build = lambda: mem0_extract_facts(request, max_facts)  # noqa: E731
+            else:
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+                return
+
+            delay, error_status, hang = profile.draw()
+            stats.record(delay, error_status, hang)
+            time.sleep(delay)
+            if error_status:
+                self._send_json(error_status, {"error": {"message": "injected failure", "type": "fake_upstream"}})
+                return
+            self._send_json(200, build())
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Groq / Mem0 upstream for benchmarks")
+    parser.add_argument("kind", choices=["groq", "mem0"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="Default: groq 8091, mem0 8092")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform: ± ms; lognormal: sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tỉ lệ request trả lỗi (0..1)")
+    parser.add_argument("--error-status", default="500", help="Status lỗi, chọn ngẫu nhiên (vd: 500,503,429)")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Tỉ lệ request treo (test timeout)")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--max-facts", type=int, default=3, help="mem0: số facts tối đa mỗi conversation")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    profile = FaultProfile(
+        latency_ms=args.latency_ms,
+        dist=args.dist,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_statuses=tuple(int(code) for code in args.error_status.split(",") if code.strip()),
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        seed=args.seed,
+    )
+    stats = UpstreamStats()
+    port = args.port or (8091 if args.kind == "groq" else 8092)
+    server = ThreadingHTTPServer((args.host, port), build_handler(args.kind, profile, stats, args.max_facts))
+    server.daemon_threads = True
+    print(f"🧪 Fake {args.kind} listening on http://{args.host}:{port} | {profile}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 {args.kind} stats: {stats.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Locust scenarios cho các API chính (thay cho `.tours/locustfile_tour.py` - Locust quickstart).
+
+User classes (chọn bằng tên class trên command line, mặc định chạy tất cả theo `weight`):
+
+- ConversationEndUser  : POST /v1/conversations/end (conversation_id unique, log `--turns` turns)
+- SuggestUser          : POST /v1/activities/suggest cho pool `--user-pool` users
+                         (+ If-None-Match khi server trả ETag)
+- CalculateScoreUser   : POST /v1/friendship_status/calculate-score/{id} và
+                         /calculate-score-and-update trên các conversation mà
+                         ConversationEndUser đã tạo trong cùng lần chạy (hoặc `--conversation-ids`)
+
+Khi kết thúc, RPS + p50/p95/p99 từng endpoint được ghi ra `--results-file`
+(bench_results.write_results, suite "locust"). Dùng fake_upstreams.py cho Groq/Mem0 để
+kết quả lặp lại được.
+
+Usage (headless):
+    locust -f benchmarks/locustfile.py --host http://localhost:8000 --headless \\
+        -u 100 -r 20 -t 2m --turns 40 --user-pool 5000 --results-file results/locust.json
+    locust -f benchmarks/locustfile.py --host http://localhost:8000 --headless -u 50 -t 1m SuggestUser
+"""
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from locust import HttpUser, between, events, task
+from locust.runners import WorkerRunner
+
+from bench_results import write_results
+
+CONVERSATION_PREFIX = "conv_bench_"
+
+_created_conversations: List[str] = []
+_created_lock = threading.Lock()
+
+
+@events.init_command_line_parser.add_listener
+def _add_arguments(parser):
+    parser.add_argument("--user-prefix", default="bench_user_", help="Prefix user_id")
+    parser.add_argument("--user-pool", type=int, default=1000, help="Số user_id khác nhau")
+    parser.add_argument("--turns", type=int, default=20, help="Số turn (pika + user) mỗi conversation")
+    parser.add_argument("--conversation-ids", default="", help="Conversation có sẵn cho calculate-score (phẩy)")
+    parser.add_argument("--results-file", default="", help="JSON output (mặc định benchmarks/results/)")
+
+
+def _conversation_log(turns: int, seed: int) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    log = []
+    for index in range(turns):
+        log.append({"speaker": "pika", "text": f"Hôm nay con thích chơi gì nhất, lượt {index}?"})
+        question = " Còn Pika thì sao?" if rng.random() < 0.2 else ""
+        log.append({"speaker": "user", "text": f"Con thích đá bóng với bạn {rng.randint(1, 99)}.{question}"})
+    return log
+
+
+def _remember_conversation(conversation_id: str) -> None:
+    with _created_lock:
+        _created_conversations.append(conversation_id)
+        if len(_created_conversations) > 10000:
+            del _created_conversations[:5000]
+
+
+def _pick_conversation(environment) -> Optional[str]:
+    with _created_lock:
+        if _created_conversations:
+            return random.choice(_created_conversations)
+    preset = [item.strip() for item in environment.parsed_options.conversation_ids.split(",") if item.strip()]
+    return random.choice(preset) if preset else None
+
+
+def _random_user_id(environment) -> str:
+    options = environment.parsed_options
+    return f"{options.user_prefix}{random.randrange(max(1, options.user_pool))}"
+
+
+class ConversationEndUser(HttpUser):
+    """Backend gửi conversation log sau mỗi phiên."""
+    weight = 3
+    wait_time = between(0.5, 1.5)
+
+    @task
+    def end_conversation(self):
+        options = self.environment.parsed_options
+        conversation_id = f"{CONVERSATION_PREFIX}{uuid.uuid4().hex}"
+        end_time = datetime.now(timezone.utc)
+        payload = {
+            "conversation_id": conversation_id,
+            "user_id": _random_user_id(self.environment),
+            "bot_type": "TALK",
+            "bot_id": "talk_movie_preference",
+            "bot_name": "Movie Preference Talk",
+            "start_time": (end_time - timedelta(minutes=10)).isoformat(),
+            "end_time": end_time.isoformat(),
+            "conversation_log": _conversation_log(options.turns, hash(conversation_id)),
+        }
+        with self.client.post("/v1/conversations/end", json=payload, catch_response=True) as response:
+            if response.status_code == 202:
+                _remember_conversation(conversation_id)
+                response.success()
+            else:
+                response.failure(f"status {response.status_code}")
+
+
+class SuggestUser(HttpUser):
+    """Robot gọi suggest trước mỗi phiên; giữ ETag theo user như client thật."""
+    weight = 6
+    wait_time = between(0.2, 1.0)
+
+    def on_start(self):
+        self.etags: Dict[str, str] = {}
+
+    @task
+    def suggest(self):
+        user_id = _random_user_id(self.environment)
+        headers = {"If-None-Match": self.etags[user_id]} if user_id in self.etags else {}
+        with self.client.post(
+            "/v1/activities/suggest",
+            json={"user_id": user_id},
+            headers=headers,
+            catch_response=True,
+        ) as response:
+            if response.status_code in (200, 304):
+                etag = response.headers.get("ETag")
+                if etag:
+                    self.etags[user_id] = etag
+                response.success()
+            else:
+                response.failure(f"status {response.status_code}")
+
+
+class CalculateScoreUser(HttpUser):
+    """Các route calculate-score (đồng bộ với Groq/Mem0)."""
+    weight = 1
+    wait_time = between(1, 3)
+
+    @task(3)
+    def calculate_score(self):
+        conversation_id = _pick_conversation(self.environment)
+        if conversation_id is None:
+            return
+        self.client.post(
+            f"/v1/friendship_status/calculate-score/{conversation_id}",
+            name="/v1/friendship_status/calculate-score/[conversation_id]",
+        )
+
+    @task(1)
+    def calculate_score_and_update(self):
+        conversation_id = _pick_conversation(self.environment)
+        if conversation_id is None:
+            return
+        self.client.post(
+            "/v1/friendship_status/calculate-score-and-update",
+            json={"user_id": _random_user_id(self.environment), "conversation_id": conversation_id},
+        )
+
+
+@events.quitting.add_listener
+def _write_results(environment, **kwargs):
+    """Ghi RPS / p50 / p95 / p99 từng endpoint (master hoặc local runner)."""
+    if isinstance(environment.runner, WorkerRunner):
+        return
+    stats = environment.stats
+    metrics = {}
+    for entry in list(stats.entries.values()) + [stats.total]:
+        if not entry.num_requests:
+            continue
+        name = "TOTAL" if entry is stats.total else f"{entry.method} {entry.name}"
+        metrics[name] = {
+            "requests": entry.num_requests,
+            "failures": entry.num_failures,
+            "failure_ratio": round(entry.fail_ratio, 4),
+            "rps": round(entry.total_rps, 2),
+            "avg_ms": round(entry.avg_response_time, 2),
+            "p50_ms": entry.get_response_time_percentile(0.50),
+            "p95_ms": entry.get_response_time_percentile(0.95),
+            "p99_ms": entry.get_response_time_percentile(0.99),
+        }
+    options = environment.parsed_options
+    params = {
+        "host": environment.host,
+        "users": getattr(options, "num_users", None),
+        "spawn_rate": getattr(options, "spawn_rate", None),
+        "run_time": getattr(options, "run_time", None),
+        "user_classes": [user_class.__name__ for user_class in environment.user_classes],
+        "user_pool": options.user_pool,
+        "turns": options.turns,
+    }
+    write_results("locust", metrics, params=params, path=options.results_file or None)
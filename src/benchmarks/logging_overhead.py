@@ -0,0 +1,167 @@
+"""
+Chi phí logging trên hot path của worker: CPU của thread gọi log, CPU cả process và
+bytes/writes ra stdout cho mỗi event.
+
+Mỗi event gọi đúng các hàm thật đang log payload lớn:
+- `_prepare_memory_api_request` (payload Mem0 = cả conversation)
+- `_interpret_memory_api_result` (response Mem0)
+- `_BaseLLMAnalysisClient._extract_result_text` (raw LLM response + usage)
+
+Modes (cùng code path, chỉ khác cấu hình logger_setup):
+- `sync_full`:  LOG_QUEUE_ENABLED=False, LOG_PAYLOAD_SAMPLE_RATE=1, không cap (gần với logging cũ:
+  format + write trên thread gọi, log mọi payload; payload cũ còn là json.dumps indent=2 nên
+  số bytes thực tế trước đây còn lớn hơn)
+- `queue_full`: queue + listener nền, vẫn log mọi payload
+- `default`:    queue + sampling + field caps theo config hiện tại
+
+Output ghi vào sink đếm bytes (không in ra terminal). Không cần Mem0 / Groq / DB. Mọi metric
+là giá trị / event (`*_us` so sánh được bằng compare_results.py).
+
+Usage:
+    python benchmarks/logging_overhead.py --events 2000 --turns 100
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.config_settings import settings  # noqa: E402
+from app.services.utils.llm_analysis_utils import (  # noqa: E402
+    LLMAnalysisClient,
+    _interpret_memory_api_result,
+    _prepare_memory_api_request,
+)
+from app.utils.logger_setup import configure_logging, dropped_log_records, shutdown_logging  # noqa: E402
+
+from bench_results import write_results  # noqa: E402
+
+MODES = {
+    "sync_full": {"LOG_QUEUE_ENABLED": False, "LOG_PAYLOAD_SAMPLE_RATE": 1.0,
+                  "LOG_MAX_FIELD_CHARS": 0, "LOG_MAX_MESSAGE_CHARS": 0},
+    "queue_full": {"LOG_QUEUE_ENABLED": True, "LOG_PAYLOAD_SAMPLE_RATE": 1.0,
+                   "LOG_MAX_FIELD_CHARS": 0, "LOG_MAX_MESSAGE_CHARS": 0},
+    "default": {},
+}
+
+
+class CountingSink:
+    """Stream thay stdout: chỉ đếm bytes / số lần write."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        self.bytes += len(text.encode("utf-8"))
+        self.writes += 1
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def _conversation_log(turns: int):
+    log = []
+    for index in range(turns):
+        log.append({"speaker": "pika", "turn_id": index * 2, "text": "Hôm nay bạn đã làm gì vui không? " * 3})
+        log.append({"speaker": "user", "turn_id": index * 2 + 1, "text": "Mình đi chơi công viên với bố mẹ. " * 2})
+    return log
+
+
+def _memory_result(facts: int) -> Dict[str, Any]:
+    return {
+        "status": "success",
+        "count": facts,
+        "facts": [{"id": f"fact_{index}", "fact_value": f"Bé thích khủng long số {index}"} for index in range(facts)],
+    }
+
+
+def _llm_response(chars: int):
+    content = '{"engagement_score": 7, "reasoning": "' + "Bé trả lời dài, hào hứng. " * (chars // 26) + '"}'
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=1800, completion_tokens=350, total_tokens=2150),
+    )
+
+
+def _set_app_log_level(level: int) -> None:
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("app."):
+            logging.getLogger(name).setLevel(level)
+
+
+def run_mode(name: str, overrides: Dict[str, Any], args) -> Dict[str, float]:
+    defaults = {key: getattr(settings, key) for key in MODES["sync_full"]}
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+    sink = CountingSink()
+    configure_logging(stream=sink)
+    try:
+        log = _conversation_log(args.turns)
+        result = _memory_result(args.facts)
+        response = _llm_response(args.response_chars)
+        client = LLMAnalysisClient.__new__(LLMAnalysisClient)
+        user_prompt = "Phân tích hội thoại sau:\n" + "\n".join(entry["text"] for entry in log)
+
+        process_started = time.process_time()
+        wall_started = time.perf_counter()
+        thread_started = time.thread_time()
+        for index in range(args.events):
+            conversation_id = f"conv_bench_{index}"
+            _prepare_memory_api_request(log, "user_bench", conversation_id)
+            _interpret_memory_api_result(result, conversation_id)
+            client._extract_result_text(response, user_prompt, "engagement", time.perf_counter())
+        caller_cpu = time.thread_time() - thread_started
+        caller_wall = time.perf_counter() - wall_started
+        dropped = dropped_log_records()
+        shutdown_logging()  # chờ listener ghi hết queue
+        process_cpu = time.process_time() - process_started
+    finally:
+        for key, value in defaults.items():
+            setattr(settings, key, value)
+
+    return {
+        "caller_cpu_us": round(caller_cpu / args.events * 1e6, 2),
+        "process_cpu_us": round(process_cpu / args.events * 1e6, 2),
+        "caller_wall_us": round(caller_wall / args.events * 1e6, 2),
+        "stdout_bytes_per_event": round(sink.bytes / args.events, 1),
+        "stdout_writes_per_event": round(sink.writes / args.events, 2),
+        "dropped_records": dropped,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Logging overhead per worker event")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=100, help="Số turn của conversation gửi Mem0")
+    parser.add_argument("--facts", type=int, default=10)
+    parser.add_argument("--response-chars", type=int, default=4000, help="Độ dài raw LLM response")
+    parser.add_argument("--results-file", default="", help="Ghi thêm file kết quả (bench_results)")
+    args = parser.parse_args()
+
+    settings.MEMORY_API_ENABLED = True
+    settings.MEMORY_API_URL = settings.MEMORY_API_URL or "http://mem0.benchmark.local"
+    _set_app_log_level(logging.INFO)
+
+    results = {name: run_mode(name, overrides, args) for name, overrides in MODES.items()}
+    configure_logging()  # trả logger về stdout
+
+    print(f"events={args.events} turns={args.turns} response_chars={args.response_chars} "
+          f"sample_rate={settings.LOG_PAYLOAD_SAMPLE_RATE}")
+    print(f"{'mode':<12}{'caller cpu us':>15}{'process cpu us':>16}{'wall us':>10}{'bytes':>11}{'writes':>8}{'dropped':>9}")
+    for name, metrics in results.items():
+        print(f"{name:<12}{metrics['caller_cpu_us']:>15.1f}{metrics['process_cpu_us']:>16.1f}"
+              f"{metrics['caller_wall_us']:>10.1f}{metrics['stdout_bytes_per_event']:>11.0f}"
+              f"{metrics['stdout_writes_per_event']:>8.1f}{metrics['dropped_records']:>9}")
+
+    if args.results_file:
+        write_results("logging_overhead", results, params=vars(args), path=args.results_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Microbenchmarks cho các hàm CPU-bound chạy trên mỗi event / mỗi lần suggest, có baseline
+và ngưỡng regression.
+
+Cases (synthetic, deterministic):
+- conversation: transform_conversation_logs, is_api_format, format_conversation_for_llm,
+  format_conversation_for_memory_api, FriendshipScoreCalculationService._count_complete_turns
+  với 10 / 100 / 500 / 2000 turns
+- topic map: AgentSelectionService._get_topics_by_score / _get_topics_by_turns với
+  5 / 50 / 500 / 5000 topics; _build_final_prompt (persona multi-KB);
+  FriendshipStatusRepository._determine_topic_level
+
+Mỗi case: calibrate số lần gọi để 1 round >= `--min-round-ms`, chạy `--rounds` rounds,
+lấy min (ít nhiễu nhất) và median thời gian / call (µs).
+
+- `--save-baseline`: ghi kết quả vào `--baseline` (mặc định benchmarks/baselines/microbench.json)
+- mặc định: so với baseline, exit 1 khi min_us của 1 case tăng quá `--threshold` %
+  (`--case-threshold name=pct` để nới riêng cho case nhiễu) hoặc khi chưa có file baseline
+
+benchmarks/baselines/microbench.json được commit làm mốc tham chiếu; khi đổi máy / runner
+thì chạy lại `--save-baseline` trên commit gốc trước khi so.
+
+Baseline phụ thuộc máy: tạo baseline và so sánh trên cùng 1 máy / runner. Logger của app
+mặc định hạ về WARNING (`--log-level INFO` để đo cả chi phí logging).
+
+Usage:
+    python benchmarks/microbench.py --save-baseline
+    python benchmarks/microbench.py --threshold 15 --filter topics
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.constants_enums import FriendshipLevel  # noqa: E402
+from app.repositories.friendship_status_repository import FriendshipStatusRepository  # noqa: E402
+from app.services.agent_selection_service import AgentSelectionService  # noqa: E402
+from app.services.friendship_score_calculation_service import FriendshipScoreCalculationService  # noqa: E402
+from app.services.utils.llm_analysis_utils import (  # noqa: E402
+    format_conversation_for_llm,
+    format_conversation_for_memory_api,
+)
+from app.utils.conversation_log_transform import is_api_format, transform_conversation_logs  # noqa: E402
+
+from bench_results import write_results  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "microbench.json")
+TURN_SIZES = (10, 100, 500, 2000)
+TOPIC_SIZES = (5, 50, 500, 5000)
+
+
+def api_log(turns: int, seed: int = 7) -> List[Dict[str, str]]:
+    """Log dạng API (character/content) như backend gửi lên."""
+    rng = random.Random(seed)
+    log = []
+    for index in range(turns):
+        log.append({
+            "character": "BOT_RESPONSE_CONVERSATION",
+            "content": f"Pika hỏi nè, lượt {index}: hôm nay con thích làm gì nhất? " * rng.randint(1, 3),
+        })
+        log.append({
+            "character": "USER_RESPONSE_CONVERSATION",
+            "content": f"Con thích vẽ tranh và đá bóng với bạn số {rng.randint(1, 99)}." + (" Còn Pika?" if index % 4 == 0 else ""),
+        })
+    return log
+
+
+def standard_log(turns: int) -> List[Dict[str, Any]]:
+    end_time = datetime(2026, 1, 1, 10, 30, tzinfo=timezone.utc)
+    return transform_conversation_logs(api_log(turns), end_time - timedelta(minutes=30), end_time)
+
+
+def topic_metrics(topics: int, seed: int = 11) -> Dict[str, Dict[str, Any]]:
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return {
+        f"topic_{index:05d}": {
+            "score": round(rng.uniform(0, 200), 2),
+            "turns": rng.randint(0, 500),
+            "level": rng.choice([level.value for level in FriendshipLevel]),
+            "last_date": (base + timedelta(minutes=rng.randint(0, 500000))).isoformat(),
+        }
+        for index in range(topics)
+    }
+
+
+def build_cases() -> List[Tuple[str, Callable[[], Any]]]:
+    # Chỉ gọi các helper thuần (không đụng self.db / prompt catalog) -> không cần DB
+    selection = AgentSelectionService.__new__(AgentSelectionService)
+    status_repo = FriendshipStatusRepository.__new__(FriendshipStatusRepository)
+    score_service = FriendshipScoreCalculationService()
+    start_time = datetime(2026, 1, 1, 10, 0, tzinfo=timezone.utc)
+    end_time = start_time + timedelta(minutes=30)
+
+    cases: List[Tuple[str, Callable[[], Any]]] = []
+    for turns in TURN_SIZES:
+        raw, log = api_log(turns), standard_log(turns)
+        cases += [
+            (f"transform_conversation_logs[{turns}]",
+             lambda raw=raw: transform_conversation_logs(raw, start_time, end_time)),
+            (f"is_api_format[{turns}]", lambda raw=raw, log=log: (is_api_format(raw), is_api_format(log))),
+            (f"format_conversation_for_llm[{turns}]", lambda log=log: format_conversation_for_llm(log)),
+            (f"format_conversation_for_memory_api[{turns}]", lambda log=log: format_conversation_for_memory_api(log)),
+            (f"count_complete_turns[{turns}]", lambda log=log: score_service._count_complete_turns(log)),
+        ]
+
+    for topics in TOPIC_SIZES:
+        metrics = topic_metrics(topics)
+        exclude = set(list(metrics)[:2])
+        cases += [
+            (f"topics_by_score[{topics}]", lambda metrics=metrics: selection._get_topics_by_score(metrics, 2, exclude)),
+            (f"topics_by_turns[{topics}]", lambda metrics=metrics: selection._get_topics_by_turns(metrics, 1, exclude)),
+        ]
+
+    persona = SimpleNamespace(
+        context_style_guideline="Bạn là Pika, nói chuyện vui vẻ, ngắn gọn.\n" * 60,
+        user_profile="Bé 7 tuổi, thích khủng long, vẽ tranh, bóng đá.\n" * 40,
+    )
+    agenda = "Hỏi bé về bộ phim hoạt hình yêu thích, gợi ý kể lại một cảnh.\n" * 50
+    cases.append(("build_final_prompt", lambda: selection._build_final_prompt(persona=persona, talking_agenda=agenda)))
+
+    levels = list(FriendshipLevel)
+    level_inputs = [(score, user_level, topic_level.value)
+                    for score in (0.0, 49.9, 50.0, 120.0, 150.0, 400.0)
+                    for user_level in levels for topic_level in levels]
+    cases.append((
+        "determine_topic_level",
+        lambda: [status_repo._determine_topic_level(*args) for args in level_inputs],
+    ))
+    return cases
+
+
+def measure(fn: Callable[[], Any], rounds: int, min_round_ms: float) -> Dict[str, float]:
+    """Per-call time (µs): min + median qua `rounds` rounds."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed * 1000 >= min_round_ms or number >= 1_000_000:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_round_ms / 1000 / elapsed) + 1)
+    per_call = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - started) / number * 1e6)
+    return {
+        "min_us": round(min(per_call), 3),
+        "median_us": round(statistics.median(per_call), 3),
+        "calls_per_round": number,
+    }
+
+
+def _set_app_log_level(level: str) -> None:
+    value = getattr(logging, level.upper(), logging.WARNING)
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("app."):
+            logging.getLogger(name).setLevel(value)
+
+
+def _parse_case_thresholds(items: List[str]) -> Dict[str, float]:
+    thresholds = {}
+    for item in items:
+        name, _, pct = item.partition("=")
+        thresholds[name.strip()] = float(pct)
+    return thresholds
+
+
+def check_regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold_pct: float,
+    case_thresholds: Dict[str, float],
+) -> List[str]:
+    failures = []
+    print(f"\n{'case':<44}{'baseline µs':>13}{'current µs':>13}{'change':>9}")
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if not reference or not reference.get("min_us"):
+            print(f"{name:<44}{'-':>13}{current['min_us']:>13.2f}{'new':>9}")
+            continue
+        change = (current["min_us"] - reference["min_us"]) / reference["min_us"] * 100
+        limit = case_thresholds.get(name, threshold_pct)
+        flag = "  ❌" if change > limit else ""
+        if flag:
+            failures.append(f"{name}: {reference['min_us']:.2f} -> {current['min_us']:.2f} µs (+{change:.1f}% > {limit}%)")
+        print(f"{name:<44}{reference['min_us']:>13.2f}{current['min_us']:>13.2f}{change:>8.1f}%{flag}")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for hot pure functions")
+    parser.add_argument("--filter", default="", help="Chỉ chạy case chứa chuỗi này")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-round-ms", type=float, default=50.0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Ghi kết quả làm baseline mới")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Regression threshold (%%) trên min_us")
+    parser.add_argument("--case-threshold", action="append", default=[], metavar="NAME=PCT")
+    parser.add_argument("--log-level", default="WARNING", help="Level cho logger app.* khi đo")
+    parser.add_argument("--results-file", default="", help="Ghi thêm file kết quả (bench_results)")
+    args = parser.parse_args()
+
+    _set_app_log_level(args.log_level)
+    results: Dict[str, Dict[str, float]] = {}
+    for name, fn in build_cases():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(fn, args.rounds, args.min_round_ms)
+        print(f"{name:<44}{results[name]['min_us']:>12.2f} µs (median {results[name]['median_us']:.2f})")
+
+    if args.results_file:
+        write_results("microbench", results, params=vars(args), path=args.results_file)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as handle:
+                baseline = json.load(handle)
+        baseline.update(results)  # --filter chỉ cập nhật các case đã chạy
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(baseline, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        print(f"📄 Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"❌ No baseline at {args.baseline}; run with --save-baseline first")
+        sys.exit(1)
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    failures = check_regressions(results, baseline, args.threshold, _parse_case_thresholds(args.case_threshold))
+    if failures:
+        print(f"\n❌ {len(failures)} regression(s):")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+So sánh message queue cũ (json.dumps cả conversation_log) với compact schema (orjson).
+
+In ra bytes/message và thời gian encode cho hội thoại N turns; không cần RabbitMQ.
+
+Usage:
+    python benchmarks/queue_message_size.py --turns 200 --iterations 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.background.message_codec import build_event_message, encode_message  # noqa: E402
+
+
+def _conversation_log(turns: int):
+    log = []
+    for index in range(turns):
+        log.append({"speaker": "pika", "turn_id": index * 2, "text": "Hôm nay bạn đã làm gì vui không? " * 3})
+        log.append({"speaker": "user", "turn_id": index * 2 + 1, "text": "Mình đi chơi công viên với bố mẹ. " * 2})
+    return log
+
+
+def _legacy_message(log):
+    return {
+        "conversation_id": "conv_benchmark_123",
+        "user_id": "user_benchmark",
+        "bot_id": "talk_movie_preference",
+        "conversation_log": log,
+        "enqueued_at": datetime.utcnow().isoformat(),
+    }
+
+
+def _time_it(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Queue message size / encode benchmark")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    legacy = _legacy_message(_conversation_log(args.turns))
+    compact = build_event_message(
+        123456,
+        "conv_benchmark_123",
+        "user_benchmark",
+        trace={"traceparent": "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"},
+    )
+
+    legacy_bytes = len(json.dumps(legacy).encode("utf-8"))
+    compact_bytes = len(encode_message(compact))
+    legacy_us = _time_it(lambda: json.dumps(legacy).encode("utf-8"), args.iterations)
+    compact_us = _time_it(lambda: encode_message(compact), args.iterations)
+
+    print(f"turns={args.turns} iterations={args.iterations}")
+    print(f"{'schema':<22}{'bytes':>12}{'encode us':>12}")
+    print(f"{'legacy (json.dumps)':<22}{legacy_bytes:>12}{legacy_us:>12.2f}")
+    print(f"{'compact (orjson)':<22}{compact_bytes:>12}{compact_us:>12.2f}")
+    print(f"size ratio: {legacy_bytes / compact_bytes:.1f}x, encode ratio: {legacy_us / compact_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Throughput: `/v1/activities/suggest` từng user vs `/v1/activities/suggest/batch` (NDJSON).
+
+Pha 1 gọi endpoint single cho N users với `--concurrency` request song song (cách backend
+pre-fetch hiện tại); pha 2 gửi cùng N users qua endpoint batch (chia `--batch-size` users /
+request) và đọc stream từng dòng. In users/s, thời gian tới dòng đầu tiên và số lỗi.
+
+Usage:
+    python benchmarks/suggest_batch_throughput.py \\
+        --base-url http://localhost:8000 \\
+        --user-prefix bench_user_ --users 2000 --concurrency 32 --batch-size 1000
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List, Tuple
+
+import httpx
+
+
+async def _run_single(client: httpx.AsyncClient, user_ids: List[str], concurrency: int) -> Tuple[float, int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one(user_id: str) -> None:
+        nonlocal errors
+        async with semaphore:
+            try:
+                response = await client.post("/v1/activities/suggest", json={"user_id": user_id})
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(user_id) for user_id in user_ids))
+    return time.perf_counter() - started, errors
+
+
+async def _run_batch(client: httpx.AsyncClient, user_ids: List[str], batch_size: int) -> Tuple[float, float, int, int]:
+    started = time.perf_counter()
+    first_line_at = None
+    lines = 0
+    errors = 0
+    for offset in range(0, len(user_ids), batch_size):
+        chunk = user_ids[offset:offset + batch_size]
+        async with client.stream("POST", "/v1/activities/suggest/batch", json={"user_ids": chunk}) as response:
+            if response.status_code != 200:
+                errors += len(chunk)
+                continue
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                if first_line_at is None:
+                    first_line_at = time.perf_counter()
+                lines += 1
+                if not json.loads(line).get("success"):
+                    errors += 1
+    elapsed = time.perf_counter() - started
+    first_line_ms = ((first_line_at or time.perf_counter()) - started) * 1000
+    return elapsed, first_line_ms, lines, errors
+
+
+async def main_async(args) -> None:
+    user_ids = [f"{args.user_prefix}{index}" for index in range(args.users)]
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+        single_s, single_errors = await _run_single(client, user_ids, args.concurrency)
+        batch_s, first_line_ms, lines, batch_errors = await _run_batch(client, user_ids, args.batch_size)
+
+    print(f"users={args.users} concurrency={args.concurrency} batch_size={args.batch_size}")
+    print(f"{'mode':<10}{'seconds':>10}{'users/s':>12}{'errors':>9}")
+    print(f"{'single':<10}{single_s:>10.2f}{args.users / single_s:>12.1f}{single_errors:>9}")
+    print(f"{'batch':<10}{batch_s:>10.2f}{lines / batch_s if batch_s else 0:>12.1f}{batch_errors:>9}")
+    print(f"batch first line: {first_line_ms:.1f} ms, lines received: {lines}")
+    if batch_s:
+        print(f"speedup: {single_s / batch_s:.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Single vs batch suggest throughput")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--user-prefix", default="bench_user_")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Worker throughput: events/s của RabbitMQ consumer và scheduler path trên data seed sẵn.
+
+Seed N conversation_events (`--turns` turns, nội dung khác nhau để không hit LLM analysis
+cache, rải trên `--users` users) rồi xử lý bằng 1 trong các mode:
+
+- callback : `RabbitMQConsumer.callback` (sequential) hoặc `ConcurrentRabbitMQConsumer.callback`
+             (`--workers` > 1). Broker được thay bằng LocalBroker in-process: giao message theo
+             prefetch như RabbitMQ, ack/nack và add_callback_threadsafe chạy trên main thread
+             (như connection thread của pika) -> đo đúng consumer + processing, không cần
+             RabbitMQ. Latency = từ lúc giao message tới lúc ack/nack.
+- due      : `ConversationEventProcessingService.process_due_events(--batch-size)` lặp tới hết
+- bulk     : `process_due_events_bulk(--batch-size, --concurrency)` lặp tới hết
+
+Groq/Mem0 nên trỏ vào benchmarks/fake_upstreams.py (GROQ_BASE_URL, MEMORY_API_URL) để
+latency upstream cố định giữa các lần chạy. Mode due/bulk claim MỌI event đến hạn trong DB:
+chạy trên DB benchmark và tắt scheduler. Rows seed (events, friendship_status,
+user_topic_metrics của users benchmark) bị xóa khi kết thúc (trừ khi --keep).
+
+Usage:
+    python benchmarks/worker_throughput.py --mode callback --workers 8 --events 500 --turns 30
+    python benchmarks/worker_throughput.py --mode due --batch-size 50 --events 500
+"""
+import argparse
+import os
+import queue
+import sys
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import delete, func, select  # noqa: E402
+
+from app.background.message_codec import build_event_message, encode_message  # noqa: E402
+from app.background.rabbitmq_consumer import ConcurrentRabbitMQConsumer, RabbitMQConsumer  # noqa: E402
+from app.core.constants_enums import ConversationEventStatus  # noqa: E402
+from app.db.database_connection import SessionLocal  # noqa: E402
+from app.models.conversation_event_model import ConversationEvent  # noqa: E402
+from app.models.friendship_status_model import FriendshipStatus  # noqa: E402
+from app.models.user_topic_metrics_model import UserTopicMetric  # noqa: E402
+from app.repositories.conversation_event_repository import ConversationEventRepository  # noqa: E402
+from app.services.conversation_data_fetch_service import ConversationDataFetchService  # noqa: E402
+from app.services.conversation_event_processing_service import ConversationEventProcessingService  # noqa: E402
+from app.services.friendship_score_calculation_service import FriendshipScoreCalculationService  # noqa: E402
+from app.services.friendship_status_update_service import FriendshipStatusUpdateService  # noqa: E402
+from app.services.utils.llm_analysis_utils import close_analysis_clients  # noqa: E402
+from app.utils.conversation_features import extract_conversation_features  # noqa: E402
+
+from bench_results import latency_summary, write_results  # noqa: E402
+
+PREFIX = "bench_worker_"
+
+
+def _conversation_log(turns: int, index: int) -> List[Dict[str, str]]:
+    log = []
+    for turn in range(turns):
+        log.append({"speaker": "pika", "text": f"[{index}] Hôm nay con làm gì vui, lượt {turn}?"})
+        question = " Pika có thích không?" if (index + turn) % 5 == 0 else ""
+        log.append({"speaker": "user", "text": f"[{index}] Con vẽ tranh con mèo số {turn}.{question}"})
+    return log
+
+
+def _seed(events: int, users: int, turns: int, due: bool) -> List[Tuple[int, str, str]]:
+    """Insert events, return (id, conversation_id, user_id) theo thứ tự tạo."""
+    now = datetime.now(timezone.utc)
+    # callback: claim_event() claim PENDING ngay, next_attempt_at xa để scheduler thật không lấy
+    next_attempt_at = now if due else now + timedelta(days=1)
+    db = SessionLocal()
+    try:
+        rows = []
+        for index in range(events):
+            log = _conversation_log(turns, index)
+            rows.append(
+                ConversationEvent(
+                    conversation_id=f"conv_{PREFIX}{index}",
+                    user_id=f"{PREFIX}user_{index % max(1, users)}",
+                    bot_type="TALK",
+                    bot_id="talk_movie_preference",
+                    bot_name="Movie Preference Talk",
+                    start_time=now - timedelta(minutes=10),
+                    end_time=now,
+                    conversation_log=log,
+                    status=ConversationEventStatus.PENDING.value,
+                    next_attempt_at=next_attempt_at,
+                    **extract_conversation_features(log).as_columns(),
+                )
+            )
+        db.add_all(rows)
+        db.commit()
+        return [(row.id, row.conversation_id, row.user_id) for row in rows]
+    finally:
+        db.close()
+
+
+def _cleanup() -> None:
+    db = SessionLocal()
+    try:
+        db.execute(delete(ConversationEvent).where(ConversationEvent.conversation_id.like(f"conv_{PREFIX}%")))
+        db.execute(delete(UserTopicMetric).where(UserTopicMetric.user_id.like(f"{PREFIX}%")))
+        db.execute(delete(FriendshipStatus).where(FriendshipStatus.user_id.like(f"{PREFIX}%")))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _status_counts() -> Dict[str, int]:
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(ConversationEvent.status, func.count())
+            .where(ConversationEvent.conversation_id.like(f"conv_{PREFIX}%"))
+            .group_by(ConversationEvent.status)
+        ).all()
+        return {status: count for status, count in rows}
+    finally:
+        db.close()
+
+
+class _LocalConnection:
+    """add_callback_threadsafe -> queue, chạy trên main thread (như pika connection thread)."""
+
+    def __init__(self):
+        self.callbacks: "queue.Queue" = queue.Queue()
+        self.is_closed = False
+
+    def add_callback_threadsafe(self, callback) -> None:
+        self.callbacks.put(callback)
+
+    def close(self) -> None:
+        self.is_closed = True
+
+
+class _LocalChannel:
+    def __init__(self):
+        self.on_settle = None
+
+    def basic_ack(self, delivery_tag: int) -> None:
+        self.on_settle(delivery_tag, "ack")
+
+    def basic_nack(self, delivery_tag: int, requeue: bool = True) -> None:
+        self.on_settle(delivery_tag, "nack")
+
+    def basic_qos(self, prefetch_count: int) -> None:
+        return None
+
+    def stop_consuming(self) -> None:
+        return None
+
+
+class _Delivery:
+    def __init__(self, delivery_tag: int):
+        self.delivery_tag = delivery_tag
+
+
+def _local(consumer_class):
+    """Consumer class với `_connect` gắn LocalBroker thay vì RabbitMQ."""
+    class LocalConsumer(consumer_class):
+        def _connect(self):
+            self.connection = _LocalConnection()
+            self.channel = _LocalChannel()
+    return LocalConsumer
+
+
+class LocalBroker:
+    """Giao message cho consumer.callback theo prefetch_count, ghi latency giao -> settle."""
+
+    def __init__(self, consumer: RabbitMQConsumer, bodies: List[bytes]):
+        self.consumer = consumer
+        self.pending: Deque[Tuple[int, bytes]] = deque(enumerate(bodies, 1))
+        self.delivered_at: Dict[int, float] = {}
+        self.latencies_ms: List[float] = []
+        self.outcomes: Counter = Counter()
+        consumer.channel.on_settle = self._settled
+
+    def _settled(self, delivery_tag: int, outcome: str) -> None:
+        self.latencies_ms.append((time.perf_counter() - self.delivered_at.pop(delivery_tag)) * 1000)
+        self.outcomes[outcome] += 1
+
+    def run(self) -> None:
+        while self.pending or self.delivered_at:
+            while self.pending and len(self.delivered_at) < self.consumer.prefetch_count:
+                delivery_tag, body = self.pending.popleft()
+                self.delivered_at[delivery_tag] = time.perf_counter()
+                self.consumer.callback(self.consumer.channel, _Delivery(delivery_tag), None, body)
+            if not self.delivered_at:
+                continue
+            try:
+                self.consumer.connection.callbacks.get(timeout=0.5)()
+            except queue.Empty:
+                continue
+
+
+def run_callback_mode(seeded: List[Tuple[int, str, str]], workers: int) -> Dict[str, object]:
+    if workers > 1:
+        consumer = _local(ConcurrentRabbitMQConsumer)(workers=workers)
+    else:
+        consumer = _local(RabbitMQConsumer)(prefetch_count=1)
+    bodies = [
+        encode_message(build_event_message(event_id, conversation_id, user_id))
+        for event_id, conversation_id, user_id in seeded
+    ]
+    broker = LocalBroker(consumer, bodies)
+    started = time.perf_counter()
+    try:
+        broker.run()
+    finally:
+        elapsed = time.perf_counter() - started
+        executor = getattr(consumer, "_executor", None)
+        if executor is not None:
+            executor.shutdown(wait=True)
+    return {
+        "seconds": round(elapsed, 2),
+        "events_per_second": round(len(bodies) / elapsed, 2) if elapsed else 0.0,
+        "acked": broker.outcomes["ack"],
+        "nacked": broker.outcomes["nack"],
+        **latency_summary(broker.latencies_ms),
+    }
+
+
+def run_due_mode(bulk: bool, batch_size: int, concurrency: int) -> Dict[str, object]:
+    batch_ms: List[float] = []
+    totals = Counter()
+    started = time.perf_counter()
+    while True:
+        db = SessionLocal()
+        try:
+            processor = ConversationEventProcessingService(
+                db=db,
+                score_service=FriendshipScoreCalculationService(
+                    conversation_fetch_service=ConversationDataFetchService(
+                        conversation_repository=ConversationEventRepository(db),
+                        external_api_client=None,
+                    )
+                ),
+                status_update_service=FriendshipStatusUpdateService(db),
+            )
+            batch_started = time.perf_counter()
+            if bulk:
+                stats = processor.process_due_events_bulk(batch_size=batch_size, concurrency=concurrency)
+            else:
+                stats = processor.process_due_events(batch_size=batch_size)
+        finally:
+            db.close()
+        if not stats["total"]:
+            break
+        batch_ms.append((time.perf_counter() - batch_started) * 1000)
+        totals.update(stats)
+    elapsed = time.perf_counter() - started
+    return {
+        "seconds": round(elapsed, 2),
+        "events_per_second": round(totals["total"] / elapsed, 2) if elapsed else 0.0,
+        "processed": totals["processed"],
+        "failed": totals["failed"],
+        "batches": len(batch_ms),
+        **{f"batch_{key}": value for key, value in latency_summary(batch_ms).items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker throughput benchmark")
+    parser.add_argument("--mode", choices=["callback", "due", "bulk"], default="callback")
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50, help="Events rải trên N users (ordering theo user)")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=1, help="callback: >1 = ConcurrentRabbitMQConsumer")
+    parser.add_argument("--batch-size", type=int, default=50, help="due/bulk")
+    parser.add_argument("--concurrency", type=int, default=8, help="bulk")
+    parser.add_argument("--results-file", default="")
+    parser.add_argument("--keep", action="store_true", help="Không xóa rows benchmark")
+    args = parser.parse_args()
+
+    _cleanup()
+    seeded = _seed(args.events, args.users, args.turns, due=args.mode != "callback")
+    print(f"🌱 Seeded {len(seeded)} events ({args.turns} turns, {args.users} users), mode={args.mode}")
+    try:
+        if args.mode == "callback":
+            result = run_callback_mode(seeded, args.workers)
+        else:
+            result = run_due_mode(args.mode == "bulk", args.batch_size, args.concurrency)
+        result["final_status"] = _status_counts()
+    finally:
+        close_analysis_clients()
+        if not args.keep:
+            _cleanup()
+
+    case = f"{args.mode}_w{args.workers}" if args.mode == "callback" else f"{args.mode}_b{args.batch_size}"
+    for key, value in result.items():
+        print(f"  {key:<22}{value}")
+    write_results("worker_throughput", {case: result}, params=vars(args), path=args.results_file or None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Standalone process chạy APScheduler job xử lý conversation events.
+
+Dùng khi CONVERSATION_EVENT_SCHEDULER_MODE=standalone để job không chạy trong process API.
+
+Run: python src/scheduler.py
+     python src/scheduler.py --daily-rollup 2026-10-16   # rollup 1 ngày rồi thoát
+     python src/scheduler.py --daily-rollup pending      # rollup các ngày còn thiếu rồi thoát
+"""
+import argparse
+import sys
+import os
+from datetime import date
+
+# Add src/ to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app.background.conversation_event_scheduler import run_standalone_scheduler
+from app.background.daily_rollup_job import run_daily_rollup, run_pending_daily_rollups
+from app.utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Conversation event scheduler")
+    parser.add_argument(
+        "--daily-rollup",
+        metavar="YYYY-MM-DD|pending",
+        help="Chạy end-of-day rollup 1 lần (theo ngày hoặc các ngày còn thiếu) rồi thoát",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    if args.daily_rollup:
+        if args.daily_rollup == "pending":
+            reports = run_pending_daily_rollups()
+        else:
+            reports = [run_daily_rollup(date.fromisoformat(args.daily_rollup))]
+        for report in reports:
+            logger.info(f"📊 Daily rollup report: {report}")
+        sys.exit(0)
+
+    logger.info("🕒 Starting conversation event scheduler...")
+    try:
+        run_standalone_scheduler()
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("🛑 Scheduler stopped by user")
+    except Exception as e:
+        logger.error(f"❌ Scheduler crashed: {str(e)}", exc_info=True)
+        raise
@@ -0,0 +1,127 @@
+"""
+Candidates cache: batch pre-warm (`/suggest/batch`) phải phục vụ được `/activities/suggest`
+khi bật CANDIDATES_RAW_RESPONSE_ENABLED.
+"""
+import asyncio
+
+import pytest
+
+from app.cache import candidates_cache_manager
+from app.core.config_settings import settings
+from app.services import activity_suggestion_service
+from app.services.activity_suggestion_service import AsyncActivitySuggestionService, SuggestionBatch
+
+
+def _agent(agent_id: str, agent_type: str):
+    return {
+        "agent_id": agent_id,
+        "agent_name": agent_id,
+        "agent_type": agent_type,
+        "friendship_level": "PHASE1_STRANGER",
+    }
+
+
+def _candidates(user_id: str):
+    return {
+        "user_id": user_id,
+        "friendship_level": "PHASE1_STRANGER",
+        "greeting_agent": _agent("greeting_hello", "GREETING"),
+        "talk_agents": [_agent("talk_movie", "TALK")],
+        "game_agents": [],
+    }
+
+
+class FakeRedis:
+    """In-memory Redis cho các lệnh CandidatesCacheManager dùng; eval = _SET_IF_CURRENT_SCRIPT."""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, *keys):
+        keys = keys[0] if len(keys) == 1 and isinstance(keys[0], list) else keys
+        return [self.data.get(key) for key in keys]
+
+    def eval(self, script, numkeys, *keys_and_args):
+        assert script == candidates_cache_manager._SET_IF_CURRENT_SCRIPT
+        keys, args = keys_and_args[:numkeys], keys_and_args[numkeys:]
+        if (self.data.get(keys[1]) or "0") != args[0]:
+            return 0
+        self.data[keys[0]] = args[2]
+        if len(keys) > 2:
+            self.data[keys[2]] = args[3]
+        return 1
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def eval(self, *args):
+        self.calls.append(args)
+
+    def execute(self):
+        return [self.redis.eval(*args) for args in self.calls]
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(candidates_cache_manager, "get_redis_client", lambda: fake)
+    monkeypatch.setattr(activity_suggestion_service, "get_prompt_catalog", lambda: None)
+    monkeypatch.setattr(settings, "CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "CANDIDATES_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "CANDIDATES_RAW_RESPONSE_ENABLED", True)
+    return fake
+
+
+@pytest.fixture
+def service():
+    service = AsyncActivitySuggestionService.__new__(AsyncActivitySuggestionService)
+    service.computed = []
+
+    async def compute(user_id):
+        service.computed.append(user_id)
+        return _candidates(user_id)
+
+    service._compute_candidates = compute
+    return service
+
+
+def test_batch_prewarm_writes_rendered_response(redis, service):
+    cache = candidates_cache_manager.CandidatesCacheManager()
+    batch = SuggestionBatch(user_ids=["u1", "u2"], fingerprint=None, cache=cache)
+    results = [{"user_id": user_id, "success": True, "data": _candidates(user_id)} for user_id in batch.user_ids]
+
+    asyncio.run(service._store_batch(batch, results))
+
+    rendered, _ = cache.lookup_response("u1")
+    assert rendered is not None
+    assert asyncio.run(service.get_rendered_suggestions("u1")) == rendered
+    assert service.computed == []
+
+
+def test_rendered_suggestions_fall_back_to_entry(redis, service):
+    cache = candidates_cache_manager.CandidatesCacheManager()
+    # Entry ghi không kèm response (vd pre-warm trước khi bật raw response)
+    cache.set("u1", _candidates("u1"))
+
+    rendered = asyncio.run(service.get_rendered_suggestions("u1"))
+
+    assert service.computed == []
+    assert b'"talk_movie"' in rendered.body
+    assert cache.lookup_response("u1")[0] == rendered
+
+
+def test_rendered_suggestions_recompute_on_miss(redis, service):
+    rendered = asyncio.run(service.get_rendered_suggestions("u1"))
+
+    assert service.computed == ["u1"]
+    assert candidates_cache_manager.CandidatesCacheManager().lookup_response("u1")[0] == rendered
@@ -0,0 +1,211 @@
+"""
+Lease / fencing của conversation event processing trên Postgres thật.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, text, update
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config_settings import settings
+from app.core.constants_enums import ConversationEventStatus
+from app.models.conversation_event_model import ConversationEvent
+from app.models.friendship_status_model import FriendshipStatus
+from app.repositories.conversation_event_repository import ConversationEventRepository
+from app.services import conversation_event_processing_service as processing_module
+from app.services.conversation_event_processing_service import ConversationEventProcessingService
+from app.services.friendship_status_update_service import FriendshipStatusUpdateService
+
+pytestmark = pytest.mark.integration
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_ENABLED", False)
+
+
+@pytest.fixture
+def other_session(pg_engine):
+    """Session của 1 processor khác."""
+    session = sessionmaker(bind=pg_engine, autoflush=False)()
+    yield session
+    session.close()
+
+
+def _create_events(db_session, count: int, user_id: str = "user_test", agent_tag=None):
+    start_time = datetime(2025, 1, 1, 10, 0, tzinfo=timezone.utc)
+    repository = ConversationEventRepository(db_session)
+    for index in range(count):
+        repository.create({
+            "conversation_id": f"conv_test_{index:03d}",
+            "user_id": user_id,
+            "bot_type": "TALK",
+            "bot_id": "b1",
+            "bot_name": "Bot",
+            "agent_tag": agent_tag,
+            "start_time": start_time,
+            "end_time": start_time + timedelta(minutes=20),
+            "conversation_log": [
+                {"speaker": "pika", "turn_id": 1, "text": "Hi"},
+                {"speaker": "user", "turn_id": 2, "text": "Hello"},
+            ],
+            "status": ConversationEventStatus.PENDING.value,
+            "next_attempt_at": datetime.now(timezone.utc) - timedelta(seconds=1),
+        })
+
+
+def _statuses(session):
+    session.expire_all()
+    rows = session.execute(
+        select(ConversationEvent.conversation_id, ConversationEvent.status).order_by(ConversationEvent.id)
+    ).all()
+    return [status for _, status in rows]
+
+
+class FakeScoreService:
+    """Score cố định 10; `on_score` chạy trong lúc "gọi LLM" (giữa claim và apply)."""
+
+    conversation_fetch_service = None
+
+    def __init__(self, on_score=None):
+        self.on_score = on_score
+
+    def calculate_score_from_conversation_data(self, conversation_id, conversation_data):
+        if self.on_score:
+            self.on_score(conversation_id)
+        return {"friendship_score_change": 10.0, "calculation_details": {"total_turns": 1}}
+
+    async def calculate_score_from_conversation_data_async(self, conversation_id, conversation_data):
+        return self.calculate_score_from_conversation_data(conversation_id, conversation_data)
+
+
+def _processing_service(db_session, score_service):
+    return ConversationEventProcessingService(db_session, score_service, FriendshipStatusUpdateService(db_session))
+
+
+def test_marks_are_fenced_after_reclaim(db_session, other_session):
+    _create_events(db_session, 1)
+    first = ConversationEventRepository(db_session)
+    # Lease 0s: hết hạn ngay -> processor khác reclaim được
+    (event,) = first.claim_due_events(batch_size=1, lease_seconds=0, detach=False)
+
+    second = ConversationEventRepository(other_session)
+    (reclaimed,) = second.claim_due_events(batch_size=1, detach=False)
+    assert reclaimed.id == event.id
+
+    assert first.lock_held_events([event]) == set()
+    assert first.mark_processed(event, 10.0, "PHASE1_STRANGER") is False
+    assert first.mark_failed(event, "UNEXPECTED_ERROR", "boom") is False
+    assert _statuses(other_session) == ["PROCESSING"]
+
+    assert second.mark_processed(reclaimed, 5.0, "PHASE1_STRANGER") is True
+    other_session.expire_all()
+    stored = other_session.get(ConversationEvent, event.id)
+    assert stored.status == "PROCESSED"
+    assert stored.friendship_score_change == 5.0
+
+
+def test_process_due_events_claims_one_event_at_a_time(db_session, other_session):
+    _create_events(db_session, 3)
+    seen = []
+
+    def on_score(conversation_id):
+        seen.append((conversation_id, _statuses(other_session)))
+
+    stats = _processing_service(db_session, FakeScoreService(on_score)).process_due_events(batch_size=20)
+
+    assert stats == {"processed": 3, "failed": 0, "total": 3}
+    assert seen == [
+        ("conv_test_000", ["PROCESSING", "PENDING", "PENDING"]),
+        ("conv_test_001", ["PROCESSED", "PROCESSING", "PENDING"]),
+        ("conv_test_002", ["PROCESSED", "PROCESSED", "PROCESSING"]),
+    ]
+    assert other_session.get(FriendshipStatus, "user_test").friendship_score == 30.0
+
+
+def test_crash_before_mark_processed_does_not_apply_score(db_session, other_session, monkeypatch):
+    _create_events(db_session, 1)
+    service = _processing_service(db_session, FakeScoreService())
+
+    def crash(**_):
+        raise RuntimeError("worker died")
+
+    monkeypatch.setattr(service.repository, "mark_processed", crash)
+    stats = service.process_due_events()
+
+    # Status update rollback cùng event -> lần retry sau cộng score đúng 1 lần
+    assert stats == {"processed": 0, "failed": 1, "total": 1}
+    assert other_session.get(FriendshipStatus, "user_test") is None
+    assert _statuses(other_session) == ["FAILED"]
+
+
+def test_topic_update_commits_with_event(db_session, other_session, monkeypatch):
+    _create_events(db_session, 2, agent_tag="talk_movie")
+    monkeypatch.setattr(processing_module, "get_topic_id_from_agent_id", lambda **_: "movie")
+
+    stats = _processing_service(db_session, FakeScoreService()).process_due_events()
+
+    assert stats == {"processed": 2, "failed": 0, "total": 2}
+    assert _statuses(other_session) == ["PROCESSED", "PROCESSED"]
+    status = other_session.get(FriendshipStatus, "user_test")
+    assert status.friendship_score == 20.0
+    assert status.topic_metrics["movie"]["score"] == 20.0
+
+
+def test_topic_update_failure_falls_back_in_same_transaction(db_session, other_session, monkeypatch):
+    _create_events(db_session, 1, agent_tag="talk_movie")
+    monkeypatch.setattr(processing_module, "get_topic_id_from_agent_id", lambda **_: "movie")
+    service = _processing_service(db_session, FakeScoreService())
+
+    def broken_topic_update(**_):
+        db_session.execute(text("SELECT 1/0"))
+
+    monkeypatch.setattr(service.status_update_service, "apply_topic_update", broken_topic_update)
+    stats = service.process_due_events()
+
+    # Savepoint rollback giữ lock event -> fallback apply_score_change + PROCESSED cùng commit
+    assert stats == {"processed": 1, "failed": 0, "total": 1}
+    assert _statuses(other_session) == ["PROCESSED"]
+    assert other_session.get(FriendshipStatus, "user_test").friendship_score == 10.0
+
+
+def test_score_not_applied_when_lease_lost(db_session, other_session):
+    _create_events(db_session, 1)
+    other_lease = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    def reclaim_by_other_processor(conversation_id):
+        other_session.execute(
+            update(ConversationEvent)
+            .where(ConversationEvent.conversation_id == conversation_id)
+            .values(next_attempt_at=other_lease, attempt_count=ConversationEvent.attempt_count + 1)
+        )
+        other_session.commit()
+
+    stats = _processing_service(db_session, FakeScoreService(reclaim_by_other_processor)).process_due_events()
+
+    assert stats == {"processed": 0, "failed": 1, "total": 1}
+    assert other_session.get(FriendshipStatus, "user_test") is None
+    other_session.expire_all()
+    stored = other_session.execute(select(ConversationEvent)).scalar_one()
+    assert stored.status == "PROCESSING"
+    assert stored.next_attempt_at == other_lease
+
+
+def test_bulk_discards_results_of_reclaimed_events(db_session, other_session):
+    _create_events(db_session, 2)
+
+    def reclaim_first(conversation_id):
+        if conversation_id == "conv_test_000":
+            other_session.execute(
+                update(ConversationEvent)
+                .where(ConversationEvent.conversation_id == conversation_id)
+                .values(next_attempt_at=datetime.now(timezone.utc) + timedelta(hours=1))
+            )
+            other_session.commit()
+
+    service = _processing_service(db_session, FakeScoreService(reclaim_first))
+    stats = service.process_due_events_bulk(batch_size=10, concurrency=1)
+
+    assert stats == {"processed": 1, "failed": 0, "total": 2}
+    assert _statuses(other_session) == ["PROCESSING", "PROCESSED"]
+    assert other_session.get(FriendshipStatus, "user_test").friendship_score == 10.0
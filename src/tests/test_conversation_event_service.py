@@ -0,0 +1,65 @@
+"""
+AsyncConversationEventService.create_event trên Postgres thật (asyncpg).
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.config_settings import settings
+from app.repositories.async_conversation_event_repository import AsyncConversationEventRepository
+from app.schemas.conversation_event_schemas import ConversationEventCreateRequest
+from app.services.conversation_event_service import AsyncConversationEventService
+
+pytestmark = [pytest.mark.integration, pytest.mark.asyncio]
+
+
+def _request(conversation_id: str = "conv_test_001", **overrides) -> ConversationEventCreateRequest:
+    # Giống body JSON của POST /v1/conversations/end: thời gian là ISO string có "Z"
+    body = {
+        "conversation_id": conversation_id,
+        "user_id": "user_test",
+        "bot_type": "TALK",
+        "bot_id": "talk_movie_preference",
+        "bot_name": "Movie Preference Talk",
+        "start_time": "2025-01-01T10:00:00Z",
+        "end_time": "2025-01-01T10:20:00Z",
+        "conversation_logs": [
+            {"character": "BOT_RESPONSE_CONVERSATION", "content": "Hello! Ready to talk about movies?"},
+            {"character": "USER_RESPONSE_CONVERSATION", "content": "Yes, I like cartoons."},
+        ],
+    }
+    body.update(overrides)
+    return ConversationEventCreateRequest.model_validate(body)
+
+
+async def test_create_event_stores_timestamps(async_db_session):
+    result = await AsyncConversationEventService(async_db_session).create_event(_request())
+
+    assert result["start_time"] == datetime(2025, 1, 1, 10, 0, tzinfo=timezone.utc)
+    assert result["end_time"] == datetime(2025, 1, 1, 10, 20, tzinfo=timezone.utc)
+    assert result["duration_seconds"] == 1200
+    assert result["status"] == "PENDING"
+    assert result["raw_conversation_log"][0]["character"] == "BOT_RESPONSE_CONVERSATION"
+    assert [entry["speaker"] for entry in result["conversation_log"]] == ["pika", "user"]
+
+    stored = await AsyncConversationEventRepository(async_db_session).get_by_conversation_id("conv_test_001")
+    assert stored is not None
+    assert stored.end_time == result["end_time"]
+
+
+async def test_create_event_with_outbox(async_db_session, monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOX_ENABLED", True)
+
+    result = await AsyncConversationEventService(async_db_session).create_event(_request())
+
+    assert result["id"] is not None
+
+
+async def test_duplicate_conversation_id_gets_suffix(async_db_session):
+    service = AsyncConversationEventService(async_db_session)
+
+    first = await service.create_event(_request())
+    second = await service.create_event(_request())
+
+    assert first["conversation_id"] == "conv_test_001"
+    assert second["conversation_id"].startswith("conv_test_001_")
@@ -0,0 +1,76 @@
+"""
+FriendshipStatusRepository.apply_topic_update trên Postgres thật (jsonb_set trong SQL).
+"""
+import pytest
+from sqlalchemy import text
+
+from app.repositories.async_friendship_status_repository import AsyncFriendshipStatusRepository
+from app.repositories.friendship_status_repository import FriendshipStatusRepository
+
+pytestmark = pytest.mark.integration
+
+
+def test_two_updates_accumulate_on_same_topic(db_session):
+    repository = FriendshipStatusRepository(db_session)
+
+    first = repository.update_topic_metrics("u1", "t1", 10.0, "b1")
+    second = repository.update_topic_metrics("u1", "t1", 10.0, "b2")
+
+    assert isinstance(first, dict)
+    assert second["score"] == 20.0
+    assert second["turns"] == 2
+    assert second["agents_used"] == ["b1", "b2"]
+    assert second["friendship_level"] == "PHASE1_STRANGER"
+
+    topic_metrics = db_session.execute(
+        text("SELECT topic_metrics FROM friendship_status WHERE user_id = 'u1'")
+    ).scalar_one()
+    assert topic_metrics == {"t1": second}
+
+
+def test_same_bot_is_not_appended_twice(db_session):
+    repository = FriendshipStatusRepository(db_session)
+
+    repository.update_topic_metrics("u1", "t1", 5.0, "b1")
+    entry = repository.update_topic_metrics("u1", "t1", 5.0, "b1")
+
+    assert entry["agents_used"] == ["b1"]
+
+
+def test_update_keeps_other_topics_and_user_score(db_session):
+    repository = FriendshipStatusRepository(db_session)
+
+    repository.update_topic_metrics("u1", "t1", 10.0, "b1")
+    row = repository.apply_topic_update("u1", "t2", 30.0, "b2")
+
+    assert set(row.topic_metrics) == {"t1", "t2"}
+    assert row.topic_metrics["t1"]["score"] == 10.0
+    assert row.friendship_score == 40.0
+
+
+def test_malformed_entry_is_replaced(db_session):
+    # Dữ liệu ghi bởi bản cũ: topic entry là JSON string '"{}"' thay vì object
+    FriendshipStatusRepository(db_session).ensure_defaults(["u1"])
+    db_session.execute(
+        text("""UPDATE friendship_status SET topic_metrics = '{"t1": "{}"}'::jsonb WHERE user_id = 'u1'""")
+    )
+    db_session.commit()
+
+    entry = FriendshipStatusRepository(db_session).update_topic_metrics("u1", "t1", 10.0, "b1")
+
+    assert entry["score"] == 10.0
+    assert entry["turns"] == 1
+    assert entry["agents_used"] == ["b1"]
+
+
+@pytest.mark.asyncio
+async def test_async_two_updates_accumulate_on_same_topic(async_db_session):
+    repository = AsyncFriendshipStatusRepository(async_db_session)
+
+    await repository.apply_topic_update("u1", "t1", 10.0, "b1")
+    row = await repository.apply_topic_update("u1", "t1", 10.0, "b2")
+
+    entry = row.topic_metrics["t1"]
+    assert entry["score"] == 20.0
+    assert entry["turns"] == 2
+    assert entry["agents_used"] == ["b1", "b2"]
@@ -0,0 +1,61 @@
+"""
+Analysis cache hit: new_memories_count chỉ được dùng lại cho chính conversation đã gọi Mem0.
+"""
+import pytest
+
+from app.cache import llm_analysis_cache_manager
+from app.cache.llm_analysis_cache_manager import LLMAnalysisCacheManager
+from app.services.utils import llm_analysis_utils
+from app.services.utils.llm_analysis_utils import (
+    _lookup_analysis_cache,
+    _store_analysis_cache,
+    analyze_conversation_with_llm,
+)
+
+LOG = [
+    {"speaker": "pika", "text": "Hi!"},
+    {"speaker": "user", "text": "Bye!"},
+]
+ANALYSIS = {"user_initiated_questions": 1, "session_emotion": "happy", "new_memories_count": 2}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    manager = LLMAnalysisCacheManager(local_size=16, ttl_seconds=60)
+    monkeypatch.setattr(llm_analysis_utils, "get_llm_analysis_cache", lambda: manager)
+    monkeypatch.setattr(llm_analysis_cache_manager, "get_redis_client", lambda: None)
+    return manager
+
+
+def _store(conversation_id):
+    cache, key = _lookup_analysis_cache(LOG, "user_1", "TALK")
+    _store_analysis_cache(cache, key, dict(ANALYSIS), False, True, conversation_id)
+
+
+def test_retry_of_same_conversation_keeps_memories(cache):
+    _store("conv_a")
+
+    result = analyze_conversation_with_llm(LOG, conversation_id="conv_a", user_id="user_1", bot_type="TALK")
+
+    assert result == ANALYSIS
+
+
+def test_other_conversation_with_same_content_gets_no_memories(cache):
+    _store("conv_a")
+
+    result = analyze_conversation_with_llm(LOG, conversation_id="conv_b", user_id="user_1", bot_type="TALK")
+
+    assert result["new_memories_count"] == 0
+    assert result["user_initiated_questions"] == 1
+    assert result["session_emotion"] == "happy"
+    assert "_source_conversation_id" not in result
+
+
+def test_entry_without_source_gets_no_memories(cache):
+    # Entry ghi trước khi có source conversation
+    _, key = _lookup_analysis_cache(LOG, "user_1", "TALK")
+    cache.set(key, dict(ANALYSIS))
+
+    result = analyze_conversation_with_llm(LOG, conversation_id="conv_a", user_id="user_1", bot_type="TALK")
+
+    assert result["new_memories_count"] == 0
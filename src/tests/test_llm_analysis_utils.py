@@ -0,0 +1,38 @@
+"""
+Parse/validate kết quả LLM analysis.
+"""
+import pytest
+
+from app.services.utils.llm_analysis_utils import (
+    _BaseLLMAnalysisClient,
+    _interpret_combined,
+    _interpret_session_emotion,
+    _interpret_user_questions,
+)
+
+
+@pytest.mark.parametrize("value", [None, "many", [1]])
+def test_invalid_question_count_defaults_to_zero(value):
+    data = {"user_initiated_questions": value}
+
+    assert _interpret_user_questions(data) == 0
+    assert _interpret_combined(data)["user_initiated_questions"] == 0
+
+
+def test_question_count_is_clamped():
+    assert _interpret_user_questions({"user_initiated_questions": "3"}) == 3
+    assert _interpret_user_questions({"user_initiated_questions": -2}) == 0
+
+
+def test_base_client_requires_create_client():
+    with pytest.raises(TypeError):
+        _BaseLLMAnalysisClient()
+
+
+def test_combined_matches_separate_parsers():
+    data = {"user_initiated_questions": "2", "session_emotion": "ANGRY!"}
+
+    assert _interpret_combined(data) == {
+        "user_initiated_questions": _interpret_user_questions(data),
+        "session_emotion": _interpret_session_emotion(data),
+    }
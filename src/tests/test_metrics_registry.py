@@ -0,0 +1,30 @@
+"""
+/metrics export của cache stats (cả API lẫn sidecar của worker dùng chung REGISTRY).
+"""
+from app.cache.candidates_cache_manager import candidates_cache_stats
+from app.cache.llm_analysis_cache_manager import llm_analysis_cache_stats
+from app.utils.metrics_registry import render_metrics
+
+
+def _samples():
+    return dict(
+        line.rsplit(" ", 1) for line in render_metrics().splitlines() if line and not line.startswith("#")
+    )
+
+
+def test_cache_stats_are_exported():
+    llm_analysis_cache_stats.reset()
+    candidates_cache_stats.reset()
+    llm_analysis_cache_stats.record("redis_hits")
+    llm_analysis_cache_stats.record("misses")
+    llm_analysis_cache_stats.record("misses")
+    llm_analysis_cache_stats.record("misses")
+    candidates_cache_stats.record_hit(1.0)
+
+    samples = _samples()
+
+    assert samples['pika_llm_analysis_cache_events_total{event="redis_hit"}'] == "1.0"
+    assert samples['pika_llm_analysis_cache_events_total{event="miss"}'] == "3.0"
+    assert samples['pika_candidates_cache_events_total{event="hit"}'] == "1.0"
+    assert samples['pika_cache_hit_rate{cache="llm_analysis"}'] == "0.25"
+    assert samples['pika_cache_hit_rate{cache="candidates"}'] == "1.0"
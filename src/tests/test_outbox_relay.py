@@ -0,0 +1,116 @@
+"""
+Outbox relay: publish cả batch rồi chờ confirms 1 lần; ack / nack / unroutable / lỗi broker.
+"""
+import asyncio
+from types import SimpleNamespace
+
+from aio_pika.exceptions import DeliveryError, PublishError
+from pamqp.commands import Basic
+
+from app.background.outbox_relay import OutboxBatchPublisher, OutboxRelay
+from app.models.event_outbox_model import EventOutbox
+
+
+def _rows(count: int):
+    return [
+        EventOutbox(
+            id=index + 1,
+            conversation_id=f"conv_{index}",
+            routing_key="conversation_events" if index % 2 == 0 else "other_queue",
+            payload={"conversation_id": f"conv_{index}", "priority": 5},
+            attempts=0,
+        )
+        for index in range(count)
+    ]
+
+
+def _unroutable(routing_key: str = "other_queue") -> PublishError:
+    frame = Basic.Return(reply_code=312, reply_text="NO_ROUTE", exchange="", routing_key=routing_key)
+    return PublishError(SimpleNamespace(delivery=frame), frame)
+
+
+def _nack() -> DeliveryError:
+    return DeliveryError(None, Basic.Nack(delivery_tag=1))
+
+
+class FakeExchange:
+    """Confirm chỉ tới khi cả batch đã được gửi: publish tuần tự (1 round-trip / message) sẽ treo."""
+
+    def __init__(self, batch_size: int, outcomes):
+        self.batch_size = batch_size
+        self.outcomes = outcomes
+        self.calls = []
+        self.all_sent = asyncio.Event()
+
+    async def publish(self, message, routing_key, mandatory=False, timeout=None):
+        self.calls.append((routing_key, mandatory, message.priority))
+        if len(self.calls) == self.batch_size:
+            self.all_sent.set()
+        await self.all_sent.wait()
+        outcome = self.outcomes[routing_key]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_publish_batch_waits_for_confirms_once():
+    rows = _rows(4)
+    exchange = FakeExchange(len(rows), {"conversation_events": object(), "other_queue": _unroutable()})
+    publisher = OutboxBatchPublisher()
+
+    async def channel():
+        return type("Channel", (), {"default_exchange": exchange})()
+
+    publisher._get_channel = channel
+
+    results = asyncio.run(asyncio.wait_for(publisher.publish_batch(rows), timeout=2))
+
+    assert [routing_key for routing_key, _, _ in exchange.calls] == [row.routing_key for row in rows]
+    assert all(mandatory for _, mandatory, _ in exchange.calls)
+    assert [call[2] for call in exchange.calls] == [5] * 4
+    assert [result is None for result in results] == [True, False, True, False]
+    assert isinstance(results[1], PublishError)
+
+
+def test_publish_rows_classifies_results():
+    relay = OutboxRelay(batch_size=10, poll_seconds=1)
+    broker_down = ConnectionError("connection reset")
+
+    class FakePublisher:
+        async def publish_batch(self, rows):
+            return [None, _unroutable(), _nack(), broker_down]
+
+        async def close(self):
+            pass
+
+    relay._publisher = FakePublisher()
+    rows = _rows(4)
+
+    published_ids, rejected, broker_error = relay._publish_rows(rows)
+    relay._close_publisher()
+
+    assert published_ids == [1]
+    assert [row.id for row, _ in rejected] == [2, 3]
+    assert rejected[0][1].startswith("PublishError")
+    assert rejected[1][1].startswith("DeliveryError")
+    # Row 4 chưa được confirm -> không xoá, không reschedule; relay reconnect rồi publish lại
+    assert broker_error is broker_down
+
+
+def test_publish_rows_connection_failure_keeps_rows():
+    relay = OutboxRelay(batch_size=10, poll_seconds=1)
+
+    class BrokenPublisher:
+        async def publish_batch(self, rows):
+            raise ConnectionRefusedError("broker down")
+
+        async def close(self):
+            pass
+
+    relay._publisher = BrokenPublisher()
+
+    published_ids, rejected, broker_error = relay._publish_rows(_rows(2))
+    relay._close_publisher()
+
+    assert (published_ids, rejected) == ([], [])
+    assert isinstance(broker_error, ConnectionRefusedError)
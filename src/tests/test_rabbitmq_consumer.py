@@ -0,0 +1,39 @@
+"""
+RabbitMQConsumer._process_message: chỉ message hỏng mới bị ACK bỏ, lỗi xử lý thì requeue.
+"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.background import rabbitmq_consumer
+from app.background.rabbitmq_consumer import ACK, NACK_REQUEUE, RabbitMQConsumer
+
+
+@pytest.fixture
+def consumer():
+    return RabbitMQConsumer.__new__(RabbitMQConsumer)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    db = MagicMock()
+    monkeypatch.setattr(rabbitmq_consumer, "SessionLocal", lambda: db)
+    return db
+
+
+@pytest.mark.parametrize("body", [b"not json", b"[1, 2]"])
+def test_invalid_body_is_acked(consumer, session, body):
+    assert consumer._process_message(body) == ACK
+    session.rollback.assert_not_called()
+
+
+def test_value_error_while_processing_is_requeued(consumer, session, monkeypatch):
+    processor = MagicMock()
+    processor.process_single_event.side_effect = ValueError("bad score")
+    monkeypatch.setattr(rabbitmq_consumer, "ConversationEventProcessingService", lambda **_: processor)
+
+    outcome = consumer._process_message(b'{"id": 1, "conversation_id": "conv_1"}')
+
+    assert outcome == NACK_REQUEUE
+    session.rollback.assert_called_once()
+    session.close.assert_called_once()
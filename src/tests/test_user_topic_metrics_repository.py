@@ -0,0 +1,57 @@
+"""
+Dual-write friendship_status.topic_metrics (JSONB) -> user_topic_metrics trên Postgres thật.
+"""
+import pytest
+
+from app.core.config_settings import settings
+from app.models.user_topic_metrics_model import UserTopicMetric
+from app.repositories.async_friendship_status_repository import AsyncFriendshipStatusRepository
+from app.repositories.friendship_status_repository import FriendshipStatusRepository
+from app.repositories.user_topic_metrics_repository import (
+    UserTopicMetricsRepository,
+    build_upsert_entries_stmt,
+)
+
+
+@pytest.fixture
+def dual_write(monkeypatch):
+    monkeypatch.setattr(settings, "TOPIC_METRICS_DUAL_WRITE", True)
+
+
+def test_build_upsert_rejects_non_dict_entry():
+    with pytest.raises(TypeError):
+        build_upsert_entries_stmt([("u1", "t1", ["{}", {"score": 10}])])
+
+
+def test_build_upsert_empty_entries():
+    assert build_upsert_entries_stmt([]) is None
+
+
+@pytest.mark.integration
+def test_dual_write_matches_jsonb_topic(db_session, dual_write):
+    repository = FriendshipStatusRepository(db_session)
+
+    repository.update_topic_metrics("u1", "t1", 10.0, "b1")
+    row = repository.apply_topic_update("u1", "t1", 15.0, "b2")
+
+    table_entry = UserTopicMetricsRepository(db_session).get_topic_metrics("u1")["t1"]
+    jsonb_entry = row.topic_metrics["t1"]
+    assert table_entry["score"] == jsonb_entry["score"] == 25.0
+    assert table_entry["turns"] == jsonb_entry["turns"] == 2
+    assert table_entry["agents_used"] == jsonb_entry["agents_used"] == ["b1", "b2"]
+    assert table_entry["friendship_level"] == jsonb_entry["friendship_level"]
+    assert table_entry["last_date"] == jsonb_entry["last_date"]
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_async_dual_write_matches_jsonb_topic(async_db_session, dual_write):
+    repository = AsyncFriendshipStatusRepository(async_db_session)
+
+    await repository.apply_topic_update("u1", "t1", 10.0, "b1")
+    row = await repository.apply_topic_update("u1", "t1", 15.0, "b2")
+
+    metric = await async_db_session.get(UserTopicMetric, ("u1", "t1"))
+    assert metric.score == row.topic_metrics["t1"]["score"] == 25.0
+    assert metric.turns == row.topic_metrics["t1"]["turns"] == 2
+    assert metric.agents_used == row.topic_metrics["t1"]["agents_used"] == ["b1", "b2"]